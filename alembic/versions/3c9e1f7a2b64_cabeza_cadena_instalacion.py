@@ -0,0 +1,76 @@
+"""cabeza de cadena por instalacion
+
+Revision ID: 3c9e1f7a2b64
+Revises: 82d845f5a419
+Create Date: 2026-01-12 10:15:42.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e1f7a2b64"
+down_revision: Union[str, None] = "82d845f5a419"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cabeza_cadena_instalacion",
+        sa.Column("instalacion_sif_id", sa.Integer(), nullable=False),
+        sa.Column("ultima_huella", sa.String(length=64), nullable=True),
+        sa.Column("ultimo_emisor_nif", sa.String(length=20), nullable=True),
+        sa.Column("ultima_serie", sa.String(length=50), nullable=True),
+        sa.Column("ultimo_numero", sa.String(length=50), nullable=True),
+        sa.Column("ultima_fecha_expedicion", sa.Date(), nullable=True),
+        sa.Column("ultimo_registro_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column(
+            "ultima_fecha_hora_gen",
+            sa.DateTime(timezone=True),
+            nullable=True,
+            comment="FechaHoraHusoGenRegistro del último registro (orden de la cadena)",
+        ),
+        sa.Column(
+            "num_registros",
+            sa.BigInteger(),
+            server_default=sa.text("0"),
+            nullable=False,
+        ),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["instalacion_sif_id"],
+            ["instalacion_sif.id"],
+        ),
+        sa.PrimaryKeyConstraint("instalacion_sif_id"),
+    )
+
+    # Backfill: último registro (por created_at) de cada instalación
+    op.execute("""
+        INSERT INTO cabeza_cadena_instalacion (
+            instalacion_sif_id, ultima_huella, ultimo_emisor_nif, ultima_serie,
+            ultimo_numero, ultima_fecha_expedicion, ultimo_registro_id,
+            ultima_fecha_hora_gen, num_registros
+        )
+        SELECT DISTINCT ON (r.instalacion_sif_id)
+            r.instalacion_sif_id, r.huella, r.emisor_nif, r.serie, r.numero,
+            r.fecha_expedicion, r.id, r.created_at,
+            COUNT(*) OVER (PARTITION BY r.instalacion_sif_id)
+        FROM registro_facturacion r
+        ORDER BY r.instalacion_sif_id, r.created_at DESC
+        """)
+    # Instalaciones sin registros: cabeza vacía
+    op.execute("""
+        INSERT INTO cabeza_cadena_instalacion (instalacion_sif_id)
+        SELECT i.id FROM instalacion_sif i
+        ON CONFLICT (instalacion_sif_id) DO NOTHING
+        """)
+
+
+def downgrade() -> None:
+    op.drop_table("cabeza_cadena_instalacion")
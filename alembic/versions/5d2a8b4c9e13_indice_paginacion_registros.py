@@ -0,0 +1,42 @@
+"""indice de paginacion por cursor de registros
+
+Revision ID: 5d2a8b4c9e13
+Revises: 3c9e1f7a2b64
+Create Date: 2026-01-19 09:42:07.512836
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2a8b4c9e13"
+down_revision: Union[str, None] = "3c9e1f7a2b64"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY: registro_facturacion es grande y recibe escrituras continuas
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "idx_registro_instalacion_created_id",
+            "registro_facturacion",
+            ["instalacion_sif_id", sa.text("created_at DESC"), sa.text("id DESC")],
+            unique=False,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "idx_registro_instalacion_created_id",
+            table_name="registro_facturacion",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
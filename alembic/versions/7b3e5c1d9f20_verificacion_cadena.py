@@ -0,0 +1,46 @@
+"""punto de control de la verificacion de cadena
+
+Revision ID: 7b3e5c1d9f20
+Revises: 5d2a8b4c9e13
+Create Date: 2026-02-09 11:02:17.550912
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7b3e5c1d9f20"
+down_revision: Union[str, None] = "5d2a8b4c9e13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "verificacion_cadena",
+        sa.Column("instalacion_sif_id", sa.Integer(), nullable=False),
+        sa.Column("ultimo_registro_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("ultima_huella", sa.String(length=64), nullable=False),
+        sa.Column("ultima_fecha_hora_gen", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("registros_verificados", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "verificada_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["instalacion_sif_id"],
+            ["instalacion_sif.id"],
+        ),
+        sa.PrimaryKeyConstraint("instalacion_sif_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("verificacion_cadena")
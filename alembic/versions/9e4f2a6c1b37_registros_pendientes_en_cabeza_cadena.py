@@ -0,0 +1,91 @@
+"""registros_pendientes en cabeza_cadena_instalacion
+
+Revision ID: 9e4f2a6c1b37
+Revises: 7b3e5c1d9f20
+Create Date: 2026-02-10 09:41:05.118204
+
+Hasta ahora la ingesta no sumaba al contador de registros PENDIENTES (el lote sí
+restaba). Pasa a sumarlo, y el contador se mueve de instalacion_sif a la cabeza
+de cadena: la ingesta ya bloquea esa fila, y sumarlo en instalacion_sif la
+convertiría en un punto caliente (control de flujo del worker, last_used_at).
+Se inicializa desde los registros PENDIENTE.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9e4f2a6c1b37"
+down_revision: Union[str, None] = "7b3e5c1d9f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RESINCRONIZAR = """
+    UPDATE {tabla} AS t
+    SET registros_pendientes = (
+        SELECT count(*)
+        FROM registro_facturacion AS r
+        WHERE r.instalacion_sif_id = t.{columna} AND r.estado = 'Pendiente'
+    )
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "cabeza_cadena_instalacion",
+        sa.Column(
+            "registros_pendientes",
+            sa.Integer(),
+            server_default=sa.text("0"),
+            nullable=False,
+            comment="Registros PENDIENTES (sin lote) de la instalación",
+        ),
+    )
+    op.execute(
+        RESINCRONIZAR.format(
+            tabla="cabeza_cadena_instalacion", columna="instalacion_sif_id"
+        )
+    )
+    op.create_index(
+        "idx_cabeza_pendientes",
+        "cabeza_cadena_instalacion",
+        ["instalacion_sif_id"],
+        unique=False,
+        postgresql_where=sa.text("registros_pendientes > 0"),
+    )
+    op.drop_index(
+        "idx_instalacion_para_worker",
+        table_name="instalacion_sif",
+        postgresql_where=sa.text("registros_pendientes > 0"),
+    )
+    op.drop_column("instalacion_sif", "registros_pendientes")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "instalacion_sif",
+        sa.Column(
+            "registros_pendientes",
+            sa.Integer(),
+            server_default=sa.text("0"),
+            nullable=False,
+            comment="Contador de registros PENDIENTES/ENCOLADOS para esta instalación",
+        ),
+    )
+    op.execute(RESINCRONIZAR.format(tabla="instalacion_sif", columna="id"))
+    op.create_index(
+        "idx_instalacion_para_worker",
+        "instalacion_sif",
+        ["ultimo_envio_at", "ultimo_tiempo_espera", "registros_pendientes"],
+        unique=False,
+        postgresql_where=sa.text("registros_pendientes > 0"),
+    )
+    op.drop_index(
+        "idx_cabeza_pendientes",
+        table_name="cabeza_cadena_instalacion",
+        postgresql_where=sa.text("registros_pendientes > 0"),
+    )
+    op.drop_column("cabeza_cadena_instalacion", "registros_pendientes")
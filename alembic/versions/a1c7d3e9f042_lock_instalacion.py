@@ -0,0 +1,42 @@
+"""tokens de fencing del lock de orquestacion
+
+Revision ID: a1c7d3e9f042
+Revises: 9e4f2a6c1b37
+Create Date: 2026-02-11 10:12:44.902317
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1c7d3e9f042"
+down_revision: Union[str, None] = "9e4f2a6c1b37"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lock_instalacion",
+        sa.Column("instalacion_sif_id", sa.Integer(), nullable=False),
+        sa.Column("fencing_token", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["instalacion_sif_id"],
+            ["instalacion_sif.id"],
+        ),
+        sa.PrimaryKeyConstraint("instalacion_sif_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("lock_instalacion")
@@ -0,0 +1,48 @@
+"""notificar outbox_event PENDIENTE (LISTEN/NOTIFY del dispatcher continuo)
+
+Revision ID: b4d8e2f6a913
+Revises: a1c7d3e9f042
+Create Date: 2026-02-12 10:05:37.402913
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b4d8e2f6a913"
+down_revision: Union[str, None] = "a1c7d3e9f042"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Carga vacía: PostgreSQL agrupa las notificaciones idénticas de una misma
+    # transacción (una por commit aunque se creen varios eventos) y el
+    # dispatcher solo necesita saber que hay algo que despachar
+    op.execute(
+        """
+        CREATE FUNCTION notificar_outbox_pendiente() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_notify('outbox_pendiente', '');
+            RETURN NULL;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_outbox_pendiente
+        AFTER INSERT OR UPDATE OF estado ON outbox_event
+        FOR EACH ROW
+        WHEN (NEW.estado = 'Pendiente')
+        EXECUTE FUNCTION notificar_outbox_pendiente()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_outbox_pendiente ON outbox_event")
+    op.execute("DROP FUNCTION IF EXISTS notificar_outbox_pendiente()")
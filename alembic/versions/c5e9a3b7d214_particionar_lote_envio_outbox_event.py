@@ -0,0 +1,144 @@
+"""particionar lote_envio y outbox_event por meses de created_at
+
+Revision ID: c5e9a3b7d214
+Revises: b4d8e2f6a913
+Create Date: 2026-02-16 09:27:51.630478
+
+Convierte las dos tablas en particionadas (PARTITION BY RANGE created_at) con
+una partición por mes desde el primer registro hasta dos meses después del
+actual, más una DEFAULT de seguridad. Las siguientes las crea la tarea
+mantener_particiones (app/infrastructure/particiones.py).
+
+La clave primaria pasa a ser (id, created_at) y desaparecen las FOREIGN KEY
+hacia lote_envio (registro_facturacion.lote_envio_id, outbox_event.lote_id):
+PostgreSQL no admite una FK hacia una tabla particionada por una columna que no
+forma parte de ella.
+
+Copia los datos: ejecutar con los workers parados (la API no escribe en estas
+tablas).
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c5e9a3b7d214"
+down_revision: Union[str, None] = "b4d8e2f6a913"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MESES_ADELANTADOS = 2
+
+INDICES = {
+    "lote_envio": [
+        ("ix_lote_envio_estado", ["estado"], None),
+        ("ix_lote_envio_instalacion_sif_id", ["instalacion_sif_id"], None),
+    ],
+    "outbox_event": [
+        ("idx_outbox_instalacion_estado", ["instalacion_sif_id", "estado"], None),
+        (
+            "idx_outbox_polling_fifo",
+            ["created_at", "id"],
+            sa.text("estado = 'Pendiente'"),
+        ),
+        ("ix_outbox_event_created_at", ["created_at"], None),
+        ("ix_outbox_event_estado", ["estado"], None),
+        ("ix_outbox_event_id", ["id"], None),
+        ("ix_outbox_event_instalacion_sif_id", ["instalacion_sif_id"], None),
+        ("ix_outbox_event_lote_id", ["lote_id"], None),
+    ],
+}
+
+TRIGGER_OUTBOX = """
+    CREATE TRIGGER trg_outbox_pendiente
+    AFTER INSERT OR UPDATE OF estado ON outbox_event
+    FOR EACH ROW
+    WHEN (NEW.estado = 'Pendiente')
+    EXECUTE FUNCTION notificar_outbox_pendiente()
+"""
+
+
+def _sumar_meses(mes: date, meses: int) -> date:
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _crear_particiones(tabla: str, origen: str) -> None:
+    primero = op.get_bind().scalar(
+        sa.text(f"SELECT date_trunc('month', min(created_at))::date FROM {origen}")
+    )
+    actual = date.today().replace(day=1)
+    mes = min(primero or actual, actual)
+    while mes <= _sumar_meses(actual, MESES_ADELANTADOS):
+        siguiente = _sumar_meses(mes, 1)
+        op.execute(
+            f"CREATE TABLE {tabla}_p{mes:%Y%m} PARTITION OF {tabla} "
+            f"FOR VALUES FROM ('{mes}') TO ('{siguiente}')"
+        )
+        mes = siguiente
+    op.execute(f"CREATE TABLE {tabla}_default PARTITION OF {tabla} DEFAULT")
+
+
+def _restaurar_restricciones(tabla: str, pk: str) -> None:
+    op.execute(f"ALTER TABLE {tabla} ADD CONSTRAINT {tabla}_pkey PRIMARY KEY ({pk})")
+    op.create_foreign_key(
+        f"{tabla}_instalacion_sif_id_fkey",
+        tabla,
+        "instalacion_sif",
+        ["instalacion_sif_id"],
+        ["id"],
+    )
+    for nombre, columnas, where in INDICES[tabla]:
+        op.create_index(nombre, tabla, columnas, postgresql_where=where)
+    if tabla == "outbox_event":
+        op.execute("ALTER SEQUENCE outbox_event_id_seq OWNED BY outbox_event.id")
+        op.execute(TRIGGER_OUTBOX)
+
+
+def _copiar(tabla: str, particionada: bool) -> None:
+    anterior = f"{tabla}_anterior"
+    op.execute(f"ALTER TABLE {tabla} RENAME TO {anterior}")
+    op.execute(
+        f"CREATE TABLE {tabla} (LIKE {anterior} INCLUDING DEFAULTS INCLUDING COMMENTS)"
+        + (" PARTITION BY RANGE (created_at)" if particionada else "")
+    )
+    if particionada:
+        _crear_particiones(tabla, anterior)
+    op.execute(f"INSERT INTO {tabla} SELECT * FROM {anterior}")
+    if tabla == "outbox_event":
+        # La secuencia del id se borraría con la tabla anterior
+        op.execute("ALTER SEQUENCE outbox_event_id_seq OWNED BY NONE")
+    # Libera los nombres de clave primaria, índices y trigger
+    op.execute(f"DROP TABLE {anterior}")
+    _restaurar_restricciones(tabla, "id, created_at" if particionada else "id")
+
+
+def upgrade() -> None:
+    op.drop_constraint(
+        "registro_facturacion_lote_envio_id_fkey",
+        "registro_facturacion",
+        type_="foreignkey",
+    )
+    op.drop_constraint("outbox_event_lote_id_fkey", "outbox_event", type_="foreignkey")
+    for tabla in ("lote_envio", "outbox_event"):
+        _copiar(tabla, particionada=True)
+
+
+def downgrade() -> None:
+    # Solo vuelven las filas de las particiones adjuntas: las archivadas siguen
+    # en su esquema. Las FK se crean NOT VALID por si apuntan a lotes archivados
+    for tabla in ("outbox_event", "lote_envio"):
+        _copiar(tabla, particionada=False)
+    op.execute(
+        "ALTER TABLE outbox_event ADD CONSTRAINT outbox_event_lote_id_fkey "
+        "FOREIGN KEY (lote_id) REFERENCES lote_envio (id) NOT VALID"
+    )
+    op.execute(
+        "ALTER TABLE registro_facturacion "
+        "ADD CONSTRAINT registro_facturacion_lote_envio_id_fkey "
+        "FOREIGN KEY (lote_envio_id) REFERENCES lote_envio (id) NOT VALID"
+    )
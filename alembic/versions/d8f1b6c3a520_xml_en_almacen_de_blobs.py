@@ -0,0 +1,52 @@
+"""xml de lote_envio y registro_facturacion en el almacén de blobs
+
+Revision ID: d8f1b6c3a520
+Revises: c5e9a3b7d214
+Create Date: 2026-02-18 10:12:37.904315
+
+Añade las columnas *_digest / *_tamano (app/infrastructure/almacen_blobs.py).
+Las columnas de texto anteriores se conservan, sin uso desde el código, hasta
+volcar su contenido con scripts/migrar_xml_a_blobs.py (las deja a NULL); una
+migración posterior las eliminará. lote_envio.xml_enviado deja de ser NOT NULL:
+los lotes nuevos ya no lo rellenan.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d8f1b6c3a520"
+down_revision: Union[str, None] = "c5e9a3b7d214"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNAS = {
+    "lote_envio": ("xml_enviado", "xml_respuesta"),
+    # xml_generado no se ha escrito nunca: sin blob
+    "registro_facturacion": ("xml_respuesta_aeat",),
+}
+
+
+def upgrade() -> None:
+    for tabla, columnas in COLUMNAS.items():
+        for columna in columnas:
+            op.add_column(tabla, sa.Column(f"{columna}_digest", sa.String(64)))
+            op.add_column(tabla, sa.Column(f"{columna}_tamano", sa.Integer()))
+    op.alter_column("lote_envio", "xml_enviado", nullable=True)
+    op.execute(
+        "COMMENT ON COLUMN registro_facturacion.xml_respuesta_aeat_digest IS "
+        "'Blob del XML de RespuestaLinea de AEAT para este registro'"
+    )
+
+
+def downgrade() -> None:
+    # Los XML volcados al almacén no vuelven a las columnas de texto
+    op.execute("UPDATE lote_envio SET xml_enviado = '' WHERE xml_enviado IS NULL")
+    op.alter_column("lote_envio", "xml_enviado", nullable=False)
+    for tabla, columnas in COLUMNAS.items():
+        for columna in columnas:
+            op.drop_column(tabla, f"{columna}_tamano")
+            op.drop_column(tabla, f"{columna}_digest")
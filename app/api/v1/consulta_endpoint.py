@@ -1,20 +1,102 @@
+import base64
+import binascii
+import csv
+import io
+import json
 from datetime import date, datetime
-from typing import Any, Optional, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, field_validator
-from sqlalchemy import select
+from sqlalchemy import ColumnElement, Row, Select, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.api.v1.schemas import ErrorResponse, HealthOut, RegistroEstado, RegistroOut
+from sqlalchemy.orm import load_only, raiseload
+
+from app.api.v1.schemas import (
+    ErrorResponse,
+    HealthOut,
+    RegistroEstado,
+    RegistroOut,
+    RegistrosPagina,
+)
 from app.config.settings import settings
-from app.domain.models.models import InstalacionSIF, RegistroFacturacion
-from app.infrastructure.database import get_db
+from app.domain.models.models import RegistroFacturacion
+from app.infrastructure.database import abrir_sesion_lectura
+from app.infrastructure.lecturas import get_db_lectura
 from app.infrastructure.security.auth import verificar_api_key
+from app.infrastructure.security.auth_cache import InstalacionSnapshot
 
 router = APIRouter()
 
+# Perfiles de carga: solo las columnas que usa cada endpoint (sin JSON/XML) y
+# sin relaciones (raiseload: ningún acceso accidental dispara consultas)
+CARGA_ESTADO = (
+    load_only(
+        RegistroFacturacion.instalacion_sif_id,
+        RegistroFacturacion.serie,
+        RegistroFacturacion.numero,
+        RegistroFacturacion.fecha_expedicion,
+        RegistroFacturacion.tipo_operacion,
+        RegistroFacturacion.estado,
+        RegistroFacturacion.qr_data,
+        RegistroFacturacion.aeat_codigo_error,
+        RegistroFacturacion.aeat_descripcion_error,
+    ),
+    raiseload("*"),
+)
+CARGA_LISTADO = (
+    load_only(
+        RegistroFacturacion.serie,
+        RegistroFacturacion.numero,
+        RegistroFacturacion.fecha_expedicion,
+        RegistroFacturacion.tipo_operacion,
+        RegistroFacturacion.estado,
+        RegistroFacturacion.importe_total,
+        RegistroFacturacion.huella,
+        RegistroFacturacion.created_at,
+    ),
+    raiseload("*"),
+)
+
+# Filas por lote del cursor de servidor en /registros/export (memoria constante)
+EXPORT_YIELD_PER = 1000
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# Columnas exportadas (nunca factura_json ni XML)
+COLUMNAS_EXPORT = (
+    RegistroFacturacion.id,
+    RegistroFacturacion.serie,
+    RegistroFacturacion.numero,
+    RegistroFacturacion.fecha_expedicion,
+    RegistroFacturacion.tipo_factura,
+    RegistroFacturacion.tipo_operacion,
+    RegistroFacturacion.estado,
+    RegistroFacturacion.destinatario_nif,
+    RegistroFacturacion.destinatario_nombre,
+    RegistroFacturacion.cuota_total,
+    RegistroFacturacion.importe_total,
+    RegistroFacturacion.huella,
+    RegistroFacturacion.created_at,
+)
+CAMPOS_EXPORT = [
+    "uuid",
+    "serie",
+    "numero",
+    "fecha_expedicion",
+    "tipo_factura",
+    "tipo_operacion",
+    "estado",
+    "destinatario_nif",
+    "destinatario_nombre",
+    "cuota_total",
+    "importe_total",
+    "huella",
+    "created_at",
+]
+
 
 def formatear_fecha(dt: date) -> str:
     """Convierte date a dd-mm-yyyy"""
@@ -30,15 +112,19 @@ def formatear_fecha(dt: date) -> str:
 )
 async def consultar_estado_registro(
     uuid: UUID = Query(..., description="UUID del registro"),
-    instalacion: InstalacionSIF = Depends(verificar_api_key),
-    db: AsyncSession = Depends(get_db),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+    db: AsyncSession = Depends(get_db_lectura),
 ) -> RegistroEstado:
     """
     GET /v1/status?uuid=...
 
     Devuelve el estado actual del registro de facturación.
     """
-    stmt = select(RegistroFacturacion).where(RegistroFacturacion.id == uuid)
+    stmt = (
+        select(RegistroFacturacion)
+        .options(*CARGA_ESTADO)
+        .where(RegistroFacturacion.id == uuid)
+    )
     result = await db.execute(stmt)
     registro = result.scalar_one_or_none()
 
@@ -68,7 +154,7 @@ async def consultar_estado_registro(
     }.get(registro.estado, registro.estado)
 
     return RegistroEstado(
-        nif=registro.instalacion_sif.obligado.nif,
+        nif=instalacion.obligado.nif,  # el registro es de esta instalación
         serie=registro.serie,
         numero=registro.numero,
         fecha_expedicion=registro.fecha_expedicion,
@@ -99,66 +185,232 @@ class FechaRango(BaseModel):
         raise ValueError(f"Valor no válido para fecha: {v}")
 
 
+def _filtros_registros(
+    instalacion_id: int,
+    estado: Optional[str],
+    fecha_desde: Optional[str],
+    fecha_hasta: Optional[str],
+) -> List[ColumnElement[bool]]:
+    """Condiciones WHERE comunes de /registros y /registros/export"""
+    filtros = [RegistroFacturacion.instalacion_sif_id == instalacion_id]
+
+    if estado:
+        filtros.append(RegistroFacturacion.estado == estado)
+
+    fechas = FechaRango.model_validate(
+        {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta}
+    )
+
+    if fechas.fecha_desde:
+        filtros.append(RegistroFacturacion.fecha_expedicion >= fechas.fecha_desde)
+
+    if fechas.fecha_hasta:
+        filtros.append(RegistroFacturacion.fecha_expedicion <= fechas.fecha_hasta)
+
+    return filtros
+
+
+def codificar_cursor(created_at: datetime, registro_id: UUID) -> str:
+    """Cursor opaco (base64url) con la clave de ordenación del último registro"""
+    crudo = json.dumps([created_at.isoformat(), str(registro_id)])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Raises:
+        HTTPException 400: Cursor manipulado o de otra versión
+    """
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        created_at, registro_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return datetime.fromisoformat(created_at), UUID(registro_id)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor no válido"
+        ) from e
+
+
 @router.get(
     "/registros",
-    response_model=list[RegistroOut],
+    response_model=RegistrosPagina,
+    responses={400: {"model": ErrorResponse}},
     summary="Listar registros",
     description="Lista los registros de facturación del NIF autenticado",
 )
 async def listar_registros(
-    instalacion: InstalacionSIF = Depends(verificar_api_key),
-    db: AsyncSession = Depends(get_db),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+    db: AsyncSession = Depends(get_db_lectura),
     limite: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor de la página anterior (vacío: primera)"
+    ),
+    offset: int = Query(
+        0,
+        ge=0,
+        deprecated=True,
+        description="Usar cursor: el coste de offset crece con la profundidad",
+    ),
     estado: str = Query(None),
     fecha_desde: str = Query(None, pattern=r"\d{2}-\d{2}-\d{4}"),
     fecha_hasta: str = Query(None, pattern=r"\d{2}-\d{2}-\d{4}"),
-) -> list[RegistroOut]:
+) -> RegistrosPagina:
     """
     GET /v1/registros
 
-    Lista registros con paginación y filtros.
-    """
-    stmt = select(RegistroFacturacion).where(
-        RegistroFacturacion.instalacion_sif_id == instalacion.id
-    )
+    Lista registros con paginación por cursor (keyset) y filtros.
 
-    if estado:
-        stmt = stmt.where(RegistroFacturacion.estado == estado)
+    Orden: created_at DESC, id DESC. El cursor codifica (created_at, id) del
+    último registro devuelto y la siguiente página empieza estrictamente después:
+    con el índice idx_registro_instalacion_created_id cada página cuesta lo mismo
+    sea cual sea su profundidad (sin OFFSET). next_cursor es null en la última
+    página.
+    """
+    if cursor and offset:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="cursor y offset son excluyentes",
+        )
 
-    fechas = FechaRango.model_validate(
-        {"fecha_desde": fecha_desde, "fecha_hasta": fecha_hasta}
+    stmt = (
+        select(RegistroFacturacion)
+        .options(*CARGA_LISTADO)
+        .where(*_filtros_registros(instalacion.id, estado, fecha_desde, fecha_hasta))
     )
 
-    if fechas.fecha_desde:
-        stmt = stmt.where(RegistroFacturacion.fecha_expedicion >= fechas.fecha_desde)
-
-    if fechas.fecha_hasta:
-        stmt = stmt.where(RegistroFacturacion.fecha_expedicion <= fechas.fecha_hasta)
+    if cursor:
+        # Comparación de filas: usa el índice como condición de rango
+        stmt = stmt.where(
+            tuple_(RegistroFacturacion.created_at, RegistroFacturacion.id)
+            < tuple_(*decodificar_cursor(cursor))
+        )
 
+    # Un registro extra para saber si hay página siguiente
     stmt = (
-        stmt.order_by(RegistroFacturacion.created_at.desc())
-        .limit(limite)
+        stmt.order_by(
+            RegistroFacturacion.created_at.desc(), RegistroFacturacion.id.desc()
+        )
+        .limit(limite + 1)
         .offset(offset)
     )
 
     result = await db.execute(stmt)
     registros = result.scalars().all()
 
-    return [
-        RegistroOut(
-            uuid=str(r.id),
-            serie=r.serie,
-            numero=r.numero,
-            fecha_expedicion=formatear_fecha(r.fecha_expedicion),
-            tipo_operacion=r.tipo_operacion,
-            estado=r.estado,
-            importe_total=str(r.importe_total) if r.importe_total else None,
-            huella=r.huella,
-            created_at=r.created_at.isoformat() if r.created_at else None,
+    siguiente = None
+    if len(registros) > limite:
+        registros = registros[:limite]
+        ultimo = registros[-1]
+        siguiente = codificar_cursor(ultimo.created_at, ultimo.id)
+
+    return RegistrosPagina(
+        registros=[
+            RegistroOut(
+                uuid=str(r.id),
+                serie=r.serie,
+                numero=r.numero,
+                fecha_expedicion=formatear_fecha(r.fecha_expedicion),
+                tipo_operacion=r.tipo_operacion,
+                estado=r.estado,
+                importe_total=str(r.importe_total) if r.importe_total else None,
+                huella=r.huella,
+                created_at=r.created_at.isoformat() if r.created_at else None,
+            )
+            for r in registros
+        ],
+        next_cursor=siguiente,
+    )
+
+
+def _fila_export(fila: Row[Any]) -> Dict[str, Any]:
+    def valor(v: Any) -> Any:
+        return getattr(v, "value", v)  # Enums → su valor AEAT
+
+    return {
+        "uuid": str(fila.id),
+        "serie": fila.serie,
+        "numero": fila.numero,
+        "fecha_expedicion": formatear_fecha(fila.fecha_expedicion),
+        "tipo_factura": valor(fila.tipo_factura),
+        "tipo_operacion": valor(fila.tipo_operacion),
+        "estado": valor(fila.estado),
+        "destinatario_nif": fila.destinatario_nif,
+        "destinatario_nombre": fila.destinatario_nombre,
+        "cuota_total": str(fila.cuota_total) if fila.cuota_total is not None else None,
+        "importe_total": (
+            str(fila.importe_total) if fila.importe_total is not None else None
+        ),
+        "huella": fila.huella,
+        "created_at": fila.created_at.isoformat() if fila.created_at else None,
+    }
+
+
+def serializar_export(filas: List[Dict[str, Any]], formato: str) -> str:
+    """Serializa un lote de filas como NDJSON o CSV (sin cabecera)"""
+    buffer = io.StringIO()
+    if formato == "csv":
+        csv.DictWriter(buffer, fieldnames=CAMPOS_EXPORT).writerows(filas)
+    else:
+        for fila in filas:
+            buffer.write(json.dumps(fila, ensure_ascii=False))
+            buffer.write("\n")
+    return buffer.getvalue()
+
+
+async def _exportar_registros(stmt: Select[Any], formato: str) -> AsyncIterator[str]:
+    """
+    Emite el export lote a lote desde un cursor de servidor.
+
+    Sesión propia: vive lo que dure la respuesta, no la dependencia. Lee de la
+    réplica si hay (un export no necesita las facturas de hace un segundo).
+    """
+    if formato == "csv":
+        yield ",".join(CAMPOS_EXPORT) + "\r\n"
+
+    async with await abrir_sesion_lectura() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=EXPORT_YIELD_PER)
         )
-        for r in registros
-    ]
+        async for filas in result.partitions():
+            yield serializar_export([_fila_export(f) for f in filas], formato)
+
+
+@router.get(
+    "/registros/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}, "text/csv": {}}},
+    },
+    summary="Exportar registros",
+    description="Exporta el registro de facturación completo del NIF autenticado"
+    " en NDJSON o CSV (streaming)",
+)
+async def exportar_registros(
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    estado: str = Query(None),
+    fecha_desde: str = Query(None, pattern=r"\d{2}-\d{2}-\d{4}"),
+    fecha_hasta: str = Query(None, pattern=r"\d{2}-\d{2}-\d{4}"),
+) -> StreamingResponse:
+    """
+    GET /v1/registros/export?formato=ndjson|csv
+
+    Orden cronológico (created_at, id). Las filas se leen con un cursor de
+    servidor en lotes de EXPORT_YIELD_PER y se escriben según llegan: la memoria
+    del proceso no depende del tamaño del export.
+    """
+    stmt = (
+        select(*COLUMNAS_EXPORT)
+        .where(*_filtros_registros(instalacion.id, estado, fecha_desde, fecha_hasta))
+        .order_by(RegistroFacturacion.created_at, RegistroFacturacion.id)
+    )
+
+    nombre = f"registros_{instalacion.obligado.nif}_{instalacion.id}.{formato}"
+    return StreamingResponse(
+        _exportar_registros(stmt, formato),
+        media_type=EXPORT_MEDIA_TYPES[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'},
+    )
 
 
 @router.get(
@@ -167,7 +419,7 @@ async def listar_registros(
     description="Estado de la API key e información del NIF",
 )
 async def health_check(
-    instalacion: InstalacionSIF = Depends(verificar_api_key),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
 ) -> HealthOut:
     """
     GET /v1/health
@@ -1,19 +1,40 @@
+import asyncio
 import logging
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import and_, select
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.v1.schemas import ErrorResponse, FacturaResponse
+from app.api.v1.schemas import (
+    ErrorResponse,
+    FacturaBatchItem,
+    FacturaBatchResponse,
+    FacturaResponse,
+)
 from app.config.settings import settings
 from app.core.utils.huella import calcular_huella
-from app.core.utils.qr_generator import generar_qr
+from app.core.utils.qr_generator import (
+    FormatoQR,
+    QRRenderer,
+    decodificar_data_uri,
+    generar_qr_async,
+)
 from app.domain.models.models import (
     EstadoRegistroFacturacion,
-    InstalacionSIF,
     RegistroFacturacion,
 )
 from app.infrastructure.aeat.models.suministro_informacion import (
@@ -21,12 +42,47 @@ from app.infrastructure.aeat.models.suministro_informacion import (
     TipoOperacionType,
 )
 from app.infrastructure.database import get_db
+from app.infrastructure.idempotencia import huella_peticion, idempotencia
+from app.infrastructure.lecturas import escrituras_recientes
+from app.infrastructure.repository.cadena_repository import (
+    CabezaCadena,
+    avanzar_cabeza_cadena,
+    bloquear_cabeza_cadena,
+    insertar_registro_encadenado,
+)
 from app.infrastructure.security.auth import verificar_api_key
-from app.sif.models import FacturaInput
+from app.infrastructure.security.auth_cache import InstalacionSnapshot
+from app.infrastructure.temporizador_envios import temporizador_ingesta
+from app.sif.models import FacturaBatchInput, FacturaInput
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Clave de unicidad de una factura dentro de una instalación
+ClaveFactura = Tuple[str, str, date]
+
+# Cabecera de respuesta que marca una respuesta reproducida por Idempotency-Key
+CABECERA_REPRODUCIDA = "Idempotent-Replayed"
+
+# El QR de un registro nunca cambia (qr_data es inmutable): caché de 1 año
+QR_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def formato_qr(
+    qr_format: str = Query(
+        "png",
+        description="Formato del QR: none (solo URL), svg, png o png@<px>"
+        " (p.ej. png@300)",
+    ),
+) -> FormatoQR:
+    """Dependencia: valida el parámetro qr_format"""
+    try:
+        return FormatoQR.parsear(qr_format)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT, detail=str(e)
+        )
+
 
 def date_to_str(d: date) -> str:
     """Convierte date a string dd-mm-yyyy para AEAT"""
@@ -44,6 +100,153 @@ def calcular_cuota_total(lineas: List[Dict[str, Any]]) -> Decimal:
     return total
 
 
+def _clave_factura(factura_input: FacturaInput) -> ClaveFactura:
+    """Clave (serie, numero, fecha_expedicion) de la restricción de unicidad"""
+    return (
+        factura_input.serie,
+        factura_input.numero,
+        factura_input.fecha_expedicion,
+    )
+
+
+def _detalle_duplicado(factura_input: FacturaInput) -> str:
+    return (
+        f"Factura duplicada: {factura_input.serie}/{factura_input.numero} "
+        f"({factura_input.fecha_expedicion})"
+    )
+
+
+def _calcular_importes(factura_input: FacturaInput) -> Tuple[Decimal, Decimal]:
+    """
+    Calcula (cuota_total, importe_total) y aplica las validaciones de importe.
+
+    Raises:
+        HTTPException 400: Factura simplificada (F2) por encima del máximo
+    """
+    cuota_total = calcular_cuota_total(
+        [linea.model_dump() for linea in factura_input.lineas],
+    )
+    importe_total = Decimal(factura_input.importe_total)
+    if factura_input.tipo_factura == ClaveTipoFacturaType.F2:
+        if importe_total >= Decimal("3000"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=(
+                    "Factura simplificada (F2) supera "
+                    "importe máximo permitido (3.000)."
+                ),
+            )
+    return cuota_total, importe_total
+
+
+def _construir_qr_url(nif: str, factura_input: FacturaInput) -> str:
+    """
+    Genera URL del QR según especificación AEAT.
+
+    IMPORTANTE: Aplicar URL encoding a los parámetros
+    (especialmente numserie puede tener &)
+    """
+    num_serie = f"{factura_input.serie}{factura_input.numero}"
+
+    # URL base según entorno y tipo de sistema
+    base_url = (
+        "https://prewww2.aeat.es/wlpl/TIKE-CONT/ValidarQR"
+        if settings.env != "production"
+        else "https://www2.agenciatributaria.gob.es/wlpl/TIKE-CONT/ValidarQR"
+    )
+
+    # Construir URL con parámetros codificados
+    return (
+        f"{base_url}"
+        f"?nif={quote(nif)}"
+        f"&numserie={quote(num_serie)}"
+        f"&fecha={quote(date_to_str(factura_input.fecha_expedicion))}"
+        f"&importe={factura_input.importe_total}"
+    )
+
+
+async def _generar_qr_seguro(qr_url: str, formato: FormatoQR) -> Optional[str]:
+    """
+    Genera QR en base64 sin bloquear la creación de la factura si falla.
+
+    El renderizado se hace en un pool fuera del event loop y se cachea por URL y
+    formato. Con formato none no se renderiza nada (el cliente usa la URL).
+    """
+    if formato.tipo == "none":
+        return None
+    try:
+        return await generar_qr_async(qr_url, str(formato))
+    except Exception as e:
+        logger.error(f"Error generando QR: {e}")
+        return ""
+
+
+async def _buscar_duplicados(
+    db: AsyncSession, instalacion_sif_id: int, claves: Sequence[ClaveFactura]
+) -> set[ClaveFactura]:
+    """Devuelve las claves que ya existen en BD para la instalación (1 consulta)"""
+    stmt = select(
+        RegistroFacturacion.serie,
+        RegistroFacturacion.numero,
+        RegistroFacturacion.fecha_expedicion,
+    ).where(
+        RegistroFacturacion.instalacion_sif_id == instalacion_sif_id,
+        tuple_(
+            RegistroFacturacion.serie,
+            RegistroFacturacion.numero,
+            RegistroFacturacion.fecha_expedicion,
+        ).in_(claves),
+    )
+    result = await db.execute(stmt)
+    return {(r.serie, r.numero, r.fecha_expedicion) for r in result.all()}
+
+
+def _construir_registro(
+    instalacion: InstalacionSnapshot,
+    factura_input: FacturaInput,
+    cuota_total: Decimal,
+    importe_total: Decimal,
+    huella: str,
+    cabeza: CabezaCadena,
+    qr_url: str,
+    fecha_hora_gen: datetime,
+) -> RegistroFacturacion:
+    """
+    Construye el RegistroFacturacion encadenado a `cabeza` (sin añadirlo a la sesión)
+
+    created_at se fija al FechaHoraHusoGenRegistro usado en la huella: define el
+    orden de la cadena (now() en BD es el inicio de la transacción, no el orden en
+    que se obtuvo el bloqueo de la cabeza).
+    """
+    obligado = instalacion.obligado
+    return RegistroFacturacion(
+        instalacion_sif_id=instalacion.id,
+        emisor_nif=obligado.nif,
+        emisor_nombre=obligado.nombre_razon_social,
+        serie=factura_input.serie,
+        numero=factura_input.numero,
+        fecha_expedicion=factura_input.fecha_expedicion,
+        fecha_operacion=factura_input.fecha_operacion,
+        destinatario_nif=factura_input.nif,
+        destinatario_nombre=factura_input.nombre,
+        tipo_operacion=TipoOperacionType.ALTA,
+        tipo_factura=factura_input.tipo_factura,
+        factura_json=factura_input.model_dump(mode="json"),
+        importe_total=importe_total,
+        cuota_total=cuota_total,
+        descripcion=factura_input.descripcion,
+        huella=huella,
+        anterior_huella=cabeza.huella,
+        anterior_emisor_nif=cabeza.emisor_nif,
+        anterior_serie=cabeza.serie,
+        anterior_numero=cabeza.numero,
+        anterior_fecha_expedicion=cabeza.fecha_expedicion,
+        qr_data=qr_url,
+        estado=EstadoRegistroFacturacion.PENDIENTE,
+        created_at=fecha_hora_gen,
+    )
+
+
 @router.post(
     "/create",
     response_model=FacturaResponse,
@@ -55,8 +258,17 @@ def calcular_cuota_total(lineas: List[Dict[str, Any]]) -> Decimal:
 )
 async def crear_factura(
     request: Request,
+    response: Response,
     factura_input: FacturaInput,
-    instalacion: InstalacionSIF = Depends(verificar_api_key),
+    formato: FormatoQR = Depends(formato_qr),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Clave única del cliente: los reintentos con la misma clave"
+        " devuelven la respuesta original",
+    ),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
     db: AsyncSession = Depends(get_db),
 ) -> FacturaResponse:
     """
@@ -64,75 +276,52 @@ async def crear_factura(
 
     Responde INMEDIATAMENTE con:
     - UUID del registro
-    - QR en base64
+    - QR en base64 (según qr_format; ninguno con qr_format=none)
     - URL del QR
     - Estado: "Pendiente"
     - Huella
 
     El procesamiento real (XML, firma?, envío AEAT) se hace en tarea en background.
+
+    Round-trips a BD: bloqueo de la cabeza (UPDATE ... RETURNING), INSERT con
+    ON CONFLICT + avance de la cabeza (una sentencia) y COMMIT.
+
+    Con Idempotency-Key, un reintento devuelve la respuesta original desde Redis
+    (cabecera Idempotent-Replayed: true) y un duplicado en vuelo espera a la
+    primera petición.
     """
-    try:
-        obligado = instalacion.obligado
+    if not idempotency_key:
+        return await _crear_factura(factura_input, formato, instalacion, db)
 
-        # Verificar duplicados (SIF + serie + numero + fecha_expedicion)
-        stmt_dup = select(RegistroFacturacion).where(
-            and_(
-                RegistroFacturacion.instalacion_sif_id == instalacion.id,
-                RegistroFacturacion.serie == factura_input.serie,
-                RegistroFacturacion.numero == factura_input.numero,
-                RegistroFacturacion.fecha_expedicion == factura_input.fecha_expedicion,
-            )
-        )
-        result_dup = await db.execute(stmt_dup)
-        duplicado = result_dup.scalar_one_or_none()
+    respuesta, reproducida = await idempotencia.ejecutar(
+        ambito=f"create:{instalacion.id}",
+        clave=idempotency_key,
+        huella=huella_peticion(factura_input.model_dump_json(), str(formato)),
+        operacion=lambda: _crear_factura(factura_input, formato, instalacion, db),
+        modelo=FacturaResponse,
+    )
+    if reproducida:
+        response.headers[CABECERA_REPRODUCIDA] = "true"
+    return respuesta
 
-        if duplicado:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=(
-                    f"Factura duplicada: {factura_input.serie}/{factura_input.numero} "
-                    f"({factura_input.fecha_expedicion})"
-                ),
-            )
+
+async def _crear_factura(
+    factura_input: FacturaInput,
+    formato: FormatoQR,
+    instalacion: InstalacionSnapshot,
+    db: AsyncSession,
+) -> FacturaResponse:
+    """Crea el registro de facturación (ver crear_factura)"""
+    try:
+        obligado = instalacion.obligado
 
         # Calcular totales
-        cuota_total = calcular_cuota_total(
-            [linea.model_dump() for linea in factura_input.lineas],
-        )
-        importe_total = Decimal(factura_input.importe_total)
-        if factura_input.tipo_factura == ClaveTipoFacturaType.F2:
-            if importe_total >= Decimal("3000"):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=(
-                        "Factura simplificada (F2) supera "
-                        "importe máximo permitido (3.000)."
-                    ),
-                )
-        # Obtener huella anterior (última del NIF)
-        stmt_anterior = (
-            select(RegistroFacturacion)
-            .where(
-                RegistroFacturacion.instalacion_sif_id == instalacion.id,
-                # 🔑 FILTRO CRUCIAL: Solo registros válidos para el encadenamiento
-                # RegistroFacturacion.estado.in_(
-                #     [
-                #         EstadoRegistroFacturacion.CORRECTO,
-                #         EstadoRegistroFacturacion.ACEPTADO_CON_ERRORES,
-                #     ]
-                # ),
-            )
-            .order_by(RegistroFacturacion.created_at.desc())
-            .limit(1)
-            # 🔒 CLÁUSULA DE BLOQUEO PARA CONTROL DE CONCURRENCIA
-            # Esto garantiza atomicidad, impidiendo que otra tarea inserte un CORRECTO
-            # en el gap que transcurre entre esta consulta y el envío del xml a la AEAT.
-            .with_for_update()
-        )
-        result_anterior = await db.execute(stmt_anterior)
-        factura_anterior = result_anterior.scalar_one_or_none()
+        cuota_total, importe_total = _calcular_importes(factura_input)
 
-        anterior_huella = factura_anterior.huella if factura_anterior else None
+        # Obtener huella anterior: bloquea la cabeza de cadena de la instalación
+        # (UPDATE ... RETURNING por PK) hasta el commit
+        cabeza = await bloquear_cabeza_cadena(db, instalacion.id)
+        fecha_hora_gen = cabeza.siguiente_fecha_hora_gen()
 
         # Calcular huella
         try:
@@ -143,7 +332,8 @@ async def crear_factura(
                 tipo_factura=factura_input.tipo_factura.value,
                 cuota_total=cuota_total,
                 importe_total=importe_total,
-                huella_anterior=anterior_huella,
+                huella_anterior=cabeza.huella,
+                fecha_hora_gen=fecha_hora_gen,
             )
         except Exception as e:
             logger.error(f"Error calculando huella: {e}")
@@ -152,68 +342,39 @@ async def crear_factura(
                 detail=f"Error calculando huella: {str(e)}",
             )
 
-        # Generar URL del QR según especificación AEAT
-        # IMPORTANTE: Aplicar URL encoding a los parámetros
-        # (especialmente numserie puede tener &)
-        from urllib.parse import quote
-
-        num_serie = f"{factura_input.serie}{factura_input.numero}"
-
-        # URL base según entorno y tipo de sistema
-        base_url = (
-            "https://prewww2.aeat.es/wlpl/TIKE-CONT/ValidarQR"
-            if settings.env != "production"
-            else "https://www2.agenciatributaria.gob.es/wlpl/TIKE-CONT/ValidarQR"
-        )
-
-        # Construir URL con parámetros codificados
-        qr_url = (
-            f"{base_url}"
-            f"?nif={quote(obligado.nif)}"
-            f"&numserie={quote(num_serie)}"
-            f"&fecha={quote(date_to_str(factura_input.fecha_expedicion))}"
-            f"&importe={factura_input.importe_total}"
-        )
-
-        # Generar QR en base64
-        try:
-            qr_base64 = generar_qr(qr_url)
-        except Exception as e:
-            logger.error(f"Error generando QR: {e}")
-            qr_base64 = ""
+        qr_url = _construir_qr_url(obligado.nif, factura_input)
 
         # Crear registro
-
-        registro = RegistroFacturacion(
-            instalacion_sif_id=instalacion.id,
-            emisor_nif=obligado.nif,
-            emisor_nombre=obligado.nombre_razon_social,
-            serie=factura_input.serie,
-            numero=factura_input.numero,
-            fecha_expedicion=factura_input.fecha_expedicion,
-            fecha_operacion=factura_input.fecha_operacion,
-            destinatario_nif=factura_input.nif,
-            destinatario_nombre=factura_input.nombre,
-            tipo_operacion=TipoOperacionType.ALTA,
-            tipo_factura=factura_input.tipo_factura,
-            factura_json=factura_input.model_dump(mode="json"),
-            importe_total=importe_total,
-            cuota_total=cuota_total,
-            descripcion=factura_input.descripcion,
-            huella=huella,
-            anterior_huella=(anterior_huella if anterior_huella else None),
-            anterior_serie=factura_anterior.serie if factura_anterior else None,
-            anterior_numero=factura_anterior.numero if factura_anterior else None,
-            anterior_fecha_expedicion=(
-                factura_anterior.fecha_expedicion if factura_anterior else None
-            ),
-            qr_data=qr_url,
-            estado=EstadoRegistroFacturacion.PENDIENTE,
+        registro = _construir_registro(
+            instalacion,
+            factura_input,
+            cuota_total,
+            importe_total,
+            huella,
+            cabeza,
+            qr_url,
+            fecha_hora_gen,
         )
 
-        db.add(registro)
+        # INSERT + avance de la cabeza en una sentencia; la restricción
+        # uq_factura_instalacion detecta los duplicados (sin SELECT previo)
+        control_flujo = await insertar_registro_encadenado(
+            db, registro, cabeza.avanzar(registro)
+        )
+        if control_flujo is None:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=_detalle_duplicado(factura_input),
+            )
         await db.commit()
-        await db.refresh(registro)
+        # /status inmediato: leer de la primaria mientras la réplica se pone al día
+        await escrituras_recientes.registrar(instalacion.id)
+        # Cola que empieza o llega a 1000: despertar la instalación a su hora
+        await temporizador_ingesta.registrar(instalacion.id, control_flujo, 1)
+
+        # Generar QR en base64 (tras el commit: fuera del bloqueo de la cadena)
+        qr_base64 = await _generar_qr_seguro(qr_url, formato)
 
         logger.info(
             f"Factura creada: "
@@ -235,3 +396,273 @@ async def crear_factura(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e) if settings.debug else "Error interno del servidor",
         )
+
+
+@router.post(
+    "/create/batch",
+    response_model=FacturaBatchResponse,
+    status_code=status.HTTP_200_OK,
+    responses={500: {"model": ErrorResponse}},
+    summary="Crear facturas en bloque",
+    description="Crea hasta 1000 registros de facturación encadenados en una sola"
+    " transacción. Devuelve el resultado de cada factura.",
+)
+async def crear_facturas_batch(
+    request: Request,
+    response: Response,
+    batch_input: FacturaBatchInput,
+    formato: FormatoQR = Depends(formato_qr),
+    idempotency_key: Optional[str] = Header(
+        None,
+        alias="Idempotency-Key",
+        max_length=255,
+        description="Clave única del cliente: los reintentos con la misma clave"
+        " devuelven la respuesta original",
+    ),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+    db: AsyncSession = Depends(get_db),
+) -> FacturaBatchResponse:
+    """
+    Endpoint de ingesta masiva: POST /v1/create/batch
+
+    Pensado para sincronizaciones de fin de día de los TPV:
+    - Autenticación, consulta de duplicados y bloqueo de la cabeza de cadena
+      UNA sola vez por petición (no por factura)
+    - Huellas encadenadas en memoria en el orden de la lista
+    - INSERT masivo y un único commit
+    - QR generados tras el commit (fuera del bloqueo de la cadena)
+
+    Cada factura conserva la semántica de /create: 409 si está duplicada (en BD o
+    dentro de la propia petición), 400 si no supera las validaciones de importe.
+    Las facturas rechazadas no rompen la cadena: la siguiente se encadena con la
+    última aceptada.
+
+    Admite Idempotency-Key con la misma semántica que /create.
+    """
+    if not idempotency_key:
+        return await _crear_facturas_batch(batch_input, formato, instalacion, db)
+
+    respuesta, reproducida = await idempotencia.ejecutar(
+        ambito=f"create_batch:{instalacion.id}",
+        clave=idempotency_key,
+        huella=huella_peticion(batch_input.model_dump_json(), str(formato)),
+        operacion=lambda: _crear_facturas_batch(batch_input, formato, instalacion, db),
+        modelo=FacturaBatchResponse,
+    )
+    if reproducida:
+        response.headers[CABECERA_REPRODUCIDA] = "true"
+    return respuesta
+
+
+async def _crear_facturas_batch(
+    batch_input: FacturaBatchInput,
+    formato: FormatoQR,
+    instalacion: InstalacionSnapshot,
+    db: AsyncSession,
+) -> FacturaBatchResponse:
+    """Crea los registros del bloque (ver crear_facturas_batch)"""
+    try:
+        obligado = instalacion.obligado
+        facturas = batch_input.facturas
+        resultados: Dict[int, FacturaBatchItem] = {}
+
+        # Cabeza de cadena: un solo bloqueo para toda la petición
+        cabeza = await bloquear_cabeza_cadena(db, instalacion.id)
+
+        # Duplicados en BD: una sola consulta para toda la petición. Tras el
+        # bloqueo: toda inserción de la instalación pasa por la cabeza, así que
+        # la consulta ya ve cualquier alta concurrente confirmada y ninguna
+        # otra puede colarse antes del INSERT (uq_factura_instalacion → 500)
+        existentes = await _buscar_duplicados(
+            db, instalacion.id, [_clave_factura(f) for f in facturas]
+        )
+
+        vistas: set[ClaveFactura] = set()
+        creados: List[Tuple[int, RegistroFacturacion]] = []
+
+        for indice, factura_input in enumerate(facturas):
+            clave = _clave_factura(factura_input)
+            if clave in existentes or clave in vistas:
+                resultados[indice] = FacturaBatchItem(
+                    indice=indice,
+                    status_code=status.HTTP_409_CONFLICT,
+                    error=_detalle_duplicado(factura_input),
+                )
+                continue
+
+            try:
+                cuota_total, importe_total = _calcular_importes(factura_input)
+            except HTTPException as e:
+                resultados[indice] = FacturaBatchItem(
+                    indice=indice, status_code=e.status_code, error=str(e.detail)
+                )
+                continue
+
+            # created_at estrictamente creciente: define el orden de la cadena
+            # (todas las filas comparten transacción y, por tanto, now() en BD)
+            fecha_hora_gen = cabeza.siguiente_fecha_hora_gen()
+
+            try:
+                huella = calcular_huella(
+                    nif_emisor=obligado.nif,
+                    numero_serie=f"{factura_input.serie}{factura_input.numero}",
+                    fecha_expedicion=date_to_str(factura_input.fecha_expedicion),
+                    tipo_factura=factura_input.tipo_factura.value,
+                    cuota_total=cuota_total,
+                    importe_total=importe_total,
+                    huella_anterior=cabeza.huella,
+                    fecha_hora_gen=fecha_hora_gen,
+                )
+            except Exception as e:
+                logger.error(f"Error calculando huella: {e}")
+                resultados[indice] = FacturaBatchItem(
+                    indice=indice,
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    error=f"Error calculando huella: {str(e)}",
+                )
+                continue
+
+            registro = _construir_registro(
+                instalacion,
+                factura_input,
+                cuota_total,
+                importe_total,
+                huella,
+                cabeza,
+                _construir_qr_url(obligado.nif, factura_input),
+                fecha_hora_gen,
+            )
+            creados.append((indice, registro))
+            vistas.add(clave)
+            cabeza = cabeza.avanzar(registro)
+
+        if creados:
+            # INSERT masivo (insertmanyvalues + RETURNING de los UUID)
+            db.add_all([registro for _, registro in creados])
+            await db.flush()
+            control_flujo = await avanzar_cabeza_cadena(
+                db, cabeza, creados[-1][1].id, num_registros=len(creados)
+            )
+            await db.commit()
+            await escrituras_recientes.registrar(instalacion.id)
+            await temporizador_ingesta.registrar(
+                instalacion.id, control_flujo, len(creados)
+            )
+
+        # QR en paralelo en el pool (acotado por su semáforo)
+        qrs = await asyncio.gather(
+            *(
+                _generar_qr_seguro(registro.qr_data or "", formato)
+                for _, registro in creados
+            )
+        )
+        for (indice, registro), qr_base64 in zip(creados, qrs):
+            resultados[indice] = FacturaBatchItem(
+                indice=indice,
+                status_code=status.HTTP_200_OK,
+                factura=FacturaResponse(
+                    uuid=registro.id,
+                    estado="Pendiente",
+                    url=registro.qr_data or "",
+                    qr=qr_base64,
+                    huella=registro.huella,
+                ),
+            )
+
+        logger.info(
+            "Facturas creadas en bloque",
+            extra={
+                "instalacion_id": instalacion.id,
+                "total": len(facturas),
+                "creadas": len(creados),
+            },
+        )
+        return FacturaBatchResponse(
+            total=len(facturas),
+            creadas=len(creados),
+            rechazadas=len(facturas) - len(creados),
+            resultados=[resultados[i] for i in range(len(facturas))],
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creando facturas en bloque: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e) if settings.debug else "Error interno del servidor",
+        )
+
+
+@router.get(
+    "/qr/{uuid}",
+    response_class=Response,
+    responses={
+        200: {"content": {"image/png": {}, "image/svg+xml": {}}},
+        304: {"description": "No modificado (If-None-Match)"},
+        403: {"model": ErrorResponse},
+        404: {"model": ErrorResponse},
+    },
+    summary="QR de un registro",
+    description="Devuelve la imagen del QR de un registro de facturación,"
+    " renderizada bajo demanda a partir de su URL de cotejo.",
+)
+async def obtener_qr(
+    uuid: UUID,
+    request: Request,
+    formato: FormatoQR = Depends(formato_qr),
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+    db: AsyncSession = Depends(get_db),
+) -> Response:
+    """
+    GET /v1/qr/{uuid}?qr_format=svg|png|png@<px>
+
+    Para clientes que crean facturas con qr_format=none y solo necesitan la
+    imagen ocasionalmente. qr_data no cambia nunca, así que la respuesta se
+    cachea como inmutable; el ETag depende solo de la URL y el formato, por lo
+    que If-None-Match responde 304 sin renderizar.
+    """
+    if formato.tipo == "none":
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="qr_format=none no es válido para obtener la imagen",
+        )
+
+    # Solo las columnas necesarias (sin factura_json)
+    stmt = select(
+        RegistroFacturacion.instalacion_sif_id, RegistroFacturacion.qr_data
+    ).where(RegistroFacturacion.id == uuid)
+    registro = (await db.execute(stmt)).one_or_none()
+
+    if not registro or not registro.qr_data:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Registro no encontrado"
+        )
+
+    if registro.instalacion_sif_id != instalacion.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permiso para consultar este registro",
+        )
+
+    etag = f'"{QRRenderer.clave(registro.qr_data, str(formato))}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": QR_CACHE_CONTROL,
+        "Vary": "Authorization",
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    etags_cliente = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+    if etag in etags_cliente or "*" in etags_cliente:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    qr_base64 = await _generar_qr_seguro(registro.qr_data, formato)
+    if not qr_base64:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error generando QR",
+        )
+
+    contenido, media_type = decodificar_data_uri(qr_base64)
+    return Response(content=contenido, media_type=media_type, headers=headers)
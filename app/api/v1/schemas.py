@@ -13,7 +13,9 @@ class FacturaResponse(BaseModel):
     uuid: UUID = Field(..., description="Identificador único del registro")
     estado: str = Field(default="Pendiente", description="Estado del registro")
     url: str = Field(..., description="URL de verificación del código QR")
-    qr: str = Field(..., description="Código QR en base64")
+    qr: Optional[str] = Field(
+        None, description="Código QR en base64 (null con qr_format=none)"
+    )
     huella: Optional[str] = Field(None, description="Huella o hash del registro")
 
     model_config = ConfigDict(from_attributes=True)
@@ -59,3 +61,30 @@ class RegistroOut(BaseModel):
     importe_total: Optional[str]
     huella: str
     created_at: Optional[str]
+
+
+class RegistrosPagina(BaseModel):
+    """Página de GET /registros (paginación por cursor)"""
+
+    registros: list[RegistroOut]
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor de la página siguiente (null: última página)"
+    )
+
+
+class FacturaBatchItem(BaseModel):
+    """Resultado de una factura dentro de POST /create/batch"""
+
+    indice: int = Field(..., description="Posición de la factura en la petición")
+    status_code: int = Field(..., description="Código HTTP equivalente a /create")
+    factura: Optional[FacturaResponse] = None
+    error: Optional[str] = None
+
+
+class FacturaBatchResponse(BaseModel):
+    """Respuesta de POST /create/batch con el resultado de cada factura"""
+
+    total: int
+    creadas: int
+    rechazadas: int
+    resultados: list[FacturaBatchItem]
@@ -1,5 +1,8 @@
+from typing import Any, Dict
+
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import celeryd_init
 
 celery_app = Celery(
     "app",
@@ -19,6 +22,7 @@ celery_app = Celery(
 celery_app.conf.task_routes = {
     # CAPA 1: Scheduler ligero
     "app.tasks.scheduler.scheduler_envios_ligero": {"queue": "scheduler"},
+    "app.tasks.scheduler.despertar_instalaciones": {"queue": "scheduler"},
     # CAPA 2: Orquestador (procesamiento pesado)
     "app.tasks.orquestador.orquestar_instalacion": {"queue": "orquestador"},
     # CAPA 3: Dispatcher outbox
@@ -27,6 +31,8 @@ celery_app.conf.task_routes = {
     "app.tasks.worker_aeat.enviar_lote_aeat": {"queue": "envios"},
     # MONITOREO
     "app.tasks.monitoring.*": {"queue": "monitoring"},
+    # MANTENIMIENTO (tareas ligeras: comparten worker con monitoreo)
+    "app.tasks.mantenimiento.*": {"queue": "monitoring"},
 }
 
 # ============================================================================
@@ -39,22 +45,13 @@ celery_app.conf.beat_schedule = {
     # ========================================================================
     "scheduler-envios-ligero": {
         "task": "app.tasks.scheduler.scheduler_envios_ligero",
+        # Red de seguridad del temporizador (Redis caído o entradas perdidas)
         "schedule": 60.0,  # Cada 60 segundos (1 minuto) ⚡ CRÍTICO: 240s límite
         "options": {
             "expires": 50,  # Expirar si no se ejecuta en 50 segundos
         },
     },
     # ========================================================================
-    # CAPA 3: DISPATCHER OUTBOX (CRÍTICO - FRECUENCIA ALTA)
-    # ========================================================================
-    "dispatcher-outbox": {
-        "task": "app.tasks.dispatcher.dispatch_outbox_event",
-        "schedule": 5.0,  # Cada 5 segundos (latencia ultra-baja) ⚡
-        "options": {
-            "expires": 4,  # Expirar si no se ejecuta en 4 segundos
-        },
-    },
-    # ========================================================================
     # MONITOREO Y ALERTAS
     # ========================================================================
     "detector-atasco-dispatcher": {
@@ -78,8 +75,104 @@ celery_app.conf.beat_schedule = {
             "expires": 240,
         },
     },
+    # ========================================================================
+    # MANTENIMIENTO
+    # ========================================================================
+    "mantener-particiones": {
+        "task": "app.tasks.mantenimiento.mantener_particiones",
+        "schedule": crontab(hour=4, minute=0),  # Cada noche
+        "options": {
+            "expires": 3600,
+        },
+    },
+    "verificar-cadenas": {
+        "task": "app.tasks.mantenimiento.verificar_cadenas",
+        "schedule": crontab(hour=3, minute=30),  # Cada noche (incremental)
+        "options": {
+            "expires": 3600,
+        },
+    },
 }
 
+
+def _programar_intervalos_configurables(sender: Celery, **kwargs: Any) -> None:
+    """
+    Entradas de Beat cuyo intervalo sale de settings.
+
+    Se añaden al configurarse la app (primer acceso a celery_app.conf en
+    Beat o en el worker), no al importar el módulo: importar app.celery (lo
+    hace app/__init__) no exige DATABASE_URL ni AEAT_WSDL_URL.
+    """
+    from app.config.settings import settings
+
+    sender.conf.beat_schedule.update(
+        {
+            # CAPA 1: temporizador de envíos
+            "despertar-instalaciones": {
+                "task": "app.tasks.scheduler.despertar_instalaciones",
+                # Envío a los 't' segundos
+                "schedule": settings.temporizador_intervalo,
+                "options": {
+                    "expires": settings.temporizador_intervalo,
+                },
+            },
+            # CAPA 3: DISPATCHER OUTBOX (CRÍTICO - FRECUENCIA ALTA)
+            "dispatcher-outbox": (
+                {
+                    # Modo continuo (LISTEN/NOTIFY): solo red de seguridad
+                    "task": "app.tasks.dispatcher.dispatch_outbox_event",
+                    "schedule": settings.dispatcher_sondeo_respaldo,
+                    "options": {
+                        "expires": settings.dispatcher_sondeo_respaldo,
+                    },
+                }
+                if settings.dispatcher_continuo
+                else {
+                    "task": "app.tasks.dispatcher.dispatch_outbox_event",
+                    "schedule": 5.0,  # Cada 5 segundos (latencia ultra-baja) ⚡
+                    "options": {
+                        "expires": 4,  # Expirar si no se ejecuta en 4 segundos
+                    },
+                }
+            ),
+            # MANTENIMIENTO
+            "volcar-last-used-at": {
+                "task": "app.tasks.mantenimiento.volcar_last_used_at",
+                "schedule": float(settings.auth_last_used_precision),
+                "options": {
+                    "expires": settings.auth_last_used_precision,
+                },
+            },
+        }
+    )
+
+
+# Registro sin decorador: celery no está tipado (disallow_untyped_decorators)
+celery_app.on_after_configure.connect(_programar_intervalos_configurables)
+
+
+def _rol_desde_cola(options: Dict[str, Any], **kwargs: Any) -> None:
+    """
+    Rol del proceso (perfil de pool de BD) a partir de la cola del worker.
+
+    Sin PROCESS_ROLE explícito, un worker de una sola cola (-Q envios) toma el
+    rol de esa cola en vez de "api" (pool de la API en cada proceso prefork).
+    Se ejecuta en el proceso principal antes del fork y antes de crear ningún
+    engine: los procesos hijos heredan el rol.
+    """
+    from app.config.settings import settings
+    from app.infrastructure.database import PERFILES_BD
+
+    colas = options.get("queues") or []
+    if "process_role" in settings.model_fields_set or len(colas) != 1:
+        return
+    if colas[0] in PERFILES_BD:
+        settings.process_role = colas[0]
+
+
+celeryd_init.connect(_rol_desde_cola)
+
+
 # ============================================================================
 # CONFIGURACIÓN GENERAL
 # ============================================================================
@@ -103,23 +196,30 @@ celery_app.conf.task_soft_time_limit = 540  # Aviso a 9 minutos
 # ============================================================================
 
 """
+# PROCESS_ROLE elige el perfil de pool de BD de cada worker (si falta, un worker
+# de una sola cola lo deduce de -Q: ver _rol_desde_cola)
+
 # Worker para SCHEDULER (CAPA 1)
-celery -A app.celery.celery_app worker -Q scheduler -n scheduler@%h -l info
+PROCESS_ROLE=scheduler celery -A app.celery.celery_app worker \
+    -Q scheduler -n scheduler@%h -l info
 
 # Worker para ORQUESTADOR (CAPA 2) - Múltiples workers recomendado
-celery -A app.celery.celery_app worker \
+PROCESS_ROLE=orquestador celery -A app.celery.celery_app worker \
     -Q orquestador -n orquestador@%h -l info --concurrency=4
 
 # Worker para DISPATCHER (CAPA 3) - Un solo worker suficiente
-celery -A app.celery.celery_app worker \
+PROCESS_ROLE=dispatcher celery -A app.celery.celery_app worker \
     -Q dispatcher -n dispatcher@%h -l info --concurrency=2
 
+# DISPATCHER continuo (CAPA 3, LISTEN/NOTIFY) - con DISPATCHER_CONTINUO=true
+PROCESS_ROLE=dispatcher python -m app.tasks.dispatcher_continuo
+
 # Worker para ENVIOS AEAT (CAPA 4) - Rate limited
-celery -A app.celery.celery_app worker \
+PROCESS_ROLE=envios celery -A app.celery.celery_app worker \
     -Q envios -n envios@%h -l info --concurrency=10
 
 # Worker para MONITOREO
-celery -A app.celery.celery_app worker \
+PROCESS_ROLE=monitoring celery -A app.celery.celery_app worker \
     -Q monitoring -n monitoring@%h -l info
 
 # Celery Beat (scheduler de tareas periódicas)
@@ -136,14 +236,20 @@ docker run -d --name scheduler \
   mi-app celery -A app.celery.celery_app beat -l info
 
 # 4 cocineros
-docker run -d --name orquestador \
+docker run -d --name orquestador -e PROCESS_ROLE=orquestador \
   mi-app celery -A app.celery.celery_app worker -Q orquestador -c 4 -l info
 
 # 2 despachadores ultra-rápidos
-docker run -d --name dispatcher \
+docker run -d --name dispatcher -e PROCESS_ROLE=dispatcher \
   mi-app celery -A app.celery.celery_app worker -Q dispatcher -c 2 -l info
 
 # 10 transportistas (rate-limit 10/m en conjunto)
-docker run -d --name envios \
+docker run -d --name envios -e PROCESS_ROLE=envios \
   mi-app celery -A app.celery.celery_app worker -Q envios -c 10 -l info
+
+# Planificador ligero y monitoreo (un proceso cada uno)
+docker run -d --name planificador -e PROCESS_ROLE=scheduler \
+  mi-app celery -A app.celery.celery_app worker -Q scheduler -c 1 -l info
+docker run -d --name monitoring -e PROCESS_ROLE=monitoring \
+  mi-app celery -A app.celery.celery_app worker -Q monitoring -c 1 -l info
 """
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic import Field, field_validator
 from pydantic_settings import BaseSettings
@@ -12,6 +13,27 @@ class Settings(BaseSettings):
 
     # Base de datos
     database_url: str = Field(default="", min_length=1)
+    # Rol del proceso: elige el perfil de pool (PERFILES_BD en database.py).
+    # Cada worker Celery arranca con el de su cola (PROCESS_ROLE=envios, ...);
+    # sin PROCESS_ROLE, un worker de una sola cola lo toma de -Q (app/celery.py)
+    process_role: Literal[
+        "api", "scheduler", "orquestador", "dispatcher", "envios", "monitoring"
+    ] = "api"
+    db_pool_size: int | None = None  # None: el del perfil del rol
+    db_max_overflow: int | None = None
+    db_pool_recycle: int = 1800  # segundos
+    # PgBouncer en modo transaction pooling (sin sentencias preparadas con nombre)
+    db_pgbouncer: bool = False
+    # Sentencias preparadas por conexión (asyncpg): el listado con filtros y
+    # cursor genera bastantes variantes; 256 cubre la API sin desalojos
+    db_statement_cache_size: int = 256
+    db_prepared_statement_cache_size: int = 256
+    # Réplica de lectura (opcional): /status, /registros y tareas de monitoreo
+    database_replica_url: str | None = None
+    db_replica_connect_timeout: float = 2.0  # segundos; después, a la primaria
+    # Tras crear facturas, la instalación lee de la primaria durante este tiempo
+    # (lectura de escrituras propias con el retraso de replicación)
+    db_replica_ventana_escritura: int = 5  # segundos
 
     # Redis
     redis_url: str = Field(default="redis://localhost:6379/0")
@@ -30,13 +52,79 @@ class Settings(BaseSettings):
 
     # AEAT
     aeat_wsdl_url: str = Field(default="", min_length=1)
-    aeat_timeout: int = 30
+    aeat_timeout: int = 30  # segundos de espera de la respuesta a un envío
+    # Cliente HTTP persistente por certificado (app/infrastructure/aeat_client)
+    aeat_connect_timeout: float = 10.0  # segundos (TCP + handshake TLS)
+    aeat_pool_conexiones: int = 4  # por certificado y proceso
+    # Conexión ociosa que se conserva: cubre la espera 't' entre lotes (60 s)
+    aeat_keepalive: float = 120.0
+    # Sustituto local de SuministroLR (en lugar de AEATClient.URLS) y su CA
+    aeat_url: str | None = None
+    aeat_ca_path: str | None = None
 
     # Certificados (cuando los tengas)
     cert_path: str | None = None
     cert_key_path: str | None = None
     cert_password: str | None = None
 
+    # QR (renderizado fuera del event loop + caché por URL)
+    qr_pool_workers: int = 4
+    qr_pool_procesos: bool = True  # False: ThreadPoolExecutor
+    qr_pool_max_pendientes: int = 64
+    qr_cache_max_items: int = 10_000
+    qr_cache_ttl: int = 7 * 24 * 3600  # segundos en Redis
+
+    # Caché de autenticación (key_hash → snapshot de la instalación)
+    auth_cache_ttl: int = 30  # segundos en memoria (acota la invalidación sin Redis)
+    auth_cache_redis_ttl: int = 600  # segundos en Redis
+    auth_cache_max_items: int = 10_000
+    # last_used_at diferido: como mucho 1 escritura por instalación y periodo (s)
+    auth_last_used_precision: int = 60
+
+    # Idempotency-Key en /create
+    idempotency_ttl: int = 24 * 3600  # segundos que se reproduce la respuesta
+    idempotency_ttl_en_curso: int = 60  # libera la clave si el proceso muere
+    idempotency_espera_max: float = 30.0  # espera de duplicados en vuelo (s)
+
+    # Lock de orquestación por instalación (app/infrastructure/locks_instalacion.py)
+    lock_backend: Literal["redis", "postgres"] = "redis"
+    lock_ttl: int = 60  # segundos (redis); se renueva cada lock_ttl / 3
+
+    # Temporizador de envíos (Redis): despierta cada instalación al vencer 't'.
+    # Cada cuánto se extraen las vencidas (s) y cuántas como mucho por extracción
+    temporizador_intervalo: float = 1.0
+    temporizador_lote_max: int = 500
+
+    # Dispatcher outbox continuo (LISTEN/NOTIFY, app/tasks/dispatcher_continuo.py).
+    # Activo: el Beat de dispatch_outbox_event pasa a red de seguridad y se
+    # ejecuta cada dispatcher_sondeo_respaldo segundos en lugar de cada 5
+    dispatcher_continuo: bool = False
+    dispatcher_sondeo_respaldo: float = 30.0  # s sin notificaciones → sondeo
+    dispatcher_lote_min: int = 10  # eventos por transacción (adaptativo)
+    dispatcher_lote_max: int = 500
+    dispatcher_metricas_intervalo: float = 60.0  # s entre logs de latencia
+
+    # Particiones mensuales de lote_envio y outbox_event (tarea mantener_particiones)
+    particiones_meses_adelantados: int = 2  # además del mes actual
+    particiones_retencion_meses: int = 3  # meses completos que siguen adjuntos
+    particiones_esquema_archivo: str = "archivo"
+
+    # XML de envío y respuesta AEAT fuera de PostgreSQL, comprimidos con zstd
+    # (app/infrastructure/almacen_blobs.py)
+    blobs_backend: Literal["local", "s3"] = "local"
+    blobs_directorio: str = "data/blobs"  # local: compartido por los workers
+    blobs_nivel_zstd: int = 9
+    blobs_s3_endpoint: str = "http://localhost:9000"  # MinIO en desarrollo
+    blobs_s3_bucket: str = "factubridge-xml"
+    blobs_s3_region: str = "us-east-1"
+    blobs_s3_access_key: str | None = None
+    blobs_s3_secret_key: str | None = None
+    blobs_s3_timeout: float = 10.0  # segundos
+    blobs_s3_concurrencia: int = 16  # PUT simultáneos por lote
+
+    # Huella: vuelca en DEBUG la cadena y los bytes de cada huella (diagnóstico)
+    huella_traza: bool = False
+
     # Webhooks
     webhook_timeout: int = 10
     webhook_max_retries: int = 3
@@ -47,6 +135,10 @@ class Settings(BaseSettings):
     # Sentry (opcional)
     sentry_dsn: str | None = None
 
+    # Métricas internas (/metrics): token propio para el scraper, independiente
+    # de las API keys de instalación. Sin token, /metrics responde 404
+    metrics_token: str | None = None
+
     @property
     def is_production(self) -> bool:
         return self.env == "production"
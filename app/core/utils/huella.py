@@ -7,13 +7,117 @@ https://www.agenciatributaria.es/static_files/AEAT_Desarrolladores/EEDD/IVA/VERI
 
 import hashlib
 import logging
+from dataclasses import dataclass
 from datetime import datetime
 from decimal import Decimal
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, List, Optional
+
+from app.config.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True, slots=True)
+class EntradaHuella:
+    """Campos de un registro de alta que entran en la huella"""
+
+    nif_emisor: str
+    numero_serie: str  # Serie + Número concatenados
+    fecha_expedicion: str  # dd-mm-yyyy
+    tipo_factura: str
+    cuota_total: Decimal
+    importe_total: Decimal
+    fecha_hora_gen: datetime
+
+
+@lru_cache(maxsize=4096)
+def _normalizar_fecha_expedicion(fecha: str) -> str:
+    """dd-mm-yyyy validada y con ceros (las facturas comparten pocas fechas)"""
+    return datetime.strptime(fecha, "%d-%m-%Y").strftime("%d-%m-%Y")
+
+
+def _valor(valor: Optional[str]) -> str:
+    return "" if valor is None else valor.strip()
+
+
+class MotorHuella:
+    """
+    Cálculo de huellas de registros de alta.
+
+    Camino rápido sin logging: una cadena, un encode y un SHA-256 por huella.
+    Con traza=True (settings.huella_traza) vuelca en DEBUG la cadena exacta y
+    sus primeros bytes, como la implementación Java de referencia.
+    """
+
+    def __init__(self, traza: bool = False):
+        self.traza = traza
+
+    def cadena_alta(
+        self, entrada: EntradaHuella, huella_anterior: Optional[str]
+    ) -> str:
+        """Cadena de referencia AEAT (campos separados por &)"""
+        return (
+            f"IDEmisorFactura={_valor(entrada.nif_emisor)}"
+            f"&NumSerieFactura={_valor(entrada.numero_serie)}"
+            "&FechaExpedicionFactura="
+            f"{_normalizar_fecha_expedicion(entrada.fecha_expedicion)}"
+            f"&TipoFactura={_valor(entrada.tipo_factura)}"
+            f"&CuotaTotal={entrada.cuota_total:.2f}"
+            f"&ImporteTotal={entrada.importe_total:.2f}"
+            f"&Huella={_valor(huella_anterior)}"
+            "&FechaHoraHusoGenRegistro="
+            f"{entrada.fecha_hora_gen.astimezone().isoformat()}"
+        )
+
+    def huella(self, cadena: str) -> str:
+        """SHA-256 de la cadena en hexadecimal con mayúsculas (64 caracteres)"""
+        if self.traza:
+            self._trazar(cadena)
+        return hashlib.sha256(cadena.encode("utf-8")).hexdigest().upper()
+
+    def huella_alta(
+        self, entrada: EntradaHuella, huella_anterior: Optional[str] = None
+    ) -> str:
+        return self.huella(self.cadena_alta(entrada, huella_anterior))
+
+    def encadenar(
+        self, entradas: Iterable[EntradaHuella], huella_anterior: Optional[str] = None
+    ) -> List[str]:
+        """
+        Huellas de una cadena completa: cada registro encadena la del anterior.
+
+        Args:
+            entradas: Registros en orden de la cadena
+            huella_anterior: Huella del eslabón previo (None: primer registro)
+
+        Returns:
+            Una huella por entrada, en el mismo orden
+        """
+        huellas = []
+        for entrada in entradas:
+            huella_anterior = self.huella(self.cadena_alta(entrada, huella_anterior))
+            huellas.append(huella_anterior)
+        return huellas
+
+    @staticmethod
+    def _trazar(cadena: str) -> None:
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        input_bytes = cadena.encode("utf-8")
+        logger.debug(
+            "Huella: cadena [%s], longitud %d, %d bytes UTF-8, primeros 20 (hex): %s",
+            cadena,
+            len(cadena),
+            len(input_bytes),
+            input_bytes[:20].hex(" ").upper(),
+        )
+
+
+# Instancia global
+motor_huella = MotorHuella(traza=settings.huella_traza)
+
+
 def get_hash_verifactu(msg: str) -> str:
     """
     Calcula el hash SHA-256 en formato hexadecimal (mayúsculas) según VeriFactu
@@ -24,44 +128,7 @@ def get_hash_verifactu(msg: str) -> str:
     Returns:
         Hash SHA-256 en formato hexadecimal con mayúsculas (64 caracteres)
     """
-    try:
-        # DEBUG: Imprimir la cadena exacta y sus bytes (igual que en Java)
-        logger.debug("=== DEBUG HASH ===")
-        logger.debug(f"Cadena a hashear: [{msg}]")
-        logger.debug(f"Longitud: {len(msg)}")
-
-        # Primeros 50 caracteres
-        logger.debug("Primeros 50 caracteres:")
-        logger.debug(msg[: min(50, len(msg))])
-
-        # Últimos 50 caracteres
-        logger.debug("Últimos 50 caracteres:")
-        logger.debug(msg[max(0, len(msg) - 50) :])
-
-        # Convertir a bytes UTF-8
-        input_bytes = msg.encode("utf-8")
-        logger.debug(f"Bytes UTF-8: {len(input_bytes)}")
-
-        # Primeros 20 bytes en hex
-        hex_bytes = " ".join(
-            f"{b:02X}" for b in input_bytes[: min(20, len(input_bytes))]
-        )
-        logger.debug(f"Primeros 20 bytes (hex): {hex_bytes}")
-
-        # Calcular SHA-256
-        hash_bytes = hashlib.sha256(input_bytes).digest()
-
-        # Convertir a hexadecimal en mayúsculas
-        result = "".join(f"{b:02x}" for b in hash_bytes).upper()
-
-        logger.debug(f"Hash resultado: {result}")
-        logger.debug("==================")
-
-        return result
-
-    except Exception as e:
-        logger.error(f"Error al generar la huella SHA: {e}")
-        return ""
+    return motor_huella.huella(msg)
 
 
 def get_valor_campo(nombre: str, valor: Optional[str], separador: bool) -> str:
@@ -191,11 +258,7 @@ def calcular_huella_alta(
         fecha_hora_reg,
     )
 
-    logger.debug(f"Calculando Huella Alta de: {ref}")
-    print("Cadena completa para hash:")
-    print(ref)
-
-    return get_hash_verifactu(ref)
+    return motor_huella.huella(ref)
 
 
 # Función de conveniencia para usar desde el endpoint
@@ -207,6 +270,7 @@ def calcular_huella(
     cuota_total: Decimal,
     importe_total: Decimal,
     huella_anterior: Optional[str] = None,
+    fecha_hora_gen: Optional[datetime] = None,
 ) -> str:
     """
     Función de alto nivel para calcular huella desde el endpoint
@@ -219,30 +283,27 @@ def calcular_huella(
         cuota_total: Cuota total como Decimal
         importe_total: Importe total como Decimal
         huella_anterior: Huella del registro anterior (opcional)
+        fecha_hora_gen: Timestamp de generación del registro (por defecto, ahora)
 
     Returns:
         Hash SHA-256 en mayúsculas
     """
-    # Parsear fecha de expedición desde dd-mm-yyyy
-    fecha_exp_dt = datetime.strptime(fecha_expedicion, "%d-%m-%Y")
-
     # Timestamp actual de generación del registro
-    fecha_hora_gen = datetime.now().astimezone()
-
-    # Formatear importes como strings (sin formato especial aquí,
-    # AEAT los espera como números normales con hasta 2 decimales)
-    cuota_str = f"{cuota_total:.2f}"
-    importe_str = f"{importe_total:.2f}"
-
-    return calcular_huella_alta(
-        nif_emisor=nif_emisor,
-        num_factura_serie=numero_serie,
-        fecha_expedicion=fecha_exp_dt,
-        tipo_factura=tipo_factura,
-        cuota_total=cuota_str,
-        importe_total=importe_str,
-        huella_anterior=huella_anterior,
-        fecha_hora_huso_gen_registro=fecha_hora_gen,
+    if fecha_hora_gen is None:
+        fecha_hora_gen = datetime.now().astimezone()
+
+    # Importes con 2 decimales: AEAT los espera como números normales
+    return motor_huella.huella_alta(
+        EntradaHuella(
+            nif_emisor=nif_emisor,
+            numero_serie=numero_serie,
+            fecha_expedicion=fecha_expedicion,
+            tipo_factura=tipo_factura,
+            cuota_total=cuota_total,
+            importe_total=importe_total,
+            fecha_hora_gen=fecha_hora_gen,
+        ),
+        huella_anterior,
     )
 
 
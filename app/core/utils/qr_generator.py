@@ -4,16 +4,82 @@ Generador de código QR según especificaciones AEAT para Verifactu
 Documentación: Características del QR y especificaciones del servicio de cotejo
 """
 
+import asyncio
 import base64
+import hashlib
 import logging
+import multiprocessing
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
 
 import qrcode
+import qrcode.image.svg
+from PIL import Image
+
+from app.config.settings import settings
+from app.infrastructure.redis_client import redis_async_client
 
 logger = logging.getLogger(__name__)
 
+# Límites de png@<px> (por debajo de 64px el QR no es legible en impresora)
+QR_TAMANO_PX_MIN = 64
+QR_TAMANO_PX_MAX = 2048
+
+
+@dataclass(frozen=True)
+class FormatoQR:
+    """
+    Formato de salida del QR solicitado por el cliente.
+
+    - none: sin imagen (el cliente imprime el QR a partir de la URL)
+    - svg: imagen vectorial (image/svg+xml)
+    - png: imagen PNG con el tamaño por defecto (box_size=10)
+    - png@<px>: imagen PNG de <px> x <px> píxeles
+    """
+
+    tipo: str
+    tamano_px: Optional[int] = None
+
+    @classmethod
+    def parsear(cls, valor: str) -> "FormatoQR":
+        """
+        Raises:
+            ValueError: Formato desconocido o tamaño fuera de rango
+        """
+        tipo, arroba, tamano = valor.strip().lower().partition("@")
+        if tipo not in ("none", "svg", "png") or (arroba and tipo != "png"):
+            raise ValueError(f"Formato QR no soportado: {valor}")
+        if not arroba:
+            return cls(tipo=tipo)
+        if not tamano.isdigit() or not (
+            QR_TAMANO_PX_MIN <= int(tamano) <= QR_TAMANO_PX_MAX
+        ):
+            raise ValueError(
+                f"Tamaño QR fuera de rango ({QR_TAMANO_PX_MIN}-{QR_TAMANO_PX_MAX}px):"
+                f" {valor}"
+            )
+        return cls(tipo=tipo, tamano_px=int(tamano))
+
+    @property
+    def media_type(self) -> str:
+        return "image/svg+xml" if self.tipo == "svg" else "image/png"
+
+    def __str__(self) -> str:
+        return f"{self.tipo}@{self.tamano_px}" if self.tamano_px else self.tipo
+
+
+def decodificar_data_uri(data_uri: str) -> Tuple[bytes, str]:
+    """Devuelve (contenido, media_type) de un data URI base64"""
+    cabecera, _, datos = data_uri.partition(",")
+    media_type = cabecera.removeprefix("data:").split(";")[0]
+    return base64.b64decode(datos), media_type
+
 
-def generar_qr(url: str, size_mm: int = 40) -> str:
+def generar_qr(url: str, size_mm: int = 40, formato: str = "png") -> str:
     """
     Genera un código QR a partir de una URL según especificaciones AEAT.
 
@@ -25,11 +91,15 @@ def generar_qr(url: str, size_mm: int = 40) -> str:
     Args:
         url: URL a codificar en el QR (ya debe estar con URL encoding aplicado)
         size_mm: Tamaño del QR en milímetros (30-40, default 40)
+        formato: svg | png | png@<px> (ver FormatoQR)
 
     Returns:
-        String con la imagen en base64 (formato: data:image/png;base64,...)
+        String con la imagen en base64 (formato: data:image/png;base64,...
+        o data:image/svg+xml;base64,...)
     """
     try:
+        formato_qr = FormatoQR.parsear(formato)
+
         # Validar tamaño según AEAT
         if not 30 <= size_mm <= 40:
             logger.warning(
@@ -48,19 +118,31 @@ def generar_qr(url: str, size_mm: int = 40) -> str:
         qr.add_data(url)
         qr.make(fit=True)
 
-        # Generar imagen (qrcode usará PIL automáticamente si está instalado)
-        img = qr.make_image(fill_color="black", back_color="white")
-
-        # Nota: El tamaño se ajusta automáticamente con box_size y version
-        # No es crítico hacer resize exacto, el QR será válido igualmente
-
-        # Convertir a base64
         buffer = BytesIO()
-        img.save(buffer, "PNG")
+        if formato_qr.tipo == "svg":
+            # Vectorial: el cliente escala sin pérdida a 30-40mm al imprimir
+            qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+        else:
+            if formato_qr.tamano_px:
+                # box_size más cercano al tamaño pedido; el resize NEAREST final
+                # solo ajusta unos píxeles (sin suavizar los módulos)
+                modulos = qr.modules_count + 2 * qr.border
+                qr.box_size = max(1, round(formato_qr.tamano_px / modulos))
+
+            # Generar imagen (qrcode usará PIL automáticamente si está instalado)
+            img = qr.make_image(fill_color="black", back_color="white").get_image()
+
+            # Nota: sin png@<px> el tamaño se ajusta con box_size y version
+            # No es crítico hacer resize exacto, el QR será válido igualmente
+            lado = formato_qr.tamano_px
+            if lado and img.size != (lado, lado):
+                img = img.resize((lado, lado), Image.Resampling.NEAREST)
+            img.save(buffer, "PNG")
+
         img_base64 = base64.b64encode(buffer.getvalue()).decode("utf-8")
 
         # Retornar en formato data URI para incrustar directamente
-        return f"data:image/png;base64,{img_base64}"
+        return f"data:{formato_qr.media_type};base64,{img_base64}"
 
     except Exception as e:
         logger.error(f"Error generando QR: {e}", exc_info=True)
@@ -68,6 +150,218 @@ def generar_qr(url: str, size_mm: int = 40) -> str:
         return ""
 
 
+class QRRenderer:
+    """
+    Renderizado de QR fuera del event loop con caché direccionada por contenido.
+
+    - Pool acotado (procesos por defecto: qrcode/PIL retienen el GIL) con un
+      semáforo que limita los renderizados en curso (backpressure)
+    - Caché LRU en memoria + Redis, ambas con clave sha256(formato, url): un
+      reintento o una reconsulta de la misma factura nunca vuelve a renderizar
+    - Peticiones concurrentes de la misma URL comparten un único renderizado
+    - Si Redis falla se desactiva temporalmente (no penaliza cada petición)
+    - Métricas de saturación del pool y ratio de aciertos de caché
+    """
+
+    PREFIJO_REDIS = "qr:"
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(
+        self,
+        workers: int,
+        max_pendientes: int,
+        cache_max_items: int,
+        cache_ttl: int,
+        usar_procesos: bool = True,
+    ):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self.cache_max_items = cache_max_items
+        self.cache_ttl = cache_ttl
+        self.usar_procesos = usar_procesos
+
+        self._executor: Optional[Executor] = None
+        self._semaforo: Optional[asyncio.Semaphore] = None
+        self._cache: OrderedDict[str, str] = OrderedDict()
+        self._en_vuelo: Dict[str, asyncio.Future[str]] = {}
+        self._redis_desactivado_hasta = 0.0
+
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.hits_memoria = 0
+        self.hits_redis = 0
+        self.coalescidos = 0
+        self.misses = 0
+        self.errores = 0
+
+    @staticmethod
+    def clave(url: str, formato: str = "png") -> str:
+        # png conserva la clave sha256(url) de las entradas ya cacheadas
+        contenido = url if formato == "png" else f"{formato}|{url}"
+        return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.usar_procesos:
+                # spawn: no heredar threads/sockets del proceso uvicorn
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="qr"
+                )
+        return self._executor
+
+    def _get_semaforo(self) -> asyncio.Semaphore:
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.max_pendientes)
+        return self._semaforo
+
+    def _cache_get(self, clave: str) -> Optional[str]:
+        valor = self._cache.get(clave)
+        if valor is not None:
+            self._cache.move_to_end(clave)
+        return valor
+
+    def _cache_set(self, clave: str, valor: str) -> None:
+        self._cache[clave] = valor
+        self._cache.move_to_end(clave)
+        while len(self._cache) > self.cache_max_items:
+            self._cache.popitem(last=False)
+
+    def _redis_disponible(self) -> bool:
+        return time.monotonic() >= self._redis_desactivado_hasta
+
+    def _redis_fallo(self, e: Exception) -> None:
+        # Redis es solo caché: nunca bloquea la creación de facturas
+        logger.warning(f"Caché QR en Redis no disponible: {e}")
+        self._redis_desactivado_hasta = time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+
+    async def _redis_get(self, clave: str) -> Optional[str]:
+        if not self._redis_disponible():
+            return None
+        try:
+            valor = await redis_async_client.get(self.PREFIJO_REDIS + clave)
+            # decode_responses=True: str (bytes solo con otro cliente)
+            if isinstance(valor, bytes):
+                return valor.decode("utf-8")
+            return valor
+        except Exception as e:
+            self._redis_fallo(e)
+            return None
+
+    async def _redis_set(self, clave: str, valor: str) -> None:
+        if not self._redis_disponible():
+            return
+        try:
+            await redis_async_client.set(
+                self.PREFIJO_REDIS + clave, valor, ex=self.cache_ttl
+            )
+        except Exception as e:
+            self._redis_fallo(e)
+
+    async def generar(self, url: str, formato: str = "png") -> str:
+        """
+        Devuelve el QR (data URI base64) de `url` sin bloquear el event loop.
+
+        Args:
+            formato: svg | png | png@<px> (ver FormatoQR)
+
+        Returns:
+            String data:image/...;base64,... o "" si falla el renderizado
+        """
+        clave = self.clave(url, formato)
+
+        valor = self._cache_get(clave)
+        if valor is not None:
+            self.hits_memoria += 1
+            return valor
+
+        futuro = self._en_vuelo.get(clave)
+        if futuro is None:
+            futuro = asyncio.ensure_future(self._resolver(url, formato, clave))
+            self._en_vuelo[clave] = futuro
+            futuro.add_done_callback(lambda _: self._en_vuelo.pop(clave, None))
+        else:
+            self.coalescidos += 1
+
+        # shield: la cancelación de un cliente no cancela el render compartido
+        return await asyncio.shield(futuro)
+
+    async def _resolver(self, url: str, formato: str, clave: str) -> str:
+        """Redis → render en pool → guardar en ambas cachés"""
+        valor = await self._redis_get(clave)
+        if valor is not None:
+            self.hits_redis += 1
+            self._cache_set(clave, valor)
+            return valor
+
+        self.misses += 1
+        async with self._get_semaforo():
+            self.en_curso += 1
+            self.max_en_curso = max(self.max_en_curso, self.en_curso)
+            try:
+                loop = asyncio.get_running_loop()
+                valor = await loop.run_in_executor(
+                    self._get_executor(), generar_qr, url, 40, formato
+                )
+            except Exception as e:
+                logger.error(f"Error generando QR en pool: {e}", exc_info=True)
+                valor = ""
+            finally:
+                self.en_curso -= 1
+
+        if not valor:
+            self.errores += 1
+            return ""
+
+        self._cache_set(clave, valor)
+        await self._redis_set(clave, valor)
+        return valor
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Métricas de saturación del pool y de la caché"""
+        hits = self.hits_memoria + self.hits_redis + self.coalescidos
+        consultas = hits + self.misses
+        return {
+            "pool_tipo": "procesos" if self.usar_procesos else "threads",
+            "pool_workers": self.workers,
+            "pool_max_pendientes": self.max_pendientes,
+            "pool_en_curso": self.en_curso,
+            "pool_max_en_curso": self.max_en_curso,
+            "pool_saturacion": round(self.en_curso / self.max_pendientes, 3),
+            "cache_items": len(self._cache),
+            "cache_hits_memoria": self.hits_memoria,
+            "cache_hits_redis": self.hits_redis,
+            "cache_coalescidos": self.coalescidos,
+            "cache_misses": self.misses,
+            "cache_hit_ratio": round(hits / consultas, 3) if consultas else 0.0,
+            "errores": self.errores,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia global (una por proceso uvicorn)
+qr_renderer = QRRenderer(
+    workers=settings.qr_pool_workers,
+    max_pendientes=settings.qr_pool_max_pendientes,
+    cache_max_items=settings.qr_cache_max_items,
+    cache_ttl=settings.qr_cache_ttl,
+    usar_procesos=settings.qr_pool_procesos,
+)
+
+
+async def generar_qr_async(url: str, formato: str = "png") -> str:
+    """Versión awaitable de generar_qr (pool + caché). Ver QRRenderer."""
+    return await qr_renderer.generar(url, formato)
+
+
 def validar_url_qr(url: str) -> bool:
     """
     Valida que la URL del QR cumpla con las especificaciones AEAT.
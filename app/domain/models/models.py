@@ -8,6 +8,7 @@ from uuid import UUID
 
 import sqlalchemy as sa
 from sqlalchemy import (
+    DDL,
     DECIMAL,
     Boolean,
     Date,
@@ -18,6 +19,7 @@ from sqlalchemy import (
     String,
     Text,
     UniqueConstraint,
+    event,
     text,
 )
 from sqlalchemy.dialects import postgresql
@@ -166,7 +168,7 @@ class InstalacionSIF(Base):
     obligado: Mapped[ObligadoTributario] = relationship(
         "ObligadoTributario",
         back_populates="instalaciones_sif",
-        lazy="selectin",  # ← Carga en batch al acceder a obligado
+        lazy="raise_on_sql",  # Carga explícita: joinedload donde se use
     )
     registros: Mapped[List["RegistroFacturacion"]] = relationship(
         back_populates="instalacion_sif",
@@ -186,26 +188,136 @@ class InstalacionSIF(Base):
     ultimo_envio_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), comment="Fecha/hora del último envío exitoso a AEAT"
     )
+    # Registros pendientes: CabezaCadenaInstalacion.registros_pendientes
+
+    def __repr__(self) -> str:
+        return f"<InstalacionSIF(id={self.id}, obligado_id={self.obligado_id})>"
+
+
+class CabezaCadenaInstalacion(Base):
+    """
+    Cabeza de la cadena de huellas de una instalación SIF.
+
+    Guarda los datos del último registro encadenado para que la creación de
+    facturas obtenga la huella anterior con un UPDATE ... RETURNING por clave
+    primaria (que además bloquea la fila) en lugar de ordenar registro_facturacion
+    por created_at. Se actualiza en la MISMA transacción que el INSERT del registro.
+
+    También lleva el contador de registros PENDIENTES (control de flujo): la
+    ingesta ya tiene la fila bloqueada, así que sumarlo aquí no añade otro
+    row-lock caliente (instalacion_sif).
+    """
+
+    __tablename__ = "cabeza_cadena_instalacion"
+
+    instalacion_sif_id: Mapped[int] = mapped_column(
+        ForeignKey("instalacion_sif.id"), primary_key=True
+    )
+
+    # ===== ÚLTIMO REGISTRO ENCADENADO (NULL si la cadena está vacía) =====
+    ultima_huella: Mapped[str | None] = mapped_column(String(64))
+    ultimo_emisor_nif: Mapped[str | None] = mapped_column(String(20))
+    ultima_serie: Mapped[str | None] = mapped_column(String(50))
+    ultimo_numero: Mapped[str | None] = mapped_column(String(50))
+    ultima_fecha_expedicion: Mapped[date | None] = mapped_column(Date)
+    ultimo_registro_id: Mapped[UUID | None] = mapped_column(
+        postgresql.UUID(as_uuid=True)
+    )
+    ultima_fecha_hora_gen: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True),
+        comment="FechaHoraHusoGenRegistro del último registro (orden de la cadena)",
+    )
+    num_registros: Mapped[int] = mapped_column(
+        sa.BigInteger, nullable=False, default=0, server_default=sa.text("0")
+    )
     registros_pendientes: Mapped[int] = mapped_column(
         Integer,
-        default=0,
         nullable=False,
-        comment="Contador de registros PENDIENTES/ENCOLADOS para esta instalación",
+        default=0,
+        server_default=sa.text("0"),
+        comment="Registros PENDIENTES (sin lote) de la instalación",
+    )
+
+    updated_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), onupdate=func.now()
     )
 
     __table_args__ = (
-        # Índice para workers de envío
+        # Scheduler: solo instalaciones con algo pendiente
         Index(
-            "idx_instalacion_para_worker",
-            "ultimo_envio_at",
-            "ultimo_tiempo_espera",
-            "registros_pendientes",
+            "idx_cabeza_pendientes",
+            "instalacion_sif_id",
             postgresql_where=text("registros_pendientes > 0"),
         ),
     )
 
     def __repr__(self) -> str:
-        return f"<InstalacionSIF obligado_nif={self.obligado.nif}>"
+        return (
+            f"<CabezaCadenaInstalacion instalacion={self.instalacion_sif_id} "
+            f"num_registros={self.num_registros}>"
+        )
+
+
+class VerificacionCadena(Base):
+    """
+    Punto de control de la verificación de la cadena de huellas de una instalación.
+
+    Último registro verificado sin roturas (en orden de cadena: created_at, id).
+    La siguiente verificación empieza a partir de él y solo recorre los registros
+    nuevos. Ver app/domain/services/verificacion_cadena.py.
+    """
+
+    __tablename__ = "verificacion_cadena"
+
+    instalacion_sif_id: Mapped[int] = mapped_column(
+        ForeignKey("instalacion_sif.id"), primary_key=True
+    )
+    ultimo_registro_id: Mapped[UUID] = mapped_column(
+        postgresql.UUID(as_uuid=True), nullable=False
+    )
+    ultima_huella: Mapped[str] = mapped_column(String(64), nullable=False)
+    ultima_fecha_hora_gen: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+    registros_verificados: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    verificada_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<VerificacionCadena instalacion={self.instalacion_sif_id} "
+            f"registros_verificados={self.registros_verificados}>"
+        )
+
+
+class LockInstalacion(Base):
+    """
+    Último token de fencing aceptado para el lock de orquestación de una instalación.
+
+    Quien tiene el lock comprueba su token aquí antes del commit: si otro
+    orquestador con un token mayor ya ha escrito, el lock había caducado y la
+    transacción se descarta. Ver app/infrastructure/locks_instalacion.py.
+    """
+
+    __tablename__ = "lock_instalacion"
+
+    instalacion_sif_id: Mapped[int] = mapped_column(
+        ForeignKey("instalacion_sif.id"), primary_key=True
+    )
+    fencing_token: Mapped[int] = mapped_column(sa.BigInteger, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<LockInstalacion instalacion={self.instalacion_sif_id} "
+            f"fencing_token={self.fencing_token}>"
+        )
 
 
 class EstadoRegistroFacturacion(str, enum.Enum):
@@ -269,6 +381,19 @@ class EstadoOutboxEvent(str, enum.Enum):
     ERROR = "Error"  # Falló después de reintentos
 
 
+class PerfilCargaRegistro:
+    """
+    Perfiles de carga de RegistroFacturacion (grupos de columnas diferidas).
+
+    select(RegistroFacturacion) NO carga estas columnas: cada consulta que las
+    lea debe pedir su grupo con undefer_group(PerfilCargaRegistro.X). En la API
+    (async) leer una columna diferida sin cargarla falla (MissingGreenlet).
+    """
+
+    CONTENIDO = "contenido"  # factura_json: generación del XML de alta
+    AEAT = "aeat"  # respuesta_aeat y digests de los XML: auditoría
+
+
 class RegistroFacturacion(Base):
     """
     Registros de facturación recibidos desde los SIFs y enviados a AEAT.
@@ -277,6 +402,10 @@ class RegistroFacturacion(Base):
     1. Llega desde el SIF del obligado tributario
     2. Se valida y procesa
     3. Se envía a AEAT (con posibles reintentos)
+
+    Las columnas pesadas (JSON/XML) son diferidas: ver PerfilCargaRegistro.
+    Las relaciones no se cargan solas (lazy="raise_on_sql"): cada consulta declara
+    lo que necesita con joinedload/selectinload.
     """
 
     __tablename__ = "registro_facturacion"
@@ -339,7 +468,12 @@ class RegistroFacturacion(Base):
     cuota_total: Mapped[Decimal] = mapped_column(DECIMAL(precision=15, scale=2))
 
     # ===== CONTENIDO COMPLETO =====
-    factura_json: Mapped[dict] = mapped_column(postgresql.JSONB, nullable=False)
+    factura_json: Mapped[dict] = mapped_column(
+        postgresql.JSONB,
+        nullable=False,
+        deferred=True,
+        deferred_group=PerfilCargaRegistro.CONTENIDO,
+    )
 
     # ===== ENCADENAMIENTO Y SEGURIDAD =====
     huella: Mapped[str] = mapped_column(
@@ -369,11 +503,20 @@ class RegistroFacturacion(Base):
     )
 
     # ===== COMUNICACIÓN CON AEAT =====
-    xml_generado: Mapped[str | None] = mapped_column(Text)
-    xml_respuesta_aeat: Mapped[str | None] = mapped_column(
-        Text, comment="XML de RespuestaLinea de AEAT para este registro específico"
+    # XML en el almacén de blobs (app/infrastructure/almacen_blobs.py): digest
+    # SHA-256 y tamaño sin comprimir; contenido con leer_blob(digest)
+    xml_respuesta_aeat_digest: Mapped[str | None] = mapped_column(
+        String(64),
+        comment="Blob del XML de RespuestaLinea de AEAT para este registro",
+        deferred=True,
+        deferred_group=PerfilCargaRegistro.AEAT,
+    )
+    xml_respuesta_aeat_tamano: Mapped[int | None] = mapped_column(
+        Integer, deferred=True, deferred_group=PerfilCargaRegistro.AEAT
+    )
+    respuesta_aeat: Mapped[dict | None] = mapped_column(
+        postgresql.JSONB, deferred=True, deferred_group=PerfilCargaRegistro.AEAT
     )
-    respuesta_aeat: Mapped[dict | None] = mapped_column(postgresql.JSONB)
 
     intentos_envio: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     ultimo_intento_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
@@ -411,14 +554,18 @@ class RegistroFacturacion(Base):
         String(500), nullable=True
     )
 
+    # Sin FOREIGN KEY: lote_envio está particionada por created_at y su clave
+    # primaria es (id, created_at)
     lote_envio_id: Mapped[UUID | None] = mapped_column(
-        ForeignKey("lote_envio.id"),
+        postgresql.UUID(as_uuid=True),
         index=True,
         nullable=True,  # Puede ser NULL si aún no se ha enviado
     )
     # Relación 1:N con LoteEnvio
     lote_envio: Mapped["LoteEnvio | None"] = relationship(
-        back_populates="registros", lazy="selectin"
+        primaryjoin="foreign(RegistroFacturacion.lote_envio_id) == LoteEnvio.id",
+        back_populates="registros",
+        lazy="raise_on_sql",
     )
 
     # ===== TIMESTAMPS =====
@@ -433,7 +580,8 @@ class RegistroFacturacion(Base):
     instalacion_sif: Mapped[InstalacionSIF] = relationship(
         "InstalacionSIF",
         back_populates="registros",
-        lazy="selectin",  # ← Carga en batch cuando accedas a instalacion_sif
+        # Sin SQL propio: se resuelve desde el identity map (instalación ya cargada)
+        lazy="raise_on_sql",
     )
     __table_args__ = (
         # Índice compuesto para búsquedas frecuentes
@@ -441,6 +589,13 @@ class RegistroFacturacion(Base):
             "idx_registro_instalacion_fecha", "instalacion_sif_id", "fecha_expedicion"
         ),
         Index("idx_registro_estado_created", "estado", "created_at"),
+        # Paginación por cursor de GET /registros: (created_at, id) DESC
+        Index(
+            "idx_registro_instalacion_created_id",
+            "instalacion_sif_id",
+            sa.desc("created_at"),
+            sa.desc("id"),
+        ),
         # Unicidad: misma factura no puede existir dos veces en la misma instalación
         UniqueConstraint(
             "instalacion_sif_id",
@@ -459,6 +614,13 @@ class RegistroFacturacion(Base):
 
 
 class LoteEnvio(Base):
+    """
+    Lote de registros enviado a AEAT.
+
+    Particionada por meses de created_at (app/infrastructure/particiones.py): la
+    clave primaria de la tabla es (id, created_at); el mapper usa solo id.
+    """
+
     __tablename__ = "lote_envio"
 
     id: Mapped[UUID] = mapped_column(
@@ -471,13 +633,17 @@ class LoteEnvio(Base):
         ForeignKey("instalacion_sif.id"), index=True
     )
     registros: Mapped[list["RegistroFacturacion"]] = relationship(
+        primaryjoin="foreign(RegistroFacturacion.lote_envio_id) == LoteEnvio.id",
         back_populates="lote_envio",
-        lazy="selectin",
+        lazy="raise_on_sql",  # Hasta 1000 registros: consultarlos explícitamente
     )
     num_registros: Mapped[int] = mapped_column(Integer, nullable=False)
 
-    xml_enviado: Mapped[str] = mapped_column(Text, nullable=False)
-    xml_respuesta: Mapped[str | None] = mapped_column(Text)
+    # XML en el almacén de blobs (digest SHA-256 y tamaño sin comprimir)
+    xml_enviado_digest: Mapped[str | None] = mapped_column(String(64))
+    xml_enviado_tamano: Mapped[int | None] = mapped_column(Integer)
+    xml_respuesta_digest: Mapped[str | None] = mapped_column(String(64))
+    xml_respuesta_tamano: Mapped[int | None] = mapped_column(Integer)
     respuesta_json: Mapped[dict | None] = mapped_column(postgresql.JSONB)
 
     codigo_respuesta: Mapped[str | None] = mapped_column(String(50))
@@ -486,8 +652,9 @@ class LoteEnvio(Base):
     tiempo_respuesta_ms: Mapped[int | None] = mapped_column(Integer)
     endpoint_usado: Mapped[str] = mapped_column(String(500), nullable=False)
 
+    # Clave de partición (forma parte de la clave primaria de la tabla)
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        DateTime(timezone=True), primary_key=True, server_default=func.now()
     )
     estado: Mapped[EstadoLoteEnvio] = mapped_column(
         sa.Enum(
@@ -511,7 +678,7 @@ class LoteEnvio(Base):
     instalacion_sif: Mapped["InstalacionSIF"] = relationship(
         "InstalacionSIF",
         back_populates="lotes_envio",  # Opcional: si quieres acceso bidireccional
-        lazy="joined",  # Carga automáticamente con el lote
+        lazy="raise_on_sql",  # Carga explícita: CARGA_LOTE en process_lote
     )
     # ===== CONTROL DE FLUJO =====
     tiempo_espera_recibido: Mapped[int | None] = mapped_column(
@@ -528,6 +695,9 @@ class LoteEnvio(Base):
         comment="Número real de registros incluidos en este lote (máx 1000)",
     )
 
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
+    __mapper_args__ = {"primary_key": [id]}
+
 
 class OutboxEvent(Base):
     """
@@ -544,6 +714,8 @@ class OutboxEvent(Base):
     2. ENCOLADO: Dispatcher envió a worker AEAT
     3. PROCESADO: Worker AEAT completó exitosamente
     4. ERROR: Falló después de todos los reintentos
+
+    Particionada por meses de created_at, como lote_envio.
     """
 
     __tablename__ = "outbox_event"
@@ -552,10 +724,9 @@ class OutboxEvent(Base):
         Integer, primary_key=True, index=True, autoincrement=True
     )
 
-    # Relación con lote (FK)
+    # Relación con lote (sin FOREIGN KEY: lote_envio está particionada)
     lote_id: Mapped[UUID] = mapped_column(
         postgresql.UUID(as_uuid=True),
-        ForeignKey("lote_envio.id"),
         nullable=False,
         index=True,
     )
@@ -596,8 +767,10 @@ class OutboxEvent(Base):
     max_intentos: Mapped[int] = mapped_column(Integer, nullable=False, default=10)
 
     # Timestamps (CRÍTICO: created_at define orden FIFO)
+    # Clave de partición (forma parte de la clave primaria de la tabla)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
+        primary_key=True,
         nullable=False,
         server_default=func.now(),
         index=True,  # Índice crítico para ORDER BY created_at
@@ -626,10 +799,24 @@ class OutboxEvent(Base):
         ),
         # Índice para ver historial por instalación (útil para UI/Debug)
         Index("idx_outbox_instalacion_estado", "instalacion_sif_id", "estado"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
+    __mapper_args__ = {"primary_key": [id]}
 
     def __repr__(self) -> str:
         return (
             f"<OutboxEvent(id={self.id}, lote_id={self.lote_id}, "
             f"estado={self.estado}, created_at={self.created_at})>"
         )
+
+
+# create_all (desarrollo, tests): partición DEFAULT para poder insertar sin las
+# particiones mensuales. En producción las crean la migración y la tarea
+# mantener_particiones (app/infrastructure/particiones.py)
+for _modelo in (LoteEnvio, OutboxEvent):
+    _nombre = _modelo.__tablename__
+    event.listen(
+        _modelo.__table__,
+        "after_create",
+        DDL(f"CREATE TABLE {_nombre}_default PARTITION OF {_nombre} DEFAULT"),
+    )
@@ -6,7 +6,7 @@ Servicio de dominio para gestión de lotes de envío.
 Responsabilidades:
 - Validar condiciones de control de flujo (AEAT)
 - Crear lotes y asociar registros
-- Actualizar contadores de instalación
+- Actualizar el contador de registros pendientes (cabeza de cadena)
 
 NO gestiona:
 - Transacciones (commit/rollback)
@@ -16,13 +16,16 @@ NO gestiona:
 """
 
 import logging
-from datetime import datetime, timezone
-from typing import Optional
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional
+from uuid import UUID
 
-from sqlalchemy import func, select, update
+from sqlalchemy import func, insert, literal, literal_column, or_, select, update
 from sqlalchemy.orm import Session
 
 from app.domain.models.models import (
+    CabezaCadenaInstalacion,
     EstadoRegistroFacturacion,
     InstalacionSIF,
     LoteEnvio,
@@ -31,6 +34,40 @@ from app.domain.models.models import (
 
 logger = logging.getLogger(__name__)
 
+# AEAT: máximo de registros por envío (y umbral de envío inmediato)
+MAX_REGISTROS_LOTE = 1000
+
+
+def tiempo_espera_seguro(tiempo_espera: int) -> float:
+    """Tiempo 't' con margen de seguridad: mayor entre +10% y +5 segundos"""
+    return max(tiempo_espera * 1.1, tiempo_espera + 5)
+
+
+@dataclass(frozen=True)
+class EstadoControlFlujo:
+    """Campos de control de flujo de una instalación (tras una escritura)"""
+
+    registros_pendientes: int
+    ultimo_envio_at: Optional[datetime]
+    ultimo_tiempo_espera: int
+
+    def envio_permitido_at(self) -> Optional[datetime]:
+        """Cuándo se cumple la condición de tiempo (None: primer envío)"""
+        if self.ultimo_envio_at is None:
+            return None
+        return self.ultimo_envio_at + timedelta(
+            seconds=tiempo_espera_seguro(self.ultimo_tiempo_espera)
+        )
+
+
+@dataclass(frozen=True)
+class LoteCreado:
+    """Lote recién creado (pendiente de commit)"""
+
+    id: UUID
+    instalacion_sif_id: int
+    num_registros: int
+
 
 class LoteService:
     """
@@ -49,7 +86,7 @@ class LoteService:
         self,
         instalacion_sif_id: int,
         max_registros: int = 1000,
-    ) -> Optional[LoteEnvio]:
+    ) -> Optional[LoteCreado]:
         """
         Crea un lote si se cumplen las condiciones de control de flujo AEAT.
 
@@ -58,14 +95,16 @@ class LoteService:
             max_registros: Límite máximo de registros por lote (AEAT: 1000)
 
         Returns:
-            LoteEnvio si se creó exitosamente
-            None si no se cumplen las condiciones
+            LoteCreado si se creó exitosamente
+            None si no se cumplen las condiciones o no hay registros
 
         Raises:
             SQLAlchemyError: Errores de base de datos
 
         IMPORTANTE:
-        - NO hace commit (usa flush() para obtener IDs)
+        - NO hace commit
+        - Una sola sentencia reclama los registros, inserta el lote y actualiza
+          el contador (ver _sentencia_crear_lote): no carga registros en el ORM
         - El caller DEBE tener lock de Redis adquirido
         - El caller DEBE hacer commit/rollback
         - El caller DEBE crear evento outbox en la MISMA transacción
@@ -81,75 +120,147 @@ class LoteService:
             )
             return None
 
-        # Seleccionar registros pendientes con row-level lock
-        # FOR UPDATE SKIP LOCKED: evita bloqueos, solo toma registros disponibles
-        registros = (
-            self.db.execute(
-                select(RegistroFacturacion)
-                .where(
-                    RegistroFacturacion.instalacion_sif_id == instalacion_sif_id,
-                    RegistroFacturacion.estado == EstadoRegistroFacturacion.PENDIENTE,
-                )
-                .order_by(RegistroFacturacion.created_at)
-                .limit(max_registros)
-                .with_for_update(skip_locked=True)
-            )
-            .scalars()
-            .all()
-        )
+        lote = self.db.execute(
+            self._sentencia_crear_lote(instalacion_sif_id, max_registros)
+        ).one_or_none()
 
-        if not registros:
+        if lote is None:
             logger.debug(
                 "No hay registros disponibles para crear lote",
                 extra={"instalacion_id": instalacion_sif_id},
             )
             return None
 
-        # Crear lote
-        lote = LoteEnvio(
+        logger.info(
+            "Lote creado con flush, pendiente de commit",
+            extra={
+                "lote_id": str(lote.id),
+                "instalacion_id": instalacion_sif_id,
+                "num_registros": lote.num_registros,
+            },
+        )
+
+        return LoteCreado(
+            id=lote.id,
             instalacion_sif_id=instalacion_sif_id,
-            num_registros=len(registros),
-            xml_enviado="",  # Se generará en worker_aeat
-            tiempo_espera_recibido=None,  # Se actualizará tras respuesta AEAT
-            proximo_envio_permitido_at=None,  # Se actualizará tras respuesta AEAT
+            num_registros=lote.num_registros,
         )
 
-        self.db.add(lote)
-        self.db.flush()  # Obtener ID del lote sin commitear
+    @staticmethod
+    def _sentencia_crear_lote(instalacion_sif_id: int, max_registros: int) -> Any:
+        """
+        Creación del lote en una sola sentencia (sin hidratar registros).
+
+        WITH elegidos  -- ids PENDIENTES, FOR UPDATE SKIP LOCKED
+             lote      -- INSERT lote_envio ... HAVING count(*) > 0 RETURNING
+             encolados -- UPDATE registros: lote_envio_id + ENCOLADO
+        UPDATE cabeza_cadena_instalacion (registros_pendientes -= num)
+        RETURNING lote
 
+        Sin registros elegidos no se inserta lote y no devuelve filas.
+        """
+        elegidos = (
+            select(RegistroFacturacion.id)
+            .where(
+                RegistroFacturacion.instalacion_sif_id == instalacion_sif_id,
+                RegistroFacturacion.estado == EstadoRegistroFacturacion.PENDIENTE,
+            )
+            .order_by(RegistroFacturacion.created_at)
+            .limit(max_registros)
+            # FOR UPDATE SKIP LOCKED: evita bloqueos, solo toma registros
+            # disponibles (PostgreSQL no integra en la consulta principal un CTE
+            # con FOR UPDATE: se evalúa una sola vez)
+            .with_for_update(skip_locked=True)
+            .cte("elegidos")
+        )
+        num_elegidos = func.count()
+        lote = (
+            insert(LoteEnvio)
+            .from_select(
+                [
+                    LoteEnvio.instalacion_sif_id,
+                    LoteEnvio.num_registros,
+                    LoteEnvio.num_registros_enviados,
+                    LoteEnvio.endpoint_usado,
+                ],
+                select(
+                    literal(instalacion_sif_id),
+                    num_elegidos,
+                    num_elegidos,
+                    literal(""),
+                )
+                .select_from(elegidos)
+                .having(num_elegidos > 0),
+            )
+            # tiempo_espera_recibido y proximo_envio_permitido_at: tras respuesta AEAT
+            .returning(LoteEnvio.id, LoteEnvio.num_registros)
+            .cte("lote")
+        )
         # Asociar registros al lote y marcarlos como ENCOLADO
-        registro_ids = [r.id for r in registros]
-        self.db.execute(
+        encolados = (
             update(RegistroFacturacion)
-            .where(RegistroFacturacion.id.in_(registro_ids))
+            .where(RegistroFacturacion.id.in_(select(elegidos.c.id)))
             .values(
-                lote_envio_id=lote.id,
+                lote_envio_id=select(lote.c.id).scalar_subquery(),
                 estado=EstadoRegistroFacturacion.ENCOLADO,
             )
+            .cte("encolados")
         )
-
-        # Decrementar contador de pendientes en la instalación
-        encolados = len(registros)
-        self.db.execute(
-            update(InstalacionSIF)
-            .where(InstalacionSIF.id == instalacion_sif_id)
+        # Decrementar contador de pendientes (ultimo_envio_at de la
+        # instalación se actualizará tras respuesta de AEAT)
+        return (
+            update(CabezaCadenaInstalacion)
+            .where(
+                CabezaCadenaInstalacion.instalacion_sif_id == instalacion_sif_id,
+                lote.c.id.isnot(None),
+            )
             .values(
-                registros_pendientes=InstalacionSIF.registros_pendientes
-                - encolados
-                # ultimo_envio_at se actualizará tras respuesta de AEAT
+                registros_pendientes=CabezaCadenaInstalacion.registros_pendientes
+                - lote.c.num_registros
             )
+            .returning(lote.c.id, lote.c.num_registros)
+            .add_cte(encolados)
         )
 
-        logger.info(
-            "Lote creado con flush, pendiente de commit",
-            extra={
-                "lote_id": str(lote.id),
-                "instalacion_id": instalacion_sif_id,
-                "num_registros": encolados,
-            },
-        )
+    def instalaciones_elegibles(self, max_registros: int = 1000) -> List[int]:
+        """
+        Instalaciones que cumplen el control de flujo, en una sola consulta.
 
-        return lote
+        Mismas condiciones que _control_flujo evaluadas en PostgreSQL:
+        registros_pendientes > 0 y (≥max_registros, primer envío, o tiempo 't'
+        cumplido con margen de seguridad). El contador está en la cabeza de
+        cadena: el predicado registros_pendientes > 0 coincide con el del índice
+        parcial idx_cabeza_pendientes, así que solo se recorren (y se unen a
+        instalacion_sif) las instalaciones con algo pendiente.
+
+        Sin el COUNT de verificación: el orquestador vuelve a evaluar
+        _control_flujo (y corrige el contador) antes de crear el lote.
+        """
+        # tiempo_espera_seguro() en SQL
+        espera_segura = func.greatest(
+            InstalacionSIF.ultimo_tiempo_espera * 1.1,  # +10% margen
+            InstalacionSIF.ultimo_tiempo_espera + 5,  # +5s mínimo absoluto
+        )
+        return list(
+            self.db.scalars(
+                select(InstalacionSIF.id)
+                .join(
+                    CabezaCadenaInstalacion,
+                    CabezaCadenaInstalacion.instalacion_sif_id == InstalacionSIF.id,
+                )
+                .where(
+                    CabezaCadenaInstalacion.registros_pendientes > 0,
+                    or_(
+                        CabezaCadenaInstalacion.registros_pendientes >= max_registros,
+                        InstalacionSIF.ultimo_envio_at.is_(None),
+                        InstalacionSIF.ultimo_envio_at
+                        <= func.now()
+                        - espera_segura * literal_column("interval '1 second'"),
+                    ),
+                )
+                .order_by(InstalacionSIF.id)
+            )
+        )
 
     def control_flujo(self, instalacion_sif_id: int, max_registros: int = 1000) -> bool:
         """
@@ -181,18 +292,30 @@ class LoteService:
             InstalacionSIF si cumple condiciones
             None si no cumple o no existe
         """
-        instalacion = self.db.get(InstalacionSIF, instalacion_sif_id)
-        if not instalacion:
+        # Instalación y contador de pendientes (cabeza de cadena) en una consulta
+        fila = self.db.execute(
+            select(
+                InstalacionSIF,
+                func.coalesce(CabezaCadenaInstalacion.registros_pendientes, 0),
+            )
+            .outerjoin(
+                CabezaCadenaInstalacion,
+                CabezaCadenaInstalacion.instalacion_sif_id == InstalacionSIF.id,
+            )
+            .where(InstalacionSIF.id == instalacion_sif_id)
+        ).one_or_none()
+        if not fila:
             logger.warning(
                 "Instalación no encontrada",
                 extra={"instalacion_id": instalacion_sif_id},
             )
             return None
+        instalacion, registros_pendientes = fila
 
         ahora = datetime.now(timezone.utc)
 
         # Condición 1: Límite de registros alcanzado (≥1000)
-        max_registros_acumulados = instalacion.registros_pendientes >= max_registros
+        max_registros_acumulados = registros_pendientes >= max_registros
 
         # Condición 2: Tiempo de espera 't' cumplido (con margen de seguridad)
         tiempo_cumplido = False
@@ -200,19 +323,16 @@ class LoteService:
 
         if instalacion.ultimo_envio_at:
             # Aplicar margen de seguridad: mayor entre +10% y +5 segundos
-            tiempo_espera_seguro = max(
-                instalacion.ultimo_tiempo_espera * 1.1,  # +10% margen
-                instalacion.ultimo_tiempo_espera + 5,  # +5s mínimo absoluto
-            )
+            espera_segura = tiempo_espera_seguro(instalacion.ultimo_tiempo_espera)
             tiempo_transcurrido = (ahora - instalacion.ultimo_envio_at).total_seconds()
-            tiempo_cumplido = tiempo_transcurrido >= tiempo_espera_seguro
+            tiempo_cumplido = tiempo_transcurrido >= espera_segura
 
             logger.debug(
                 "Evaluación de tiempo de espera",
                 extra={
                     "instalacion_id": instalacion_sif_id,
                     "tiempo_transcurrido": round(tiempo_transcurrido, 1),
-                    "tiempo_espera_seguro": round(tiempo_espera_seguro, 1),
+                    "tiempo_espera_seguro": round(espera_segura, 1),
                     "tiempo_cumplido": tiempo_cumplido,
                 },
             )
@@ -230,7 +350,7 @@ class LoteService:
                 "Instalación no cumple condiciones de control de flujo",
                 extra={
                     "instalacion_id": instalacion_sif_id,
-                    "registros_pendientes": instalacion.registros_pendientes,
+                    "registros_pendientes": registros_pendientes,
                     "max_registros": max_registros,
                     "tiempo_transcurrido": (
                         round(tiempo_transcurrido, 1) if tiempo_transcurrido else 0
@@ -254,13 +374,13 @@ class LoteService:
                 "Inconsistencia detectada en contador de registros pendientes",
                 extra={
                     "instalacion_id": instalacion_sif_id,
-                    "contador": instalacion.registros_pendientes,
+                    "contador": registros_pendientes,
                     "real": count_pendientes,
                 },
             )
             self.db.execute(
-                update(InstalacionSIF)
-                .where(InstalacionSIF.id == instalacion_sif_id)
+                update(CabezaCadenaInstalacion)
+                .where(CabezaCadenaInstalacion.instalacion_sif_id == instalacion_sif_id)
                 .values(registros_pendientes=0)
             )
             # NO hacer commit aquí - el caller lo hará
@@ -270,7 +390,7 @@ class LoteService:
             "Instalación cumple condiciones de control de flujo",
             extra={
                 "instalacion_id": instalacion_sif_id,
-                "registros_pendientes": instalacion.registros_pendientes,
+                "registros_pendientes": registros_pendientes,
                 "max_registros_acumulados": max_registros_acumulados,
                 "tiempo_cumplido": tiempo_cumplido,
             },
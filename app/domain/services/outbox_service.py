@@ -7,11 +7,19 @@ Servicio para gestión de eventos del Outbox Pattern.
 import json
 import logging
 from datetime import datetime, timezone
+from typing import Sequence
+from uuid import UUID
 
 from sqlalchemy import exists, select, update
 from sqlalchemy.orm import Session
 
-from app.domain.models.models import EstadoOutboxEvent, LoteEnvio, OutboxEvent
+from app.domain.models.models import (
+    EstadoLoteEnvio,
+    EstadoOutboxEvent,
+    LoteEnvio,
+    OutboxEvent,
+)
+from app.domain.services.lote_service import LoteCreado
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +39,7 @@ class OutboxService:
 
     def crear_evento(
         self,
-        lote: LoteEnvio,
+        lote: LoteEnvio | LoteCreado,
         task_name: str = "app.tasks.worker_aeat.enviar_lote_aeat",
         max_intentos: int = 10,
         correlation_id: str | None = None,
@@ -43,7 +51,7 @@ class OutboxService:
         que la creación del lote. NO hace commit.
 
         Args:
-            lote: Lote recién creado (debe tener ID después de flush)
+            lote: Lote recién creado (LoteService.crear_lote_para_instalacion)
             task_name: Nombre de la tarea Celery a ejecutar
             max_intentos: Número máximo de reintentos
 
@@ -115,6 +123,44 @@ class OutboxService:
 
         # NO hacer commit aquí - el caller lo hará
 
+    def marcar_encolados(
+        self, evento_ids: Sequence[int], lote_ids: Sequence[UUID]
+    ) -> None:
+        """
+        Marca como ENCOLADO un bloque de eventos publicados y sus lotes.
+
+        Dos sentencias para todo el bloque (en lugar de marcar_encolado y el
+        UPDATE del lote por evento). Los ids vienen del SELECT FOR UPDATE del
+        dispatcher: eventos y lotes existen y están bloqueados por esta
+        transacción. Solo pasan a ENCOLADO los lotes aún en CREADO: un reenvío
+        de un lote ya procesado (CORRECTO, ERROR...) no retrocede su estado.
+
+        Args:
+            evento_ids: IDs de los eventos publicados en Celery
+            lote_ids: IDs de sus lotes
+        """
+        if not evento_ids:
+            return
+        self.db.execute(
+            update(OutboxEvent)
+            .where(OutboxEvent.id.in_(evento_ids))
+            .values(
+                estado=EstadoOutboxEvent.ENCOLADO,
+                intentos=OutboxEvent.intentos + 1,
+                ultimo_intento_at=datetime.now(timezone.utc),
+            )
+        )
+        self.db.execute(
+            update(LoteEnvio)
+            .where(
+                LoteEnvio.id.in_(lote_ids),
+                LoteEnvio.estado == EstadoLoteEnvio.CREADO,
+            )
+            .values(estado=EstadoLoteEnvio.ENCOLADO)
+        )
+
+        # NO hacer commit aquí - el caller lo hará
+
     def marcar_procesado(self, evento_id: int) -> None:
         """
         Marca un evento como procesado exitosamente.
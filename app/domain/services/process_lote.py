@@ -5,36 +5,52 @@ Servicio para procesamiento completo de lotes de envío a AEAT.
 
 Responsabilidades:
 - Generar XML de envío Veri*factu
+- Guardar el XML enviado y las respuestas en el almacén de blobs (auditoría)
 - Enviar a AEAT (POST con certificado)
 - Procesar respuesta (aplicar lógica de negocio)
-- Actualizar instalación (control de flujo)
+- Actualizar instalación (control de flujo) y calcular el próximo envío; el
+  worker lo programa en el temporizador tras el commit
+  (app/infrastructure/temporizador_envios.py)
 - Actualizar estados de registros
 """
 
 import logging
 import uuid
 from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
 
 from sqlalchemy import select, update
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, undefer_group
 
 from app.domain.models.models import (
+    CabezaCadenaInstalacion,
     EstadoRegistroFacturacion,
     InstalacionSIF,
     LoteEnvio,
+    PerfilCargaRegistro,
     RegistroFacturacion,
 )
+from app.domain.services.lote_service import MAX_REGISTROS_LOTE, tiempo_espera_seguro
 from app.infrastructure.aeat.models.respuesta_suministro import EstadoEnvioType
 from app.infrastructure.aeat.response_parser import (
     ResultadoProcesamiento,
     ResultadoRegistroError,
     ResultadoRegistroOK,
 )
+from app.infrastructure.almacen_blobs import BlobRef, ErrorAlmacenBlobs, almacen_blobs
 
 logger = logging.getLogger(__name__)
 
 TIEMPO_ESPERA_DEFAULT: int = 60
 
+# Carga del lote para procesarlo: instalación (cliente AEAT) y obligado (cabecera
+# del XML) en la misma consulta. Los registros se consultan aparte
+# (_obtener_registros_lote) y resuelven registro.instalacion_sif desde el
+# identity map, sin SQL adicional.
+CARGA_LOTE = (
+    joinedload(LoteEnvio.instalacion_sif).joinedload(InstalacionSIF.obligado),
+)
+
 
 class ProcessLoteService:
     """
@@ -51,6 +67,9 @@ class ProcessLoteService:
 
     def __init__(self, db: Session):
         self.db = db
+        # Próximo envío de la instalación tras el último lote procesado (None:
+        # sin pendientes). Lo programa el caller después del commit
+        self.proximo_envio: Optional[datetime] = None
 
     def procesar_lote(self, lote: LoteEnvio) -> ResultadoProcesamiento:
         """
@@ -67,6 +86,7 @@ class ProcessLoteService:
 
         IMPORTANTE:
         - NO hace commit (el caller debe hacerlo)
+        - NO programa el próximo envío: lo deja en self.proximo_envio
         - Actualiza estado del lote y registros
         - CRÍTICO: Actualiza instalacion.ultimo_envio_at y ultimo_tiempo_espera
         """
@@ -98,8 +118,11 @@ class ProcessLoteService:
             # PASO 2: Generar XML de envío
             xml_envio = self._generar_xml_envio(lote, registros)
 
-            # Guardar XML en el lote (para auditoría)
-            lote.xml_enviado = xml_envio
+            # Guardar XML para auditoría: en el lote solo digest y tamaño. Si el
+            # almacén falla se propaga (aún no se ha enviado nada a AEAT)
+            xml_ref = almacen_blobs().guardar(xml_envio)
+            lote.xml_enviado_digest = xml_ref.digest
+            lote.xml_enviado_tamano = xml_ref.tamano
             self.db.flush()
 
             logger.info(
@@ -109,6 +132,7 @@ class ProcessLoteService:
 
             # PASO 3: Enviar a AEAT y parsear respuesta
             resultado = self._enviar_a_aeat(lote, xml_envio)
+            xml_lineas = self._guardar_respuestas_aeat(lote, resultado)
 
             if not resultado.exitoso:
                 # Error en envío o parseo: marcar registros como ERROR
@@ -117,10 +141,10 @@ class ProcessLoteService:
                 return resultado
 
             # PASO 4: Aplicar resultados a la BD
-            self._aplicar_resultados_a_bd(lote, resultado)
+            self._aplicar_resultados_a_bd(lote, resultado, xml_lineas)
 
             # PASO 5: CRÍTICO - Actualizar instalación (control de flujo)
-            self._actualizar_instalacion_control_flujo(
+            self.proximo_envio = self._actualizar_instalacion_control_flujo(
                 lote, resultado.tiempo_espera_segundos or TIEMPO_ESPERA_DEFAULT
             )
 
@@ -148,10 +172,15 @@ class ProcessLoteService:
             raise
 
     def _obtener_registros_lote(self, lote: LoteEnvio) -> list[RegistroFacturacion]:
-        """Obtiene los registros asociados al lote."""
+        """
+        Obtiene los registros asociados al lote (con factura_json para el XML).
+
+        El lote debe estar cargado con CARGA_LOTE.
+        """
         registros = (
             self.db.execute(
                 select(RegistroFacturacion)
+                .options(undefer_group(PerfilCargaRegistro.CONTENIDO))
                 .where(RegistroFacturacion.lote_envio_id == lote.id)
                 .order_by(RegistroFacturacion.created_at.asc())
             )
@@ -247,8 +276,44 @@ class ProcessLoteService:
             )
             raise
 
-    def _aplicar_resultados_a_bd(
+    def _guardar_respuestas_aeat(
         self, lote: LoteEnvio, resultado: ResultadoProcesamiento
+    ) -> Dict[str, Optional[BlobRef]]:
+        """
+        Guarda en el almacén de blobs la respuesta completa (en el lote) y la
+        línea de respuesta de cada registro.
+
+        Si el almacén falla solo se pierde el XML de auditoría: AEAT ya ha
+        procesado el envío y propagar el error lo reenviaría.
+
+        Returns:
+            ref_externa → blob de su línea de respuesta
+        """
+        lineas: list[ResultadoRegistroOK | ResultadoRegistroError] = [
+            *resultado.registros_ok,
+            *resultado.registros_error,
+        ]
+        try:
+            almacen = almacen_blobs()
+            if resultado.xml_raw:
+                xml_ref = almacen.guardar(resultado.xml_raw)
+                lote.xml_respuesta_digest = xml_ref.digest
+                lote.xml_respuesta_tamano = xml_ref.tamano
+            refs = almacen.guardar_varios([li.xml_linea_respuesta for li in lineas])
+        except ErrorAlmacenBlobs as e:
+            logger.error(
+                "No se pudieron guardar los XML de respuesta de AEAT",
+                extra={"lote_id": str(lote.id), "error": str(e)},
+                exc_info=True,
+            )
+            return {}
+        return {linea.ref_externa: ref for linea, ref in zip(lineas, refs)}
+
+    def _aplicar_resultados_a_bd(
+        self,
+        lote: LoteEnvio,
+        resultado: ResultadoProcesamiento,
+        xml_lineas: Dict[str, Optional[BlobRef]],
     ) -> None:
         """
         Aplica los resultados del parseo a la base de datos.
@@ -270,11 +335,13 @@ class ProcessLoteService:
 
         # Aplicar resultados a registros OK
         for reg_ok in resultado.registros_ok:
-            self._aplicar_registro_ok(reg_ok)
+            self._aplicar_registro_ok(reg_ok, xml_lineas.get(reg_ok.ref_externa))
 
         # Aplicar resultados a registros ERROR
         for reg_error in resultado.registros_error:
-            self._aplicar_registro_error(reg_error)
+            self._aplicar_registro_error(
+                reg_error, xml_lineas.get(reg_error.ref_externa)
+            )
 
         logger.info(
             "Resultados aplicados a base de datos",
@@ -286,7 +353,9 @@ class ProcessLoteService:
             },
         )
 
-    def _aplicar_registro_ok(self, reg_ok: ResultadoRegistroOK) -> None:
+    def _aplicar_registro_ok(
+        self, reg_ok: ResultadoRegistroOK, xml_ref: Optional[BlobRef]
+    ) -> None:
         """
         Aplica resultado OK a un registro.
 
@@ -315,16 +384,11 @@ class ProcessLoteService:
                 )
                 nuevo_estado = EstadoRegistroFacturacion.CORRECTO
 
-            # Serializar respuesta XML (si está disponible)
-            xml_respuesta_aeat = None
-            if reg_ok.xml_linea_respuesta:
-                xml_respuesta_aeat = reg_ok.xml_linea_respuesta
-
             # Actualizar registro
             self.db.execute(
                 update(RegistroFacturacion)
                 .where(RegistroFacturacion.id == registro_id)
-                .values(estado=nuevo_estado, xml_respuesta_aeat=xml_respuesta_aeat)
+                .values(estado=nuevo_estado, **_valores_xml_respuesta(xml_ref))
             )
 
             logger.debug(
@@ -345,7 +409,9 @@ class ProcessLoteService:
                 },
             )
 
-    def _aplicar_registro_error(self, reg_error: ResultadoRegistroError) -> None:
+    def _aplicar_registro_error(
+        self, reg_error: ResultadoRegistroError, xml_ref: Optional[BlobRef]
+    ) -> None:
         """
         Aplica resultado ERROR a un registro.
 
@@ -358,15 +424,10 @@ class ProcessLoteService:
             # Siempre INCORRECTO (fue rechazado por AEAT)
             nuevo_estado = EstadoRegistroFacturacion.INCORRECTO
 
-            # Serializar respuesta XML (si está disponible)
-            xml_respuesta_aeat = None
-            if reg_error.xml_linea_respuesta:
-                xml_respuesta_aeat = reg_error.xml_linea_respuesta
-
             # Preparar datos a actualizar
             valores = {
                 "estado": nuevo_estado,
-                "xml_respuesta_aeat": xml_respuesta_aeat,
+                **_valores_xml_respuesta(xml_ref),
                 "aeat_codigo_error": (
                     int(reg_error.codigo_error) if reg_error.codigo_error else None
                 ),
@@ -457,7 +518,7 @@ class ProcessLoteService:
 
     def _actualizar_instalacion_control_flujo(
         self, lote: LoteEnvio, tiempo_espera: int
-    ) -> None:
+    ) -> Optional[datetime]:
         """
         CRÍTICO: Actualiza instalación para control de flujo.
 
@@ -465,39 +526,57 @@ class ProcessLoteService:
         - ultimo_envio_at: timestamp del envío
         - ultimo_tiempo_espera: tiempo 't' recibido de AEAT
 
-        El scheduler usa estos valores para decidir cuándo enviar de nuevo.
+        Returns:
+            Próximo envío: al vencer 't' con margen, o ya si quedan
+            MAX_REGISTROS_LOTE pendientes. None sin pendientes (lo programará la
+            ingesta del siguiente). No se programa aquí: antes del commit el
+            temporizador podría despertar la instalación con el estado anterior.
         """
         ahora = datetime.now(timezone.utc)
 
-        self.db.execute(
-            update(InstalacionSIF)
-            .where(InstalacionSIF.id == lote.instalacion_sif_id)
-            .values(
-                ultimo_envio_at=ahora,
-                ultimo_tiempo_espera=tiempo_espera,
-            )
+        pendientes = (
+            self.db.execute(
+                update(InstalacionSIF)
+                .where(InstalacionSIF.id == lote.instalacion_sif_id)
+                .values(
+                    ultimo_envio_at=ahora,
+                    ultimo_tiempo_espera=tiempo_espera,
+                )
+                # Contador en la cabeza de cadena: se lee sin bloquear su fila
+                .returning(
+                    select(CabezaCadenaInstalacion.registros_pendientes)
+                    .where(
+                        CabezaCadenaInstalacion.instalacion_sif_id == InstalacionSIF.id
+                    )
+                    .scalar_subquery()
+                )
+            ).scalar_one()
+            or 0
         )
 
+        proximo_envio: Optional[datetime] = None
+        if pendientes >= MAX_REGISTROS_LOTE:
+            proximo_envio = ahora
+        elif pendientes > 0:
+            proximo_envio = ahora + timedelta(
+                seconds=tiempo_espera_seguro(tiempo_espera)
+            )
         logger.info(
             "Instalación actualizada con control de flujo",
             extra={
                 "instalacion_id": lote.instalacion_sif_id,
                 "ultimo_envio_at": ahora.isoformat(),
                 "ultimo_tiempo_espera": tiempo_espera,
+                "registros_pendientes": pendientes,
+                "proximo_envio": proximo_envio.isoformat() if proximo_envio else None,
             },
         )
+        return proximo_envio
 
 
-def procesar_lote(lote: LoteEnvio, db: Session) -> ResultadoProcesamiento:
-    """
-    Función helper para procesar un lote.
-
-    Args:
-        lote: Lote a procesar
-        db: Sesión de BD (NO hace commit)
-
-    Returns:
-        ResultadoProcesamiento
-    """
-    servicio = ProcessLoteService(db)
-    return servicio.procesar_lote(lote)
+def _valores_xml_respuesta(xml_ref: Optional[BlobRef]) -> Dict[str, object]:
+    """Columnas del blob de la línea de respuesta (None si no hay XML)"""
+    return {
+        "xml_respuesta_aeat_digest": xml_ref.digest if xml_ref else None,
+        "xml_respuesta_aeat_tamano": xml_ref.tamano if xml_ref else None,
+    }
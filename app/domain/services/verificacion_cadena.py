@@ -0,0 +1,280 @@
+"""
+app/domain/services/verificacion_cadena.py
+
+Verificación de la integridad de la cadena de huellas de cada instalación.
+
+Responsabilidades:
+- Recorrer los registros de una instalación en orden de cadena (created_at, id)
+  con un cursor de servidor, sin cargar la cadena entera en memoria
+- Comprobar en cada registro:
+  - enlace: anterior_huella == huella del registro previo
+  - huella: la huella guardada coincide con la recalculada (motor_huella)
+- Informar de las roturas con su posición exacta en la cadena
+- Guardar un punto de control (VerificacionCadena) tras el último registro
+  verificado sin roturas: la siguiente ejecución solo recorre los nuevos
+- Repartir las instalaciones entre un pool de procesos (verificar_instalaciones)
+
+IMPORTANTE: FechaHoraHusoGenRegistro se formatea con la zona horaria local del
+proceso (igual que al crear la factura). Ejecutar con la misma TZ que la API.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Row, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.core.utils.huella import EntradaHuella, motor_huella
+from app.domain.models.models import (
+    InstalacionSIF,
+    RegistroFacturacion,
+    VerificacionCadena,
+)
+from app.infrastructure.aeat.models.suministro_informacion import TipoOperacionType
+from app.infrastructure.database import get_sync_db, get_sync_engine
+
+logger = logging.getLogger(__name__)
+
+# Filas por viaje del cursor de servidor
+VERIFICACION_YIELD_PER = 5000
+
+COLUMNAS_VERIFICACION = (
+    RegistroFacturacion.id,
+    RegistroFacturacion.created_at,
+    RegistroFacturacion.emisor_nif,
+    RegistroFacturacion.serie,
+    RegistroFacturacion.numero,
+    RegistroFacturacion.fecha_expedicion,
+    RegistroFacturacion.tipo_factura,
+    RegistroFacturacion.tipo_operacion,
+    RegistroFacturacion.cuota_total,
+    RegistroFacturacion.importe_total,
+    RegistroFacturacion.huella,
+    RegistroFacturacion.anterior_huella,
+)
+
+MOTIVO_ENLACE = "enlace"  # anterior_huella no es la huella del registro previo
+MOTIVO_HUELLA = "huella"  # la huella no corresponde a los datos del registro
+
+
+@dataclass(frozen=True)
+class RoturaCadena:
+    """Registro en el que la cadena no se sostiene"""
+
+    posicion: int  # 1 = primer registro de la instalación
+    registro_id: UUID
+    serie: str
+    numero: str
+    created_at: datetime
+    motivo: str
+    esperado: Optional[str]
+    encontrado: Optional[str]
+
+
+@dataclass(frozen=True)
+class ResultadoVerificacion:
+    instalacion_id: int
+    verificados: int  # registros recorridos en esta ejecución
+    total: int  # posición del último registro recorrido
+    roturas: List[RoturaCadena] = field(default_factory=list)
+
+    @property
+    def intacta(self) -> bool:
+        return not self.roturas
+
+
+def _comprobar(
+    fila: Row[Any], huella_previa: Optional[str], posicion: int
+) -> List[RoturaCadena]:
+    roturas = []
+
+    def rotura(motivo: str, esperado: Optional[str], encontrado: Optional[str]) -> None:
+        roturas.append(
+            RoturaCadena(
+                posicion=posicion,
+                registro_id=fila.id,
+                serie=fila.serie,
+                numero=fila.numero,
+                created_at=fila.created_at,
+                motivo=motivo,
+                esperado=esperado,
+                encontrado=encontrado,
+            )
+        )
+
+    if fila.anterior_huella != huella_previa:
+        rotura(MOTIVO_ENLACE, huella_previa, fila.anterior_huella)
+
+    # Solo hay altas: la huella de una anulación lleva otros campos
+    if fila.tipo_operacion == TipoOperacionType.ALTA:
+        recalculada = motor_huella.huella_alta(
+            EntradaHuella(
+                nif_emisor=fila.emisor_nif,
+                numero_serie=f"{fila.serie}{fila.numero}",
+                fecha_expedicion=fila.fecha_expedicion.strftime("%d-%m-%Y"),
+                tipo_factura=fila.tipo_factura.value,
+                cuota_total=fila.cuota_total,
+                importe_total=fila.importe_total,
+                fecha_hora_gen=fila.created_at,
+            ),
+            fila.anterior_huella,
+        )
+        if recalculada != fila.huella:
+            rotura(MOTIVO_HUELLA, recalculada, fila.huella)
+
+    return roturas
+
+
+def verificar_instalacion(
+    db: Session, instalacion_id: int, desde_cero: bool = False
+) -> ResultadoVerificacion:
+    """
+    Verifica la cadena de una instalación desde su punto de control.
+
+    Args:
+        db: Sesión síncrona (el caller hace commit del punto de control)
+        instalacion_id: Instalación a verificar
+        desde_cero: Ignorar el punto de control y recorrer la cadena entera
+
+    Returns:
+        ResultadoVerificacion con las roturas encontradas (vacío si intacta)
+
+    El punto de control avanza hasta el último registro anterior a la primera
+    rotura: mientras no se corrija, cada ejecución la vuelve a informar.
+    """
+    punto = None if desde_cero else db.get(VerificacionCadena, instalacion_id)
+
+    stmt = (
+        select(*COLUMNAS_VERIFICACION)
+        .where(RegistroFacturacion.instalacion_sif_id == instalacion_id)
+        .order_by(RegistroFacturacion.created_at, RegistroFacturacion.id)
+    )
+    huella_previa: Optional[str] = None
+    posicion = 0
+    if punto:
+        stmt = stmt.where(
+            tuple_(RegistroFacturacion.created_at, RegistroFacturacion.id)
+            > tuple_(punto.ultima_fecha_hora_gen, punto.ultimo_registro_id)
+        )
+        huella_previa = punto.ultima_huella
+        posicion = punto.registros_verificados
+    posicion_inicial = posicion
+
+    roturas: List[RoturaCadena] = []
+    ultima_intacta: Optional[Row[Any]] = None
+    posicion_intacta = posicion
+
+    result = db.execute(stmt.execution_options(yield_per=VERIFICACION_YIELD_PER))
+    for filas in result.partitions():
+        for fila in filas:
+            posicion += 1
+            roturas_fila = _comprobar(fila, huella_previa, posicion)
+            if roturas_fila:
+                roturas.extend(roturas_fila)
+            elif not roturas:
+                ultima_intacta = fila
+                posicion_intacta = posicion
+            # Seguir con la huella guardada: una rotura no arrastra a las siguientes
+            huella_previa = fila.huella
+
+    if ultima_intacta is not None:
+        _guardar_punto_control(db, instalacion_id, ultima_intacta, posicion_intacta)
+
+    resultado = ResultadoVerificacion(
+        instalacion_id=instalacion_id,
+        verificados=posicion - posicion_inicial,
+        total=posicion,
+        roturas=roturas,
+    )
+    for r in roturas:
+        logger.critical(
+            "Rotura en la cadena de huellas",
+            extra={
+                "instalacion_id": instalacion_id,
+                "posicion": r.posicion,
+                "registro_id": str(r.registro_id),
+                "serie": r.serie,
+                "numero": r.numero,
+                "motivo": r.motivo,
+                "esperado": r.esperado,
+                "encontrado": r.encontrado,
+            },
+        )
+    logger.info(
+        "Cadena verificada",
+        extra={
+            "instalacion_id": instalacion_id,
+            "verificados": resultado.verificados,
+            "total": resultado.total,
+            "roturas": len(roturas),
+        },
+    )
+    return resultado
+
+
+def _guardar_punto_control(
+    db: Session, instalacion_id: int, fila: Row[Any], posicion: int
+) -> None:
+    valores = {
+        "ultimo_registro_id": fila.id,
+        "ultima_huella": fila.huella,
+        "ultima_fecha_hora_gen": fila.created_at,
+        "registros_verificados": posicion,
+        "verificada_at": func.now(),
+    }
+    db.execute(
+        pg_insert(VerificacionCadena)
+        .values(instalacion_sif_id=instalacion_id, **valores)
+        .on_conflict_do_update(
+            index_elements=[VerificacionCadena.instalacion_sif_id], set_=valores
+        )
+    )
+
+
+def verificar_instalacion_en_proceso(
+    instalacion_id: int, desde_cero: bool = False
+) -> ResultadoVerificacion:
+    """Verifica una instalación con su propia sesión (hace commit)."""
+    with get_sync_db() as db:
+        return verificar_instalacion(db, instalacion_id, desde_cero)
+
+
+def _inicializar_proceso() -> None:
+    # Las conexiones heredadas del padre por fork no se pueden compartir
+    if get_sync_engine.cache_info().currsize:
+        get_sync_engine().dispose(close=False)
+
+
+def verificar_instalaciones(
+    instalaciones: Optional[Sequence[int]] = None,
+    procesos: int = 1,
+    desde_cero: bool = False,
+) -> List[ResultadoVerificacion]:
+    """
+    Verifica varias instalaciones (todas si no se indican) repartidas en
+    `procesos` procesos. Cada instalación se verifica y confirma por separado.
+    """
+    if instalaciones is None:
+        with get_sync_db() as db:
+            instalaciones = list(
+                db.scalars(select(InstalacionSIF.id).order_by(InstalacionSIF.id))
+            )
+
+    if procesos <= 1:
+        return [verificar_instalacion_en_proceso(i, desde_cero) for i in instalaciones]
+
+    with ProcessPoolExecutor(
+        max_workers=procesos, initializer=_inicializar_proceso
+    ) as pool:
+        return list(
+            pool.map(
+                verificar_instalacion_en_proceso,
+                instalaciones,
+                [desde_cero] * len(instalaciones),
+            )
+        )
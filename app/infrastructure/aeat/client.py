@@ -2,16 +2,24 @@
 app/infrastructure/aeat/client.py
 
 Cliente HTTP para comunicación con AEAT Veri*factu.
+
+Las conexiones (pool keep-alive, contexto SSL con el certificado) son del
+proceso y se comparten entre lotes: app/infrastructure/aeat_client/http_client.py.
+AEATClient es ligero y se puede crear por lote.
 """
 
 import logging
 from dataclasses import dataclass
-from typing import Optional, Tuple
+from typing import Optional
 
-import requests
-from requests.exceptions import RequestException, Timeout
+import httpx
 
+from app.config.settings import settings
 from app.domain.models.models import InstalacionSIF
+from app.infrastructure.aeat_client.http_client import (
+    Certificado,
+    registro_clientes_aeat,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +34,10 @@ class RespuestaAeatHTTP:
     error: Optional[str] = None
 
 
+class ErrorComunicacionAEAT(Exception):
+    """Error de red, timeout o 5xx de AEAT (reintentable)"""
+
+
 class AEATClient:
     """
     Cliente HTTP para envío a AEAT.
@@ -33,7 +45,8 @@ class AEATClient:
     Responsabilidades:
     - Configurar URLs según entorno
     - Gestionar certificados
-    - Hacer POST con timeouts
+    - Hacer POST con timeouts (settings.aeat_timeout) por el cliente persistente
+      del certificado
     - Manejar errores HTTP
     """
 
@@ -62,7 +75,7 @@ class AEATClient:
             RespuestaAeatHTTP con status y contenido
 
         Raises:
-            RequestException: Errores de red/timeout (retryables)
+            ErrorComunicacionAEAT: Errores de red/timeout/5xx (retryables)
         """
         try:
             data = xml_envio.encode("utf-8")
@@ -70,17 +83,15 @@ class AEATClient:
                 f"Enviando XML ({len(data)} bytes) a AEAT"
                 f" (instalación {self.instalacion.id}): {self.url}"
             )
-            response = requests.post(
+            # Verifica el SSL de AEAT y presenta self.cert (contexto del cliente)
+            response = registro_clientes_aeat.cliente(self.cert).post(
                 self.url,
-                data=data,
+                content=data,
                 headers={
                     "Content-Type": "application/xml; charset=utf-8",
                     "Accept": "application/xml",
                     "SOAPAction": "SuministroLR",  # Según especificación AEAT
                 },
-                cert=self.cert,
-                timeout=60,  # 60 segundos máximo
-                verify=True,  # Verificar SSL de AEAT
             )
 
             # Log de respuesta
@@ -101,30 +112,36 @@ class AEATClient:
 
                 # 5xx = error de servidor (reintentar)
                 logger.error(f"Error 5xx de AEAT: {error_msg}")
-                raise RequestException(error_msg)
+                raise ErrorComunicacionAEAT(error_msg)
 
             # Respuesta exitosa
             return RespuestaAeatHTTP(
                 exitoso=True, status_code=200, xml_respuesta=response.text
             )
 
-        except Timeout as e:
+        except ErrorComunicacionAEAT:
+            raise
+
+        except httpx.TimeoutException as e:
             error_msg = f"Timeout al enviar a AEAT: {e}"
             logger.error(error_msg)
-            raise RequestException(error_msg) from e
+            raise ErrorComunicacionAEAT(error_msg) from e
 
-        except RequestException as e:
+        except httpx.HTTPError as e:
             error_msg = f"Error de conexión con AEAT: {e}"
             logger.error(error_msg)
-            raise
+            raise ErrorComunicacionAEAT(error_msg) from e
 
         except Exception as e:
             error_msg = f"Error inesperado al enviar a AEAT: {e}"
             logger.error(error_msg, exc_info=True)
-            raise RequestException(error_msg) from e
+            raise ErrorComunicacionAEAT(error_msg) from e
 
     def _get_url(self) -> str:
         """Obtiene URL según entorno de la instalación."""
+        if settings.aeat_url:
+            return settings.aeat_url  # Sustituto local
+
         # TODO: Añadir campo 'entorno' a InstalacionSIF
         # entorno = self.instalacion.entorno or "pruebas"
         entorno = "pruebas"  # Por defecto pruebas
@@ -135,7 +152,7 @@ class AEATClient:
 
         return url
 
-    def _get_certificado(self) -> Tuple[str, str]:
+    def _get_certificado(self) -> Certificado:
         """
         Obtiene certificado del obligado.
 
@@ -152,6 +169,10 @@ class AEATClient:
         # cert_dir = f"/certs/{self.instalacion.id}"
         # return (f"{cert_dir}/cert.pem", f"{cert_dir}/key.pem")
 
+        # Mientras tanto: certificado único del .env (CERT_PATH, CERT_KEY_PATH)
+        if settings.cert_path and settings.cert_key_path:
+            return (settings.cert_path, settings.cert_key_path)
+
         # PLACEHOLDER
         logger.warning(
             f"⚠️ Usando certificado placeholder para instalación {self.instalacion.id}"
@@ -1 +1,144 @@
-# app.infrastructure.aeat_client.http_client.py # (fichero por si lo encapsulo)
+"""
+app/infrastructure/aeat_client/http_client.py
+
+Clientes HTTP persistentes (mTLS) para los envíos a AEAT, compartidos por proceso.
+
+Responsabilidades:
+- Un httpx.Client por certificado de cliente, creado la primera vez que se usa
+  y reutilizado por todos los lotes del proceso: pool de conexiones keep-alive
+  (el siguiente lote de la instalación no repite handshake TLS mientras la
+  conexión siga abierta)
+- Contexto SSL por certificado, con el certificado y la clave cargados una sola
+  vez (no en cada envío)
+- Reanudar la sesión TLS en las conexiones nuevas (la anterior caducó o AEAT la
+  cerró): handshake abreviado, sin intercambio de certificados
+- Timeouts de settings.aeat_timeout (lectura) y settings.aeat_connect_timeout
+
+NO gestiona:
+- El envío ni la interpretación de la respuesta (app/infrastructure/aeat/client.py)
+- Reintentos: los hace Celery (worker_aeat)
+
+Los clientes se crean de forma perezosa: en los workers prefork cada proceso
+hijo abre sus propias conexiones (nunca se heredan del padre).
+"""
+
+import logging
+import ssl
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# (ruta del certificado, ruta de la clave)
+Certificado = Tuple[str, str]
+
+
+class ContextoTLSReanudable(ssl.SSLContext):
+    """
+    SSLContext que ofrece en cada conexión nueva la última sesión TLS del mismo
+    servidor.
+
+    httpcore abre las conexiones con wrap_socket(sock, server_hostname=...) sin
+    pasar sesión: se inyecta aquí. La sesión se recoge tras cada respuesta
+    (recordar_sesiones, hook de httpx): en TLS 1.3 el ticket llega después del
+    handshake y al cerrarse la conexión ya no se puede leer.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__()
+        self._lock_sesiones = threading.Lock()
+        self._sesiones: Dict[Optional[str], ssl.SSLSession] = {}
+        self._ultimas: Dict[Optional[str], ssl.SSLSocket] = {}
+        self.handshakes = 0
+        self.reanudadas = 0
+
+    def wrap_socket(self, sock: Any, *args: Any, **kwargs: Any) -> ssl.SSLSocket:
+        servidor = kwargs.get("server_hostname")
+        with self._lock_sesiones:
+            kwargs.setdefault("session", self._sesiones.get(servidor))
+        conexion = super().wrap_socket(sock, *args, **kwargs)
+        with self._lock_sesiones:
+            self._ultimas[servidor] = conexion
+            self.handshakes += 1
+            if conexion.session_reused:
+                self.reanudadas += 1
+        return conexion
+
+    def recordar_sesiones(self, *args: Any) -> None:
+        """Guarda la sesión vigente de la última conexión a cada servidor"""
+        with self._lock_sesiones:
+            for servidor, conexion in self._ultimas.items():
+                sesion = conexion.session  # None si ya está cerrada
+                if sesion is not None:
+                    self._sesiones[servidor] = sesion
+
+
+def crear_contexto_ssl(
+    certificado: Certificado, password: Optional[str] = None
+) -> ContextoTLSReanudable:
+    """Contexto cliente: verifica el servidor (CAs del sistema y, si está
+    configurada, settings.aeat_ca_path) y presenta el certificado"""
+    contexto = ContextoTLSReanudable(ssl.PROTOCOL_TLS_CLIENT)
+    contexto.load_default_certs(ssl.Purpose.SERVER_AUTH)
+    if settings.aeat_ca_path:
+        contexto.load_verify_locations(cafile=settings.aeat_ca_path)
+    contexto.load_cert_chain(*certificado, password=password)
+    return contexto
+
+
+class RegistroClientesAEAT:
+    """Clientes HTTP por certificado (uno por proceso y certificado)"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._clientes: Dict[Certificado, httpx.Client] = {}
+        self._contextos: Dict[Certificado, ContextoTLSReanudable] = {}
+
+    def cliente(self, certificado: Certificado) -> httpx.Client:
+        with self._lock:
+            cliente = self._clientes.get(certificado)
+            if cliente is None:
+                contexto = crear_contexto_ssl(certificado, settings.cert_password)
+                cliente = httpx.Client(
+                    verify=contexto,
+                    timeout=httpx.Timeout(
+                        settings.aeat_timeout, connect=settings.aeat_connect_timeout
+                    ),
+                    limits=httpx.Limits(
+                        max_connections=settings.aeat_pool_conexiones,
+                        max_keepalive_connections=settings.aeat_pool_conexiones,
+                        keepalive_expiry=settings.aeat_keepalive,
+                    ),
+                    event_hooks={"response": [contexto.recordar_sesiones]},
+                )
+                self._clientes[certificado] = cliente
+                self._contextos[certificado] = contexto
+                logger.info(
+                    "Cliente HTTP de AEAT creado",
+                    extra={"certificado": certificado[0]},
+                )
+            return cliente
+
+    def estadisticas(self) -> Dict[str, Dict[str, int]]:
+        """Handshakes TLS y cuántos reanudaron sesión, por certificado"""
+        with self._lock:
+            return {
+                cert: {"handshakes": c.handshakes, "reanudadas": c.reanudadas}
+                for (cert, _), c in self._contextos.items()
+            }
+
+    def cerrar(self) -> None:
+        """Cierra las conexiones (tests, recarga de certificados)"""
+        with self._lock:
+            for cliente in self._clientes.values():
+                cliente.close()
+            self._clientes.clear()
+            self._contextos.clear()
+
+
+# Singleton por proceso
+registro_clientes_aeat = RegistroClientesAEAT()
@@ -0,0 +1,307 @@
+"""
+app/infrastructure/almacen_blobs.py
+
+Almacén de blobs direccionado por contenido para los XML enviados a AEAT y sus
+respuestas: columnas *_digest / *_tamano de lote_envio (xml_enviado,
+xml_respuesta) y registro_facturacion (xml_respuesta_aeat).
+
+Responsabilidades:
+- Guardar cada XML comprimido con zstd bajo el SHA-256 de su contenido sin
+  comprimir: el mismo XML se guarda una sola vez
+- Devolver a quien guarda solo digest y tamaño (BlobRef): es lo que se persiste
+  en las filas. El contenido se lee bajo demanda (leer / leer_blob), nunca al
+  cargar la fila
+- Comprobar la integridad al leer (SHA-256 del contenido descomprimido)
+
+Backends (settings.blobs_backend):
+- local: ficheros en settings.blobs_directorio/ab/cd/<digest>.zst, escritos de
+  forma atómica (fichero temporal + rename)
+- s3: API S3 (HEAD/PUT/GET Object, firma SigV4, direccionamiento por ruta) en
+  settings.blobs_s3_endpoint: AWS S3 o un sustituto local (MinIO, LocalStack)
+
+NO gestiona:
+- Borrado: un blob puede estar referenciado por varias filas (deduplicación) y
+  la retención de auditoría es de años; la purga sería una tarea aparte
+"""
+
+import hashlib
+import hmac
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import httpx
+import zstandard
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EXTENSION = ".zst"
+
+
+class ErrorAlmacenBlobs(Exception):
+    """Fallo del backend (disco, red, credenciales)"""
+
+
+class BlobNoEncontrado(ErrorAlmacenBlobs):
+    """No hay blob con ese digest"""
+
+
+class BlobCorrupto(ErrorAlmacenBlobs):
+    """El contenido descomprimido no coincide con su digest"""
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    digest: str  # SHA-256 (hex) del contenido sin comprimir
+    tamano: int  # bytes sin comprimir
+
+
+def calcular_ref(datos: bytes) -> BlobRef:
+    return BlobRef(hashlib.sha256(datos).hexdigest(), len(datos))
+
+
+def clave_blob(digest: str) -> str:
+    """ab/cd/abcd...zst: reparte los ficheros en 65536 directorios"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{EXTENSION}"
+
+
+class AlmacenBlobs(ABC):
+    # Escrituras simultáneas en guardar_varios (1: secuencial)
+    concurrencia = 1
+
+    def __init__(self, nivel_zstd: int):
+        self.nivel_zstd = nivel_zstd
+
+    @abstractmethod
+    def _existe(self, clave: str) -> bool: ...
+
+    @abstractmethod
+    def _escribir(self, clave: str, datos: bytes) -> None: ...
+
+    @abstractmethod
+    def _leer(self, clave: str) -> bytes:
+        """Raises: BlobNoEncontrado"""
+
+    def guardar(self, contenido: str) -> BlobRef:
+        """Comprime y guarda el contenido si no existía ya (idempotente)"""
+        datos = contenido.encode("utf-8")
+        ref = calcular_ref(datos)
+        clave = clave_blob(ref.digest)
+        if not self._existe(clave):
+            # Compresor por llamada: ZstdCompressor no es seguro entre hilos
+            comprimido = zstandard.ZstdCompressor(level=self.nivel_zstd).compress(datos)
+            self._escribir(clave, comprimido)
+            logger.debug(
+                "Blob guardado",
+                extra={
+                    "digest": ref.digest,
+                    "tamano": ref.tamano,
+                    "comprimido": len(comprimido),
+                },
+            )
+        return ref
+
+    def guardar_varios(
+        self, contenidos: Sequence[Optional[str]]
+    ) -> List[Optional[BlobRef]]:
+        """guardar() de cada contenido (None → None), en paralelo si el backend lo
+        admite: las respuestas por registro de un lote son hasta 1000 blobs"""
+        unicos = list({c for c in contenidos if c is not None})
+        if self.concurrencia > 1 and len(unicos) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(self.concurrencia, len(unicos))
+            ) as pool:
+                refs = dict(zip(unicos, pool.map(self.guardar, unicos)))
+        else:
+            refs = {c: self.guardar(c) for c in unicos}
+        return [refs[c] if c is not None else None for c in contenidos]
+
+    def leer(self, digest: str) -> str:
+        datos = zstandard.ZstdDecompressor().decompress(self._leer(clave_blob(digest)))
+        if hashlib.sha256(datos).hexdigest() != digest:
+            raise BlobCorrupto(digest)
+        return datos.decode("utf-8")
+
+
+class AlmacenBlobsLocal(AlmacenBlobs):
+    def __init__(self, directorio: Path, nivel_zstd: int):
+        super().__init__(nivel_zstd)
+        self.directorio = directorio
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave
+
+    def _existe(self, clave: str) -> bool:
+        return self._ruta(clave).exists()
+
+    def _escribir(self, clave: str, datos: bytes) -> None:
+        ruta = self._ruta(clave)
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            # Temporal + rename: un lector nunca ve un blob a medio escribir
+            fd, temporal = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(datos)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temporal, ruta)
+            except BaseException:
+                os.unlink(temporal)
+                raise
+        except OSError as e:
+            raise ErrorAlmacenBlobs(f"{ruta}: {e}") from e
+
+    def _leer(self, clave: str) -> bytes:
+        try:
+            return self._ruta(clave).read_bytes()
+        except FileNotFoundError:
+            raise BlobNoEncontrado(clave) from None
+        except OSError as e:
+            raise ErrorAlmacenBlobs(f"{clave}: {e}") from e
+
+
+class AlmacenBlobsS3(AlmacenBlobs):
+    """
+    Cliente S3 mínimo sobre httpx (sin SDK): solo HEAD, PUT y GET de objetos.
+
+    Direccionamiento por ruta (endpoint/bucket/clave), que aceptan AWS y los
+    sustitutos locales. El bucket debe existir.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        region: str,
+        access_key: str,
+        secret_key: str,
+        nivel_zstd: int,
+        concurrencia: int,
+        transport: Optional[httpx.BaseTransport] = None,
+    ):
+        super().__init__(nivel_zstd)
+        self.bucket = bucket
+        self.region = region
+        self.concurrencia = concurrencia
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._host = urlsplit(endpoint).netloc
+        self._cliente = httpx.Client(
+            base_url=endpoint,
+            timeout=settings.blobs_s3_timeout,
+            limits=httpx.Limits(max_connections=concurrencia),
+            transport=transport,
+        )
+
+    def _firmar(self, metodo: str, ruta: str, cuerpo: bytes) -> Dict[str, str]:
+        """Cabeceras de AWS Signature Version 4 (sin query string)"""
+        ahora = datetime.now(timezone.utc)
+        dia = ahora.strftime("%Y%m%d")
+        instante = ahora.strftime("%Y%m%dT%H%M%SZ")
+        hash_cuerpo = hashlib.sha256(cuerpo).hexdigest()
+        cabeceras = {
+            "host": self._host,
+            "x-amz-content-sha256": hash_cuerpo,
+            "x-amz-date": instante,
+        }
+        firmadas = ";".join(sorted(cabeceras))
+        peticion_canonica = "\n".join(
+            [
+                metodo,
+                ruta,
+                "",
+                *(f"{k}:{cabeceras[k]}" for k in sorted(cabeceras)),
+                "",
+                firmadas,
+                hash_cuerpo,
+            ]
+        )
+        ambito = f"{dia}/{self.region}/s3/aws4_request"
+        texto_firma = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                instante,
+                ambito,
+                hashlib.sha256(peticion_canonica.encode()).hexdigest(),
+            ]
+        )
+        clave = f"AWS4{self._secret_key}".encode()
+        for parte in (dia, self.region, "s3", "aws4_request"):
+            clave = hmac.new(clave, parte.encode(), hashlib.sha256).digest()
+        firma = hmac.new(clave, texto_firma.encode(), hashlib.sha256).hexdigest()
+
+        del cabeceras["host"]  # La pone httpx (mismo valor)
+        cabeceras["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self._access_key}/{ambito}, "
+            f"SignedHeaders={firmadas}, Signature={firma}"
+        )
+        return cabeceras
+
+    def _peticion(self, metodo: str, clave: str, cuerpo: bytes = b"") -> httpx.Response:
+        # Claves de hex, "/" y ".zst": no necesitan codificación URI
+        ruta = f"/{self.bucket}/{clave}"
+        try:
+            respuesta = self._cliente.request(
+                metodo,
+                ruta,
+                content=cuerpo or None,
+                headers=self._firmar(metodo, ruta, cuerpo),
+            )
+        except httpx.HTTPError as e:
+            raise ErrorAlmacenBlobs(f"{metodo} {ruta}: {e}") from e
+        if respuesta.status_code == 404:
+            raise BlobNoEncontrado(clave)
+        if respuesta.is_error:
+            raise ErrorAlmacenBlobs(
+                f"{metodo} {ruta}: HTTP {respuesta.status_code} {respuesta.text[:200]}"
+            )
+        return respuesta
+
+    def _existe(self, clave: str) -> bool:
+        try:
+            self._peticion("HEAD", clave)
+        except BlobNoEncontrado:
+            return False
+        return True
+
+    def _escribir(self, clave: str, datos: bytes) -> None:
+        self._peticion("PUT", clave, datos)
+
+    def _leer(self, clave: str) -> bytes:
+        return self._peticion("GET", clave).content
+
+
+@lru_cache
+def almacen_blobs() -> AlmacenBlobs:
+    """Backend configurado (settings.blobs_backend)"""
+    if settings.blobs_backend == "s3":
+        if not settings.blobs_s3_access_key or not settings.blobs_s3_secret_key:
+            raise ValueError(
+                "blobs_backend=s3 requiere BLOBS_S3_ACCESS_KEY y _SECRET_KEY"
+            )
+        return AlmacenBlobsS3(
+            endpoint=settings.blobs_s3_endpoint,
+            bucket=settings.blobs_s3_bucket,
+            region=settings.blobs_s3_region,
+            access_key=settings.blobs_s3_access_key,
+            secret_key=settings.blobs_s3_secret_key,
+            nivel_zstd=settings.blobs_nivel_zstd,
+            concurrencia=settings.blobs_s3_concurrencia,
+        )
+    return AlmacenBlobsLocal(Path(settings.blobs_directorio), settings.blobs_nivel_zstd)
+
+
+def leer_blob(digest: Optional[str]) -> Optional[str]:
+    """Contenido de la columna *_digest de una fila (None si no se guardó)"""
+    return almacen_blobs().leer(digest) if digest else None
@@ -1,26 +1,144 @@
+"""
+app/infrastructure/database.py
+
+Engines y sesiones de BD según el rol del proceso (settings.process_role).
+
+Cada rol tiene su perfil de pool (PERFILES_BD) y los engines se crean en el
+primer uso: un worker Celery solo abre el engine síncrono y la API solo el
+asíncrono. Crearlos tarde también evita heredar conexiones a través del fork de
+los workers prefork.
+
+Con settings.db_pgbouncer (PgBouncer en modo transaction pooling) se desactivan
+las sentencias preparadas con nombre fijo de asyncpg, que no sobreviven a un
+cambio de conexión de servidor entre transacciones.
+
+Réplica de lectura (opcional, settings.database_replica_url): las sesiones de
+solo lectura (abrir_sesion_lectura, get_sync_db_lectura) van a la réplica y
+vuelven a la primaria si no responde. La lectura de escrituras propias la decide
+el caller (ver app/infrastructure/lecturas.py).
+"""
+
+import logging
+import time
 from contextlib import contextmanager
-from typing import AsyncGenerator, Generator
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
+from uuid import uuid4
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import Session, sessionmaker
 
 from app.config.settings import settings
 
-# Engine asíncrono
-engine = create_async_engine(
-    settings.database_url,
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-)
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PerfilBD:
+    """Pool de conexiones de un proceso (por engine)"""
+
+    pool_size: int
+    max_overflow: int
+
+
+# Conexiones por proceso. Los workers Celery (prefork) ejecutan una tarea a la
+# vez: con una conexión fija y algo de margen basta, y multiplicado por decenas de
+# procesos es lo que determina el consumo de max_connections de PostgreSQL.
+PERFILES_BD: Dict[str, PerfilBD] = {
+    "api": PerfilBD(pool_size=10, max_overflow=20),
+    "scheduler": PerfilBD(pool_size=1, max_overflow=1),
+    "orquestador": PerfilBD(pool_size=1, max_overflow=2),
+    "dispatcher": PerfilBD(pool_size=1, max_overflow=1),
+    "envios": PerfilBD(pool_size=1, max_overflow=1),
+    "monitoring": PerfilBD(pool_size=1, max_overflow=2),
+}
+
+
+def perfil_bd() -> PerfilBD:
+    """Perfil del rol del proceso, con los overrides de settings aplicados"""
+    perfil = PERFILES_BD[settings.process_role]
+    return PerfilBD(
+        pool_size=(
+            settings.db_pool_size
+            if settings.db_pool_size is not None
+            else perfil.pool_size
+        ),
+        max_overflow=(
+            settings.db_max_overflow
+            if settings.db_max_overflow is not None
+            else perfil.max_overflow
+        ),
+    )
+
+
+def _opciones_pool() -> Dict[str, Any]:
+    perfil = perfil_bd()
+    return {
+        "echo": settings.debug,
+        "pool_pre_ping": True,
+        "pool_size": perfil.pool_size,
+        "max_overflow": perfil.max_overflow,
+        "pool_recycle": settings.db_pool_recycle,
+    }
+
+
+def _connect_args_asyncpg(timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Caché de sentencias preparadas de asyncpg (por conexión).
+
+    - statement_cache_size: caché interna de asyncpg
+    - prepared_statement_cache_size: caché LRU del dialecto de SQLAlchemy
+
+    En modo PgBouncer ambas van a 0 y los nombres de las sentencias son únicos:
+    otra transacción puede ir por otra conexión de servidor.
+    """
+    args: Dict[str, Any] = {"timeout": timeout} if timeout else {}
+    if settings.db_pgbouncer:
+        return {
+            **args,
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        **args,
+        "statement_cache_size": settings.db_statement_cache_size,
+        "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+    }
+
+
+# ===== ASYNC (API) =====
+
+
+@lru_cache
+def get_async_engine() -> AsyncEngine:
+    return create_async_engine(
+        settings.database_url,
+        connect_args=_connect_args_asyncpg(),
+        **_opciones_pool(),
+    )
+
+
+@lru_cache
+def _async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        get_async_engine(), class_=AsyncSession, expire_on_commit=False
+    )
+
+
+def session_factory_async() -> AsyncSession:
+    """Sesión asíncrona fuera de la dependencia get_db (p. ej. streaming)"""
+    return _async_sessionmaker()()
 
-# Session factory
-AsyncSessionLocal = async_sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
 
 # Base para los modelos
 Base = declarative_base()
@@ -28,7 +146,7 @@ Base = declarative_base()
 
 # Dependency para obtener sesión de BD
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with AsyncSessionLocal() as session:
+    async with session_factory_async() as session:
         try:
             yield session
             await session.commit()
@@ -40,22 +158,24 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 
 # ===== SYNC (para Celery tasks, schedulers, scripts) =====
-# Convierte la URL async a sync (postgresql+asyncpg -> postgresql)
-sync_database_url = settings.database_url.replace("+asyncpg", "")
-sync_engine = create_engine(
-    sync_database_url,
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-)
 
-SyncSessionLocal = sessionmaker(
-    bind=sync_engine,
-    autocommit=False,
-    autoflush=False,
-    expire_on_commit=False,
-)
+
+@lru_cache
+def get_sync_engine() -> Engine:
+    # Convierte la URL async a sync (postgresql+asyncpg -> postgresql)
+    return create_engine(
+        settings.database_url.replace("+asyncpg", ""), **_opciones_pool()
+    )
+
+
+@lru_cache
+def _sync_sessionmaker() -> sessionmaker[Session]:
+    return sessionmaker(
+        bind=get_sync_engine(),
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
 
 
 def session_factory_sync() -> Session:
@@ -63,7 +183,7 @@ def session_factory_sync() -> Session:
 
     Manejar manualmente commit(), rollback() y close()
     """
-    return SyncSessionLocal()
+    return _sync_sessionmaker()()
 
 
 @contextmanager
@@ -72,7 +192,7 @@ def get_sync_db() -> Generator[Session, None, None]:
 
     Hace commit(), rollback() (en exception) y close() automáticamente.
     """
-    db = SyncSessionLocal()
+    db = session_factory_sync()
     try:
         yield db
         db.commit()
@@ -81,3 +201,136 @@ def get_sync_db() -> Generator[Session, None, None]:
         raise
     finally:
         db.close()
+
+
+# ===== RÉPLICA DE LECTURA =====
+
+
+class EstadoReplica:
+    """
+    Disponibilidad de la réplica en este proceso.
+
+    Tras un fallo de conexión las lecturas van a la primaria durante
+    BACKOFF_SEGUNDOS (sin reintentar la réplica en cada petición).
+    """
+
+    BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(self) -> None:
+        self._caida_hasta = 0.0
+        self.lecturas_replica = 0
+        self.lecturas_primaria = 0
+        self.fallos = 0
+
+    def disponible(self) -> bool:
+        return (
+            settings.database_replica_url is not None
+            and time.monotonic() >= self._caida_hasta
+        )
+
+    def fallo(self, e: Exception) -> None:
+        self.fallos += 1
+        self._caida_hasta = time.monotonic() + self.BACKOFF_SEGUNDOS
+        logger.warning(
+            "Réplica de lectura no disponible: lecturas a la primaria",
+            extra={"error": str(e), "error_type": type(e).__name__},
+        )
+
+    def estadisticas(self) -> Dict[str, Any]:
+        return {
+            "configurada": settings.database_replica_url is not None,
+            "disponible": self.disponible(),
+            "lecturas_replica": self.lecturas_replica,
+            "lecturas_primaria": self.lecturas_primaria,
+            "fallos": self.fallos,
+        }
+
+
+estado_replica = EstadoReplica()
+
+
+@lru_cache
+def get_replica_async_engine() -> AsyncEngine:
+    assert settings.database_replica_url, "Sin réplica configurada"
+    return create_async_engine(
+        settings.database_replica_url,
+        connect_args=_connect_args_asyncpg(settings.db_replica_connect_timeout),
+        **_opciones_pool(),
+    )
+
+
+@lru_cache
+def _replica_async_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        get_replica_async_engine(), class_=AsyncSession, expire_on_commit=False
+    )
+
+
+async def abrir_sesion_lectura(usar_replica: bool = True) -> AsyncSession:
+    """
+    Sesión asíncrona de solo lectura: réplica si está disponible, si no primaria.
+
+    La conexión a la réplica se abre aquí para poder caer a la primaria antes
+    de ejecutar nada. El caller cierra la sesión (sin commit).
+    """
+    if usar_replica and estado_replica.disponible():
+        session = _replica_async_sessionmaker()()
+        try:
+            await session.connection()
+            estado_replica.lecturas_replica += 1
+            return session
+        except (SQLAlchemyError, OSError) as e:
+            await session.close()
+            estado_replica.fallo(e)
+
+    estado_replica.lecturas_primaria += 1
+    return session_factory_async()
+
+
+@lru_cache
+def get_replica_sync_engine() -> Engine:
+    assert settings.database_replica_url, "Sin réplica configurada"
+    return create_engine(
+        settings.database_replica_url.replace("+asyncpg", ""),
+        connect_args={"connect_timeout": int(settings.db_replica_connect_timeout)},
+        **_opciones_pool(),
+    )
+
+
+@lru_cache
+def _replica_sync_sessionmaker() -> sessionmaker[Session]:
+    return sessionmaker(
+        bind=get_replica_sync_engine(),
+        autocommit=False,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+@contextmanager
+def get_sync_db_lectura() -> Generator[Session, None, None]:
+    """
+    Sesión síncrona de solo lectura (tareas de monitoreo).
+
+    Réplica si está disponible, si no primaria. Nunca hace commit.
+    """
+    db: Optional[Session] = None
+    if estado_replica.disponible():
+        db = _replica_sync_sessionmaker()()
+        try:
+            db.connection()
+            estado_replica.lecturas_replica += 1
+        except (SQLAlchemyError, OSError) as e:
+            db.close()
+            db = None
+            estado_replica.fallo(e)
+
+    if db is None:
+        estado_replica.lecturas_primaria += 1
+        db = session_factory_sync()
+
+    try:
+        yield db
+    finally:
+        db.rollback()
+        db.close()
@@ -0,0 +1,205 @@
+"""
+app/infrastructure/idempotencia.py
+
+Idempotencia de las peticiones de creación (cabecera Idempotency-Key).
+
+Responsabilidades:
+- Guardar en Redis la respuesta de la primera petición con una clave dada
+- Reproducir esa respuesta en los reintentos (sin tocar PostgreSQL)
+- Hacer esperar a los duplicados en vuelo hasta que termine la primera petición
+- Rechazar la reutilización de una clave con un cuerpo distinto
+
+NO gestiona:
+- La creación en sí (la recibe como callable)
+- Errores de la operación: solo se guardan respuestas correctas; si la primera
+  petición falla, la clave se libera y el reintento se ejecuta de nuevo
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+
+from app.config.settings import settings
+from app.infrastructure.redis_client import redis_async_client
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar("M", bound=BaseModel)
+
+EN_CURSO = "en_curso"
+COMPLETADA = "completada"
+
+
+def huella_peticion(*partes: str) -> str:
+    """sha256 del contenido de la petición (cuerpo + parámetros relevantes)"""
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+class IdempotenciaStore:
+    """
+    Respuestas por (ámbito, Idempotency-Key) en Redis.
+
+    Estados de una clave:
+    - en_curso: la primera petición se está procesando (TTL corto: si el proceso
+      muere, la clave se libera sola)
+    - completada: respuesta guardada durante `ttl` segundos
+
+    Si Redis no está disponible la petición se procesa sin idempotencia: la
+    restricción de unicidad de la factura sigue impidiendo duplicados (409).
+    """
+
+    PREFIJO_REDIS = "idem:"
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+    ESPERA_INICIAL = 0.02
+    ESPERA_MAXIMA = 0.2
+
+    def __init__(self, ttl: int, ttl_en_curso: int, espera_max: float):
+        self.ttl = ttl
+        self.ttl_en_curso = ttl_en_curso
+        self.espera_max = espera_max
+        self._redis_desactivado_hasta = 0.0
+
+        self.ejecutadas = 0
+        self.reproducidas = 0
+        self.esperas = 0
+        self.sin_redis = 0
+
+    def _clave_redis(self, ambito: str, clave: str) -> str:
+        digest = hashlib.sha256(clave.encode("utf-8")).hexdigest()
+        return f"{self.PREFIJO_REDIS}{ambito}:{digest}"
+
+    def _redis_fallo(self, e: Exception) -> None:
+        logger.warning(f"Idempotencia en Redis no disponible: {e}")
+        self._redis_desactivado_hasta = time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+
+    async def _leer(self, clave_redis: str) -> Optional[Dict[str, object]]:
+        valor = await redis_async_client.get(clave_redis)
+        return json.loads(valor) if valor is not None else None
+
+    async def ejecutar(
+        self,
+        ambito: str,
+        clave: str,
+        huella: str,
+        operacion: Callable[[], Awaitable[M]],
+        modelo: Type[M],
+    ) -> Tuple[M, bool]:
+        """
+        Ejecuta `operacion` una sola vez por (ámbito, clave).
+
+        Args:
+            ambito: Separa las claves por instalación y endpoint
+            clave: Valor de la cabecera Idempotency-Key
+            huella: huella_peticion() del cuerpo; detecta reutilización de la clave
+            operacion: Crea el recurso y devuelve la respuesta
+            modelo: Modelo de la respuesta (para reconstruirla desde Redis)
+
+        Returns:
+            (respuesta, reproducida)
+
+        Raises:
+            HTTPException 422: Clave reutilizada con otra petición
+            HTTPException 409: La primera petición sigue en curso tras la espera
+        """
+        if time.monotonic() < self._redis_desactivado_hasta:
+            self.sin_redis += 1
+            return await operacion(), False
+
+        clave_redis = self._clave_redis(ambito, clave)
+        limite = time.monotonic() + self.espera_max
+        espera = self.ESPERA_INICIAL
+
+        while True:
+            try:
+                guardada = await self._leer(clave_redis)
+                if guardada is None:
+                    marca = json.dumps({"estado": EN_CURSO, "huella": huella})
+                    adquirida = await redis_async_client.set(
+                        clave_redis, marca, nx=True, ex=self.ttl_en_curso
+                    )
+                    if adquirida:
+                        break
+                    # Otra petición la adquirió entre el GET y el SET
+                    continue
+            except Exception as e:
+                self._redis_fallo(e)
+                self.sin_redis += 1
+                return await operacion(), False
+
+            if guardada["huella"] != huella:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                    detail="Idempotency-Key reutilizada con una petición distinta",
+                )
+
+            if guardada["estado"] == COMPLETADA:
+                self.reproducidas += 1
+                return modelo.model_validate(guardada["respuesta"]), True
+
+            # En curso: esperar a la primera petición en lugar de competir con ella
+            if time.monotonic() >= limite:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Petición con la misma Idempotency-Key en curso",
+                )
+            self.esperas += 1
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, self.ESPERA_MAXIMA)
+
+        return await self._ejecutar_primera(clave_redis, huella, operacion), False
+
+    async def _ejecutar_primera(
+        self,
+        clave_redis: str,
+        huella: str,
+        operacion: Callable[[], Awaitable[M]],
+    ) -> M:
+        self.ejecutadas += 1
+        try:
+            respuesta = await operacion()
+        except BaseException:
+            # Liberar la clave: el reintento debe poder ejecutarse
+            try:
+                await redis_async_client.delete(clave_redis)
+            except Exception as e:
+                self._redis_fallo(e)
+            raise
+
+        try:
+            await redis_async_client.set(
+                clave_redis,
+                json.dumps(
+                    {
+                        "estado": COMPLETADA,
+                        "huella": huella,
+                        "respuesta": respuesta.model_dump(mode="json"),
+                    }
+                ),
+                ex=self.ttl,
+            )
+        except Exception as e:
+            # La respuesta ya está creada: un reintento recibirá 409 (duplicada)
+            self._redis_fallo(e)
+        return respuesta
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {
+            "ejecutadas": self.ejecutadas,
+            "reproducidas": self.reproducidas,
+            "esperas": self.esperas,
+            "sin_redis": self.sin_redis,
+        }
+
+
+# Instancia global (una por proceso uvicorn)
+idempotencia = IdempotenciaStore(
+    ttl=settings.idempotency_ttl,
+    ttl_en_curso=settings.idempotency_ttl_en_curso,
+    espera_max=settings.idempotency_espera_max,
+)
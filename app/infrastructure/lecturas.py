@@ -0,0 +1,109 @@
+"""
+app/infrastructure/lecturas.py
+
+Enrutado de las lecturas de la API a la réplica (settings.database_replica_url).
+
+Responsabilidades:
+- Dependencia get_db_lectura: sesión de solo lectura en la réplica, o en la
+  primaria si la réplica no está disponible
+- Lectura de escrituras propias: tras crear facturas, la instalación lee de la
+  primaria durante settings.db_replica_ventana_escritura segundos (la réplica
+  puede no tener aún el registro recién creado)
+
+NO gestiona:
+- Engines ni disponibilidad de la réplica (app/infrastructure/database.py)
+"""
+
+import logging
+import time
+from typing import AsyncGenerator, Dict
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import settings
+from app.infrastructure.database import abrir_sesion_lectura
+from app.infrastructure.redis_client import redis_async_client
+from app.infrastructure.security.auth import verificar_api_key
+from app.infrastructure.security.auth_cache import InstalacionSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class EscriturasRecientes:
+    """
+    Instalaciones con escrituras recientes (marca con TTL en Redis).
+
+    La marca local cubre el mismo proceso aunque Redis falle; la de Redis, al
+    resto de procesos uvicorn. Sin Redis, ante la duda se lee de la primaria.
+    """
+
+    PREFIJO_REDIS = "ryw:"
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(self, ventana: int):
+        self.ventana = ventana
+        self._locales: Dict[int, float] = {}
+        self._redis_desactivado_hasta = 0.0
+
+    def _redis_fallo(self, e: Exception) -> None:
+        logger.warning(f"Marcas de escritura en Redis no disponibles: {e}")
+        self._redis_desactivado_hasta = time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+
+    async def registrar(self, instalacion_id: int) -> None:
+        """Llamar tras el commit de una creación"""
+        if settings.database_replica_url is None:
+            return
+        self._locales[instalacion_id] = time.monotonic() + self.ventana
+        if time.monotonic() < self._redis_desactivado_hasta:
+            return
+        try:
+            await redis_async_client.set(
+                f"{self.PREFIJO_REDIS}{instalacion_id}", "1", ex=self.ventana
+            )
+        except Exception as e:
+            self._redis_fallo(e)
+
+    async def reciente(self, instalacion_id: int) -> bool:
+        ahora = time.monotonic()
+        hasta = self._locales.get(instalacion_id)
+        if hasta is not None:
+            if ahora < hasta:
+                return True
+            del self._locales[instalacion_id]
+
+        if ahora < self._redis_desactivado_hasta:
+            return True
+        try:
+            return bool(
+                await redis_async_client.exists(f"{self.PREFIJO_REDIS}{instalacion_id}")
+            )
+        except Exception as e:
+            self._redis_fallo(e)
+            return True
+
+
+# Instancia global (una por proceso uvicorn)
+escrituras_recientes = EscriturasRecientes(
+    ventana=settings.db_replica_ventana_escritura
+)
+
+
+async def get_db_lectura(
+    instalacion: InstalacionSnapshot = Depends(verificar_api_key),
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Dependency de solo lectura para los endpoints de consulta.
+
+    Réplica salvo escritura reciente de la instalación o réplica caída. Nunca
+    hace commit.
+    """
+    usar_replica = settings.database_replica_url is not None and not (
+        await escrituras_recientes.reciente(instalacion.id)
+    )
+    session = await abrir_sesion_lectura(usar_replica=usar_replica)
+    try:
+        yield session
+    finally:
+        await session.rollback()
+        await session.close()
@@ -0,0 +1,329 @@
+"""
+app/infrastructure/locks_instalacion.py
+
+Lock de orquestación por instalación con tokens de fencing.
+
+Responsabilidades:
+- Adquirir (non-blocking) y liberar el lock exclusivo de una instalación
+- Emitir un token de fencing monótono por instalación en cada adquisición
+- Comprobar el token antes del commit (lock_instalacion): si otro orquestador
+  con un token mayor ya ha escrito, el lock había caducado → LockPerdido
+- Métricas de espera (adquisición) y retención del lock: en el log de cada
+  liberación y agregadas por proceso (estadisticas_locks)
+
+Backends (settings.lock_backend):
+- redis: SET NX PX + INCR atómicos (Lua). Caduca a los settings.lock_ttl
+  segundos si el worker muere; mientras se tiene, un hilo lo renueva cada
+  lock_ttl / 3. El fencing cubre la renovación que llega tarde.
+- postgres: pg_try_advisory_xact_lock en la transacción del orquestador. Dura
+  exactamente lo que la transacción (no caduca ni necesita renovación); el token
+  se asigna en lock_instalacion dentro de esa misma transacción.
+
+NO gestiona:
+- Transacciones (commit/rollback): el caller las controla
+"""
+
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from uuid import uuid4
+
+from redis import Redis
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.domain.models.models import LockInstalacion
+from app.infrastructure.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Espacio de claves de pg_advisory_xact_lock(int, int) reservado a este lock
+CLAVE_ADVISORY_ORQUESTADOR = 0x51F
+
+# Lock adquirido → token de fencing (nunca menor que el último aceptado en BD)
+_LUA_ADQUIRIR = """
+if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return false
+end
+local token = redis.call('INCR', KEYS[2])
+local minimo = tonumber(ARGV[3]) + 1
+if token < minimo then
+    redis.call('SET', KEYS[2], minimo)
+    token = minimo
+end
+return token
+"""
+
+_LUA_RENOVAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LUA_LIBERAR = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LockPerdido(Exception):
+    """El lock caducó y otro orquestador lo adquirió (token de fencing superado)"""
+
+
+class EstadisticasLocks:
+    """Tiempos de espera y retención de los locks de este proceso"""
+
+    def __init__(self) -> None:
+        self.adquiridos = 0
+        self.ocupados = 0
+        self.perdidos = 0
+        self.renovaciones = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.retencion_total = 0.0
+        self.retencion_max = 0.0
+
+    def espera(self, segundos: float, adquirido: bool) -> None:
+        if adquirido:
+            self.adquiridos += 1
+        else:
+            self.ocupados += 1
+        self.espera_total += segundos
+        self.espera_max = max(self.espera_max, segundos)
+
+    def retencion(self, segundos: float) -> None:
+        self.retencion_total += segundos
+        self.retencion_max = max(self.retencion_max, segundos)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        intentos = self.adquiridos + self.ocupados
+        return {
+            "backend": settings.lock_backend,
+            "adquiridos": self.adquiridos,
+            "ocupados": self.ocupados,
+            "perdidos": self.perdidos,
+            "renovaciones": self.renovaciones,
+            "espera_media_ms": (
+                round(self.espera_total / intentos * 1000, 2) if intentos else 0.0
+            ),
+            "espera_max_ms": round(self.espera_max * 1000, 2),
+            "retencion_media_ms": (
+                round(self.retencion_total / self.adquiridos * 1000, 2)
+                if self.adquiridos
+                else 0.0
+            ),
+            "retencion_max_ms": round(self.retencion_max * 1000, 2),
+        }
+
+
+estadisticas_locks = EstadisticasLocks()
+
+
+class LockInstalacionAdquirido(ABC):
+    """Lock en posesión del orquestador"""
+
+    def __init__(self, instalacion_id: int, token: int, espera: float):
+        self.instalacion_id = instalacion_id
+        self.token = token
+        self.espera = espera
+        self._adquirido_at = time.monotonic()
+        estadisticas_locks.espera(espera, True)
+
+    @abstractmethod
+    def verificar(self, db: Session) -> None:
+        """
+        Comprueba el token antes del commit, en la transacción del caller.
+
+        Raises:
+            LockPerdido: otro orquestador con un token mayor ya ha escrito
+        """
+
+    def liberar(self) -> None:
+        retencion = time.monotonic() - self._adquirido_at
+        estadisticas_locks.retencion(retencion)
+        logger.info(
+            "Lock liberado para instalación",
+            extra={
+                "instalacion_id": self.instalacion_id,
+                "fencing_token": self.token,
+                "espera_ms": round(self.espera * 1000, 1),
+                "retencion_ms": round(retencion * 1000, 1),
+            },
+        )
+
+
+class BackendLocks(ABC):
+    @abstractmethod
+    def adquirir(
+        self, db: Session, instalacion_id: int
+    ) -> Optional[LockInstalacionAdquirido]:
+        """Intenta adquirir el lock sin esperar (None si lo tiene otro)"""
+
+
+# ===== REDIS =====
+
+
+class LockRedis(LockInstalacionAdquirido):
+    def __init__(
+        self,
+        redis: Redis,
+        clave: str,
+        valor: str,
+        instalacion_id: int,
+        token: int,
+        espera: float,
+    ):
+        super().__init__(instalacion_id, token, espera)
+        self._redis = redis
+        self._clave = clave
+        self._valor = valor
+        self._ttl_ms = settings.lock_ttl * 1000
+        self._parar = threading.Event()
+        self._renovador = threading.Thread(
+            target=self._renovar, name=f"lock-{clave}", daemon=True
+        )
+        self._renovador.start()
+
+    def _renovar(self) -> None:
+        while not self._parar.wait(settings.lock_ttl / 3):
+            try:
+                if not self._redis.eval(
+                    _LUA_RENOVAR, 1, self._clave, self._valor, self._ttl_ms
+                ):
+                    logger.warning(
+                        "Lock caducado antes de renovarlo",
+                        extra={"instalacion_id": self.instalacion_id},
+                    )
+                    return
+                estadisticas_locks.renovaciones += 1
+            except Exception as e:
+                # Reintentar en el siguiente ciclo; el fencing cubre la caducidad
+                logger.warning(
+                    "Error renovando lock",
+                    extra={"instalacion_id": self.instalacion_id, "error": str(e)},
+                )
+
+    def verificar(self, db: Session) -> None:
+        # Fila bloqueada hasta el commit: los verificadores concurrentes se
+        # serializan y el de token menor falla
+        stmt = pg_insert(LockInstalacion).values(
+            instalacion_sif_id=self.instalacion_id, fencing_token=self.token
+        )
+        aceptado = db.scalar(
+            stmt.on_conflict_do_update(
+                index_elements=[LockInstalacion.instalacion_sif_id],
+                set_={"fencing_token": stmt.excluded.fencing_token},
+                where=LockInstalacion.fencing_token < stmt.excluded.fencing_token,
+            ).returning(LockInstalacion.fencing_token)
+        )
+        if aceptado is None:
+            estadisticas_locks.perdidos += 1
+            raise LockPerdido(
+                f"Token {self.token} superado para instalación {self.instalacion_id}"
+            )
+
+    def liberar(self) -> None:
+        self._parar.set()
+        try:
+            self._redis.eval(_LUA_LIBERAR, 1, self._clave, self._valor)
+        finally:
+            super().liberar()
+
+
+class BackendLocksRedis(BackendLocks):
+    """
+    Lock en Redis (clave sif:{id}, la misma que el lock anterior).
+
+    El contador de tokens vive en Redis (lock:fencing:{id}); al adquirir se
+    eleva por encima del último token aceptado en BD, de modo que sigue siendo
+    monótono aunque se pierda Redis o se venga del backend postgres.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    def adquirir(self, db: Session, instalacion_id: int) -> Optional[LockRedis]:
+        inicio = time.monotonic()
+        ultimo = db.scalar(
+            select(LockInstalacion.fencing_token).where(
+                LockInstalacion.instalacion_sif_id == instalacion_id
+            )
+        )
+        # Lectura de BD cerrada: no mantener la transacción abierta sin lock
+        db.rollback()
+
+        clave = f"sif:{instalacion_id}"
+        valor = uuid4().hex
+        token = self.redis.eval(
+            _LUA_ADQUIRIR,
+            2,
+            clave,
+            f"lock:fencing:{instalacion_id}",
+            valor,
+            settings.lock_ttl * 1000,
+            ultimo or 0,
+        )
+        espera = time.monotonic() - inicio
+        if token is None:
+            estadisticas_locks.espera(espera, False)
+            return None
+        return LockRedis(self.redis, clave, valor, instalacion_id, int(token), espera)
+
+
+# ===== POSTGRES =====
+
+
+class LockPostgres(LockInstalacionAdquirido):
+    def verificar(self, db: Session) -> None:
+        # El advisory lock y la fila de lock_instalacion pertenecen a esta misma
+        # transacción: no han podido caducar
+        pass
+
+
+class BackendLocksPostgres(BackendLocks):
+    """
+    pg_try_advisory_xact_lock en la sesión del orquestador.
+
+    Se libera con el commit/rollback de esa sesión: el caller no debe hacer
+    commit intermedio si quiere conservar el lock.
+    """
+
+    def adquirir(self, db: Session, instalacion_id: int) -> Optional[LockPostgres]:
+        inicio = time.monotonic()
+        adquirido = db.scalar(
+            select(
+                func.pg_try_advisory_xact_lock(
+                    CLAVE_ADVISORY_ORQUESTADOR, instalacion_id
+                )
+            )
+        )
+        if not adquirido:
+            estadisticas_locks.espera(time.monotonic() - inicio, False)
+            return None
+
+        stmt = pg_insert(LockInstalacion).values(
+            instalacion_sif_id=instalacion_id, fencing_token=1
+        )
+        token = db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[LockInstalacion.instalacion_sif_id],
+                set_={"fencing_token": LockInstalacion.fencing_token + 1},
+            ).returning(LockInstalacion.fencing_token)
+        ).scalar_one()
+        return LockPostgres(instalacion_id, token, time.monotonic() - inicio)
+
+
+@lru_cache
+def backend_locks() -> BackendLocks:
+    """Backend configurado (settings.lock_backend)"""
+    if settings.lock_backend == "postgres":
+        return BackendLocksPostgres()
+    return BackendLocksRedis(redis_client)
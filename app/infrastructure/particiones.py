@@ -0,0 +1,194 @@
+"""
+app/infrastructure/particiones.py
+
+Particiones mensuales de lote_envio y outbox_event (PARTITION BY RANGE created_at).
+
+Responsabilidades:
+- Crear por adelantado las particiones de los próximos meses
+  (settings.particiones_meses_adelantados): ningún INSERT debería caer en la
+  partición DEFAULT, que solo es una red de seguridad
+- Archivar las particiones más antiguas que settings.particiones_retencion_meses:
+  DETACH PARTITION y traslado al esquema settings.particiones_esquema_archivo.
+  Siguen consultables (archivo.lote_envio_p202501), pero las consultas del
+  dispatcher y de monitoreo solo recorren las particiones recientes
+- No archivar una partición con filas aún en curso (lote sin respuesta
+  definitiva, evento sin procesar): se avisa y se reintenta en la siguiente
+  ejecución
+
+NO gestiona:
+- La conversión inicial de las tablas (migración c5e9a3b7d214)
+- Transacciones: el caller hace commit (una transacción por partición archivada
+  para no retener el lock del padre)
+
+Nombres: {tabla}_pAAAAMM, límites [día 1 del mes, día 1 del mes siguiente).
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.domain.models.models import (
+    EstadoLoteEnvio,
+    EstadoOutboxEvent,
+    LoteEnvio,
+    OutboxEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+# Estados con trabajo pendiente: sus particiones no se archivan
+ESTADOS_EN_CURSO: Dict[str, Sequence[str]] = {
+    LoteEnvio.__tablename__: (
+        EstadoLoteEnvio.CREADO.value,
+        EstadoLoteEnvio.ENCOLADO.value,
+        EstadoLoteEnvio.ENVIANDO.value,
+        EstadoLoteEnvio.ERROR_REINTENTABLE.value,
+    ),
+    OutboxEvent.__tablename__: (
+        EstadoOutboxEvent.PENDIENTE.value,
+        EstadoOutboxEvent.ENCOLADO.value,
+    ),
+}
+TABLAS_PARTICIONADAS = tuple(ESTADOS_EN_CURSO)
+
+# Sin esperar tras consultas largas: el DETACH bloquea la tabla padre
+LOCK_TIMEOUT_DETACH = "5s"
+
+
+@dataclass(frozen=True)
+class Particion:
+    tabla: str
+    mes: date  # día 1 del mes
+
+    @property
+    def nombre(self) -> str:
+        return f"{self.tabla}_p{self.mes:%Y%m}"
+
+    @property
+    def hasta(self) -> date:
+        return sumar_meses(self.mes, 1)
+
+
+def sumar_meses(mes: date, meses: int) -> date:
+    """Día 1 del mes desplazado `meses` (negativo: hacia atrás)"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def inicio_de_mes(dia: date) -> date:
+    return dia.replace(day=1)
+
+
+def meses_a_archivar(
+    existentes: Sequence[date], hoy: date, retencion_meses: int
+) -> List[date]:
+    """Meses cuyas particiones terminan antes del inicio de la retención"""
+    limite = sumar_meses(inicio_de_mes(hoy), -retencion_meses)
+    return sorted(m for m in existentes if sumar_meses(m, 1) <= limite)
+
+
+def particiones_existentes(db: Session, tabla: str) -> List[Particion]:
+    """Particiones mensuales adjuntas a `tabla` (sin la DEFAULT)"""
+    nombres = db.scalars(
+        text("""
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:tabla AS regclass)
+            ORDER BY c.relname
+            """),
+        {"tabla": tabla},
+    )
+    prefijo = f"{tabla}_p"
+    return [
+        Particion(tabla, date(int(n[-6:-2]), int(n[-2:]), 1))
+        for n in nombres
+        if n.startswith(prefijo) and n[len(prefijo) :].isdigit()
+    ]
+
+
+def crear_particiones(db: Session, hoy: date, meses_adelantados: int) -> List[str]:
+    """
+    Crea (si faltan) las particiones del mes actual y los siguientes.
+
+    Returns:
+        Nombres de las particiones creadas
+    """
+    creadas = []
+    for tabla in TABLAS_PARTICIONADAS:
+        for i in range(meses_adelantados + 1):
+            particion = Particion(tabla, sumar_meses(inicio_de_mes(hoy), i))
+            existe = db.scalar(
+                text("SELECT to_regclass(:nombre) IS NOT NULL"),
+                {"nombre": particion.nombre},
+            )
+            if existe:
+                continue
+            # Falla si la DEFAULT ya tiene filas de ese mes (mantenimiento
+            # atrasado): hay que moverlas a mano antes de crear la partición
+            db.execute(
+                text(
+                    f"CREATE TABLE {particion.nombre} PARTITION OF {tabla} "
+                    f"FOR VALUES FROM ('{particion.mes}') TO ('{particion.hasta}')"
+                )
+            )
+            creadas.append(particion.nombre)
+    return creadas
+
+
+def _en_curso(db: Session, particion: Particion) -> bool:
+    return bool(
+        db.scalar(
+            text(
+                f"SELECT EXISTS (SELECT 1 FROM {particion.nombre} "
+                "WHERE CAST(estado AS text) = ANY(:estados))"
+            ),
+            {"estados": list(ESTADOS_EN_CURSO[particion.tabla])},
+        )
+    )
+
+
+def archivar_particion(db: Session, particion: Particion) -> bool:
+    """
+    DETACH de la partición y traslado al esquema de archivo.
+
+    Returns:
+        False si tiene filas en curso (no se toca)
+    """
+    if _en_curso(db, particion):
+        logger.warning(
+            "Partición con filas en curso, no se archiva",
+            extra={"particion": particion.nombre},
+        )
+        return False
+
+    esquema = settings.particiones_esquema_archivo
+    db.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_DETACH}'"))
+    db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {esquema}"))
+    db.execute(
+        text(f"ALTER TABLE {particion.tabla} DETACH PARTITION {particion.nombre}")
+    )
+    db.execute(text(f"ALTER TABLE {particion.nombre} SET SCHEMA {esquema}"))
+    logger.info(
+        "Partición archivada",
+        extra={"particion": particion.nombre, "esquema": esquema},
+    )
+    return True
+
+
+def particiones_a_archivar(
+    db: Session, hoy: date, retencion_meses: int
+) -> List[Particion]:
+    pendientes: List[Particion] = []
+    for tabla in TABLAS_PARTICIONADAS:
+        existentes = {p.mes: p for p in particiones_existentes(db, tabla)}
+        pendientes.extend(
+            existentes[m]
+            for m in meses_a_archivar(list(existentes), hoy, retencion_meses)
+        )
+    return pendientes
@@ -1,4 +1,8 @@
 from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
 
 # Instancia global reutilizable en toda la app
 redis_client = Redis(host="redis", port=6379, db=0, decode_responses=True)
+
+# Cliente asíncrono para los endpoints FastAPI (no bloquea el event loop)
+redis_async_client = AsyncRedis(host="redis", port=6379, db=0, decode_responses=True)
@@ -0,0 +1,311 @@
+"""
+app/infrastructure/repository/cadena_repository.py
+
+Acceso a la cabeza de la cadena de huellas por instalación SIF.
+
+Responsabilidades:
+- Bloquear y leer la cabeza de cadena con un único UPDATE ... RETURNING (PK)
+- Inicializar la cabeza a partir del último registro si aún no existe
+- Avanzar la cabeza tras insertar registros (misma transacción)
+- Insertar un registro y avanzar la cabeza en una sola sentencia
+- Sumar los registros insertados a registros_pendientes de la cabeza (control
+  de flujo) en esas mismas sentencias y devolver el control de flujo resultante
+
+NO gestiona:
+- Transacciones (commit/rollback): el caller las controla
+"""
+
+import logging
+from dataclasses import dataclass, replace
+from datetime import date, datetime, timedelta
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlalchemy import Row, func
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.domain.models.models import (
+    CabezaCadenaInstalacion,
+    EstadoRegistroFacturacion,
+    InstalacionSIF,
+    RegistroFacturacion,
+)
+from app.domain.services.lote_service import EstadoControlFlujo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CabezaCadena:
+    """Último eslabón de la cadena de una instalación (inmutable)."""
+
+    instalacion_sif_id: int
+    huella: Optional[str] = None
+    emisor_nif: Optional[str] = None
+    serie: Optional[str] = None
+    numero: Optional[str] = None
+    fecha_expedicion: Optional[date] = None
+    fecha_hora_gen: Optional[datetime] = None
+
+    def siguiente_fecha_hora_gen(self) -> datetime:
+        """
+        Timestamp de generación para el siguiente registro.
+
+        Estrictamente creciente respecto al último eslabón: created_at define el
+        orden de la cadena aunque varios registros compartan transacción o los
+        relojes de distintos nodos difieran.
+        """
+        ahora = datetime.now().astimezone()
+        if self.fecha_hora_gen and ahora <= self.fecha_hora_gen:
+            return self.fecha_hora_gen + timedelta(microseconds=1)
+        return ahora
+
+    def avanzar(self, registro: RegistroFacturacion) -> "CabezaCadena":
+        """Devuelve la nueva cabeza tras encadenar `registro` (en memoria)."""
+        return replace(
+            self,
+            huella=registro.huella,
+            emisor_nif=registro.emisor_nif,
+            serie=registro.serie,
+            numero=registro.numero,
+            fecha_expedicion=registro.fecha_expedicion,
+            fecha_hora_gen=registro.created_at,
+        )
+
+
+def _desde_fila(instalacion_sif_id: int, fila: Row[Any]) -> CabezaCadena:
+    return CabezaCadena(
+        instalacion_sif_id=instalacion_sif_id,
+        huella=fila.ultima_huella,
+        emisor_nif=fila.ultimo_emisor_nif,
+        serie=fila.ultima_serie,
+        numero=fila.ultimo_numero,
+        fecha_expedicion=fila.ultima_fecha_expedicion,
+        fecha_hora_gen=fila.ultima_fecha_hora_gen,
+    )
+
+
+async def bloquear_cabeza_cadena(
+    db: AsyncSession, instalacion_sif_id: int
+) -> CabezaCadena:
+    """
+    Bloquea la cabeza de cadena de la instalación y la devuelve.
+
+    Un único UPDATE por clave primaria con RETURNING: adquiere el row-lock y lee
+    el último eslabón en el mismo round-trip. El lock se mantiene hasta el
+    commit/rollback del caller, serializando la creación de registros de la
+    instalación sin tocar registro_facturacion.
+
+    Si la cabeza no existe (instalaciones anteriores a la tabla), se inicializa
+    una sola vez desde el último registro por created_at.
+    """
+    stmt = (
+        update(CabezaCadenaInstalacion)
+        .where(CabezaCadenaInstalacion.instalacion_sif_id == instalacion_sif_id)
+        .values(updated_at=func.now())
+        .returning(
+            CabezaCadenaInstalacion.ultima_huella,
+            CabezaCadenaInstalacion.ultimo_emisor_nif,
+            CabezaCadenaInstalacion.ultima_serie,
+            CabezaCadenaInstalacion.ultimo_numero,
+            CabezaCadenaInstalacion.ultima_fecha_expedicion,
+            CabezaCadenaInstalacion.ultima_fecha_hora_gen,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    fila = (await db.execute(stmt)).one_or_none()
+    if fila is None:
+        await _inicializar_cabeza_cadena(db, instalacion_sif_id)
+        fila = (await db.execute(stmt)).one()
+
+    return _desde_fila(instalacion_sif_id, fila)
+
+
+async def _inicializar_cabeza_cadena(db: AsyncSession, instalacion_sif_id: int) -> None:
+    """Crea la cabeza desde el último registro existente (idempotente)."""
+    ultimo = (
+        await db.execute(
+            select(RegistroFacturacion)
+            .where(RegistroFacturacion.instalacion_sif_id == instalacion_sif_id)
+            .order_by(RegistroFacturacion.created_at.desc())
+            .limit(1)
+        )
+    ).scalar_one_or_none()
+    conteo = (
+        await db.execute(
+            select(
+                func.count(),
+                func.count().filter(
+                    RegistroFacturacion.estado == EstadoRegistroFacturacion.PENDIENTE
+                ),
+            ).where(RegistroFacturacion.instalacion_sif_id == instalacion_sif_id)
+        )
+    ).one()
+
+    valores: dict[str, object] = {
+        "instalacion_sif_id": instalacion_sif_id,
+        "num_registros": conteo[0],
+        "registros_pendientes": conteo[1],
+    }
+    if ultimo:
+        valores.update(
+            ultima_huella=ultimo.huella,
+            ultimo_emisor_nif=ultimo.emisor_nif,
+            ultima_serie=ultimo.serie,
+            ultimo_numero=ultimo.numero,
+            ultima_fecha_expedicion=ultimo.fecha_expedicion,
+            ultimo_registro_id=ultimo.id,
+            ultima_fecha_hora_gen=ultimo.created_at,
+        )
+
+    # ON CONFLICT: otra transacción concurrente pudo inicializarla antes
+    await db.execute(
+        pg_insert(CabezaCadenaInstalacion)
+        .values(**valores)
+        .on_conflict_do_nothing(
+            index_elements=[CabezaCadenaInstalacion.instalacion_sif_id]
+        )
+    )
+    logger.info(
+        "Cabeza de cadena inicializada",
+        extra={"instalacion_id": instalacion_sif_id},
+    )
+
+
+def _valores_cabeza(cabeza: CabezaCadena) -> dict[str, Any]:
+    return {
+        "ultima_huella": cabeza.huella,
+        "ultimo_emisor_nif": cabeza.emisor_nif,
+        "ultima_serie": cabeza.serie,
+        "ultimo_numero": cabeza.numero,
+        "ultima_fecha_expedicion": cabeza.fecha_expedicion,
+        "ultima_fecha_hora_gen": cabeza.fecha_hora_gen,
+    }
+
+
+def _con_control_flujo(cabeza_actualizada: Any) -> Any:
+    """
+    SELECT del control de flujo tras la CTE que avanza la cabeza.
+
+    La CTE ya suma registros_pendientes en la fila de la cabeza (bloqueada);
+    de instalacion_sif solo se leen ultimo_envio_at / ultimo_tiempo_espera, sin
+    escribir ni bloquear la fila. JOIN cabeza: sin fila si la CTE no actualizó
+    nada. Devuelve las columnas de la CTE (salvo instalacion_sif_id) y el
+    control de flujo.
+    """
+    return select(
+        *[c for c in cabeza_actualizada.c if c.name != "instalacion_sif_id"],
+        InstalacionSIF.ultimo_envio_at,
+        InstalacionSIF.ultimo_tiempo_espera,
+    ).join_from(
+        cabeza_actualizada,
+        InstalacionSIF,
+        InstalacionSIF.id == cabeza_actualizada.c.instalacion_sif_id,
+    )
+
+
+def _control_flujo(fila: Row[Any]) -> EstadoControlFlujo:
+    return EstadoControlFlujo(
+        registros_pendientes=fila.registros_pendientes,
+        ultimo_envio_at=fila.ultimo_envio_at,
+        ultimo_tiempo_espera=fila.ultimo_tiempo_espera,
+    )
+
+
+async def avanzar_cabeza_cadena(
+    db: AsyncSession,
+    cabeza: CabezaCadena,
+    ultimo_registro_id: UUID,
+    num_registros: int = 1,
+) -> EstadoControlFlujo:
+    """
+    Persiste la nueva cabeza tras insertar `num_registros` registros.
+
+    Debe ejecutarse en la MISMA transacción que el INSERT (y tras el flush, para
+    disponer del id del último registro). En la misma sentencia suma los
+    registros a registros_pendientes.
+
+    Returns:
+        Control de flujo de la instalación tras la suma
+    """
+    cabeza_actualizada = (
+        update(CabezaCadenaInstalacion)
+        .where(CabezaCadenaInstalacion.instalacion_sif_id == cabeza.instalacion_sif_id)
+        .values(
+            **_valores_cabeza(cabeza),
+            ultimo_registro_id=ultimo_registro_id,
+            num_registros=CabezaCadenaInstalacion.num_registros + num_registros,
+            registros_pendientes=CabezaCadenaInstalacion.registros_pendientes
+            + num_registros,
+        )
+        .returning(
+            CabezaCadenaInstalacion.instalacion_sif_id,
+            CabezaCadenaInstalacion.registros_pendientes,
+        )
+        .cte("cabeza")
+    )
+    fila = (await db.execute(_con_control_flujo(cabeza_actualizada))).one()
+    return _control_flujo(fila)
+
+
+async def insertar_registro_encadenado(
+    db: AsyncSession, registro: RegistroFacturacion, cabeza: CabezaCadena
+) -> Optional[EstadoControlFlujo]:
+    """
+    Inserta `registro` y avanza la cabeza a `cabeza` en UN solo round-trip.
+
+    WITH nuevo AS (INSERT ... ON CONFLICT (uq_factura_instalacion) DO NOTHING
+    RETURNING id), cabeza AS (UPDATE cabeza_cadena_instalacion SET ...,
+    registros_pendientes = registros_pendientes + 1 FROM nuevo RETURNING ...)
+    SELECT id, <control de flujo> FROM cabeza JOIN instalacion_sif
+
+    La unicidad la garantiza la restricción (sin SELECT previo de duplicados) y
+    el id generado vuelve en la misma sentencia (sin flush ni refresh). Si la
+    factura ya existe no se inserta nada y ni la cabeza ni el contador cambian.
+
+    `registro` es un objeto transitorio (no se añade a la sesión); se le asigna
+    el id devuelto. Requiere haber bloqueado la cabeza (bloquear_cabeza_cadena).
+
+    Returns:
+        Control de flujo de la instalación tras la suma, o None si la factura
+        estaba duplicada
+    """
+    valores = {
+        attr.key: registro.__dict__[attr.key]
+        for attr in sa_inspect(RegistroFacturacion).column_attrs
+        if attr.key in registro.__dict__
+    }
+    nuevo = (
+        pg_insert(RegistroFacturacion)
+        .values(**valores)
+        .on_conflict_do_nothing(constraint="uq_factura_instalacion")
+        .returning(RegistroFacturacion.id)
+        .cte("nuevo")
+    )
+    cabeza_actualizada = (
+        update(CabezaCadenaInstalacion)
+        .where(
+            CabezaCadenaInstalacion.instalacion_sif_id == cabeza.instalacion_sif_id,
+            nuevo.c.id.is_not(None),
+        )
+        .values(
+            **_valores_cabeza(cabeza),
+            ultimo_registro_id=nuevo.c.id,
+            num_registros=CabezaCadenaInstalacion.num_registros + 1,
+            registros_pendientes=CabezaCadenaInstalacion.registros_pendientes + 1,
+        )
+        .returning(
+            CabezaCadenaInstalacion.instalacion_sif_id,
+            nuevo.c.id,
+            CabezaCadenaInstalacion.registros_pendientes,
+        )
+        .cte("cabeza")
+    )
+    fila = (await db.execute(_con_control_flujo(cabeza_actualizada))).one_or_none()
+    if fila is None:
+        return None
+    registro.id = fila.id
+    return _control_flujo(fila)
@@ -1,6 +1,5 @@
 import hashlib
 import secrets
-from datetime import UTC, datetime
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, Security, status
@@ -9,10 +8,18 @@ from sqlalchemy import and_, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
-from app.domain.models.models import InstalacionSIF, ObligadoTributario
+from app.config.settings import settings
+from app.domain.models.models import (
+    CabezaCadenaInstalacion,
+    InstalacionSIF,
+    ObligadoTributario,
+)
 from app.infrastructure.database import get_db
+from app.infrastructure.security.auth_cache import InstalacionSnapshot, auth_cache
+from app.infrastructure.security.uso_api_key import registro_uso
 
 security = HTTPBearer()
+seguridad_metricas = HTTPBearer(auto_error=False)
 
 
 def hash_api_key(key: str) -> str:
@@ -25,11 +32,39 @@ def generar_api_key() -> str:
     return secrets.token_urlsafe(48)
 
 
+async def verificar_token_metricas(
+    credentials: HTTPAuthorizationCredentials | None = Security(seguridad_metricas),
+) -> None:
+    """
+    Verifica el token de /metrics (settings.metrics_token).
+
+    Las métricas son globales del proceso, no de una instalación: no se exponen
+    con una API key de cliente ni el scraping cuenta como uso (last_used_at).
+    Sin token configurado el endpoint no existe (404).
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if credentials is None or not secrets.compare_digest(
+        credentials.credentials.encode(), settings.metrics_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de métricas inválido",
+        )
+
+
 async def verificar_api_key(
     credentials: HTTPAuthorizationCredentials = Security(security),
     db: AsyncSession = Depends(get_db),
-) -> InstalacionSIF:
-    """Verifica la API key y devuelve la instalación SIF asociada."""
+) -> InstalacionSnapshot:
+    """
+    Verifica la API key y devuelve la instalación SIF asociada.
+
+    Devuelve un snapshot inmutable (no la instancia ORM) cacheado en memoria y
+    Redis por key_hash: en el caso habitual no hay ningún acceso a BD. Al deshabilitar
+    una instalación o desactivar un obligado hay que invalidar la caché (ver
+    deshabilitar_instalacion_sif y desactivar_obligado_tributario).
+    """
     if not credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="API key requerida"
@@ -37,25 +72,32 @@ async def verificar_api_key(
 
     key_hash = hash_api_key(credentials.credentials)
 
-    # Buscar instalación SIF con joinedload para cargar el obligado
-    stmt = (
-        select(InstalacionSIF)
-        .options(joinedload(InstalacionSIF.obligado))
-        .where(
-            and_(
-                InstalacionSIF.key_hash == key_hash,
-                InstalacionSIF.enabled,
+    instalacion = await auth_cache.get(key_hash)
+    if instalacion is None:
+        # Antes del SELECT: si la key se invalida mientras tanto, no se cachea
+        generacion = await auth_cache.generacion(key_hash)
+        # Buscar instalación SIF con joinedload para cargar el obligado
+        stmt = (
+            select(InstalacionSIF)
+            .options(joinedload(InstalacionSIF.obligado))
+            .where(
+                and_(
+                    InstalacionSIF.key_hash == key_hash,
+                    InstalacionSIF.enabled,
+                )
             )
         )
-    )
-    result = await db.execute(stmt)
-    instalacion = result.scalar_one_or_none()
+        result = await db.execute(stmt)
+        instalacion_orm = result.scalar_one_or_none()
 
-    if not instalacion:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="API key inválida o instalación deshabilitada",
-        )
+        if not instalacion_orm:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="API key inválida o instalación deshabilitada",
+            )
+
+        instalacion = InstalacionSnapshot.desde_orm(instalacion_orm)
+        await auth_cache.set(instalacion, generacion)
 
     # Verificar obligado activo
     if not instalacion.obligado.activo:
@@ -63,15 +105,63 @@ async def verificar_api_key(
             status_code=status.HTTP_403_FORBIDDEN, detail="Obligado tributario inactivo"
         )
 
-    # Actualizar last_used_at
-    stmt_update = (
+    # last_used_at diferido: se anota en Redis y se vuelca en bloque periódicamente
+    # (app.tasks.mantenimiento.volcar_last_used_at), sin UPDATE por petición
+    await registro_uso.registrar(instalacion.id)
+
+    return instalacion
+
+
+async def deshabilitar_instalacion_sif(db: AsyncSession, instalacion_id: int) -> None:
+    """
+    Deshabilita una instalación SIF (su API key deja de ser válida).
+
+    Hace commit e invalida la caché de autenticación en todos los procesos.
+
+    Raises:
+        ValueError: Si la instalación no existe
+    """
+    stmt = (
         update(InstalacionSIF)
-        .where(InstalacionSIF.id == instalacion.id)
-        .values(last_used_at=datetime.now(UTC))
+        .where(InstalacionSIF.id == instalacion_id)
+        .values(enabled=False)
+        .returning(InstalacionSIF.key_hash)
     )
-    await db.execute(stmt_update)
+    key_hash = (await db.execute(stmt)).scalar_one_or_none()
+    if key_hash is None:
+        raise ValueError(f"Instalación {instalacion_id} no encontrada")
 
-    return instalacion
+    await db.commit()
+    # Tras el commit: las peticiones que leyeron el estado previo no lo recachean
+    # (generación de la key, ver AuthCache.invalidar)
+    await auth_cache.invalidar([key_hash])
+
+
+async def desactivar_obligado_tributario(db: AsyncSession, obligado_id: UUID) -> None:
+    """
+    Desactiva un obligado tributario (sus instalaciones responden 403).
+
+    Hace commit e invalida la caché de autenticación de todas sus instalaciones.
+
+    Raises:
+        ValueError: Si el obligado no existe
+    """
+    stmt = (
+        update(ObligadoTributario)
+        .where(ObligadoTributario.id == obligado_id)
+        .values(activo=False)
+        .returning(ObligadoTributario.id)
+    )
+    if (await db.execute(stmt)).scalar_one_or_none() is None:
+        raise ValueError(f"No existe obligado tributario con ID {obligado_id}")
+
+    result = await db.execute(
+        select(InstalacionSIF.key_hash).where(InstalacionSIF.obligado_id == obligado_id)
+    )
+    key_hashes = list(result.scalars().all())
+
+    await db.commit()
+    await auth_cache.invalidar(key_hashes)
 
 
 # ===== Funciones de utilidad =====
@@ -175,6 +265,9 @@ async def crear_instalacion_sif(
     # 🎯 FLUSH para volcar a db la instalacion creada
     await db.flush()
 
+    # Cabeza de cadena vacía: el primer registro será "PrimerRegistro"
+    db.add(CabezaCadenaInstalacion(instalacion_sif_id=instalacion.id))
+
     # 🎯 ACTUALIZAR DESPUÉS DEL flush para que tenga en cuenta la nueva instalación
     if cliente_id:
         await _recalcular_indicador_multiples_ot(db, cliente_id)
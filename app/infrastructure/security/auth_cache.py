@@ -0,0 +1,336 @@
+"""
+app/infrastructure/security/auth_cache.py
+
+Caché de autenticación por API key (key_hash → instalación SIF).
+
+Responsabilidades:
+- Snapshot inmutable y desacoplado de la sesión de la instalación + obligado
+- Caché en dos niveles: LRU con TTL en memoria (por proceso) + Redis (compartida)
+- Invalidación explícita (instalación deshabilitada, obligado desactivado),
+  propagada al resto de procesos por Redis pub/sub
+- Generación por key_hash: un snapshot leído de BD antes de una invalidación no
+  se vuelve a cachear después de ella
+
+NO gestiona:
+- La verificación de la API key ni el acceso a BD (ver auth.py)
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+from uuid import UUID
+
+from app.config.settings import settings
+from app.domain.models.models import InstalacionSIF
+from app.infrastructure.redis_client import redis_async_client
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1] snapshot, KEYS[2] generación; ARGV[1] snapshot JSON, ARGV[2] TTL,
+# ARGV[3] generación leída antes de consultar la BD. Solo escribe si no ha habido
+# invalidaciones desde entonces (generación ausente = 0).
+_LUA_SET_SI_GENERACION = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[3] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class ObligadoSnapshot:
+    """Datos del obligado tributario necesarios en los endpoints"""
+
+    id: UUID
+    nif: str
+    nombre_razon_social: str
+    activo: bool
+
+
+@dataclass(frozen=True)
+class InstalacionSnapshot:
+    """
+    Instalación SIF autenticada, desacoplada de cualquier sesión.
+
+    Sustituye a la instancia ORM devuelta por verificar_api_key: se puede
+    compartir entre peticiones y sesiones sin lazy loads ni DetachedInstanceError.
+    No incluye secretos (certificate_password) porque se guarda en Redis.
+    """
+
+    id: int
+    key_hash: str
+    obligado_id: UUID
+    cliente_id: Optional[str]
+    numero_instalacion: str
+    obligado: ObligadoSnapshot
+
+    @classmethod
+    def desde_orm(cls, instalacion: InstalacionSIF) -> "InstalacionSnapshot":
+        """Requiere instalacion.obligado cargado (joinedload)"""
+        obligado = instalacion.obligado
+        return cls(
+            id=instalacion.id,
+            key_hash=instalacion.key_hash,
+            obligado_id=instalacion.obligado_id,
+            cliente_id=instalacion.cliente_id,
+            numero_instalacion=instalacion.numero_instalacion,
+            obligado=ObligadoSnapshot(
+                id=obligado.id,
+                nif=obligado.nif,
+                nombre_razon_social=obligado.nombre_razon_social,
+                activo=obligado.activo,
+            ),
+        )
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), default=str)
+
+    @classmethod
+    def from_json(cls, valor: str) -> "InstalacionSnapshot":
+        datos = json.loads(valor)
+        obligado = datos.pop("obligado")
+        return cls(
+            **{**datos, "obligado_id": UUID(datos["obligado_id"])},
+            obligado=ObligadoSnapshot(
+                **{**obligado, "id": UUID(obligado["id"])},
+            ),
+        )
+
+
+class AuthCache:
+    """
+    Caché de snapshots de instalación por key_hash.
+
+    - Memoria: LRU con TTL corto (evita incluso el round-trip a Redis)
+    - Redis: TTL más largo, compartida por todos los procesos uvicorn
+    - Solo se cachean autenticaciones válidas: una key inválida siempre va a BD
+    - Si Redis falla se desactiva temporalmente (como la caché de QR)
+    - Las invalidaciones se publican en un canal Redis; cada proceso las escucha
+      y expulsa sus entradas en memoria
+    - Cada invalidación incrementa la generación de la key en Redis. Quien falla
+      en caché lee la generación ANTES de ir a BD y set() solo escribe si sigue
+      siendo la misma: una petición que leyó el estado previo a la invalidación
+      no lo recachea después de ella
+    """
+
+    PREFIJO_REDIS = "auth:instalacion:"
+    PREFIJO_GENERACION = "auth:generacion:"
+    CANAL_INVALIDACION = "auth:invalidar"
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(self, ttl: int, redis_ttl: int, max_items: int):
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self.max_items = max_items
+
+        self._cache: OrderedDict[str, Tuple[float, InstalacionSnapshot]] = OrderedDict()
+        self._redis_desactivado_hasta = 0.0
+
+        self.hits_memoria = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.invalidaciones = 0
+        self.sets_descartados = 0
+
+    # ----- Memoria -----
+
+    def _local_get(self, key_hash: str) -> Optional[InstalacionSnapshot]:
+        entrada = self._cache.get(key_hash)
+        if entrada is None:
+            return None
+        expira, snapshot = entrada
+        if time.monotonic() >= expira:
+            del self._cache[key_hash]
+            return None
+        self._cache.move_to_end(key_hash)
+        return snapshot
+
+    def _local_set(self, snapshot: InstalacionSnapshot) -> None:
+        self._cache[snapshot.key_hash] = (time.monotonic() + self.ttl, snapshot)
+        self._cache.move_to_end(snapshot.key_hash)
+        while len(self._cache) > self.max_items:
+            self._cache.popitem(last=False)
+
+    def _local_invalidar(self, key_hashes: Iterable[str]) -> None:
+        for key_hash in key_hashes:
+            self._cache.pop(key_hash, None)
+
+    # ----- Redis -----
+
+    def _redis_disponible(self) -> bool:
+        return time.monotonic() >= self._redis_desactivado_hasta
+
+    def _redis_fallo(self, e: Exception) -> None:
+        # Redis es solo caché: la autenticación sigue funcionando contra BD
+        logger.warning(f"Caché de autenticación en Redis no disponible: {e}")
+        self._redis_desactivado_hasta = time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+
+    async def _redis_get(self, key_hash: str) -> Optional[InstalacionSnapshot]:
+        if not self._redis_disponible():
+            return None
+        try:
+            valor = await redis_async_client.get(self.PREFIJO_REDIS + key_hash)
+        except Exception as e:
+            self._redis_fallo(e)
+            return None
+        if valor is None:
+            return None
+        try:
+            # decode_responses=True: str (bytes solo con otro cliente)
+            if isinstance(valor, bytes):
+                valor = valor.decode("utf-8")
+            return InstalacionSnapshot.from_json(valor)
+        except (ValueError, TypeError, KeyError) as e:
+            # Formato antiguo o corrupto: se trata como miss
+            logger.warning(f"Snapshot de autenticación inválido en Redis: {e}")
+            return None
+
+    async def _redis_set(self, snapshot: InstalacionSnapshot, generacion: int) -> bool:
+        """False si la key se invalidó después de leer `generacion`"""
+        if not self._redis_disponible():
+            return True
+        try:
+            escrito = await redis_async_client.eval(
+                _LUA_SET_SI_GENERACION,
+                2,
+                self.PREFIJO_REDIS + snapshot.key_hash,
+                self.PREFIJO_GENERACION + snapshot.key_hash,
+                snapshot.to_json(),
+                self.redis_ttl,
+                generacion,
+            )
+        except Exception as e:
+            self._redis_fallo(e)
+            return True
+        return bool(escrito)
+
+    # ----- API -----
+
+    async def get(self, key_hash: str) -> Optional[InstalacionSnapshot]:
+        """Snapshot cacheado de la key o None si hay que ir a BD"""
+        snapshot = self._local_get(key_hash)
+        if snapshot is not None:
+            self.hits_memoria += 1
+            return snapshot
+
+        snapshot = await self._redis_get(key_hash)
+        if snapshot is not None:
+            self.hits_redis += 1
+            self._local_set(snapshot)
+            return snapshot
+
+        self.misses += 1
+        return None
+
+    async def generacion(self, key_hash: str) -> Optional[int]:
+        """
+        Generación actual de la key (leer ANTES de consultar la BD tras un miss).
+
+        None si Redis no está disponible: set() cacheará solo en memoria.
+        """
+        if not self._redis_disponible():
+            return None
+        try:
+            valor = await redis_async_client.get(self.PREFIJO_GENERACION + key_hash)
+        except Exception as e:
+            self._redis_fallo(e)
+            return None
+        return int(valor or 0)
+
+    async def set(
+        self, snapshot: InstalacionSnapshot, generacion: Optional[int]
+    ) -> None:
+        """
+        Cachea el snapshot leído de BD con la generación leída antes (generacion()).
+
+        Si entretanto se invalidó la key, se descarta: el snapshot puede reflejar
+        el estado anterior al cambio (p. ej. instalación aún habilitada).
+        """
+        if generacion is not None and not await self._redis_set(snapshot, generacion):
+            self.sets_descartados += 1
+            logger.info(
+                "Snapshot de autenticación descartado: key invalidada tras leerlo",
+                extra={"instalacion_id": snapshot.id},
+            )
+            return
+        self._local_set(snapshot)
+
+    async def invalidar(self, key_hashes: Iterable[str]) -> None:
+        """
+        Invalida las keys en todos los niveles y en todos los procesos.
+
+        Llamar DESPUÉS del commit del cambio: si se invalida antes, una petición
+        concurrente podría leer y volver a cachear el estado anterior. Las que ya
+        lo leyeron antes del commit no lo cachean: la generación de la key sube y
+        su set() se descarta. La generación dura al menos lo que un snapshot en
+        Redis (redis_ttl).
+        """
+        key_hashes = list(key_hashes)
+        if not key_hashes:
+            return
+
+        self.invalidaciones += len(key_hashes)
+        self._local_invalidar(key_hashes)
+        try:
+            pipe = redis_async_client.pipeline(transaction=True)
+            for key_hash in key_hashes:
+                pipe.incr(self.PREFIJO_GENERACION + key_hash)
+                pipe.expire(self.PREFIJO_GENERACION + key_hash, self.redis_ttl)
+            pipe.delete(*(self.PREFIJO_REDIS + k for k in key_hashes))
+            await pipe.execute()
+            await redis_async_client.publish(
+                self.CANAL_INVALIDACION, json.dumps(key_hashes)
+            )
+        except Exception as e:
+            # Sin Redis el resto de procesos expira sus entradas por TTL
+            logger.error(
+                f"No se pudo propagar la invalidación de autenticación: {e}",
+                extra={"num_keys": len(key_hashes)},
+            )
+
+    async def escuchar_invalidaciones(self) -> None:
+        """
+        Tarea de fondo (lifespan): aplica las invalidaciones de otros procesos.
+
+        Se reconecta indefinidamente; mientras no hay conexión, el TTL en memoria
+        acota el tiempo que una key invalidada sigue aceptándose.
+        """
+        while True:
+            try:
+                async with redis_async_client.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CANAL_INVALIDACION)
+                    async for mensaje in pubsub.listen():
+                        if mensaje.get("type") != "message":
+                            continue
+                        self._local_invalidar(json.loads(mensaje["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Escucha de invalidaciones interrumpida: {e}")
+                await asyncio.sleep(self.REDIS_BACKOFF_SEGUNDOS)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        hits = self.hits_memoria + self.hits_redis
+        consultas = hits + self.misses
+        return {
+            "cache_items": len(self._cache),
+            "cache_hits_memoria": self.hits_memoria,
+            "cache_hits_redis": self.hits_redis,
+            "cache_misses": self.misses,
+            "cache_hit_ratio": round(hits / consultas, 3) if consultas else 0.0,
+            "invalidaciones": self.invalidaciones,
+            "sets_descartados": self.sets_descartados,
+        }
+
+
+# Instancia global (una por proceso uvicorn)
+auth_cache = AuthCache(
+    ttl=settings.auth_cache_ttl,
+    redis_ttl=settings.auth_cache_redis_ttl,
+    max_items=settings.auth_cache_max_items,
+)
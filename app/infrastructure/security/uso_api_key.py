@@ -0,0 +1,137 @@
+"""
+app/infrastructure/security/uso_api_key.py
+
+Registro diferido (write-behind) del uso de las API keys.
+
+Responsabilidades:
+- Anotar en Redis el último uso de cada instalación (sin tocar BD)
+- Limitar las anotaciones a una por instalación y proceso cada `precision` s
+- Volcar todas las anotaciones a instalacion_sif.last_used_at con un único UPDATE
+  (tarea periódica, ver app.tasks.mantenimiento)
+
+Motivo: el UPDATE de last_used_at por petición convertía la fila de la
+instalación en un punto caliente que competía por el row-lock con las
+actualizaciones de control de flujo (worker).
+"""
+
+import logging
+import time
+from datetime import UTC, datetime
+from typing import Dict
+
+from redis import Redis
+from sqlalchemy import DateTime, Integer, column, or_, update, values
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.domain.models.models import InstalacionSIF
+from app.infrastructure.redis_client import redis_async_client
+
+logger = logging.getLogger(__name__)
+
+# Hash Redis instalacion_id → epoch del último uso pendiente de volcar
+CLAVE_REDIS_USO = "auth:last_used"
+
+
+class RegistroUso:
+    """
+    Buffer de last_used_at por instalación (lado API, asíncrono).
+
+    Cada proceso anota como mucho una vez por instalación cada `precision`
+    segundos; Redis agrupa las anotaciones de todos los procesos hasta el volcado.
+    Si Redis no está disponible la anotación se descarta: last_used_at es
+    informativo y nunca debe bloquear ni ralentizar la autenticación.
+    """
+
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self._ultima_anotacion: Dict[int, float] = {}
+        self._redis_desactivado_hasta = 0.0
+
+        self.anotaciones = 0
+        self.omitidas = 0
+
+    async def registrar(self, instalacion_id: int) -> None:
+        ahora = time.time()
+        if ahora - self._ultima_anotacion.get(instalacion_id, 0.0) < self.precision:
+            self.omitidas += 1
+            return
+        if time.monotonic() < self._redis_desactivado_hasta:
+            return
+
+        self._ultima_anotacion[instalacion_id] = ahora
+        try:
+            await redis_async_client.hset(CLAVE_REDIS_USO, str(instalacion_id), ahora)
+            self.anotaciones += 1
+        except Exception as e:
+            logger.warning(f"No se pudo anotar el uso de la API key: {e}")
+            self._redis_desactivado_hasta = (
+                time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+            )
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {
+            "anotaciones": self.anotaciones,
+            "omitidas": self.omitidas,
+            "instalaciones": len(self._ultima_anotacion),
+        }
+
+
+def volcar_uso_api_keys(db: Session, redis: Redis) -> int:
+    """
+    Vuelca las anotaciones pendientes a last_used_at (lado Celery, síncrono).
+
+    Lee y vacía el hash de Redis de forma atómica (MULTI) y ejecuta un único
+    UPDATE ... FROM (VALUES ...) para todas las instalaciones tocadas. Nunca
+    retrocede last_used_at. Si el UPDATE falla, las anotaciones se devuelven a
+    Redis sin pisar las más recientes.
+
+    Returns:
+        Número de instalaciones volcadas
+    """
+    pipe = redis.pipeline(transaction=True)
+    pipe.hgetall(CLAVE_REDIS_USO)
+    pipe.delete(CLAVE_REDIS_USO)
+    pendientes: Dict[str, str] = pipe.execute()[0]
+    if not pendientes:
+        return 0
+
+    filas = [
+        (int(instalacion_id), datetime.fromtimestamp(float(epoch), UTC))
+        for instalacion_id, epoch in pendientes.items()
+    ]
+    uso = values(
+        column("instalacion_id", Integer),
+        column("last_used_at", DateTime(timezone=True)),
+        name="uso",
+    ).data(filas)
+
+    try:
+        db.execute(
+            update(InstalacionSIF)
+            .where(
+                InstalacionSIF.id == uso.c.instalacion_id,
+                or_(
+                    InstalacionSIF.last_used_at.is_(None),
+                    InstalacionSIF.last_used_at < uso.c.last_used_at,
+                ),
+            )
+            .values(last_used_at=uso.c.last_used_at)
+            .execution_options(synchronize_session=False)
+        )
+        db.flush()
+    except Exception:
+        # HSETNX: si ya hay una anotación más reciente, prevalece
+        pipe = redis.pipeline(transaction=False)
+        for instalacion_id, epoch in pendientes.items():
+            pipe.hsetnx(CLAVE_REDIS_USO, instalacion_id, epoch)
+        pipe.execute()
+        raise
+
+    return len(filas)
+
+
+# Instancia global (una por proceso uvicorn)
+registro_uso = RegistroUso(precision=settings.auth_last_used_precision)
@@ -0,0 +1,140 @@
+"""
+app/infrastructure/temporizador_envios.py
+
+Temporizador de envíos: despierta cada instalación cuando puede volver a enviar.
+
+Responsabilidades:
+- Guardar en un sorted set de Redis el próximo envío permitido de cada
+  instalación (score = epoch)
+- Programar tras cada respuesta de AEAT (worker_aeat después del commit, lado
+  Celery)
+- Programar desde la ingesta (lado API) cuando la cola de la instalación pasa de
+  vacía a no vacía o alcanza MAX_REGISTROS_LOTE (envío inmediato)
+- Extraer de forma atómica las instalaciones vencidas (tarea
+  despertar_instalaciones, ver app.tasks.scheduler)
+
+Motivo: con el sondeo cada 60 s un lote podía esperar hasta un minuto más de lo
+que exige el tiempo 't' de AEAT. El sondeo (scheduler_envios_ligero) se mantiene
+como red de seguridad: si Redis falla o se pierde una entrada, la instalación
+sale en el siguiente sondeo.
+"""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from redis import Redis
+
+from app.domain.services.lote_service import MAX_REGISTROS_LOTE, EstadoControlFlujo
+from app.infrastructure.redis_client import redis_async_client
+
+logger = logging.getLogger(__name__)
+
+# Sorted set instalacion_id → epoch del próximo envío permitido
+CLAVE_REDIS_TEMPORIZADOR = "control_flujo:proximo_envio"
+
+# ZRANGEBYSCORE + ZREM atómicos: cada vencimiento lo extrae un único proceso
+_LUA_EXTRAER_VENCIDAS = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #ids > 0 then
+    redis.call('ZREM', KEYS[1], unpack(ids))
+end
+return ids
+"""
+
+
+def envio_tras_ingesta(
+    estado: EstadoControlFlujo,
+    insertados: int,
+    ahora: Optional[datetime] = None,
+) -> Optional[datetime]:
+    """
+    Cuándo despertar la instalación tras insertar `insertados` registros.
+
+    Solo en las transiciones (el resto ya está programado):
+    - La cola alcanza MAX_REGISTROS_LOTE: ya
+    - La cola estaba vacía: al cumplirse 't' (ya si no hubo envíos o se cumplió)
+
+    Returns:
+        None si no hay que programar nada
+    """
+    ahora = ahora or datetime.now(timezone.utc)
+    previos = estado.registros_pendientes - insertados
+    if previos < MAX_REGISTROS_LOTE <= estado.registros_pendientes:
+        return ahora
+    if previos <= 0 < estado.registros_pendientes:
+        permitido = estado.envio_permitido_at()
+        return max(permitido, ahora) if permitido else ahora
+    return None
+
+
+def programar_envio(redis: Redis, instalacion_id: int, cuando: datetime) -> None:
+    """
+    Programa el próximo envío (lado Celery, síncrono).
+
+    Sustituye la programación anterior: tras una respuesta de AEAT manda el
+    nuevo tiempo 't'. Un fallo de Redis solo se registra (lo cubre el sondeo).
+    """
+    try:
+        redis.zadd(CLAVE_REDIS_TEMPORIZADOR, {str(instalacion_id): cuando.timestamp()})
+    except Exception as e:
+        logger.warning(
+            "No se pudo programar el envío en el temporizador",
+            extra={"instalacion_id": instalacion_id, "error": str(e)},
+        )
+
+
+def extraer_vencidas(redis: Redis, limite: int) -> List[int]:
+    """Extrae (y elimina) hasta `limite` instalaciones con el envío vencido"""
+    ids = redis.eval(
+        _LUA_EXTRAER_VENCIDAS, 1, CLAVE_REDIS_TEMPORIZADOR, time.time(), limite
+    )
+    return [int(i) for i in ids]
+
+
+class TemporizadorIngesta:
+    """
+    Programación de envíos desde la API (asíncrono).
+
+    Solo adelanta (ZADD LT): la ingesta nunca retrasa un envío ya programado.
+    Sin Redis se omite durante REDIS_BACKOFF_SEGUNDOS; el sondeo lo recoge.
+    """
+
+    REDIS_BACKOFF_SEGUNDOS = 30.0
+
+    def __init__(self) -> None:
+        self._redis_desactivado_hasta = 0.0
+        self.programados = 0
+        self.omitidos = 0
+
+    async def registrar(
+        self, instalacion_id: int, estado: EstadoControlFlujo, insertados: int
+    ) -> None:
+        """Llamar tras el commit de una creación"""
+        cuando = envio_tras_ingesta(estado, insertados)
+        if cuando is None:
+            return
+        if time.monotonic() < self._redis_desactivado_hasta:
+            self.omitidos += 1
+            return
+        try:
+            await redis_async_client.zadd(
+                CLAVE_REDIS_TEMPORIZADOR,
+                {str(instalacion_id): cuando.timestamp()},
+                lt=True,
+            )
+            self.programados += 1
+        except Exception as e:
+            logger.warning(f"No se pudo programar el envío en el temporizador: {e}")
+            self.omitidos += 1
+            self._redis_desactivado_hasta = (
+                time.monotonic() + self.REDIS_BACKOFF_SEGUNDOS
+            )
+
+    def estadisticas(self) -> Dict[str, int]:
+        return {"programados": self.programados, "omitidos": self.omitidos}
+
+
+# Instancia global (una por proceso uvicorn)
+temporizador_ingesta = TemporizadorIngesta()
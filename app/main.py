@@ -1,8 +1,9 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from typing import Any, AsyncGenerator, Dict
 
-from fastapi import FastAPI, Request, Response, status
+from fastapi import Depends, FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -12,7 +13,18 @@ from slowapi.util import get_remote_address
 from app.api.v1 import consulta_endpoint, factura_endpoint
 from app.config.settings import settings
 from app.core.logging.logging_config import setup_logging
-from app.infrastructure.database import Base, engine
+from app.core.utils.qr_generator import qr_renderer
+from app.infrastructure.database import (
+    Base,
+    estado_replica,
+    get_async_engine,
+    get_replica_async_engine,
+)
+from app.infrastructure.idempotencia import idempotencia
+from app.infrastructure.security.auth import verificar_token_metricas
+from app.infrastructure.security.auth_cache import auth_cache
+from app.infrastructure.security.uso_api_key import registro_uso
+from app.infrastructure.temporizador_envios import temporizador_ingesta
 from app.middleware.correlation_id import CorrelationIdMiddleware
 
 # Configurar logging (JSON en producción, texto en desarrollo)
@@ -34,15 +46,22 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
 
     # Crear tablas (en producción usar Alembic)
     if settings.debug:
-        async with engine.begin() as conn:
+        async with get_async_engine().begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
         logger.info("Tablas de BD creadas/verificadas")
 
+    # Invalidaciones de la caché de autenticación publicadas por otros procesos
+    escucha_auth = asyncio.create_task(auth_cache.escuchar_invalidaciones())
+
     yield
 
     # Shutdown
     logger.info("Cerrando Factubridge...")
-    await engine.dispose()
+    escucha_auth.cancel()
+    qr_renderer.shutdown()
+    await get_async_engine().dispose()
+    if get_replica_async_engine.cache_info().currsize:
+        await get_replica_async_engine().dispose()
 
 
 # Crear app
@@ -125,6 +144,23 @@ async def health_check() -> Dict[str, str]:
     return {"status": "healthy"}
 
 
+@app.get("/metrics", dependencies=[Depends(verificar_token_metricas)])
+async def metrics() -> Dict[str, Any]:
+    """
+    Métricas internas del proceso (pool QR, cachés, réplica, temporizador).
+
+    Requiere el token de métricas (METRICS_TOKEN), no una API key de instalación.
+    """
+    return {
+        "qr": qr_renderer.estadisticas(),
+        "auth": auth_cache.estadisticas(),
+        "uso_api_keys": registro_uso.estadisticas(),
+        "idempotencia": idempotencia.estadisticas(),
+        "replica": estado_replica.estadisticas(),
+        "temporizador": temporizador_ingesta.estadisticas(),
+    }
+
+
 # Incluir routers
 app.include_router(
     factura_endpoint.router, prefix=settings.api_prefix, tags=["Facturas"]
@@ -6,11 +6,12 @@ and inline comments that map to the OpenAPI specification supplied by Verifacti.
 """
 
 from .factura_cancel import FacturaCancelInput
-from .factura_create import FacturaInput
+from .factura_create import FacturaBatchInput, FacturaInput
 from .factura_modify import FacturaModifyInput
 
 __all__ = [
     "FacturaInput",
+    "FacturaBatchInput",
     "FacturaModifyInput",
     "FacturaCancelInput",
 ]
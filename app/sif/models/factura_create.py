@@ -351,3 +351,13 @@ class FacturaInput(BaseModel):
                 )
 
         return self
+
+
+class FacturaBatchInput(BaseModel):
+    """Schema de entrada para creación de facturas en bloque (POST /create/batch).
+
+    El orden de la lista es el orden de encadenamiento: la huella de cada factura
+    se calcula sobre la de la factura anterior aceptada de la misma lista.
+    """
+
+    facturas: List[FacturaInput] = Field(..., min_length=1, max_length=1000)
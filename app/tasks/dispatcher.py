@@ -14,25 +14,25 @@ Garantías:
 - Si falla, eventos siguen en 'pendiente' (reintento automático)
 - SELECT FOR UPDATE SKIP LOCKED (concurrencia segura)
 
-Ejecutar: Cada 10 segundos vía Celery Beat
+Ejecutar:
+- Cada 5 segundos vía Celery Beat (dispatch_outbox_event)
+- O en modo continuo (LISTEN/NOTIFY): app.tasks.dispatcher_continuo, con Beat
+  como red de seguridad (settings.dispatcher_continuo)
 """
 
 import json
 import logging
-from typing import List, cast
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, cast
 
 from celery import Task
-from sqlalchemy import select, update
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from app.core.logging.logging_context import set_correlation_id
-from app.domain.models.models import (
-    EstadoLoteEnvio,
-    EstadoOutboxEvent,
-    LoteEnvio,
-    OutboxEvent,
-)
+from app.domain.models.models import EstadoOutboxEvent, LoteEnvio, OutboxEvent
 from app.domain.services.outbox_service import OutboxService
 from app.infrastructure.database import session_factory_sync
 from app.tasks.decorators import typed_task
@@ -40,144 +40,224 @@ from app.tasks.decorators import typed_task
 logger = logging.getLogger(__name__)
 
 
-@typed_task
-def dispatch_outbox_event(
-    batch_size: int = 10, correlation_id: str | None = None
-) -> None:
+class EstadisticasDespacho:
     """
-    Dispatcher: lee eventos pendientes y los encola al worker AEAT.
+    Latencia de despacho de este proceso: desde la creación del evento (commit
+    del orquestador) hasta su encolado en el worker AEAT.
 
-    GARANTÍA FIFO CRÍTICA (Art. 12):
-    - ORDER BY created_at ASC: respeta orden de creación
-    - Cadena hash nunca se rompe por procesamiento fuera de orden
+    Ventana de las últimas MUESTRAS_MAX muestras. Las mismas cifras, para todos
+    los dispatchers, las calcula en SQL estadisticas_salud_outbox (monitoring).
+    """
 
-    Args:
-        batch_size: Número máximo de eventos a procesar por ejecución
+    MUESTRAS_MAX = 10_000
+
+    def __init__(self) -> None:
+        self._latencias: Deque[float] = deque(maxlen=self.MUESTRAS_MAX)
+        self.encolados = 0
+        self.errores = 0
+        self.lotes = 0
+
+    def registrar(self, latencia: float) -> None:
+        self._latencias.append(latencia)
+        self.encolados += 1
+
+    def estadisticas(self) -> Dict[str, Any]:
+        latencias = sorted(self._latencias)
+
+        def percentil(p: float) -> float:
+            if not latencias:
+                return 0.0
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 3)
+
+        return {
+            "encolados": self.encolados,
+            "errores": self.errores,
+            "lotes": self.lotes,
+            "latencia_p50_s": percentil(0.50),
+            "latencia_p95_s": percentil(0.95),
+            "latencia_p99_s": percentil(0.99),
+            "latencia_max_s": round(latencias[-1], 3) if latencias else 0.0,
+        }
 
-    Flujo:
-    1. SELECT FOR UPDATE SKIP LOCKED (eventos pendientes, FIFO)
-    2. Para cada evento:
-       a. Encolar en worker AEAT con retry policy
-       b. Marcar evento y lote como ENCOLADO
-    3. COMMIT (transacción SEPARADA del orquestador)
 
-    Ejecutar: Cada 10 segundos vía Celery Beat
+estadisticas_despacho = EstadisticasDespacho()
+
+
+def despachar_pendientes(db: Session, batch_size: int) -> Dict[str, int]:
     """
-    logger.info("Dispatcher outbox iniciado")
+    Encola hasta `batch_size` eventos pendientes (FIFO) y hace commit.
+
+    Común al modo Beat (dispatch_outbox_event) y al modo continuo
+    (app.tasks.dispatcher_continuo).
 
+    Flujo:
+    1. SELECT FOR UPDATE SKIP LOCKED (eventos pendientes, FIFO) con JOIN a
+       sus lotes: la fila del lote queda bloqueada ANTES de publicar
+    2. Encolar cada evento en worker AEAT con retry policy
+    3. Marcar los eventos publicados y sus lotes como ENCOLADO (dos UPDATE
+       para todo el bloque)
+    4. COMMIT (transacción SEPARADA del orquestador)
+
+    Returns:
+        Contadores leidos / encolados / errores
+
+    Raises:
+        SQLAlchemyError: el caller hace rollback (eventos vuelven a 'pendiente')
+    """
     stats = {
         "leidos": 0,
         "encolados": 0,
         "errores": 0,
     }
 
-    db: Session = session_factory_sync()
+    # PASO 1: Leer eventos pendientes (FIFO, con lock del evento y del lote).
+    # El lote se bloquea aquí y no en el UPDATE del PASO 3: el worker que
+    # recibe la tarea espera a nuestro commit al poner el lote en ENVIANDO,
+    # en vez de retener el lote mientras nosotros esperamos al lote y él
+    # (marcar_procesado) al evento que tenemos bloqueado.
+    eventos: List[OutboxEvent] = list(
+        db.execute(
+            select(OutboxEvent)
+            .join(LoteEnvio, LoteEnvio.id == OutboxEvent.lote_id)
+            .where(OutboxEvent.estado == EstadoOutboxEvent.PENDIENTE)
+            .order_by(
+                OutboxEvent.created_at.asc(), OutboxEvent.id.asc()
+            )  # FIFO crítico
+            .limit(batch_size)
+            .with_for_update(
+                of=[OutboxEvent, LoteEnvio], skip_locked=True
+            )  # Concurrencia segura
+        )
+        .scalars()
+        .all()
+    )
 
-    try:
-        # PASO 1: Leer eventos pendientes (FIFO, con lock)
-        eventos: List[OutboxEvent] = list(
-            db.execute(
-                select(OutboxEvent)
-                .where(OutboxEvent.estado == EstadoOutboxEvent.PENDIENTE)
-                .order_by(
-                    OutboxEvent.created_at.asc(), OutboxEvent.id.asc()
-                )  # FIFO crítico
-                .limit(batch_size)
-                .with_for_update(skip_locked=True)  # Concurrencia segura
+    stats["leidos"] = len(eventos)
+
+    if not eventos:
+        logger.debug("No hay eventos pendientes para despachar")
+        return stats
+
+    logger.info(
+        "Procesando eventos pendientes",
+        extra={"eventos_leidos": stats["leidos"]},
+    )
+
+    # PASO 2: Encolar cada evento en worker AEAT
+    servicio_outbox = OutboxService(db)
+    publicados: List[OutboxEvent] = []
+    latencias: List[float] = []
+
+    from app.tasks.worker_aeat import enviar_lote_aeat
+
+    for evento in eventos:
+        try:
+            # Parsear payload
+            payload = json.loads(evento.payload)
+            lote_id = payload["lote_id"]
+            correlation_id = payload.get("correlation_id")
+            set_correlation_id(correlation_id)
+
+            # Encolar en worker AEAT con retry policy agresiva
+            cast(Task, enviar_lote_aeat).apply_async(
+                args=[lote_id, evento.id],
+                kwargs={"correlation_id": correlation_id},
+                retry=True,
+                retry_policy={
+                    "max_retries": evento.max_intentos,
+                    "interval_start": 10,  # 10 segundos
+                    "interval_step": 30,  # +30s por intento
+                    "interval_max": 300,  # máximo 5 minutos
+                },
+            )
+            # Evento y lote ENCOLADO al final del bloque
+            publicados.append(evento)
+            stats["encolados"] += 1
+            latencias.append(
+                (datetime.now(timezone.utc) - evento.created_at).total_seconds()
+            )
+
+            logger.info(
+                "Evento encolado para worker AEAT",
+                extra={
+                    "evento_id": evento.id,
+                    "lote_id": lote_id,
+                    "instalacion_id": evento.instalacion_sif_id,
+                },
             )
-            .scalars()
-            .all()
-        )
 
-        stats["leidos"] = len(eventos)
+        except json.JSONDecodeError as e:
+            stats["errores"] += 1
+            logger.error(
+                "Error parseando payload del evento",
+                extra={
+                    "evento_id": evento.id,
+                    "error": str(e),
+                    "error_type": "JSONDecodeError",
+                },
+            )
+            # Marcar como error y continuar
+            servicio_outbox.marcar_error(evento.id, f"Payload inválido: {e}")
+
+        except Exception as e:
+            stats["errores"] += 1
+            logger.error(
+                "Error encolando evento",
+                extra={
+                    "evento_id": evento.id,
+                    "error": str(e),
+                    "error_type": type(e).__name__,
+                },
+                exc_info=True,
+            )
+            # Continuar con otros eventos
+            continue
 
-        if not eventos:
-            logger.debug("No hay eventos pendientes para despachar")
-            return
+    # PASO 3: Eventos publicados y sus lotes → ENCOLADO (dos sentencias)
+    servicio_outbox.marcar_encolados(
+        [e.id for e in publicados], [e.lote_id for e in publicados]
+    )
 
-        logger.info(
-            "Procesando eventos pendientes",
-            extra={"eventos_leidos": stats["leidos"]},
-        )
+    # PASO 4: Commit de todos los cambios de estado
+    db.commit()
 
-        # PASO 2: Encolar cada evento en worker AEAT
-        servicio_outbox = OutboxService(db)
-
-        from app.tasks.worker_aeat import enviar_lote_aeat
-
-        for evento in eventos:
-            try:
-                # Parsear payload
-                payload = json.loads(evento.payload)
-                lote_id = payload["lote_id"]
-                correlation_id = payload.get("correlation_id")
-                set_correlation_id(correlation_id)
-
-                # Encolar en worker AEAT con retry policy agresiva
-                cast(Task, enviar_lote_aeat).apply_async(
-                    args=[lote_id, evento.id],
-                    kwargs={"correlation_id": correlation_id},
-                    retry=True,
-                    retry_policy={
-                        "max_retries": evento.max_intentos,
-                        "interval_start": 10,  # 10 segundos
-                        "interval_step": 30,  # +30s por intento
-                        "interval_max": 300,  # máximo 5 minutos
-                    },
-                )
-                # Lote ENCOLADO
-                db.execute(
-                    update(LoteEnvio)
-                    .where(LoteEnvio.id == evento.lote_id)
-                    .values(estado=EstadoLoteEnvio.ENCOLADO)
-                )
-                # Evento ENCOLADO (flush, NO commit todavía)
-                servicio_outbox.marcar_encolado(evento.id)
-                stats["encolados"] += 1
-
-                logger.info(
-                    "Evento encolado para worker AEAT",
-                    extra={
-                        "evento_id": evento.id,
-                        "lote_id": lote_id,
-                        "instalacion_id": evento.instalacion_sif_id,
-                    },
-                )
-
-            except json.JSONDecodeError as e:
-                stats["errores"] += 1
-                logger.error(
-                    "Error parseando payload del evento",
-                    extra={
-                        "evento_id": evento.id,
-                        "error": str(e),
-                        "error_type": "JSONDecodeError",
-                    },
-                )
-                # Marcar como error y continuar
-                servicio_outbox.marcar_error(evento.id, f"Payload inválido: {e}")
-
-            except Exception as e:
-                stats["errores"] += 1
-                logger.error(
-                    "Error encolando evento",
-                    extra={
-                        "evento_id": evento.id,
-                        "error": str(e),
-                        "error_type": type(e).__name__,
-                    },
-                    exc_info=True,
-                )
-                # Continuar con otros eventos
-                continue
-
-        # PASO 3: Commit de todos los cambios de estado
-        db.commit()
-
-        logger.info(
-            "Dispatcher commit exitoso",
-            extra={"eventos_encolados": stats["encolados"]},
-        )
+    # Solo tras el commit: un rollback devuelve los eventos a 'pendiente'
+    for latencia in latencias:
+        estadisticas_despacho.registrar(latencia)
+    estadisticas_despacho.errores += stats["errores"]
+    estadisticas_despacho.lotes += 1
+
+    logger.info(
+        "Dispatcher commit exitoso",
+        extra={"eventos_encolados": stats["encolados"]},
+    )
+    return stats
+
+
+@typed_task()
+def dispatch_outbox_event(
+    batch_size: int = 10, correlation_id: str | None = None
+) -> None:
+    """
+    Dispatcher: lee eventos pendientes y los encola al worker AEAT.
+
+    GARANTÍA FIFO CRÍTICA (Art. 12):
+    - ORDER BY created_at ASC: respeta orden de creación
+    - Cadena hash nunca se rompe por procesamiento fuera de orden
+
+    Args:
+        batch_size: Número máximo de eventos a procesar por ejecución
+
+    Ejecutar: Cada 5 segundos vía Celery Beat; con settings.dispatcher_continuo,
+    cada settings.dispatcher_sondeo_respaldo como red de seguridad
+    """
+    logger.info("Dispatcher outbox iniciado")
+
+    stats = {"leidos": 0, "encolados": 0, "errores": 0}
+    db: Session = session_factory_sync()
+
+    try:
+        stats = despachar_pendientes(db, batch_size)
 
     except SQLAlchemyError as e:
         # Error de BD: rollback (eventos vuelven a 'pendiente')
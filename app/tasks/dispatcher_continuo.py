@@ -0,0 +1,209 @@
+"""
+app/tasks/dispatcher_continuo.py
+
+CAPA 3: Dispatcher outbox en modo continuo (proceso de larga duración)
+
+Responsabilidades:
+- LISTEN en CANAL_OUTBOX: el trigger trg_outbox_pendiente (migración
+  b4d8e2f6a913) notifica cada vez que un evento queda PENDIENTE
+- Vaciar la cola al recibir la notificación con despachar_pendientes (FOR
+  UPDATE SKIP LOCKED, FIFO), en lotes de tamaño adaptativo: se duplica mientras
+  los lotes salen llenos y se reduce a la mitad cuando salen a medias
+- Sondeo de respaldo cada settings.dispatcher_sondeo_respaldo segundos sin
+  notificaciones (trigger ausente, notificación perdida en una reconexión)
+- Log periódico de los percentiles de latencia de despacho
+  (estadisticas_despacho)
+
+NO gestiona:
+- La lógica de encolado (app.tasks.dispatcher.despachar_pendientes)
+- La red de seguridad de Beat: dispatch_outbox_event sigue programado, cada
+  dispatcher_sondeo_respaldo segundos si settings.dispatcher_continuo
+
+Varias instancias pueden convivir (SKIP LOCKED), igual que con Beat.
+
+Ejecutar:
+    PROCESS_ROLE=dispatcher python -m app.tasks.dispatcher_continuo
+"""
+
+import logging
+import select
+import signal
+import threading
+import time
+from typing import Any, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config.settings import settings
+from app.infrastructure.database import get_sync_engine, session_factory_sync
+from app.tasks.dispatcher import despachar_pendientes, estadisticas_despacho
+
+logger = logging.getLogger(__name__)
+
+# Canal de pg_notify (mismo nombre en el trigger de la migración)
+CANAL_OUTBOX = "outbox_pendiente"
+
+# Espera máxima de cada select(): acota el tiempo de respuesta a SIGTERM
+ESPERA_MAX_SELECT = 1.0
+# Pausa antes de reconectar el LISTEN tras un error de conexión
+PAUSA_RECONEXION = 5.0
+
+
+class TamanoLoteAdaptativo:
+    """
+    Eventos por transacción de despacho.
+
+    Pocos eventos: lotes pequeños (commit pronto, latencia baja). Atasco: lotes
+    grandes (menos commits por evento).
+    """
+
+    def __init__(self, minimo: int, maximo: int):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.actual = minimo
+
+    def ajustar(self, leidos: int) -> None:
+        if leidos >= self.actual:
+            self.actual = min(self.actual * 2, self.maximo)
+        elif leidos < self.actual // 2:
+            self.actual = max(self.actual // 2, self.minimo)
+
+
+class DispatcherContinuo:
+    def __init__(self) -> None:
+        self.tamano = TamanoLoteAdaptativo(
+            settings.dispatcher_lote_min, settings.dispatcher_lote_max
+        )
+        self._parar = threading.Event()
+        self._conexion: Optional[Any] = None  # conexión psycopg2 con LISTEN
+        self._ultimo_vaciado = 0.0
+        self._ultimas_metricas = time.monotonic()
+
+    def parar(self, *args: Any) -> None:
+        logger.info("Parada del dispatcher continuo solicitada")
+        self._parar.set()
+
+    def _escuchar(self) -> None:
+        """Conexión dedicada (fuera del pool) en autocommit con LISTEN"""
+        conexion = get_sync_engine().raw_connection()
+        conexion.detach()  # No vuelve al pool: vive lo que el proceso
+        dbapi = conexion.driver_connection
+        if dbapi is None:
+            raise RuntimeError("Conexión sin conexión DBAPI (psycopg2) subyacente")
+        dbapi.autocommit = True
+        with dbapi.cursor() as cursor:
+            cursor.execute(f"LISTEN {CANAL_OUTBOX}")
+        self._conexion = dbapi
+        logger.info(
+            "Escuchando notificaciones del outbox", extra={"canal": CANAL_OUTBOX}
+        )
+
+    def _cerrar_escucha(self) -> None:
+        if self._conexion is not None:
+            try:
+                self._conexion.close()
+            except Exception:
+                pass
+            self._conexion = None
+
+    def _esperar_notificacion(self) -> bool:
+        """
+        Espera hasta ESPERA_MAX_SELECT segundos.
+
+        Returns:
+            True si llegó al menos una notificación (se descartan: basta con
+            vaciar la cola)
+        """
+        assert self._conexion is not None
+        legibles, _, _ = select.select([self._conexion], [], [], ESPERA_MAX_SELECT)
+        if not legibles:
+            return False
+        self._conexion.poll()
+        recibidas = bool(self._conexion.notifies)
+        self._conexion.notifies.clear()
+        return recibidas
+
+    def vaciar(self) -> None:
+        """Despacha hasta que un lote sale incompleto (cola vacía)"""
+        self._ultimo_vaciado = time.monotonic()
+        while not self._parar.is_set():
+            db: Session = session_factory_sync()
+            try:
+                leidos = despachar_pendientes(db, self.tamano.actual)["leidos"]
+            except Exception as e:
+                db.rollback()
+                logger.error(
+                    "Error despachando eventos, rollback ejecutado",
+                    extra={"error": str(e), "error_type": type(e).__name__},
+                    exc_info=True,
+                )
+                return  # Siguiente notificación o sondeo
+            finally:
+                db.close()
+
+            lleno = leidos >= self.tamano.actual
+            self.tamano.ajustar(leidos)
+            if not lleno:
+                return
+
+    def _publicar_metricas(self) -> None:
+        ahora = time.monotonic()
+        if ahora - self._ultimas_metricas < settings.dispatcher_metricas_intervalo:
+            return
+        self._ultimas_metricas = ahora
+        logger.info(
+            "Latencia de despacho del outbox",
+            extra={
+                "estadisticas": {
+                    **estadisticas_despacho.estadisticas(),
+                    "tamano_lote": self.tamano.actual,
+                }
+            },
+        )
+
+    def ejecutar(self) -> None:
+        while not self._parar.is_set():
+            try:
+                if self._conexion is None:
+                    self._escuchar()
+                    # Lo creado mientras no escuchábamos no se notificará
+                    self.vaciar()
+
+                notificado = self._esperar_notificacion()
+                sondeo = (
+                    time.monotonic() - self._ultimo_vaciado
+                    >= settings.dispatcher_sondeo_respaldo
+                )
+                if notificado or sondeo:
+                    if sondeo and not notificado:
+                        logger.debug("Sondeo de respaldo del outbox")
+                    self.vaciar()
+                self._publicar_metricas()
+
+            except Exception as e:
+                logger.error(
+                    "Conexión LISTEN perdida, reconectando",
+                    extra={"error": str(e), "error_type": type(e).__name__},
+                )
+                self._cerrar_escucha()
+                self._parar.wait(PAUSA_RECONEXION)
+
+        self._cerrar_escucha()
+        logger.info(
+            "Dispatcher continuo detenido",
+            extra={"estadisticas": estadisticas_despacho.estadisticas()},
+        )
+
+
+def main() -> None:
+    from app.core.logging.logging_config import setup_logging
+
+    setup_logging(log_level=settings.log_level, use_json=not settings.debug)
+    dispatcher = DispatcherContinuo()
+    signal.signal(signal.SIGTERM, dispatcher.parar)
+    signal.signal(signal.SIGINT, dispatcher.parar)
+    dispatcher.ejecutar()
+
+
+if __name__ == "__main__":
+    main()
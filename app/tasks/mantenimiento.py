@@ -0,0 +1,132 @@
+"""
+app/tasks/mantenimiento.py
+
+Tareas periódicas de mantenimiento.
+
+Responsabilidades:
+- Volcar el uso de las API keys (write-behind) a instalacion_sif.last_used_at
+- Verificar la cadena de huellas de las instalaciones (incremental, nocturna)
+- Crear y archivar las particiones mensuales de lote_envio y outbox_event
+"""
+
+import logging
+from datetime import date
+from typing import Any, Dict, List, cast
+
+from celery import Task
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.config.settings import settings
+from app.domain.models.models import InstalacionSIF
+from app.domain.services.verificacion_cadena import verificar_instalacion
+from app.infrastructure.database import get_sync_db
+from app.infrastructure.particiones import (
+    archivar_particion,
+    crear_particiones,
+    particiones_a_archivar,
+)
+from app.infrastructure.redis_client import redis_client
+from app.infrastructure.security.uso_api_key import volcar_uso_api_keys
+from app.tasks.decorators import typed_task
+
+logger = logging.getLogger(__name__)
+
+
+@typed_task()
+def volcar_last_used_at() -> int:
+    """
+    Vuelca a BD el último uso de las API keys anotado por la API.
+
+    Un único UPDATE para todas las instalaciones usadas desde el último volcado.
+
+    Ejecutar: Cada settings.auth_last_used_precision segundos vía Celery Beat
+    """
+    with get_sync_db() as db:
+        volcadas = volcar_uso_api_keys(db, redis_client)
+
+    if volcadas:
+        logger.info(
+            "last_used_at volcado",
+            extra={"instalaciones": volcadas},
+        )
+    return volcadas
+
+
+@typed_task()
+def verificar_cadenas() -> int:
+    """
+    Encola la verificación de la cadena de cada instalación.
+
+    Una tarea por instalación: los hijos prefork de Celery no pueden abrir un
+    pool de procesos propio, así que el reparto lo hacen los workers de la cola.
+    Para una ejecución puntual con pool de procesos: scripts/verificar_cadenas.py
+
+    Ejecutar: Cada noche vía Celery Beat
+    """
+    with get_sync_db() as db:
+        instalaciones = list(db.scalars(select(InstalacionSIF.id)))
+
+    for instalacion_id in instalaciones:
+        cast(Task, verificar_cadena_instalacion).apply_async(args=[instalacion_id])
+
+    logger.info(
+        "Verificación de cadenas encolada",
+        extra={"instalaciones": len(instalaciones)},
+    )
+    return len(instalaciones)
+
+
+@typed_task()
+def verificar_cadena_instalacion(instalacion_id: int) -> Dict[str, Any]:
+    """
+    Verifica la cadena de una instalación desde su último punto de control.
+
+    Las roturas se registran con logger.critical en el servicio.
+    """
+    with get_sync_db() as db:
+        resultado = verificar_instalacion(db, instalacion_id)
+
+    return {
+        "instalacion_id": instalacion_id,
+        "verificados": resultado.verificados,
+        "total": resultado.total,
+        "roturas": len(resultado.roturas),
+    }
+
+
+@typed_task()
+def mantener_particiones() -> Dict[str, List[str]]:
+    """
+    Crea las particiones de los próximos meses y archiva las antiguas.
+
+    Una transacción por partición archivada: el DETACH bloquea brevemente la
+    tabla padre y, con lock_timeout, se abandona en lugar de hacer cola detrás
+    de consultas largas (se reintenta la noche siguiente).
+
+    Ejecutar: Cada noche vía Celery Beat
+    """
+    hoy = date.today()
+    with get_sync_db() as db:
+        creadas = crear_particiones(db, hoy, settings.particiones_meses_adelantados)
+        candidatas = particiones_a_archivar(
+            db, hoy, settings.particiones_retencion_meses
+        )
+
+    archivadas = []
+    for particion in candidatas:
+        try:
+            with get_sync_db() as db:
+                if archivar_particion(db, particion):
+                    archivadas.append(particion.nombre)
+        except SQLAlchemyError as e:
+            logger.warning(
+                "No se pudo archivar la partición",
+                extra={"particion": particion.nombre, "error": str(e)},
+            )
+
+    logger.info(
+        "Particiones mantenidas",
+        extra={"creadas": creadas, "archivadas": archivadas},
+    )
+    return {"creadas": creadas, "archivadas": archivadas}
@@ -6,20 +6,25 @@ Tareas de monitoreo y alertas para Outbox Pattern.
 Responsabilidad:
 - Detectar atasco del dispatcher (eventos pendientes > 2 min)
 - Alertar eventos en error final
-- Estadísticas de salud del sistema
+- Estadísticas de salud del sistema (incluidos los percentiles de latencia de
+  despacho del outbox)
 """
 
 import logging
 from datetime import datetime, timedelta, timezone
+from typing import Dict
 
 from sqlalchemy import func, select
 
 from app.domain.models.models import EstadoOutboxEvent, OutboxEvent
-from app.infrastructure.database import get_sync_db
+from app.infrastructure.database import get_sync_db, get_sync_db_lectura
 from app.tasks.decorators import typed_task
 
 logger = logging.getLogger(__name__)
 
+PERCENTILES_DESPACHO = (0.5, 0.95, 0.99)
+VENTANA_LATENCIA_DESPACHO = timedelta(minutes=5)
+
 
 @typed_task()
 def detector_atasco_dispatcher() -> None:
@@ -104,7 +109,8 @@ def alertar_eventos_error() -> None:
     """
     logger.info("Revisor de eventos en error iniciado")
 
-    with get_sync_db() as db:
+    # Solo lectura: réplica si está configurada
+    with get_sync_db_lectura() as db:
         # Contar eventos en error
         count_errores = db.scalar(
             select(func.count()).where(OutboxEvent.estado == EstadoOutboxEvent.ERROR)
@@ -146,7 +152,7 @@ def alertar_eventos_error() -> None:
             logger.debug("No hay eventos en estado ERROR")
 
 
-@typed_task
+@typed_task()
 def estadisticas_salud_outbox() -> dict:
     """
     Genera estadísticas de salud del sistema outbox.
@@ -160,9 +166,10 @@ def estadisticas_salud_outbox() -> dict:
     """
     logger.info("Generando estadísticas de salud del sistema outbox")
 
-    with get_sync_db() as db:
-        # Contar por estado
-        stats = {}
+    # Solo lectura: réplica si está configurada
+    with get_sync_db_lectura() as db:
+        # Contar por estado (conteos enteros; latencias en segundos con decimales)
+        stats: Dict[str, float] = {}
 
         for estado in EstadoOutboxEvent:
             count = db.scalar(select(func.count()).where(OutboxEvent.estado == estado))
@@ -187,6 +194,27 @@ def estadisticas_salud_outbox() -> dict:
         # Total de eventos (histórico)
         stats["total_eventos"] = sum(stats.values())
 
+        # Latencia de despacho (creación → encolado) de todos los dispatchers en
+        # la ventana: primer encolado de cada evento (intentos = 1)
+        latencia = func.extract(
+            "epoch", OutboxEvent.ultimo_intento_at - OutboxEvent.created_at
+        )
+        percentiles = db.execute(
+            select(
+                *(
+                    func.percentile_cont(p).within_group(latencia)
+                    for p in PERCENTILES_DESPACHO
+                )
+            ).where(
+                OutboxEvent.estado != EstadoOutboxEvent.PENDIENTE,
+                OutboxEvent.intentos == 1,
+                OutboxEvent.ultimo_intento_at
+                >= datetime.now(timezone.utc) - VENTANA_LATENCIA_DESPACHO,
+            )
+        ).one()
+        for p, valor in zip(PERCENTILES_DESPACHO, percentiles):
+            stats[f"latencia_despacho_p{int(p * 100)}_s"] = round(valor or 0.0, 3)
+
         logger.info(
             "Estadísticas de salud del sistema outbox generadas",
             extra={"estadisticas": stats},
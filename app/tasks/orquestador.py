@@ -4,7 +4,8 @@ app/tasks/orquestador.py
 CAPA 2: Orquestador por instalación (Worker: orquestador)
 
 Responsabilidad CRÍTICA:
-- Lock exclusivo por instalación (Redis)
+- Lock exclusivo por instalación (Redis o advisory lock de PostgreSQL, según
+  settings.lock_backend) con token de fencing comprobado antes del commit
 - Doble verificación de condiciones de control de flujo
 - Creación atómica: lote + evento outbox en MISMA transacción
 - Commit: AMBAS ENTIDADES o NADA (garantía de integridad de cadena)
@@ -18,42 +19,40 @@ GARANTÍA ABSOLUTA (Art. 12 Reglamento Veri*factu):
 import logging
 from typing import Optional
 
-from redis.lock import Lock as RedisLock
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
 from app.domain.services.lote_service import LoteService
 from app.domain.services.outbox_service import OutboxService
 from app.infrastructure.database import session_factory_sync
-from app.infrastructure.redis_client import redis_client
+from app.infrastructure.locks_instalacion import (
+    LockInstalacionAdquirido,
+    LockPerdido,
+    backend_locks,
+)
 from app.tasks.decorators import BindTask, typed_task
 
 logger = logging.getLogger(__name__)
 
 
-def adquirir_lock_instalacion(instalacion_id: int) -> Optional[RedisLock]:
+def adquirir_lock_instalacion(
+    db: Session, instalacion_id: int
+) -> Optional[LockInstalacionAdquirido]:
     """
     Adquiere lock distribuido exclusivo para una instalación.
 
     Args:
+        db: Sesión del orquestador (backend postgres: el lock vive en su
+            transacción)
         instalacion_id: ID de la instalación SIF
 
     Returns:
-        RedisLock si se adquirió exitosamente
+        Lock con su token de fencing si se adquirió
         None si ya está bloqueado (non-blocking)
     """
-    lock_key = f"sif:{instalacion_id}"
+    lock = backend_locks().adquirir(db, instalacion_id)
 
-    # Crear lock con timeout de 60 segundos (suficiente para crear lote)
-    lock = redis_client.lock(
-        lock_key,
-        timeout=60,  # Auto-release si worker muere
-        blocking=False,  # Non-blocking: retorna inmediatamente
-    )
-
-    acquired = lock.acquire(blocking=False)
-
-    if not acquired:
+    if not lock:
         logger.debug(
             "Lock no disponible, otro worker procesando instalación",
             extra={"instalacion_id": instalacion_id},
@@ -62,7 +61,7 @@ def adquirir_lock_instalacion(instalacion_id: int) -> Optional[RedisLock]:
 
     logger.debug(
         "Lock adquirido para instalación",
-        extra={"instalacion_id": instalacion_id},
+        extra={"instalacion_id": instalacion_id, "fencing_token": lock.token},
     )
     return lock
 
@@ -75,11 +74,12 @@ def orquestar_instalacion(
     Orquesta la creación de lote + evento outbox para una instalación.
 
     FLUJO CRÍTICO (ATOMICIDAD GARANTIZADA):
-    1. Adquirir lock Redis (exclusividad por instalación)
+    1. Adquirir lock (exclusividad por instalación) y su token de fencing
     2. Doble verificación de condiciones de control de flujo
-    3. Crear lote (flush, NO commit)
+    3. Crear lote (una sentencia, NO commit)
     4. Crear evento outbox (flush, NO commit)
-    5. COMMIT ATÓMICO: lote + evento = AMBAS ENTIDADES o NADA
+    5. Verificar el token de fencing y COMMIT ATÓMICO: lote + evento = AMBAS
+       ENTIDADES o NADA
     6. Liberar lock
 
     Args:
@@ -100,12 +100,12 @@ def orquestar_instalacion(
         extra={"instalacion_id": instalacion_sif_id},
     )
 
-    lock: Optional[RedisLock] = None
+    lock: Optional[LockInstalacionAdquirido] = None
     db: Session = session_factory_sync()
 
     try:
         # PASO 1: Adquirir lock exclusivo (non-blocking)
-        lock = adquirir_lock_instalacion(instalacion_sif_id)
+        lock = adquirir_lock_instalacion(db, instalacion_sif_id)
 
         if not lock:
             logger.info(
@@ -124,7 +124,7 @@ def orquestar_instalacion(
             )
             return  # Condiciones cambiaron, skip sin error
 
-        # PASO 3: Crear lote (flush, NO commit)
+        # PASO 3: Crear lote (una sentencia, NO commit)
         lote = servicio_lote.crear_lote_para_instalacion(
             instalacion_sif_id, max_registros=1000
         )
@@ -156,7 +156,9 @@ def orquestar_instalacion(
             },
         )
 
-        # PASO 5: COMMIT ATÓMICO (lote + evento en MISMA transacción)
+        # PASO 5: COMMIT ATÓMICO (lote + evento en MISMA transacción), solo si
+        # ningún otro orquestador ha escrito con un token posterior
+        lock.verificar(db)
         db.commit()
 
         logger.info(
@@ -168,6 +170,18 @@ def orquestar_instalacion(
             },
         )
 
+    except LockPerdido as e:
+        # El lock caducó y otro orquestador lo tiene: su lote prevalece
+        db.rollback()
+        logger.error(
+            "Lock perdido antes del commit, lote descartado",
+            extra={
+                "instalacion_id": instalacion_sif_id,
+                "fencing_token": lock.token if lock else None,
+                "error": str(e),
+            },
+        )
+
     except SQLAlchemyError as e:
         # Error de BD: rollback y reintentar
         db.rollback()
@@ -204,11 +218,7 @@ def orquestar_instalacion(
         # PASO 6: Liberar lock DESPUÉS del commit
         if lock:
             try:
-                lock.release()
-                logger.debug(
-                    "Lock liberado para instalación",
-                    extra={"instalacion_id": instalacion_sif_id},
-                )
+                lock.liberar()
             except Exception as e:
                 logger.warning(
                     "Error al liberar lock para instalación",
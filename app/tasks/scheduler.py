@@ -1,118 +1,143 @@
 """
 app/tasks/scheduler.py
 
-CAPA 1: Planificador ligero (Celery Beat: cada 5 min)
+CAPA 1: Planificador ligero
 
 Responsabilidad ÚNICA:
-- Evaluar condiciones de control de flujo por instalación
+- Despertar las instalaciones cuyo envío vence en el temporizador de Redis
+  (despertar_instalaciones, cada settings.temporizador_intervalo segundos)
+- Seleccionar las instalaciones que cumplen el control de flujo (una consulta,
+  cada 60 s): red de seguridad del temporizador
 - Encolar tareas de orquestación (NO crea lotes aquí)
 
 Garantías:
 - Sin locks (lectura rápida)
 - Sin transacciones pesadas
+- Coste proporcional a las instalaciones con pendientes, no al total
+  (índice parcial idx_cabeza_pendientes de cabeza_cadena_instalacion)
 - Delegación a orquestador por instalación
 """
 
 import logging
-from typing import cast
+from datetime import datetime, timezone
+from typing import List, cast
 from uuid import uuid4
 
 from celery import Task
-from sqlalchemy import select
 
+from app.celery import celery_app
+from app.config.settings import settings
 from app.core.logging.logging_context import set_correlation_id
-from app.domain.models.models import InstalacionSIF
 from app.domain.services.lote_service import LoteService
 from app.infrastructure.database import get_sync_db
+from app.infrastructure.redis_client import redis_client
+from app.infrastructure.temporizador_envios import extraer_vencidas, programar_envio
 from app.tasks.decorators import typed_task
 
 logger = logging.getLogger(__name__)
 
 
-@typed_task
+@typed_task()
 def scheduler_envios_ligero() -> None:
     """
     Scheduler ligero: evalúa condiciones y delega a orquestador.
 
     Responsabilidad:
-    - Leer instalaciones activas
-    - Evaluar condiciones de control de flujo (rápido, sin locks)
-    - Encolar tarea de orquestación por cada instalación que califique
+    - Seleccionar en una consulta las instalaciones que cumplen el control de
+      flujo (LoteService.instalaciones_elegibles)
+    - Encolar una tarea de orquestación por cada una, con una sola conexión
+      al broker
 
     NO hace:
     - Crear lotes (responsabilidad del orquestador)
     - Adquirir locks (responsabilidad del orquestador)
     - Crear eventos outbox (responsabilidad del orquestador)
 
-    Ejecutar: Cada 5 minutos vía Celery Beat
+    Ejecutar: Cada 60 segundos vía Celery Beat
     """
     correlation_id = str(uuid4())
     set_correlation_id(correlation_id)
     logger.info("Scheduler ligero iniciado")
 
-    stats = {
-        "total": 0,
-        "encoladas": 0,
-        "sin_condiciones": 0,
-    }
-
     with get_sync_db() as db:
-        # Obtener todas las instalaciones activas
-        instalaciones = db.scalars(select(InstalacionSIF)).all()
-        stats["total"] = len(instalaciones)
+        elegibles = LoteService(db).instalaciones_elegibles(max_registros=1000)
+
+    encoladas = len(elegibles) - len(_encolar_orquestacion(elegibles, correlation_id))
+
+    logger.info(
+        "Scheduler ligero completado",
+        extra={
+            "elegibles": len(elegibles),
+            "encoladas": encoladas,
+        },
+    )
 
+
+@typed_task()
+def despertar_instalaciones() -> int:
+    """
+    Encola la orquestación de las instalaciones con el envío vencido.
+
+    Extrae del temporizador (atómico: un único proceso por vencimiento) en tandas
+    de settings.temporizador_lote_max hasta vaciar las vencidas. El orquestador
+    vuelve a comprobar el control de flujo dentro del lock.
+
+    Ejecutar: Cada settings.temporizador_intervalo segundos vía Celery Beat
+    """
+    correlation_id = str(uuid4())
+    set_correlation_id(correlation_id)
+
+    total = 0
+    while True:
+        vencidas = extraer_vencidas(redis_client, settings.temporizador_lote_max)
+        fallidas = _encolar_orquestacion(vencidas, correlation_id)
+        # No encoladas: de vuelta al temporizador para el siguiente tick
+        ahora = datetime.now(timezone.utc)
+        for instalacion_id in fallidas:
+            programar_envio(redis_client, instalacion_id, ahora)
+        total += len(vencidas) - len(fallidas)
+        if len(vencidas) < settings.temporizador_lote_max or fallidas:
+            break
+
+    if total:
         logger.info(
-            "Evaluando instalaciones activas",
-            extra={"total_instalaciones": stats["total"]},
+            "Instalaciones despertadas por el temporizador",
+            extra={"encoladas": total},
         )
+    return total
 
-        # Servicio para evaluación de control de flujo (solo lectura)
-        servicio = LoteService(db)
 
-        for ins in instalaciones:
-            try:
-                # Evaluación rápida: ¿cumple condiciones?
-                cumple_condiciones = servicio.control_flujo(ins.id, max_registros=1000)
-
-                if cumple_condiciones:
-                    # Encolar tarea de orquestación (procesamiento pesado)
-                    from app.tasks.orquestador import orquestar_instalacion
-
-                    cast(Task, orquestar_instalacion).apply_async(
-                        args=[ins.id],
-                        kwargs={"correlation_id": correlation_id},
-                    )
-                    stats["encoladas"] += 1
-
-                    logger.info(
-                        "Instalación encolada para orquestación",
-                        extra={"instalacion_id": ins.id},
-                    )
-                else:
-                    stats["sin_condiciones"] += 1
-                    logger.debug(
-                        "Instalación no cumple condiciones, omitida",
-                        extra={"instalacion_id": ins.id},
-                    )
+def _encolar_orquestacion(instalaciones: List[int], correlation_id: str) -> List[int]:
+    """
+    Encola orquestar_instalacion por instalación con una sola conexión al broker.
 
+    Returns:
+        Las instalaciones que no se pudieron encolar
+    """
+    from app.tasks.orquestador import orquestar_instalacion
+
+    errores: List[int] = []
+    if not instalaciones:
+        return errores
+
+    with celery_app.producer_or_acquire() as producer:
+        for instalacion_id in instalaciones:
+            try:
+                cast(Task, orquestar_instalacion).apply_async(
+                    args=[instalacion_id],
+                    kwargs={"correlation_id": correlation_id},
+                    producer=producer,
+                )
             except Exception as e:
-                # Error en evaluación: log y continuar
+                # Error al encolar: log y continuar (el siguiente tick lo reintenta)
+                errores.append(instalacion_id)
                 logger.error(
-                    "Error evaluando instalación",
+                    "Error encolando instalación",
                     extra={
-                        "instalacion_id": ins.id,
+                        "instalacion_id": instalacion_id,
                         "error": str(e),
                         "error_type": type(e).__name__,
                     },
                     exc_info=True,
                 )
-                continue
-
-    logger.info(
-        "Scheduler ligero completado",
-        extra={
-            "total_instalaciones": stats["total"],
-            "encoladas": stats["encoladas"],
-            "sin_condiciones": stats["sin_condiciones"],
-        },
-    )
+    return errores
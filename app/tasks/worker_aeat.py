@@ -10,6 +10,7 @@ Responsabilidad:
 - Procesar respuesta (tiempo 't', estados)
 - Actualizar instalación (ultimo_envio_at, ultimo_tiempo_espera)
 - Marcar evento outbox como 'procesado'
+- Programar el próximo envío en el temporizador (tras el commit)
 
 CRÍTICO para control de flujo:
 - Actualizar instalacion.ultimo_envio_at = now()
@@ -24,7 +25,10 @@ from sqlalchemy.orm import Session
 
 from app.domain.models.models import EstadoLoteEnvio, LoteEnvio
 from app.domain.services.outbox_service import OutboxService
+from app.domain.services.process_lote import CARGA_LOTE, ProcessLoteService
 from app.infrastructure.database import session_factory_sync
+from app.infrastructure.redis_client import redis_client
+from app.infrastructure.temporizador_envios import programar_envio
 from app.tasks.decorators import BindTask, typed_task
 
 logger = logging.getLogger(__name__)
@@ -47,7 +51,7 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
     Flujo:
     1. Obtener lote de BD
     2. Generar XML de envío
-    3. Enviar a AEAT (POST con timeout 60s)
+    3. Enviar a AEAT (POST con timeout settings.aeat_timeout)
     4. Procesar respuesta:
        - lote.tiempo_espera_recibido
        - lote.proximo_envio_permitido_at
@@ -56,6 +60,7 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
     5. Actualizar estados de registros según respuesta
     6. Marcar evento outbox como 'procesado'
     7. COMMIT
+    8. Programar el próximo envío en el temporizador
 
     CRÍTICO: Los campos de instalación controlan el próximo envío.
 
@@ -72,8 +77,8 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
     db: Session = session_factory_sync()
 
     try:
-        # PASO 1: Obtener lote
-        lote = db.get(LoteEnvio, lote_id)
+        # PASO 1: Obtener lote (con instalación y obligado, ver CARGA_LOTE)
+        lote = db.get(LoteEnvio, lote_id, options=CARGA_LOTE)
 
         if not lote:
             logger.error(
@@ -108,9 +113,8 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
         # - Enviar a AEAT
         # - Parsear respuesta
         # - Actualizar BD (lote, registros, instalación)
-        from app.domain.services.process_lote import procesar_lote
-
-        resultado = procesar_lote(lote, db)
+        servicio = ProcessLoteService(db)
+        resultado = servicio.procesar_lote(lote)
 
         # Verificar si fue exitoso
         if not resultado.exitoso:
@@ -186,6 +190,13 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
         # COMMIT final
         db.commit()
 
+        # Después del commit: el temporizador no despierta la instalación con el
+        # estado anterior ni programa un envío de una transacción deshecha
+        if servicio.proximo_envio:
+            programar_envio(
+                redis_client, lote.instalacion_sif_id, servicio.proximo_envio
+            )
+
         # Log de estadísticas (JSON estructurado para métricas)
         logger.info(
             "Estadísticas del lote procesado",
@@ -345,7 +356,7 @@ def enviar_lote_aeat(self: BindTask, lote_id: int, evento_id: int) -> None:
 
 
 # Tarea auxiliar para debugging/testing
-@typed_task
+@typed_task()
 def test_worker_aeat() -> str:
     """
     Tarea de prueba para verificar que el worker AEAT funciona.
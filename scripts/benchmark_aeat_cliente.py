@@ -0,0 +1,111 @@
+"""
+Benchmark de latencia por lote del envío HTTP a AEAT (cliente anterior vs persistente).
+
+Levanta el sustituto local mTLS de SuministroLR (tests/sustituto_aeat.py) y
+envía --lotes veces un XML de --kb KB con:
+
+- anterior: requests.post con cert= en cada lote (handshake TLS completo y
+  carga del certificado por lote)
+- persistente: AEATClient con el cliente del proceso
+  (app/infrastructure/aeat_client/http_client.py): conexión keep-alive
+- reanudada: igual, pero el sustituto cierra cada conexión (como al caducar el
+  keep-alive): handshake abreviado con la sesión TLS anterior
+
+Mide mediana, p95 y máximo. En localhost el handshake solo cuesta CPU; contra
+AEAT cada handshake evitado ahorra además 1-2 viajes de red.
+
+No necesita BD, Redis ni certificados reales.
+
+Uso:
+    python scripts/benchmark_aeat_cliente.py --lotes 200 --kb 500
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import requests
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.domain.models.models import InstalacionSIF  # noqa: E402
+from app.infrastructure.aeat.client import AEATClient  # noqa: E402
+from app.infrastructure.aeat_client.http_client import (  # noqa: E402
+    registro_clientes_aeat,
+)
+from tests.sustituto_aeat import SustitutoAEAT, generar_certificados  # noqa: E402
+
+# isort: on
+
+
+def _medir(enviar: Callable[[], None], lotes: int) -> List[float]:
+    enviar()  # Calentamiento (imports, primer cliente)
+    latencias = []
+    for _ in range(lotes):
+        inicio = time.perf_counter()
+        enviar()
+        latencias.append(time.perf_counter() - inicio)
+    return sorted(latencias)
+
+
+def benchmark(lotes: int, kb: int) -> None:
+    xml = (
+        "<RegFactuSistemaFacturacion>"
+        + "x" * kb * 1024
+        + "</RegFactuSistemaFacturacion>"
+    )
+    with tempfile.TemporaryDirectory() as directorio:
+        certificados = generar_certificados(Path(directorio))
+        with SustitutoAEAT(certificados) as aeat:
+            settings.aeat_url = aeat.url
+            settings.aeat_ca_path = str(certificados.ca)
+            settings.cert_path, settings.cert_key_path = map(str, certificados.cliente)
+            cliente = AEATClient(InstalacionSIF(id=0))
+
+            def anterior() -> None:
+                requests.post(
+                    aeat.url,
+                    data=xml.encode("utf-8"),
+                    headers={"SOAPAction": "SuministroLR"},
+                    cert=tuple(map(str, certificados.cliente)),
+                    timeout=settings.aeat_timeout,
+                    verify=str(certificados.ca),
+                ).raise_for_status()
+
+            def persistente() -> None:
+                assert cliente.enviar_xml(xml).exitoso
+
+            print(f"\n⏱️  {lotes} lotes de {kb} KB contra {aeat.url}\n")
+            print(
+                f"{'cliente':<12} {'mediana ms':>11} {'p95 ms':>8} {'max ms':>8}"
+                f" {'conexiones':>10} {'reanudadas':>10}"
+            )
+            for nombre, enviar, cerrar in (
+                ("anterior", anterior, False),
+                ("persistente", persistente, False),
+                ("reanudada", persistente, True),
+            ):
+                aeat.servidor.cerrar_conexiones = cerrar
+                aeat.servidor.conexiones = aeat.servidor.reanudadas = 0
+                latencias = _medir(enviar, lotes)
+                p95 = latencias[max(0, round(len(latencias) * 0.95) - 1)]
+                print(
+                    f"{nombre:<12} {statistics.median(latencias) * 1000:>11.2f}"
+                    f" {p95 * 1000:>8.2f} {latencias[-1] * 1000:>8.2f}"
+                    f" {aeat.servidor.conexiones:>10} {aeat.servidor.reanudadas:>10}"
+                )
+            registro_clientes_aeat.cerrar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lotes", type=int, default=200)
+    parser.add_argument("--kb", type=int, default=500)
+    args = parser.parse_args()
+    benchmark(args.lotes, args.kb)
@@ -0,0 +1,234 @@
+"""
+Benchmark de concurrencia para la obtención de la huella anterior.
+
+Compara el throughput de creación de registros con N creadores concurrentes sobre
+una misma instalación usando dos estrategias de bloqueo de la cadena:
+
+- ordenacion: SELECT registro_facturacion ORDER BY created_at DESC LIMIT 1
+  FOR UPDATE (estrategia anterior)
+- cabeza: UPDATE cabeza_cadena_instalacion ... RETURNING por clave primaria
+
+ATENCIÓN: crea instalaciones y registros de prueba en la BD del .env (usar solo
+en desarrollo). Se eliminan al terminar.
+
+Uso:
+    python scripts/benchmark_cadena.py --paralelos 8 --facturas 100
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.core.utils.huella import calcular_huella  # noqa: E402
+from app.domain.models.models import (  # noqa: E402
+    CabezaCadenaInstalacion,
+    EstadoRegistroFacturacion,
+    InstalacionSIF,
+    ObligadoTributario,
+    RegistroFacturacion,
+)
+from app.infrastructure.aeat.models.suministro_informacion import (  # noqa: E402
+    ClaveTipoFacturaType,
+    TipoOperacionType,
+)
+from app.infrastructure.repository.cadena_repository import (  # noqa: E402
+    CabezaCadena,
+    avanzar_cabeza_cadena,
+    bloquear_cabeza_cadena,
+)
+from app.infrastructure.security.auth import crear_instalacion_sif  # noqa: E402
+
+# isort: on
+
+ESTRATEGIAS = ("ordenacion", "cabeza")
+
+
+async def _cabeza_por_ordenacion(
+    session: AsyncSession, instalacion_sif_id: int
+) -> CabezaCadena:
+    """Estrategia anterior: último registro por created_at con FOR UPDATE."""
+    anterior = (
+        await session.execute(
+            select(RegistroFacturacion)
+            .where(RegistroFacturacion.instalacion_sif_id == instalacion_sif_id)
+            .order_by(RegistroFacturacion.created_at.desc())
+            .limit(1)
+            .with_for_update()
+        )
+    ).scalar_one_or_none()
+    if not anterior:
+        return CabezaCadena(instalacion_sif_id=instalacion_sif_id)
+    return CabezaCadena(instalacion_sif_id=instalacion_sif_id).avanzar(anterior)
+
+
+async def _crear_registro(
+    session: AsyncSession,
+    instalacion: InstalacionSIF,
+    nif: str,
+    estrategia: str,
+    numero: str,
+) -> None:
+    async with session.begin():
+        if estrategia == "cabeza":
+            cabeza = await bloquear_cabeza_cadena(session, instalacion.id)
+        else:
+            cabeza = await _cabeza_por_ordenacion(session, instalacion.id)
+
+        fecha_hora_gen = cabeza.siguiente_fecha_hora_gen()
+        serie = f"BENCH-{estrategia}"
+        huella = calcular_huella(
+            nif_emisor=nif,
+            numero_serie=f"{serie}{numero}",
+            fecha_expedicion=date.today().strftime("%d-%m-%Y"),
+            tipo_factura=ClaveTipoFacturaType.F2.value,
+            cuota_total=Decimal("21.00"),
+            importe_total=Decimal("121.00"),
+            huella_anterior=cabeza.huella,
+            fecha_hora_gen=fecha_hora_gen,
+        )
+        registro = RegistroFacturacion(
+            instalacion_sif_id=instalacion.id,
+            emisor_nif=nif,
+            serie=serie,
+            numero=numero,
+            fecha_expedicion=date.today(),
+            tipo_operacion=TipoOperacionType.ALTA,
+            tipo_factura=ClaveTipoFacturaType.F2,
+            factura_json={},
+            importe_total=Decimal("121.00"),
+            cuota_total=Decimal("21.00"),
+            huella=huella,
+            anterior_huella=cabeza.huella,
+            anterior_emisor_nif=cabeza.emisor_nif,
+            anterior_serie=cabeza.serie,
+            anterior_numero=cabeza.numero,
+            anterior_fecha_expedicion=cabeza.fecha_expedicion,
+            estado=EstadoRegistroFacturacion.PENDIENTE,
+            created_at=fecha_hora_gen,
+        )
+        session.add(registro)
+        await session.flush()
+        if estrategia == "cabeza":
+            await avanzar_cabeza_cadena(session, cabeza.avanzar(registro), registro.id)
+
+
+async def _ejecutar(
+    session_factory: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSIF,
+    nif: str,
+    estrategia: str,
+    paralelos: int,
+    facturas: int,
+) -> tuple[int, int, float]:
+    """Lanza `paralelos` creadores de `facturas` registros. Devuelve (ok, err, s)."""
+    errores = 0
+
+    async def creador(worker: int) -> None:
+        nonlocal errores
+        async with session_factory() as session:
+            for i in range(facturas):
+                try:
+                    await _crear_registro(
+                        session, instalacion, nif, estrategia, f"{worker}-{i}"
+                    )
+                except IntegrityError:
+                    # Dos creadores leyeron la misma cabeza (anterior_huella única)
+                    errores += 1
+
+    # Primer registro secuencial: con la cadena vacía FOR UPDATE no bloquea nada
+    async with session_factory() as session:
+        await _crear_registro(session, instalacion, nif, estrategia, "seed")
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(creador(w) for w in range(paralelos)))
+    duracion = time.perf_counter() - inicio
+
+    total = paralelos * facturas
+    return total - errores, errores, duracion
+
+
+async def benchmark(paralelos: int, facturas: int) -> None:
+    engine = create_async_engine(
+        settings.database_url, pool_size=paralelos + 2, max_overflow=0
+    )
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    instalaciones: list[int] = []
+
+    try:
+        async with session_factory() as session:
+            obligado = (
+                await session.execute(select(ObligadoTributario).limit(1))
+            ).scalar_one_or_none()
+            if not obligado:
+                print("❌ No hay obligados tributarios: ejecutar scripts/init_db.py")
+                return
+            nif = obligado.nif
+
+            por_estrategia: dict[str, InstalacionSIF] = {}
+            for estrategia in ESTRATEGIAS:
+                _, instalacion = await crear_instalacion_sif(
+                    db=session,
+                    obligado_id=obligado.id,
+                    nombre_sistema_informatico=f"BENCH {estrategia}",
+                )
+                instalaciones.append(instalacion.id)
+                por_estrategia[estrategia] = instalacion
+
+        print(f"\n⏱️  {paralelos} creadores x {facturas} facturas por estrategia\n")
+        print(f"{'estrategia':<12} {'ok':>7} {'errores':>8} {'seg':>8} {'fact/s':>9}")
+        for estrategia in ESTRATEGIAS:
+            ok, errores, duracion = await _ejecutar(
+                session_factory,
+                por_estrategia[estrategia],
+                nif,
+                estrategia,
+                paralelos,
+                facturas,
+            )
+            print(
+                f"{estrategia:<12} {ok:>7} {errores:>8} {duracion:>8.2f} "
+                f"{ok / duracion:>9.1f}"
+            )
+
+    finally:
+        if instalaciones:
+            async with session_factory() as session:
+                async with session.begin():
+                    await session.execute(
+                        delete(RegistroFacturacion).where(
+                            RegistroFacturacion.instalacion_sif_id.in_(instalaciones)
+                        )
+                    )
+                    await session.execute(
+                        delete(CabezaCadenaInstalacion).where(
+                            CabezaCadenaInstalacion.instalacion_sif_id.in_(
+                                instalaciones
+                            )
+                        )
+                    )
+                    await session.execute(
+                        delete(InstalacionSIF).where(
+                            InstalacionSIF.id.in_(instalaciones)
+                        )
+                    )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--paralelos", type=int, default=8)
+    parser.add_argument("--facturas", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.paralelos, args.facturas))
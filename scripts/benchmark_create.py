@@ -0,0 +1,233 @@
+"""
+Benchmark de round-trips a BD por factura creada (POST /v1/create).
+
+Compara dos caminos de creación de un registro sobre una misma instalación:
+
+- anterior: SELECT de duplicados, bloqueo de la cabeza, INSERT (flush), UPDATE de
+  la cabeza, COMMIT y refresh()
+- on_conflict: bloqueo de la cabeza, INSERT ... ON CONFLICT DO NOTHING RETURNING
+  + avance de la cabeza en la misma sentencia, COMMIT
+
+Cuenta los round-trips con eventos del engine (sentencias + BEGIN + COMMIT) e
+incluye un intento duplicado por cada estrategia (camino 409).
+
+ATENCIÓN: crea instalaciones y registros de prueba en la BD del .env (usar solo
+en desarrollo). Se eliminan al terminar.
+
+Uso:
+    python scripts/benchmark_create.py --facturas 500
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.core.utils.huella import calcular_huella  # noqa: E402
+from app.domain.models.models import (  # noqa: E402
+    CabezaCadenaInstalacion,
+    EstadoRegistroFacturacion,
+    InstalacionSIF,
+    ObligadoTributario,
+    RegistroFacturacion,
+)
+from app.infrastructure.aeat.models.suministro_informacion import (  # noqa: E402
+    ClaveTipoFacturaType,
+    TipoOperacionType,
+)
+from app.infrastructure.repository.cadena_repository import (  # noqa: E402
+    avanzar_cabeza_cadena,
+    bloquear_cabeza_cadena,
+    insertar_registro_encadenado,
+)
+from app.infrastructure.security.auth import crear_instalacion_sif  # noqa: E402
+
+# isort: on
+
+ESTRATEGIAS = ("anterior", "on_conflict")
+
+
+class ContadorRoundTrips:
+    """Sentencias, BEGIN y COMMIT/ROLLBACK emitidos por el engine"""
+
+    def __init__(self) -> None:
+        self.total = 0
+
+    def sumar(self, *args: Any, **kwargs: Any) -> None:
+        self.total += 1
+
+
+async def _crear_registro(
+    session: AsyncSession,
+    instalacion_id: int,
+    nif: str,
+    estrategia: str,
+    numero: str,
+) -> bool:
+    """Crea una factura F2 con la estrategia dada. False si estaba duplicada."""
+    fecha = date.today()
+    serie = f"BENCH-{estrategia}"
+
+    if estrategia == "anterior":
+        duplicado = (
+            await session.execute(
+                select(RegistroFacturacion).where(
+                    RegistroFacturacion.instalacion_sif_id == instalacion_id,
+                    RegistroFacturacion.serie == serie,
+                    RegistroFacturacion.numero == numero,
+                    RegistroFacturacion.fecha_expedicion == fecha,
+                )
+            )
+        ).scalar_one_or_none()
+        if duplicado:
+            await session.rollback()
+            return False
+
+    cabeza = await bloquear_cabeza_cadena(session, instalacion_id)
+    fecha_hora_gen = cabeza.siguiente_fecha_hora_gen()
+    huella = calcular_huella(
+        nif_emisor=nif,
+        numero_serie=f"{serie}{numero}",
+        fecha_expedicion=fecha.strftime("%d-%m-%Y"),
+        tipo_factura=ClaveTipoFacturaType.F2.value,
+        cuota_total=Decimal("21.00"),
+        importe_total=Decimal("121.00"),
+        huella_anterior=cabeza.huella,
+        fecha_hora_gen=fecha_hora_gen,
+    )
+    registro = RegistroFacturacion(
+        instalacion_sif_id=instalacion_id,
+        emisor_nif=nif,
+        serie=serie,
+        numero=numero,
+        fecha_expedicion=fecha,
+        tipo_operacion=TipoOperacionType.ALTA,
+        tipo_factura=ClaveTipoFacturaType.F2,
+        factura_json={},
+        importe_total=Decimal("121.00"),
+        cuota_total=Decimal("21.00"),
+        huella=huella,
+        anterior_huella=cabeza.huella,
+        anterior_emisor_nif=cabeza.emisor_nif,
+        anterior_serie=cabeza.serie,
+        anterior_numero=cabeza.numero,
+        anterior_fecha_expedicion=cabeza.fecha_expedicion,
+        estado=EstadoRegistroFacturacion.PENDIENTE,
+        created_at=fecha_hora_gen,
+    )
+
+    if estrategia == "anterior":
+        session.add(registro)
+        await session.flush()
+        await avanzar_cabeza_cadena(session, cabeza.avanzar(registro), registro.id)
+        await session.commit()
+        await session.refresh(registro)
+        return True
+
+    if not await insertar_registro_encadenado(
+        session, registro, cabeza.avanzar(registro)
+    ):
+        await session.rollback()
+        return False
+    await session.commit()
+    return True
+
+
+async def benchmark(facturas: int) -> None:
+    engine = create_async_engine(settings.database_url, pool_size=2)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    contador = ContadorRoundTrips()
+    for evento in ("before_cursor_execute", "begin", "commit", "rollback"):
+        event.listen(engine.sync_engine, evento, contador.sumar)
+    instalaciones: list[int] = []
+
+    try:
+        async with session_factory() as session:
+            obligado = (
+                await session.execute(select(ObligadoTributario).limit(1))
+            ).scalar_one_or_none()
+            if not obligado:
+                print("❌ No hay obligados tributarios: ejecutar scripts/init_db.py")
+                return
+            nif = obligado.nif
+
+            por_estrategia: dict[str, int] = {}
+            for estrategia in ESTRATEGIAS:
+                _, instalacion = await crear_instalacion_sif(
+                    db=session,
+                    obligado_id=obligado.id,
+                    nombre_sistema_informatico=f"BENCH {estrategia}",
+                )
+                instalaciones.append(instalacion.id)
+                por_estrategia[estrategia] = instalacion.id
+
+        print(f"\n⏱️  {facturas} facturas por estrategia (secuencial)\n")
+        print(
+            f"{'estrategia':<12} {'rt/factura':>11} {'rt/409':>7} {'seg':>8} "
+            f"{'fact/s':>9}"
+        )
+        for estrategia in ESTRATEGIAS:
+            instalacion_id = por_estrategia[estrategia]
+            async with session_factory() as session:
+                contador.total = 0
+                inicio = time.perf_counter()
+                for i in range(facturas):
+                    await _crear_registro(
+                        session, instalacion_id, nif, estrategia, str(i)
+                    )
+                duracion = time.perf_counter() - inicio
+                rt_factura = contador.total / facturas
+
+                # Camino 409: repetir la primera factura
+                contador.total = 0
+                creada = await _crear_registro(
+                    session, instalacion_id, nif, estrategia, "0"
+                )
+                assert not creada, "El duplicado no se detectó"
+                rt_duplicado = contador.total
+
+            print(
+                f"{estrategia:<12} {rt_factura:>11.2f} {rt_duplicado:>7} "
+                f"{duracion:>8.2f} {facturas / duracion:>9.1f}"
+            )
+
+    finally:
+        if instalaciones:
+            async with session_factory() as session:
+                async with session.begin():
+                    await session.execute(
+                        delete(RegistroFacturacion).where(
+                            RegistroFacturacion.instalacion_sif_id.in_(instalaciones)
+                        )
+                    )
+                    await session.execute(
+                        delete(CabezaCadenaInstalacion).where(
+                            CabezaCadenaInstalacion.instalacion_sif_id.in_(
+                                instalaciones
+                            )
+                        )
+                    )
+                    await session.execute(
+                        delete(InstalacionSIF).where(
+                            InstalacionSIF.id.in_(instalaciones)
+                        )
+                    )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--facturas", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.facturas))
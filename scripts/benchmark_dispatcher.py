@@ -0,0 +1,212 @@
+"""
+Benchmark de throughput del dispatcher outbox (eventos/s por tamaño de lote).
+
+Despacha --eventos eventos de prueba con despachar_pendientes para cada tamaño
+de lote (--lotes, por defecto 10 a 1000) y mide eventos/s y sentencias SQL por
+evento. Entre tamaños los eventos y sus lotes vuelven a PENDIENTE / CREADO.
+
+Por defecto la publicación en Celery se sustituye por una llamada vacía (mide
+la parte de BD); con --publicar se encolan de verdad en el broker (no arrancar
+workers de envíos: los lotes son ficticios).
+
+ATENCIÓN: crea una instalación, lotes y eventos de prueba en la BD del .env
+(usar solo en desarrollo). Se eliminan al terminar. No se ejecuta si hay otros
+eventos PENDIENTES: el dispatcher los despacharía.
+
+Uso:
+    python scripts/benchmark_dispatcher.py --eventos 5000 --lotes 10 100 1000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Optional
+from unittest import mock
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.domain.models.models import (  # noqa: E402
+    CabezaCadenaInstalacion,
+    EstadoLoteEnvio,
+    EstadoOutboxEvent,
+    InstalacionSIF,
+    LoteEnvio,
+    ObligadoTributario,
+    OutboxEvent,
+)
+from app.infrastructure.database import get_sync_engine  # noqa: E402
+from app.infrastructure.security.auth import crear_instalacion_sif  # noqa: E402
+from app.tasks.dispatcher import despachar_pendientes  # noqa: E402
+from app.tasks.worker_aeat import enviar_lote_aeat  # noqa: E402
+
+# isort: on
+
+LOTES = (10, 50, 100, 500, 1000)
+
+
+class ContadorSentencias:
+    def __init__(self) -> None:
+        self.total = 0
+
+    def sumar(self, *args: Any, **kwargs: Any) -> None:
+        self.total += 1
+
+
+async def _crear_instalacion() -> Optional[int]:
+    engine = create_async_engine(settings.database_url, pool_size=1)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            obligado = (
+                await session.execute(select(ObligadoTributario).limit(1))
+            ).scalar_one_or_none()
+            if not obligado:
+                return None
+            _, instalacion = await crear_instalacion_sif(
+                db=session,
+                obligado_id=obligado.id,
+                nombre_sistema_informatico="BENCH dispatcher",
+            )
+            return instalacion.id
+    finally:
+        await engine.dispose()
+
+
+def _crear_eventos(db: Session, instalacion_id: int, eventos: int) -> None:
+    lote_ids = db.scalars(
+        insert(LoteEnvio).returning(LoteEnvio.id),
+        [
+            {
+                "instalacion_sif_id": instalacion_id,
+                "num_registros": 1,
+                "num_registros_enviados": 1,
+                "endpoint_usado": "",
+            }
+            for _ in range(eventos)
+        ],
+    ).all()
+    db.execute(
+        insert(OutboxEvent),
+        [
+            {
+                "lote_id": lote_id,
+                "instalacion_sif_id": instalacion_id,
+                "estado": EstadoOutboxEvent.PENDIENTE,
+                "task_name": "app.tasks.worker_aeat.enviar_lote_aeat",
+                "payload": f'{{"lote_id": "{lote_id}"}}',
+                "intentos": 0,
+                "max_intentos": 10,
+            }
+            for lote_id in lote_ids
+        ],
+    )
+    db.commit()
+
+
+def _reiniciar(db: Session, instalacion_id: int) -> None:
+    db.execute(
+        update(OutboxEvent)
+        .where(OutboxEvent.instalacion_sif_id == instalacion_id)
+        .values(estado=EstadoOutboxEvent.PENDIENTE, intentos=0)
+    )
+    db.execute(
+        update(LoteEnvio)
+        .where(LoteEnvio.instalacion_sif_id == instalacion_id)
+        .values(estado=EstadoLoteEnvio.CREADO)
+    )
+    db.commit()
+
+
+def _medir(
+    engine: Any, instalacion_id: int, eventos: int, lote: int
+) -> tuple[float, float]:
+    contador = ContadorSentencias()
+    with Session(engine) as db:
+        _reiniciar(db, instalacion_id)
+        event.listen(engine, "before_cursor_execute", contador.sumar)
+        try:
+            despachados = 0
+            inicio = time.perf_counter()
+            while True:
+                stats = despachar_pendientes(db, lote)
+                despachados += stats["encolados"]
+                if stats["leidos"] < lote:
+                    break
+            duracion = time.perf_counter() - inicio
+        finally:
+            event.remove(engine, "before_cursor_execute", contador.sumar)
+    assert despachados == eventos, f"Despachados {despachados} de {eventos}"
+    return eventos / duracion, contador.total / eventos
+
+
+def benchmark(eventos: int, lotes: list[int], publicar: bool) -> None:
+    engine = get_sync_engine()
+    with Session(engine) as db:
+        ajenos = db.scalar(
+            select(func.count()).where(
+                OutboxEvent.estado == EstadoOutboxEvent.PENDIENTE
+            )
+        )
+    if ajenos:
+        print(f"❌ Hay {ajenos} eventos PENDIENTES en la BD: no se ejecuta")
+        return
+
+    instalacion_id = asyncio.run(_crear_instalacion())
+    if instalacion_id is None:
+        print("❌ No hay obligados tributarios: ejecutar scripts/init_db.py")
+        return
+
+    try:
+        with Session(engine) as db:
+            _crear_eventos(db, instalacion_id, eventos)
+
+        print(
+            f"\n⏱️  {eventos} eventos, publicación en Celery:"
+            f" {'sí' if publicar else 'no (sustituida)'}\n"
+        )
+        print(f"{'lote':>6} {'eventos/s':>10} {'sentencias/evento':>18}")
+        for lote in lotes:
+            with ExitStack() as contexto:
+                if not publicar:
+                    contexto.enter_context(
+                        mock.patch.object(enviar_lote_aeat, "apply_async")
+                    )
+                por_segundo, sentencias = _medir(engine, instalacion_id, eventos, lote)
+            print(f"{lote:>6} {por_segundo:>10.0f} {sentencias:>18.2f}")
+
+    finally:
+        with Session(engine) as db, db.begin():
+            db.execute(
+                delete(OutboxEvent).where(
+                    OutboxEvent.instalacion_sif_id == instalacion_id
+                )
+            )
+            db.execute(
+                delete(LoteEnvio).where(LoteEnvio.instalacion_sif_id == instalacion_id)
+            )
+            db.execute(
+                delete(CabezaCadenaInstalacion).where(
+                    CabezaCadenaInstalacion.instalacion_sif_id == instalacion_id
+                )
+            )
+            db.execute(
+                delete(InstalacionSIF).where(InstalacionSIF.id == instalacion_id)
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--eventos", type=int, default=5000)
+    parser.add_argument("--lotes", type=int, nargs="+", default=list(LOTES))
+    parser.add_argument("--publicar", action="store_true")
+    args = parser.parse_args()
+    benchmark(args.eventos, args.lotes, args.publicar)
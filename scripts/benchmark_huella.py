@@ -0,0 +1,131 @@
+"""
+Micro-benchmark del motor de huellas (huellas/s por núcleo).
+
+Variantes:
+- sha256: solo hashlib sobre una cadena ya construida (cota superior)
+- huella_alta: una huella por llamada (camino de POST /v1/create)
+- encadenar: cadena completa en una llamada (lotes, verificación de cadena)
+- traza: huella_alta con traza activada y logging DEBUG a /dev/null
+
+Con --procesos N se ejecuta la misma medida en N procesos a la vez para ver
+el escalado por núcleo (SHA-256 no libera el GIL con cadenas tan cortas).
+
+Uso:
+    python scripts/benchmark_huella.py --huellas 200000 --procesos 4
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.core.utils import huella as modulo_huella  # noqa: E402
+from app.core.utils.huella import EntradaHuella, MotorHuella  # noqa: E402
+
+# isort: on
+
+VARIANTES = ("sha256", "huella_alta", "encadenar", "traza")
+
+
+def _entradas(n: int) -> List[EntradaHuella]:
+    inicio = datetime.now().astimezone()
+    return [
+        EntradaHuella(
+            nif_emisor="89890001K",
+            numero_serie=f"BENCH{i}",
+            fecha_expedicion=(inicio.date() - timedelta(days=i % 30)).strftime(
+                "%d-%m-%Y"
+            ),
+            tipo_factura="F2",
+            cuota_total=Decimal("21.00"),
+            importe_total=Decimal("121.00"),
+            fecha_hora_gen=inicio + timedelta(microseconds=i),
+        )
+        for i in range(n)
+    ]
+
+
+def _medir(variante: str, n: int) -> float:
+    """Huellas/s de una variante en este proceso"""
+    entradas = _entradas(n)
+    motor = MotorHuella()
+    ejecutar: Callable[[], object]
+
+    if variante == "sha256":
+        cadena = motor.cadena_alta(entradas[0], None).encode("utf-8")
+
+        def ejecutar() -> None:
+            for _ in range(n):
+                hashlib.sha256(cadena).hexdigest().upper()
+
+    elif variante == "huella_alta":
+
+        def ejecutar() -> None:
+            anterior = None
+            for entrada in entradas:
+                anterior = motor.huella_alta(entrada, anterior)
+
+    elif variante == "encadenar":
+
+        def ejecutar() -> List[str]:
+            return motor.encadenar(entradas)
+
+    else:
+        motor = MotorHuella(traza=True)
+        manejador = logging.StreamHandler(open(os.devnull, "w"))
+        modulo_huella.logger.addHandler(manejador)
+        modulo_huella.logger.setLevel(logging.DEBUG)
+        modulo_huella.logger.propagate = False
+
+        def ejecutar() -> None:
+            anterior = None
+            for entrada in entradas:
+                anterior = motor.huella_alta(entrada, anterior)
+
+    inicio = time.perf_counter()
+    ejecutar()
+    return n / (time.perf_counter() - inicio)
+
+
+def _medir_args(args: tuple[str, int]) -> float:
+    return _medir(*args)
+
+
+def benchmark(huellas: int, procesos: int) -> None:
+    print(
+        f"\n⏱️  {huellas} huellas por proceso, {procesos} proceso(s)"
+        f" ({os.cpu_count()} CPUs)\n"
+    )
+    print(f"{'variante':<12} {'huellas/s/núcleo':>17} {'huellas/s total':>16}")
+    resultados: Dict[str, List[float]] = {}
+    for variante in VARIANTES:
+        if procesos == 1:
+            resultados[variante] = [_medir(variante, huellas)]
+        else:
+            with Pool(procesos) as pool:
+                resultados[variante] = pool.map(
+                    _medir_args, [(variante, huellas)] * procesos
+                )
+        por_proceso = resultados[variante]
+        print(
+            f"{variante:<12} {sum(por_proceso) / len(por_proceso):>17,.0f}"
+            f" {sum(por_proceso):>16,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--huellas", type=int, default=200_000)
+    parser.add_argument("--procesos", type=int, default=1)
+    args = parser.parse_args()
+    benchmark(args.huellas, args.procesos)
@@ -0,0 +1,231 @@
+"""
+Benchmark de latencia de creación de lote (LoteService.crear_lote_para_instalacion).
+
+Compara dos caminos sobre la misma instalación con --registros PENDIENTES:
+
+- anterior: SELECT ids FOR UPDATE SKIP LOCKED, INSERT lote (ORM + flush),
+  UPDATE ... WHERE id IN (<ids>) y UPDATE del contador
+- cte: una sola sentencia WITH ... UPDATE ... RETURNING (camino actual)
+
+Ambos incluyen el control de flujo. Cada repetición se deshace con ROLLBACK, de
+modo que todas reclaman los mismos registros. Se miden latencia (mediana, p95,
+máximo) y sentencias por lote.
+
+ATENCIÓN: crea una instalación y registros de prueba en la BD del .env (usar solo
+en desarrollo). Se eliminan al terminar. Las huellas son ficticias: la creación
+de lote no las lee.
+
+Uso:
+    python scripts/benchmark_lote.py --registros 1000 --repeticiones 50
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.domain.models.models import (  # noqa: E402
+    CabezaCadenaInstalacion,
+    EstadoRegistroFacturacion,
+    InstalacionSIF,
+    LoteEnvio,
+    ObligadoTributario,
+    RegistroFacturacion,
+)
+from app.domain.services.lote_service import LoteService  # noqa: E402
+from app.infrastructure.aeat.models.suministro_informacion import (  # noqa: E402
+    ClaveTipoFacturaType,
+    TipoOperacionType,
+)
+from app.infrastructure.database import get_sync_engine  # noqa: E402
+from app.infrastructure.security.auth import crear_instalacion_sif  # noqa: E402
+
+# isort: on
+
+ESTRATEGIAS = ("anterior", "cte")
+
+
+class ContadorSentencias:
+    def __init__(self) -> None:
+        self.total = 0
+
+    def sumar(self, *args: Any, **kwargs: Any) -> None:
+        self.total += 1
+
+
+async def _crear_instalacion() -> Optional[tuple[int, str]]:
+    engine = create_async_engine(settings.database_url, pool_size=1)
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            obligado = (
+                await session.execute(select(ObligadoTributario).limit(1))
+            ).scalar_one_or_none()
+            if not obligado:
+                return None
+            _, instalacion = await crear_instalacion_sif(
+                db=session,
+                obligado_id=obligado.id,
+                nombre_sistema_informatico="BENCH lote",
+            )
+            return instalacion.id, obligado.nif
+    finally:
+        await engine.dispose()
+
+
+def _insertar_registros(
+    db: Session, instalacion_id: int, nif: str, registros: int
+) -> None:
+    inicio = datetime.now(timezone.utc)
+    db.execute(
+        insert(RegistroFacturacion),
+        [
+            {
+                "instalacion_sif_id": instalacion_id,
+                "emisor_nif": nif,
+                "serie": "BENCH-lote",
+                "numero": str(i),
+                "fecha_expedicion": date.today(),
+                "tipo_operacion": TipoOperacionType.ALTA,
+                "tipo_factura": ClaveTipoFacturaType.F2,
+                "factura_json": {},
+                "importe_total": Decimal("121.00"),
+                "cuota_total": Decimal("21.00"),
+                "huella": f"{i:064X}",
+                "estado": EstadoRegistroFacturacion.PENDIENTE,
+                "created_at": inicio + timedelta(seconds=i),
+            }
+            for i in range(registros)
+        ],
+    )
+    db.execute(
+        update(CabezaCadenaInstalacion)
+        .where(CabezaCadenaInstalacion.instalacion_sif_id == instalacion_id)
+        .values(registros_pendientes=registros)
+    )
+    db.commit()
+
+
+def _crear_lote_anterior(db: Session, instalacion_id: int, max_registros: int) -> int:
+    """Implementación previa a la sentencia única (referencia)"""
+    if not LoteService(db).control_flujo(instalacion_id, max_registros):
+        return 0
+    registro_ids = list(
+        db.scalars(
+            select(RegistroFacturacion.id)
+            .where(
+                RegistroFacturacion.instalacion_sif_id == instalacion_id,
+                RegistroFacturacion.estado == EstadoRegistroFacturacion.PENDIENTE,
+            )
+            .order_by(RegistroFacturacion.created_at)
+            .limit(max_registros)
+            .with_for_update(skip_locked=True)
+        )
+    )
+    lote = LoteEnvio(
+        instalacion_sif_id=instalacion_id,
+        num_registros=len(registro_ids),
+        num_registros_enviados=len(registro_ids),
+        endpoint_usado="",
+    )
+    db.add(lote)
+    db.flush()
+    db.execute(
+        update(RegistroFacturacion)
+        .where(RegistroFacturacion.id.in_(registro_ids))
+        .values(lote_envio_id=lote.id, estado=EstadoRegistroFacturacion.ENCOLADO)
+    )
+    db.execute(
+        update(CabezaCadenaInstalacion)
+        .where(CabezaCadenaInstalacion.instalacion_sif_id == instalacion_id)
+        .values(
+            registros_pendientes=CabezaCadenaInstalacion.registros_pendientes
+            - len(registro_ids)
+        )
+    )
+    return len(registro_ids)
+
+
+def _crear_lote_cte(db: Session, instalacion_id: int, max_registros: int) -> int:
+    lote = LoteService(db).crear_lote_para_instalacion(instalacion_id, max_registros)
+    return lote.num_registros if lote else 0
+
+
+def benchmark(registros: int, repeticiones: int) -> None:
+    creada = asyncio.run(_crear_instalacion())
+    if creada is None:
+        print("❌ No hay obligados tributarios: ejecutar scripts/init_db.py")
+        return
+    instalacion_id, nif = creada
+
+    engine = get_sync_engine()
+    contador = ContadorSentencias()
+    event.listen(engine, "before_cursor_execute", contador.sumar)
+    caminos = {"anterior": _crear_lote_anterior, "cte": _crear_lote_cte}
+
+    try:
+        with Session(engine) as db:
+            _insertar_registros(db, instalacion_id, nif, registros)
+
+        print(f"\n⏱️  Lote de {registros} registros, {repeticiones} repeticiones\n")
+        print(
+            f"{'estrategia':<10} {'registros':>9} {'sentencias':>10}"
+            f" {'mediana ms':>11} {'p95 ms':>8} {'max ms':>8}"
+        )
+        for estrategia in ESTRATEGIAS:
+            latencias = []
+            encolados = sentencias = 0
+            with Session(engine) as db:
+                for _ in range(repeticiones + 1):
+                    contador.total = 0
+                    inicio = time.perf_counter()
+                    encolados = caminos[estrategia](db, instalacion_id, registros)
+                    latencias.append(time.perf_counter() - inicio)
+                    sentencias = contador.total
+                    db.rollback()
+            # La primera repetición calienta conexión y caché de sentencias
+            latencias = sorted(latencias[1:])
+            p95 = latencias[max(0, round(len(latencias) * 0.95) - 1)]
+            print(
+                f"{estrategia:<10} {encolados:>9} {sentencias:>10}"
+                f" {statistics.median(latencias) * 1000:>11.2f}"
+                f" {p95 * 1000:>8.2f} {latencias[-1] * 1000:>8.2f}"
+            )
+
+    finally:
+        event.remove(engine, "before_cursor_execute", contador.sumar)
+        with Session(engine) as db, db.begin():
+            db.execute(
+                delete(RegistroFacturacion).where(
+                    RegistroFacturacion.instalacion_sif_id == instalacion_id
+                )
+            )
+            db.execute(
+                delete(CabezaCadenaInstalacion).where(
+                    CabezaCadenaInstalacion.instalacion_sif_id == instalacion_id
+                )
+            )
+            db.execute(
+                delete(InstalacionSIF).where(InstalacionSIF.id == instalacion_id)
+            )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--registros", type=int, default=1000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+    benchmark(args.registros, args.repeticiones)
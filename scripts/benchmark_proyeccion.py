@@ -0,0 +1,146 @@
+"""
+Benchmark de proyección de columnas (perfiles de carga de RegistroFacturacion).
+
+Compara, para las consultas de listado (GET /v1/registros) y de creación de
+lote (LoteService), la carga completa del registro (incluidos factura_json, XML y
+respuesta AEAT) frente al perfil que usa cada consulta:
+
+- filas/s: ejecución + materialización ORM de todas las filas
+- bytes: suma de pg_column_size de las filas devueltas (datos que viajan desde
+  PostgreSQL, sin cabeceras de protocolo)
+
+Solo lectura: usa los registros existentes de la instalación indicada (por
+defecto, la que más registros tiene).
+
+Uso:
+    python scripts/benchmark_proyeccion.py --repeticiones 20 --limite 1000
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import undefer_group
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/benchmark_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.config.settings import settings  # noqa: E402
+from app.api.v1.consulta_endpoint import CARGA_LISTADO  # noqa: E402
+from app.domain.models.models import (  # noqa: E402
+    PerfilCargaRegistro,
+    RegistroFacturacion,
+)
+
+# isort: on
+
+CARGA_COMPLETA = (
+    undefer_group(PerfilCargaRegistro.CONTENIDO),
+    undefer_group(PerfilCargaRegistro.AEAT),
+)
+
+
+def _consultas(instalacion_id: int, limite: int) -> dict[str, dict[str, Any]]:
+    listado = (
+        select(RegistroFacturacion)
+        .where(RegistroFacturacion.instalacion_sif_id == instalacion_id)
+        .order_by(RegistroFacturacion.created_at.desc(), RegistroFacturacion.id.desc())
+        .limit(limite)
+    )
+    # Sin FOR UPDATE: el benchmark no debe bloquear registros reales
+    lote = (
+        select(RegistroFacturacion)
+        .where(RegistroFacturacion.instalacion_sif_id == instalacion_id)
+        .order_by(RegistroFacturacion.created_at)
+        .limit(limite)
+    )
+    return {
+        "listado": {
+            "completo": listado.options(*CARGA_COMPLETA),
+            "perfil": listado.options(*CARGA_LISTADO),
+        },
+        "lote": {
+            "completo": lote.options(*CARGA_COMPLETA),
+            "perfil": lote.with_only_columns(RegistroFacturacion.id),
+        },
+    }
+
+
+async def _bytes(session: AsyncSession, stmt: Any) -> int:
+    sql = stmt.compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    total = await session.scalar(
+        text(f"SELECT coalesce(sum(pg_column_size(q.*)), 0) FROM ({sql}) q")
+    )
+    return int(total or 0)
+
+
+async def _filas_por_segundo(
+    session: AsyncSession, stmt: Any, repeticiones: int
+) -> tuple[int, float]:
+    filas = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = await session.execute(stmt)
+        filas = len(resultado.all())
+        session.expunge_all()  # Sin identity map: cada repetición materializa
+    duracion = time.perf_counter() - inicio
+    return filas, filas * repeticiones / duracion if duracion else 0.0
+
+
+async def benchmark(
+    instalacion_id: Optional[int], repeticiones: int, limite: int
+) -> None:
+    engine = create_async_engine(settings.database_url, pool_size=1)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    try:
+        async with session_factory() as session:
+            if instalacion_id is None:
+                instalacion_id = await session.scalar(
+                    select(RegistroFacturacion.instalacion_sif_id)
+                    .group_by(RegistroFacturacion.instalacion_sif_id)
+                    .order_by(func.count().desc())
+                    .limit(1)
+                )
+            if instalacion_id is None:
+                print("❌ No hay registros de facturación en la BD")
+                return
+
+            print(
+                f"\n⏱️  Instalación {instalacion_id}, hasta {limite} filas,"
+                f" {repeticiones} repeticiones\n"
+            )
+            print(
+                f"{'consulta':<9} {'perfil':<9} {'filas':>6} {'filas/s':>10}"
+                f" {'KiB':>10} {'bytes/fila':>11}"
+            )
+            for nombre, variantes in _consultas(instalacion_id, limite).items():
+                for perfil, stmt in variantes.items():
+                    filas, por_segundo = await _filas_por_segundo(
+                        session, stmt, repeticiones
+                    )
+                    bytes_total = await _bytes(session, stmt)
+                    por_fila = bytes_total / filas if filas else 0
+                    print(
+                        f"{nombre:<9} {perfil:<9} {filas:>6} {por_segundo:>10.0f}"
+                        f" {bytes_total / 1024:>10.1f} {por_fila:>11.0f}"
+                    )
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--instalacion", type=int, default=None)
+    parser.add_argument("--repeticiones", type=int, default=20)
+    parser.add_argument("--limite", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.instalacion, args.repeticiones, args.limite))
@@ -0,0 +1,89 @@
+"""
+Vuelca los XML guardados en columnas de texto al almacén de blobs.
+
+Tras la migración d8f1b6c3a520 las filas antiguas siguen teniendo el XML en
+lote_envio.xml_enviado / xml_respuesta y registro_facturacion.xml_respuesta_aeat.
+Este script guarda cada uno en el almacén configurado (settings.blobs_backend),
+rellena <columna>_digest / _tamano y deja la columna de texto a NULL. Por lotes
+de --lote filas, un commit por lote: se puede interrumpir y volver a lanzar.
+
+El espacio se recupera con VACUUM (o VACUUM FULL / pg_repack para devolverlo
+al sistema operativo).
+
+Uso:
+    python scripts/migrar_xml_a_blobs.py --lote 500
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/migrar_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.infrastructure.almacen_blobs import almacen_blobs  # noqa: E402
+from app.infrastructure.database import get_sync_engine  # noqa: E402
+
+# isort: on
+
+COLUMNAS = (
+    ("lote_envio", "xml_enviado"),
+    ("lote_envio", "xml_respuesta"),
+    ("registro_facturacion", "xml_respuesta_aeat"),
+)
+
+
+def migrar_columna(db: Session, tabla: str, columna: str, lote: int) -> int:
+    almacen = almacen_blobs()
+    total = 0
+    while True:
+        filas = db.execute(
+            text(
+                f"SELECT id, {columna} FROM {tabla} WHERE {columna} IS NOT NULL "
+                "LIMIT :lote FOR UPDATE SKIP LOCKED"
+            ),
+            {"lote": lote},
+        ).all()
+        if not filas:
+            return total
+        # Cadena vacía (lotes creados sin XML): solo se limpia
+        refs = almacen.guardar_varios([xml or None for _, xml in filas])
+        db.execute(
+            text(
+                f"UPDATE {tabla} SET {columna} = NULL, "
+                f"{columna}_digest = :digest, {columna}_tamano = :tamano "
+                "WHERE id = :id"
+            ),
+            [
+                {
+                    "id": id_,
+                    "digest": ref.digest if ref else None,
+                    "tamano": ref.tamano if ref else None,
+                }
+                for (id_, _), ref in zip(filas, refs)
+            ],
+        )
+        db.commit()
+        total += len(filas)
+        print(f"  {tabla}.{columna}: {total}", end="\r")
+
+
+def migrar(lote: int) -> None:
+    engine = get_sync_engine()
+    try:
+        with Session(engine) as db:
+            for tabla, columna in COLUMNAS:
+                total = migrar_columna(db, tabla, columna, lote)
+                print(f"✅ {tabla}.{columna}: {total} filas")
+    finally:
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+    migrar(args.lote)
@@ -0,0 +1,70 @@
+"""
+Verificación de la cadena de huellas de las instalaciones.
+
+Recorre cada instalación desde su último punto de control (o desde el principio
+con --desde-cero), repartiendo las instalaciones en --procesos procesos.
+Termina con código 1 si encuentra alguna rotura.
+
+Ejecutar con la misma TZ que la API (FechaHoraHusoGenRegistro es hora local).
+
+Uso:
+    python scripts/verificar_cadenas.py --procesos 4
+    python scripts/verificar_cadenas.py --instalacion 12 --desde-cero
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio raíz al path. Sin esto falla python scripts/verificar_...
+sys.path.insert(0, str(Path(__file__).parent.parent))
+# isort: off
+from app.domain.services.verificacion_cadena import (  # noqa: E402
+    verificar_instalaciones,
+)
+
+# isort: on
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--instalacion",
+        type=int,
+        action="append",
+        help="Instalación a verificar (repetible). Por defecto, todas",
+    )
+    parser.add_argument("--desde-cero", action="store_true")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultados = verificar_instalaciones(
+        instalaciones=args.instalacion,
+        procesos=args.procesos,
+        desde_cero=args.desde_cero,
+    )
+    duracion = time.perf_counter() - inicio
+
+    verificados = sum(r.verificados for r in resultados)
+    roturas = [rotura for r in resultados for rotura in r.roturas]
+    for r in resultados:
+        for rotura in r.roturas:
+            print(
+                f"❌ instalación {r.instalacion_id} posición {rotura.posicion}"
+                f" ({rotura.serie}{rotura.numero}, {rotura.registro_id}):"
+                f" {rotura.motivo} esperado={rotura.esperado}"
+                f" encontrado={rotura.encontrado}"
+            )
+    print(
+        f"\n{len(resultados)} instalaciones, {verificados} registros en"
+        f" {duracion:.1f}s ({verificados / max(duracion, 1e-9):,.0f} registros/s),"
+        f" {len(roturas)} roturas"
+    )
+    return 1 if roturas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Sustituto local HTTPS (mTLS) del endpoint SuministroLR de AEAT.
+
+Genera una CA de pruebas con certificados de servidor (localhost) y de cliente,
+y sirve en un hilo POST → respuesta XML fija exigiendo certificado de cliente.
+Cuenta conexiones TCP y sesiones TLS reanudadas.
+
+Lo usan los tests del cliente AEAT y scripts/benchmark_aeat_cliente.py.
+"""
+
+import datetime as dt
+import ipaddress
+import ssl
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+RESPUESTA_SOAP = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<env:Envelope xmlns:env="http://schemas.xmlsoap.org/soap/envelope/">'
+    "<env:Body><tikR:RespuestaRegFactuSistemaFacturacion "
+    'xmlns:tikR="https://www2.agenciatributaria.gob.es/static_files/common/'
+    'internet/dep/aplicaciones/es/aeat/tike/cont/ws/RespuestaSuministro.xsd">'
+    "<tikR:TiempoEsperaEnvio>60</tikR:TiempoEsperaEnvio>"
+    "<tikR:EstadoEnvio>Correcto</tikR:EstadoEnvio>"
+    "</tikR:RespuestaRegFactuSistemaFacturacion></env:Body></env:Envelope>"
+)
+
+
+@dataclass(frozen=True)
+class CertificadosPrueba:
+    ca: Path
+    servidor: Tuple[Path, Path]  # (certificado, clave)
+    cliente: Tuple[Path, Path]
+
+
+def _clave() -> ec.EllipticCurvePrivateKey:
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def _escribir(
+    directorio: Path, nombre: str, cert: x509.Certificate, clave: Any
+) -> Tuple[Path, Path]:
+    ruta_cert = directorio / f"{nombre}.pem"
+    ruta_clave = directorio / f"{nombre}.key"
+    ruta_cert.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    ruta_clave.write_bytes(
+        clave.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return ruta_cert, ruta_clave
+
+
+def generar_certificados(directorio: Path) -> CertificadosPrueba:
+    ahora = dt.datetime.now(dt.timezone.utc)
+    clave_ca = _clave()
+    nombre_ca = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "CA pruebas")])
+    ca = (
+        x509.CertificateBuilder()
+        .subject_name(nombre_ca)
+        .issuer_name(nombre_ca)
+        .public_key(clave_ca.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(ahora - dt.timedelta(minutes=5))
+        .not_valid_after(ahora + dt.timedelta(days=1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=True,
+                content_commitment=False,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=True,
+                crl_sign=True,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            True,
+        )
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(clave_ca.public_key()), False
+        )
+        .sign(clave_ca, hashes.SHA256())
+    )
+    ruta_ca, _ = _escribir(directorio, "ca", ca, clave_ca)
+
+    def emitir(nombre: str, uso: x509.ObjectIdentifier) -> Tuple[Path, Path]:
+        clave = _clave()
+        constructor = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, nombre)]))
+            .issuer_name(nombre_ca)
+            .public_key(clave.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(ahora - dt.timedelta(minutes=5))
+            .not_valid_after(ahora + dt.timedelta(days=1))
+            .add_extension(x509.ExtendedKeyUsage([uso]), False)
+            .add_extension(
+                x509.AuthorityKeyIdentifier.from_issuer_public_key(
+                    clave_ca.public_key()
+                ),
+                False,
+            )
+        )
+        if nombre == "localhost":
+            constructor = constructor.add_extension(
+                x509.SubjectAlternativeName(
+                    [
+                        x509.DNSName("localhost"),
+                        x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+                    ]
+                ),
+                False,
+            )
+        return _escribir(
+            directorio, nombre, constructor.sign(clave_ca, hashes.SHA256()), clave
+        )
+
+    return CertificadosPrueba(
+        ca=ruta_ca,
+        servidor=emitir("localhost", x509.ExtendedKeyUsageOID.SERVER_AUTH),
+        cliente=emitir("cliente", x509.ExtendedKeyUsageOID.CLIENT_AUTH),
+    )
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # cabeceras y cuerpo en escrituras separadas
+    server: "_Servidor"
+
+    def handle(self) -> None:
+        self.server.registrar_conexion(self.connection)
+        super().handle()
+
+    def do_POST(self) -> None:
+        cuerpo = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.peticiones.append((dict(self.headers), cuerpo))
+        respuesta = self.server.respuesta.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(respuesta)))
+        if self.server.cerrar_conexiones:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(respuesta)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, contexto: ssl.SSLContext) -> None:
+        super().__init__(("127.0.0.1", 0), _Manejador)
+        self.contexto = contexto
+        self.respuesta = RESPUESTA_SOAP
+        self.cerrar_conexiones = False
+        self.peticiones: List[Tuple[dict, bytes]] = []
+        self.conexiones = 0
+        self.reanudadas = 0
+        self._lock = threading.Lock()
+
+    def get_request(self) -> Tuple[Any, Any]:
+        # Handshake en el hilo de la conexión (finish_request), no en accept()
+        sock, direccion = super().get_request()
+        return (
+            self.contexto.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False
+            ),
+            direccion,
+        )
+
+    def finish_request(self, request: Any, client_address: Any) -> None:
+        try:
+            request.do_handshake()
+        except (ssl.SSLError, OSError):
+            return  # Cliente sin certificado válido
+        super().finish_request(request, client_address)
+
+    def registrar_conexion(self, conexion: ssl.SSLSocket) -> None:
+        with self._lock:
+            self.conexiones += 1
+            self.reanudadas += int(conexion.session_reused)
+
+
+class SustitutoAEAT:
+    """Servidor en un hilo: with SustitutoAEAT(certificados) as aeat: aeat.url"""
+
+    def __init__(self, certificados: CertificadosPrueba):
+        contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        contexto.load_cert_chain(*certificados.servidor)
+        contexto.load_verify_locations(cafile=certificados.ca)
+        contexto.verify_mode = ssl.CERT_REQUIRED
+        self.servidor = _Servidor(contexto)
+        self._hilo: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return (
+            f"https://localhost:{self.servidor.server_address[1]}"
+            "/wlpl/TIKE-CONT/ws/SuministroInformacion"
+        )
+
+    def __enter__(self) -> "SustitutoAEAT":
+        self._hilo = threading.Thread(target=self.servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.servidor.shutdown()
+        self.servidor.server_close()
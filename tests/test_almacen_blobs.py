@@ -0,0 +1,94 @@
+"""Tests para el almacén de blobs (backend local y S3 contra un sustituto en memoria)"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict
+
+import httpx
+import pytest
+
+from app.infrastructure.almacen_blobs import (
+    AlmacenBlobsLocal,
+    AlmacenBlobsS3,
+    BlobCorrupto,
+    BlobNoEncontrado,
+    clave_blob,
+)
+
+XML = "<RegistroAlta>" + "<Linea>importe</Linea>" * 500 + "</RegistroAlta>"
+
+
+def test_local_guarda_comprimido_y_deduplica(tmp_path: Path) -> None:
+    almacen = AlmacenBlobsLocal(tmp_path, nivel_zstd=3)
+    ref = almacen.guardar(XML)
+
+    assert ref.digest == hashlib.sha256(XML.encode()).hexdigest()
+    assert ref.tamano == len(XML)
+    fichero = tmp_path / clave_blob(ref.digest)
+    assert fichero.stat().st_size < ref.tamano / 10
+    assert almacen.guardar(XML) == ref
+    assert len(list(tmp_path.rglob("*.zst"))) == 1
+    assert almacen.leer(ref.digest) == XML
+
+
+def test_local_detecta_blob_ausente_o_corrupto(tmp_path: Path) -> None:
+    almacen = AlmacenBlobsLocal(tmp_path, nivel_zstd=3)
+    with pytest.raises(BlobNoEncontrado):
+        almacen.leer("0" * 64)
+
+    ref = almacen.guardar(XML)
+    otro = almacen.guardar("<otro/>")
+    (tmp_path / clave_blob(ref.digest)).write_bytes(
+        (tmp_path / clave_blob(otro.digest)).read_bytes()
+    )
+    with pytest.raises(BlobCorrupto):
+        almacen.leer(ref.digest)
+
+
+class SustitutoS3:
+    """Bucket en memoria: responde HEAD/PUT/GET y exige la firma SigV4"""
+
+    def __init__(self) -> None:
+        self.objetos: Dict[str, bytes] = {}
+        self.puts = 0
+
+    def __call__(self, peticion: httpx.Request) -> httpx.Response:
+        assert peticion.headers["authorization"].startswith(
+            "AWS4-HMAC-SHA256 Credential=clave/"
+        )
+        ruta = peticion.url.path
+        if peticion.method == "PUT":
+            cuerpo = peticion.read()
+            assert peticion.headers["x-amz-content-sha256"] == (
+                hashlib.sha256(cuerpo).hexdigest()
+            )
+            self.objetos[ruta] = cuerpo
+            self.puts += 1
+            return httpx.Response(200)
+        if ruta not in self.objetos:
+            return httpx.Response(404)
+        contenido = self.objetos[ruta] if peticion.method == "GET" else b""
+        return httpx.Response(200, content=contenido)
+
+
+def test_s3_guardar_varios_y_leer() -> None:
+    s3 = SustitutoS3()
+    almacen = AlmacenBlobsS3(
+        endpoint="http://minio:9000",
+        bucket="xml",
+        region="us-east-1",
+        access_key="clave",
+        secret_key="secreto",
+        nivel_zstd=3,
+        concurrencia=4,
+        transport=httpx.MockTransport(s3),
+    )
+    refs = almacen.guardar_varios(["<a/>", None, "<b/>", "<a/>"])
+
+    assert refs[1] is None
+    assert refs[0] == refs[3]
+    assert s3.puts == 2
+    assert f"/xml/{clave_blob(refs[2].digest)}" in s3.objetos
+    assert almacen.leer(refs[2].digest) == "<b/>"
+    with pytest.raises(BlobNoEncontrado):
+        almacen.leer("f" * 64)
@@ -0,0 +1,179 @@
+"""Tests para la caché de autenticación por API key"""
+
+from dataclasses import FrozenInstanceError
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import pytest
+from fastapi.security import HTTPAuthorizationCredentials
+from pytest_mock import MockerFixture
+
+from app.infrastructure.security import auth
+from app.infrastructure.security import auth_cache as modulo_auth_cache
+from app.infrastructure.security.auth_cache import (
+    _LUA_SET_SI_GENERACION,
+    AuthCache,
+    InstalacionSnapshot,
+    ObligadoSnapshot,
+)
+
+
+def _snapshot(key_hash: str = "h1", activo: bool = True) -> InstalacionSnapshot:
+    obligado_id = uuid4()
+    return InstalacionSnapshot(
+        id=1,
+        key_hash=key_hash,
+        obligado_id=obligado_id,
+        cliente_id=None,
+        numero_instalacion="0001",
+        obligado=ObligadoSnapshot(
+            id=obligado_id,
+            nif="89890001K",
+            nombre_razon_social="Panadería Test",
+            activo=activo,
+        ),
+    )
+
+
+def _cache(ttl: int = 30) -> AuthCache:
+    cache = AuthCache(ttl=ttl, redis_ttl=60, max_items=10)
+    # Sin Redis en tests: solo caché en memoria
+    cache._redis_desactivado_hasta = float("inf")
+    return cache
+
+
+def test_snapshot_inmutable_y_serializable() -> None:
+    snapshot = _snapshot()
+    assert InstalacionSnapshot.from_json(snapshot.to_json()) == snapshot
+    with pytest.raises(FrozenInstanceError):
+        snapshot.id = 2  # type: ignore[misc]
+
+
+async def test_entrada_expira_por_ttl() -> None:
+    cache = _cache(ttl=0)
+    await cache.set(_snapshot(), None)
+    assert await cache.get("h1") is None
+    assert cache.estadisticas()["cache_misses"] == 1
+
+
+async def test_invalidar_expulsa_de_memoria(mocker: MockerFixture) -> None:
+    """La invalidación se aplica en local aunque Redis no esté disponible"""
+    mocker.patch(
+        "app.infrastructure.security.auth_cache.redis_async_client.delete",
+        side_effect=ConnectionError("sin redis"),
+    )
+    cache = _cache()
+    await cache.set(_snapshot("h1"), None)
+    await cache.set(_snapshot("h2"), None)
+
+    await cache.invalidar(["h1"])
+
+    assert await cache.get("h1") is None
+    assert await cache.get("h2") is not None
+
+
+class RedisEnMemoria:
+    """Lo justo de redis.asyncio para AuthCache (eval: solo el script de set)"""
+
+    def __init__(self) -> None:
+        self.datos: Dict[str, str] = {}
+        self._pendientes: List[Any] = []
+
+    async def get(self, clave: str) -> Optional[str]:
+        return self.datos.get(clave)
+
+    async def eval(self, script: str, numkeys: int, *args: Any) -> int:
+        assert script == _LUA_SET_SI_GENERACION and numkeys == 2
+        clave, clave_generacion, valor, _, generacion = args
+        if self.datos.get(clave_generacion, "0") != str(generacion):
+            return 0
+        self.datos[clave] = valor
+        return 1
+
+    def pipeline(self, transaction: bool = True) -> "RedisEnMemoria":
+        return self
+
+    def incr(self, clave: str) -> None:
+        self._pendientes.append(
+            lambda: self.datos.update({clave: str(int(self.datos.get(clave, 0)) + 1)})
+        )
+
+    def expire(self, clave: str, segundos: int) -> None:
+        pass
+
+    def delete(self, *claves: str) -> None:
+        self._pendientes.append(lambda: [self.datos.pop(c, None) for c in claves])
+
+    async def execute(self) -> None:
+        for operacion in self._pendientes:
+            operacion()
+        self._pendientes.clear()
+
+    async def publish(self, canal: str, mensaje: str) -> None:
+        pass
+
+
+async def test_snapshot_leido_antes_de_invalidar_no_se_recachea(
+    mocker: MockerFixture,
+) -> None:
+    """Lectura en BD (habilitada) → deshabilitar + commit → invalidar → set"""
+    redis = RedisEnMemoria()
+    mocker.patch.object(modulo_auth_cache, "redis_async_client", redis)
+    cache = AuthCache(ttl=30, redis_ttl=60, max_items=10)
+
+    # Petición A: miss, lee la generación y después la instalación habilitada
+    assert await cache.get("h1") is None
+    generacion = await cache.generacion("h1")
+    snapshot_previo = _snapshot("h1")
+
+    # Mientras tanto se deshabilita la instalación (commit) y se invalida
+    await cache.invalidar(["h1"])
+
+    # A cachea lo que leyó: se descarta en Redis y en memoria
+    await cache.set(snapshot_previo, generacion)
+    assert await cache.get("h1") is None
+    assert cache.estadisticas()["sets_descartados"] == 1
+
+    # Una lectura posterior a la invalidación sí se cachea
+    generacion = await cache.generacion("h1")
+    await cache.set(_snapshot("h1"), generacion)
+    assert "auth:instalacion:h1" in redis.datos
+
+
+class TestVerificarApiKey:
+    """verificar_api_key con la caché"""
+
+    @pytest.fixture
+    def cache(self, mocker: MockerFixture) -> AuthCache:
+        cache = _cache()
+        mocker.patch.object(auth, "auth_cache", cache)
+        return cache
+
+    @staticmethod
+    def _credenciales() -> HTTPAuthorizationCredentials:
+        return HTTPAuthorizationCredentials(scheme="Bearer", credentials="clave")
+
+    async def test_hit_no_accede_a_bd(
+        self, cache: AuthCache, mocker: MockerFixture
+    ) -> None:
+        """Con la key cacheada no hay SELECT ni UPDATE (last_used_at diferido)"""
+        registrar = mocker.patch.object(auth.registro_uso, "registrar")
+        snapshot = _snapshot(auth.hash_api_key("clave"))
+        await cache.set(snapshot, None)
+        db: Any = mocker.AsyncMock()
+
+        resultado = await auth.verificar_api_key(self._credenciales(), db)
+
+        assert resultado is snapshot
+        db.execute.assert_not_awaited()
+        registrar.assert_awaited_once_with(snapshot.id)
+
+    async def test_obligado_inactivo_cacheado_responde_403(
+        self, cache: AuthCache, mocker: MockerFixture
+    ) -> None:
+        await cache.set(_snapshot(auth.hash_api_key("clave"), activo=False), None)
+
+        with pytest.raises(auth.HTTPException) as exc:
+            await auth.verificar_api_key(self._credenciales(), mocker.AsyncMock())
+
+        assert exc.value.status_code == 403
@@ -0,0 +1,126 @@
+"""Tests para la cabeza de cadena de huellas (en memoria, sin BD)"""
+
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Optional
+from uuid import uuid4
+
+from pytest_mock import MockerFixture
+from sqlalchemy.dialects import postgresql
+
+from app.domain.models.models import RegistroFacturacion
+from app.domain.services.lote_service import EstadoControlFlujo
+from app.infrastructure.repository.cadena_repository import (
+    CabezaCadena,
+    insertar_registro_encadenado,
+)
+
+
+def test_cadena_vacia_usa_hora_actual() -> None:
+    """Sin eslabón anterior, el timestamp es la hora actual con zona horaria"""
+    antes = datetime.now().astimezone()
+    fecha = CabezaCadena(instalacion_sif_id=1).siguiente_fecha_hora_gen()
+    assert fecha >= antes
+    assert fecha.tzinfo is not None
+
+
+def test_timestamp_estrictamente_creciente() -> None:
+    """Si el último eslabón está en el futuro (reloj de otro nodo), se supera"""
+    futuro = datetime.now(timezone.utc) + timedelta(minutes=5)
+    cabeza = CabezaCadena(instalacion_sif_id=1, fecha_hora_gen=futuro)
+    assert cabeza.siguiente_fecha_hora_gen() == futuro + timedelta(microseconds=1)
+
+
+def test_avanzar_toma_datos_del_registro() -> None:
+    """avanzar() devuelve una cabeza nueva sin modificar la original"""
+    fecha_hora = datetime.now().astimezone()
+    registro = RegistroFacturacion(
+        emisor_nif="B12345678",
+        serie="A",
+        numero="1",
+        fecha_expedicion=date(2025, 2, 24),
+        importe_total=Decimal("121.00"),
+        huella="A" * 64,
+        created_at=fecha_hora,
+    )
+    cabeza = CabezaCadena(instalacion_sif_id=7)
+    nueva = cabeza.avanzar(registro)
+
+    assert cabeza.huella is None
+    assert nueva.instalacion_sif_id == 7
+    assert nueva.huella == "A" * 64
+    assert nueva.emisor_nif == "B12345678"
+    assert (nueva.serie, nueva.numero) == ("A", "1")
+    assert nueva.fecha_expedicion == date(2025, 2, 24)
+    assert nueva.fecha_hora_gen == fecha_hora
+
+
+def _db(mocker: MockerFixture, registro_id: Optional[Any]) -> Any:
+    resultado = mocker.MagicMock()
+    resultado.one_or_none.return_value = (
+        SimpleNamespace(
+            id=registro_id,
+            registros_pendientes=5,
+            ultimo_envio_at=None,
+            ultimo_tiempo_espera=60,
+        )
+        if registro_id
+        else None
+    )
+    db = mocker.MagicMock()
+    db.execute = mocker.AsyncMock(return_value=resultado)
+    return db
+
+
+def _registro() -> RegistroFacturacion:
+    return RegistroFacturacion(
+        instalacion_sif_id=7,
+        emisor_nif="B12345678",
+        serie="A",
+        numero="1",
+        fecha_expedicion=date(2025, 2, 24),
+        factura_json={},
+        importe_total=Decimal("121.00"),
+        cuota_total=Decimal("21.00"),
+        huella="A" * 64,
+        created_at=datetime.now().astimezone(),
+    )
+
+
+async def test_insertar_registro_encadenado_una_sentencia(
+    mocker: MockerFixture,
+) -> None:
+    """INSERT ON CONFLICT + avance de la cabeza + contador en un solo execute"""
+    registro_id = uuid4()
+    db = _db(mocker, registro_id)
+    registro = _registro()
+
+    creado = await insertar_registro_encadenado(
+        db, registro, CabezaCadena(instalacion_sif_id=7).avanzar(registro)
+    )
+
+    assert creado == EstadoControlFlujo(
+        registros_pendientes=5, ultimo_envio_at=None, ultimo_tiempo_espera=60
+    )
+    assert registro.id == registro_id
+    assert db.execute.await_count == 1
+    sql = str(db.execute.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT ON CONSTRAINT uq_factura_instalacion DO NOTHING" in sql
+    assert "UPDATE cabeza_cadena_instalacion" in sql
+    assert "FROM nuevo" in sql
+    assert "registros_pendientes=(cabeza_cadena_instalacion.registros_pendientes" in sql
+    # instalacion_sif solo se lee: sin row-lock caliente en la ingesta
+    assert "UPDATE instalacion_sif" not in sql
+    assert "FROM cabeza JOIN instalacion_sif" in sql
+
+
+async def test_insertar_registro_duplicado(mocker: MockerFixture) -> None:
+    """Si la restricción descarta la fila, no hay id y se informa duplicado"""
+    registro = _registro()
+    creado = await insertar_registro_encadenado(
+        _db(mocker, None), registro, CabezaCadena(instalacion_sif_id=7)
+    )
+
+    assert creado is None
+    assert registro.id is None
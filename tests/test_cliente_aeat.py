@@ -0,0 +1,77 @@
+"""Tests del cliente HTTP persistente de AEAT contra un sustituto local mTLS"""
+
+import ssl
+from typing import Iterator
+
+import httpx
+import pytest
+
+from app.config.settings import settings
+from app.domain.models.models import InstalacionSIF
+from app.infrastructure.aeat.client import AEATClient
+from app.infrastructure.aeat_client.http_client import registro_clientes_aeat
+from tests.sustituto_aeat import (
+    RESPUESTA_SOAP,
+    CertificadosPrueba,
+    SustitutoAEAT,
+    generar_certificados,
+)
+
+
+@pytest.fixture(scope="module")
+def certificados(tmp_path_factory: pytest.TempPathFactory) -> CertificadosPrueba:
+    return generar_certificados(tmp_path_factory.mktemp("certs"))
+
+
+@pytest.fixture
+def aeat(
+    certificados: CertificadosPrueba, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[SustitutoAEAT]:
+    with SustitutoAEAT(certificados) as sustituto:
+        monkeypatch.setattr(settings, "aeat_url", sustituto.url)
+        monkeypatch.setattr(settings, "aeat_ca_path", str(certificados.ca))
+        monkeypatch.setattr(settings, "cert_path", str(certificados.cliente[0]))
+        monkeypatch.setattr(settings, "cert_key_path", str(certificados.cliente[1]))
+        yield sustituto
+        registro_clientes_aeat.cerrar()
+
+
+def _enviar(xml: str = "<RegFactuSistemaFacturacion/>") -> str:
+    respuesta = AEATClient(InstalacionSIF(id=1)).enviar_xml(xml)
+    assert respuesta.exitoso
+    assert respuesta.xml_respuesta is not None
+    return respuesta.xml_respuesta
+
+
+def test_lotes_sucesivos_reutilizan_la_conexion(aeat: SustitutoAEAT) -> None:
+    assert _enviar() == RESPUESTA_SOAP
+    assert _enviar() == RESPUESTA_SOAP
+
+    assert aeat.servidor.conexiones == 1
+    cabeceras, cuerpo = aeat.servidor.peticiones[-1]
+    assert cabeceras["SOAPAction"] == "SuministroLR"
+    assert cuerpo == b"<RegFactuSistemaFacturacion/>"
+    assert list(registro_clientes_aeat.estadisticas().values()) == [
+        {"handshakes": 1, "reanudadas": 0}
+    ]
+
+
+def test_conexion_nueva_reanuda_la_sesion_tls(aeat: SustitutoAEAT) -> None:
+    aeat.servidor.cerrar_conexiones = True
+    for _ in range(3):
+        _enviar()
+
+    assert aeat.servidor.conexiones == 3
+    assert aeat.servidor.reanudadas == 2
+
+
+def test_sustituto_exige_certificado_de_cliente(
+    aeat: SustitutoAEAT, certificados: CertificadosPrueba
+) -> None:
+    with pytest.raises(httpx.HTTPError):
+        httpx.post(
+            aeat.url,
+            content=b"<x/>",
+            verify=ssl.create_default_context(cafile=certificados.ca),
+        )
+    assert aeat.servidor.peticiones == []
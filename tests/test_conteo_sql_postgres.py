@@ -0,0 +1,323 @@
+"""
+Regresión del número de sentencias SQL en los caminos calientes.
+
+Cuenta las sentencias que llegan a PostgreSQL en create, status, scheduler,
+creación de lote y procesamiento de lote. Si un cambio añade consultas (p. ej. una
+relación que vuelve a cargarse sola, o un N+1), el test falla. Si las reduce, bajar
+el presupuesto.
+
+Requiere Docker (testcontainers), igual que test_instalaciones_postgres.py.
+"""
+
+from contextlib import contextmanager
+from datetime import date
+from typing import Any, AsyncGenerator, Generator, Iterator
+from uuid import UUID
+
+import pytest
+from pytest_mock import MockerFixture
+from sqlalchemy import Engine, create_engine, event, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, joinedload, sessionmaker
+from sqlalchemy.pool import NullPool
+from testcontainers.postgres import PostgresContainer
+
+from app.api.v1.consulta_endpoint import consultar_estado_registro
+from app.api.v1.factura_endpoint import _crear_factura
+from app.core.utils.qr_generator import FormatoQR
+from app.domain.models.models import (
+    Base,
+    ColaboradorSocial,
+    InstalacionSIF,
+    LoteEnvio,
+    ObligadoTributario,
+)
+from app.domain.services.lote_service import LoteService
+from app.domain.services.process_lote import CARGA_LOTE, ProcessLoteService
+from app.infrastructure.aeat.models.respuesta_suministro import (
+    EstadoEnvioType,
+    EstadoRegistroType,
+)
+from app.infrastructure.aeat.response_parser import (
+    ResultadoProcesamiento,
+    ResultadoRegistroOK,
+)
+from app.infrastructure.security.auth import crear_instalacion_sif
+from app.infrastructure.security.auth_cache import InstalacionSnapshot
+from app.sif.models.factura_create import FacturaInput
+
+NUM_FACTURAS = 3
+
+PRESUPUESTO_SQL = {
+    # SELECT de instalaciones elegibles (sin consultas por instalación)
+    "scheduler": 1,
+    # UPDATE cabeza RETURNING + INSERT ON CONFLICT con avance de la cabeza y de
+    # registros_pendientes
+    "create": 2,
+    # SELECT del registro (perfil CARGA_ESTADO)
+    "status": 1,
+    # SELECT instalación + COUNT pendientes + CTE (reclamar registros, INSERT
+    # lote, ENCOLADO, contador)
+    "crear_lote": 3,
+    # SELECT lote (CARGA_LOTE) + SELECT registros + UPDATE xml_enviado
+    # + UPDATE lote + 1 UPDATE por registro + UPDATE instalación
+    "procesar_lote": 5 + NUM_FACTURAS,
+}
+
+
+class ContadorSQL:
+    """Sentencias enviadas por un engine (before_cursor_execute)"""
+
+    def __init__(self, engine: Engine) -> None:
+        self.sentencias: list[str] = []
+        self._activo = False
+        event.listen(engine, "before_cursor_execute", self._registrar)
+
+    def _registrar(self, conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if self._activo:
+            self.sentencias.append(statement)
+
+    @contextmanager
+    def medir(self) -> Iterator[list[str]]:
+        self.sentencias = []
+        self._activo = True
+        try:
+            yield self.sentencias
+        finally:
+            self._activo = False
+
+
+def _comprobar(camino: str, sentencias: list[str]) -> None:
+    presupuesto = PRESUPUESTO_SQL[camino]
+    assert len(sentencias) <= presupuesto, (
+        f"{camino}: {len(sentencias)} sentencias (presupuesto {presupuesto}):\n"
+        + "\n---\n".join(sentencias)
+    )
+
+
+def _factura(numero: str) -> FacturaInput:
+    return FacturaInput.model_validate(
+        {
+            "serie": "SQL",
+            "numero": numero,
+            "fecha_expedicion": date.today().strftime("%d-%m-%Y"),
+            "tipo_factura": "F2",
+            "descripcion": "Factura simplificada",
+            "lineas": [
+                {
+                    "base_imponible": "100",
+                    "tipo_impositivo": "21",
+                    "cuota_repercutida": "21",
+                }
+            ],
+            "importe_total": "121",
+        }
+    )
+
+
+# ==================== FIXTURES ====================
+
+
+@pytest.fixture(scope="module")
+def postgres_container() -> Generator[PostgresContainer, None, None]:
+    with PostgresContainer("postgres:15-alpine", driver="asyncpg") as postgres:
+        yield postgres
+
+
+@pytest.fixture(scope="module")
+def url_async(postgres_container: PostgresContainer) -> str:
+    return postgres_container.get_connection_url()
+
+
+@pytest.fixture
+def sync_engine(url_async: str) -> Generator[Engine, None, None]:
+    engine = create_engine(url_async.replace("+asyncpg", "+psycopg2"))
+    with engine.begin() as conn:
+        conn.execute(text('CREATE EXTENSION IF NOT EXISTS "uuid-ossp"'))
+        Base.metadata.create_all(conn)
+    yield engine
+    with engine.begin() as conn:
+        Base.metadata.drop_all(conn)
+    engine.dispose()
+
+
+@pytest.fixture
+async def async_engine(
+    url_async: str, sync_engine: Engine
+) -> AsyncGenerator[Any, None]:
+    engine = create_async_engine(url_async, poolclass=NullPool)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def sync_sessions(sync_engine: Engine) -> sessionmaker[Session]:
+    # Misma configuración que SyncSessionLocal (workers Celery)
+    return sessionmaker(
+        bind=sync_engine, autoflush=False, autocommit=False, expire_on_commit=False
+    )
+
+
+@pytest.fixture
+def async_sessions(async_engine: Any) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def instalacion(
+    async_sessions: async_sessionmaker[AsyncSession],
+) -> InstalacionSnapshot:
+    async with async_sessions() as db:
+        colaborador = ColaboradorSocial(
+            name="Colaborador",
+            nif="B00000000",
+            software_name="SIF",
+            software_version="1",
+        )
+        db.add(colaborador)
+        await db.flush()
+        obligado = ObligadoTributario(
+            colaborador_id=colaborador.id,
+            nif="89890001K",
+            nombre_razon_social="Panadería Test",
+        )
+        db.add(obligado)
+        await db.flush()
+        _, instalacion_sif = await crear_instalacion_sif(db, obligado.id)
+        instalacion_sif = (
+            await db.execute(
+                select(InstalacionSIF)
+                .options(joinedload(InstalacionSIF.obligado))
+                .where(InstalacionSIF.id == instalacion_sif.id)
+            )
+        ).scalar_one()
+        await db.commit()
+        return InstalacionSnapshot.desde_orm(instalacion_sif)
+
+
+async def _crear_facturas(
+    async_sessions: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSnapshot,
+    contador: ContadorSQL | None = None,
+) -> list[UUID]:
+    uuids = []
+    for i in range(NUM_FACTURAS):
+        async with async_sessions() as db:
+            if contador:
+                with contador.medir() as sentencias:
+                    respuesta = await _crear_factura(
+                        _factura(str(i)), FormatoQR.parsear("none"), instalacion, db
+                    )
+                _comprobar("create", sentencias)
+            else:
+                respuesta = await _crear_factura(
+                    _factura(str(i)), FormatoQR.parsear("none"), instalacion, db
+                )
+            uuids.append(respuesta.uuid)
+    return uuids
+
+
+# ==================== TESTS ====================
+
+
+async def test_create(
+    async_engine: Any,
+    async_sessions: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSnapshot,
+) -> None:
+    contador = ContadorSQL(async_engine.sync_engine)
+    await _crear_facturas(async_sessions, instalacion, contador)
+
+
+async def test_status(
+    async_engine: Any,
+    async_sessions: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSnapshot,
+) -> None:
+    uuids = await _crear_facturas(async_sessions, instalacion)
+    contador = ContadorSQL(async_engine.sync_engine)
+
+    async with async_sessions() as db:
+        with contador.medir() as sentencias:
+            await consultar_estado_registro(
+                uuid=uuids[0], instalacion=instalacion, db=db
+            )
+
+    _comprobar("status", sentencias)
+
+
+async def test_scheduler_elegibles(
+    sync_engine: Engine,
+    sync_sessions: sessionmaker[Session],
+    async_sessions: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSnapshot,
+) -> None:
+    contador = ContadorSQL(sync_engine)
+    with sync_sessions() as db:
+        # Sin registros pendientes: no es elegible
+        assert LoteService(db).instalaciones_elegibles() == []
+
+    await _crear_facturas(async_sessions, instalacion)
+
+    with sync_sessions() as db:
+        with contador.medir() as sentencias:
+            elegibles = LoteService(db).instalaciones_elegibles()
+        # Envío reciente con 't' sin cumplir: deja de ser elegible
+        db.execute(
+            update(InstalacionSIF)
+            .where(InstalacionSIF.id == instalacion.id)
+            .values(ultimo_envio_at=func.now(), ultimo_tiempo_espera=60)
+        )
+        assert LoteService(db).instalaciones_elegibles() == []
+        assert LoteService(db).instalaciones_elegibles(max_registros=NUM_FACTURAS) == [
+            instalacion.id
+        ]
+
+    assert elegibles == [instalacion.id]
+    _comprobar("scheduler", sentencias)
+
+
+async def test_crear_y_procesar_lote(
+    sync_engine: Engine,
+    sync_sessions: sessionmaker[Session],
+    async_sessions: async_sessionmaker[AsyncSession],
+    instalacion: InstalacionSnapshot,
+    mocker: MockerFixture,
+) -> None:
+    uuids = await _crear_facturas(async_sessions, instalacion)
+    contador = ContadorSQL(sync_engine)
+
+    with sync_sessions() as db:
+        with contador.medir() as sentencias:
+            lote = LoteService(db).crear_lote_para_instalacion(instalacion.id)
+        db.commit()
+    assert lote is not None
+    assert lote.num_registros == NUM_FACTURAS
+    _comprobar("crear_lote", sentencias)
+
+    # Sin AEAT: respuesta correcta para todos los registros
+    mocker.patch.object(
+        ProcessLoteService,
+        "_enviar_a_aeat",
+        return_value=ResultadoProcesamiento(
+            exitoso=True,
+            tiempo_espera_segundos=60,
+            estado_envio=EstadoEnvioType.CORRECTO,
+            registros_ok=[
+                ResultadoRegistroOK(
+                    ref_externa=str(u), estado=EstadoRegistroType.CORRECTO
+                )
+                for u in uuids
+            ],
+        ),
+    )
+    with sync_sessions() as db:
+        with contador.medir() as sentencias:
+            # Igual que worker_aeat.enviar_lote_aeat
+            lote_procesar = db.get(LoteEnvio, lote.id, options=CARGA_LOTE)
+            assert lote_procesar is not None
+            resultado = ProcessLoteService(db).procesar_lote(lote_procesar)
+        db.commit()
+
+    assert resultado.exitoso
+    _comprobar("procesar_lote", sentencias)
@@ -0,0 +1,72 @@
+"""Tests para los perfiles de BD por rol de proceso"""
+
+from typing import Generator
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.infrastructure import database
+
+
+@pytest.fixture
+def engines_nuevos() -> Generator[None, None, None]:
+    """Engines creados de cero en el test (y descartados al terminar)"""
+    caches = (
+        database.get_async_engine,
+        database.get_sync_engine,
+        database._async_sessionmaker,
+        database._sync_sessionmaker,
+    )
+    for cache in caches:
+        cache.cache_clear()
+    yield
+    for cache in caches:
+        cache.cache_clear()
+
+
+def test_perfil_del_rol_y_overrides(mocker: MockerFixture) -> None:
+    mocker.patch.object(database.settings, "process_role", "envios")
+    assert database.perfil_bd() == database.PerfilBD(pool_size=1, max_overflow=1)
+
+    mocker.patch.object(database.settings, "db_max_overflow", 0)
+    assert database.perfil_bd().max_overflow == 0
+
+
+def test_modo_pgbouncer_sin_sentencias_preparadas_con_nombre(
+    mocker: MockerFixture,
+) -> None:
+    mocker.patch.object(database.settings, "db_pgbouncer", True)
+    args = database._connect_args_asyncpg()
+
+    assert args["statement_cache_size"] == 0
+    assert args["prepared_statement_cache_size"] == 0
+    nombre = args["prepared_statement_name_func"]
+    assert nombre() != nombre()
+
+
+def test_engine_perezoso_con_pool_del_rol(
+    mocker: MockerFixture, engines_nuevos: None
+) -> None:
+    mocker.patch.object(database.settings, "process_role", "dispatcher")
+    crear = mocker.spy(database, "create_engine")
+
+    database.session_factory_sync().close()
+    database.session_factory_sync().close()
+
+    crear.assert_called_once()
+    assert database.get_sync_engine().pool.size() == 1  # type: ignore[attr-defined]
+
+
+def test_worker_sin_process_role_toma_el_rol_de_su_cola(
+    mocker: MockerFixture,
+) -> None:
+    from app.celery import _rol_desde_cola
+
+    mocker.patch.object(database.settings, "process_role", "api")
+    # Sin PROCESS_ROLE en el entorno (el patch anterior lo marca como fijado)
+    mocker.patch.object(database.settings, "__pydantic_fields_set__", set())
+    _rol_desde_cola(options={"queues": ["envios", "monitoring"]})
+    assert database.settings.process_role == "api"  # Varias colas: sin cambio
+
+    _rol_desde_cola(options={"queues": ["envios"]})
+    assert database.settings.process_role == "envios"
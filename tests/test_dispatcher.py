@@ -0,0 +1,75 @@
+"""Tests para el dispatcher outbox (sentencias por bloque, sin BD ni broker)"""
+
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Any
+from uuid import uuid4
+
+from pytest_mock import MockerFixture
+
+from app.tasks.dispatcher import despachar_pendientes
+from app.tasks.worker_aeat import enviar_lote_aeat
+
+
+def _evento(evento_id: int, payload: str | None = None) -> Any:
+    lote_id = uuid4()
+    return SimpleNamespace(
+        id=evento_id,
+        lote_id=lote_id,
+        instalacion_sif_id=1,
+        max_intentos=10,
+        created_at=datetime.now(timezone.utc),
+        payload=payload or json.dumps({"lote_id": str(lote_id)}),
+    )
+
+
+def test_bloque_en_tres_sentencias(mocker: MockerFixture) -> None:
+    """SELECT FOR UPDATE + UPDATE eventos + UPDATE lotes, sea cual sea el bloque"""
+    publicar = mocker.patch.object(enviar_lote_aeat, "apply_async")
+    eventos = [_evento(i) for i in range(1, 51)]
+    db = mocker.MagicMock()
+    db.execute.return_value.scalars.return_value.all.return_value = eventos
+
+    stats = despachar_pendientes(db, batch_size=50)
+
+    assert stats == {"leidos": 50, "encolados": 50, "errores": 0}
+    assert publicar.call_count == 50
+    assert db.execute.call_count == 3
+    db.commit.assert_called_once()
+
+
+def test_fallo_de_publicacion_no_se_marca(mocker: MockerFixture) -> None:
+    publicar = mocker.patch.object(enviar_lote_aeat, "apply_async")
+    publicar.side_effect = [None, ConnectionError("broker"), None]
+    eventos = [_evento(i) for i in range(1, 4)]
+    db = mocker.MagicMock()
+    db.execute.return_value.scalars.return_value.all.return_value = eventos
+    marcar = mocker.patch(
+        "app.domain.services.outbox_service.OutboxService.marcar_encolados"
+    )
+
+    stats = despachar_pendientes(db, batch_size=10)
+
+    assert stats["encolados"] == 2 and stats["errores"] == 1
+    evento_ids, lote_ids = marcar.call_args.args
+    assert evento_ids == [1, 3]
+    assert lote_ids == [eventos[0].lote_id, eventos[2].lote_id]
+
+
+def test_lotes_bloqueados_antes_de_publicar(mocker: MockerFixture) -> None:
+    """El SELECT bloquea evento y lote; el UPDATE de lotes solo toca CREADO"""
+    from sqlalchemy.dialects import postgresql
+
+    mocker.patch.object(enviar_lote_aeat, "apply_async")
+    db = mocker.MagicMock()
+    db.execute.return_value.scalars.return_value.all.return_value = [_evento(1)]
+
+    despachar_pendientes(db, batch_size=10)
+
+    seleccion, _, actualizacion_lotes = (
+        str(c.args[0].compile(dialect=postgresql.dialect()))
+        for c in db.execute.call_args_list
+    )
+    assert "FOR UPDATE OF outbox_event, lote_envio SKIP LOCKED" in seleccion
+    assert "lote_envio.estado = %(estado_1)s" in actualizacion_lotes
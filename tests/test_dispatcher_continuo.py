@@ -0,0 +1,31 @@
+"""Tests para el dispatcher continuo (tamaño de lote y latencias, sin BD)"""
+
+from app.tasks.dispatcher import EstadisticasDespacho
+from app.tasks.dispatcher_continuo import TamanoLoteAdaptativo
+
+
+def test_tamano_lote_crece_con_atasco_y_baja_sin_el() -> None:
+    tamano = TamanoLoteAdaptativo(minimo=10, maximo=50)
+    for esperado in (20, 40, 50, 50):  # Lotes llenos: duplica hasta el máximo
+        tamano.ajustar(tamano.actual)
+        assert tamano.actual == esperado
+
+    tamano.ajustar(30)  # Más de la mitad: se mantiene
+    assert tamano.actual == 50
+    for esperado in (25, 12, 10, 10):  # Cola casi vacía: vuelve al mínimo
+        tamano.ajustar(1)
+        assert tamano.actual == esperado
+
+
+def test_percentiles_de_latencia() -> None:
+    estadisticas = EstadisticasDespacho()
+    assert estadisticas.estadisticas()["latencia_p95_s"] == 0.0
+
+    for i in range(1, 101):
+        estadisticas.registrar(i / 100)
+    resultado = estadisticas.estadisticas()
+
+    assert resultado["encolados"] == 100
+    assert resultado["latencia_p50_s"] == 0.51
+    assert resultado["latencia_p99_s"] == 1.0
+    assert resultado["latencia_max_s"] == 1.0
@@ -0,0 +1,90 @@
+"""Tests para GET /v1/registros/export (streaming NDJSON/CSV)"""
+
+import csv
+import io
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, List
+from uuid import uuid4
+
+from pytest_mock import MockerFixture
+from sqlalchemy import select
+
+from app.api.v1 import consulta_endpoint
+from app.api.v1.consulta_endpoint import CAMPOS_EXPORT, COLUMNAS_EXPORT
+from app.domain.models.models import EstadoRegistroFacturacion
+
+
+def _fila(numero: str) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=uuid4(),
+        serie="A",
+        numero=numero,
+        fecha_expedicion=date(2025, 2, 24),
+        tipo_factura="F2",
+        tipo_operacion="Alta",
+        estado=EstadoRegistroFacturacion.PENDIENTE,
+        destinatario_nif=None,
+        destinatario_nombre="Cliente, S.L.",
+        cuota_total=Decimal("21.00"),
+        importe_total=Decimal("121.00"),
+        huella="A" * 64,
+        created_at=datetime(2025, 2, 24, 10, tzinfo=timezone.utc),
+    )
+
+
+class ResultadoFalso:
+    def __init__(self, lotes: List[List[SimpleNamespace]]):
+        self.lotes = lotes
+
+    async def partitions(self) -> AsyncIterator[List[SimpleNamespace]]:
+        for lote in self.lotes:
+            yield lote
+
+
+def _sesion(mocker: MockerFixture, lotes: List[List[SimpleNamespace]]) -> Any:
+    session = mocker.MagicMock()
+    session.stream = mocker.AsyncMock(return_value=ResultadoFalso(lotes))
+    session.__aenter__ = mocker.AsyncMock(return_value=session)
+    session.__aexit__ = mocker.AsyncMock(return_value=False)
+    mocker.patch.object(
+        consulta_endpoint,
+        "abrir_sesion_lectura",
+        new_callable=mocker.AsyncMock,
+        return_value=session,
+    )
+    return session
+
+
+async def _consumir(formato: str) -> List[str]:
+    stmt = select(*COLUMNAS_EXPORT)
+    return [
+        trozo async for trozo in consulta_endpoint._exportar_registros(stmt, formato)
+    ]
+
+
+async def test_export_ndjson_un_trozo_por_lote(mocker: MockerFixture) -> None:
+    """Se escribe cada lote del cursor según llega (sin acumular el export)"""
+    session = _sesion(mocker, [[_fila("1"), _fila("2")], [_fila("3")]])
+
+    trozos = await _consumir("ndjson")
+
+    assert len(trozos) == 2
+    lineas = "".join(trozos).splitlines()
+    assert [json.loads(linea)["numero"] for linea in lineas] == ["1", "2", "3"]
+    assert json.loads(lineas[0])["estado"] == EstadoRegistroFacturacion.PENDIENTE.value
+    opciones = session.stream.call_args.args[0].get_execution_options()
+    assert opciones["yield_per"] == consulta_endpoint.EXPORT_YIELD_PER
+
+
+async def test_export_csv_con_cabecera(mocker: MockerFixture) -> None:
+    _sesion(mocker, [[_fila("1")]])
+
+    contenido = "".join(await _consumir("csv"))
+
+    filas = list(csv.DictReader(io.StringIO(contenido)))
+    assert list(filas[0].keys()) == CAMPOS_EXPORT
+    assert filas[0]["destinatario_nombre"] == "Cliente, S.L."
+    assert filas[0]["importe_total"] == "121.00"
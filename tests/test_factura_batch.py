@@ -0,0 +1,76 @@
+"""Tests para la creación de facturas en bloque (sin BD)"""
+
+from typing import Any, List
+from uuid import uuid4
+
+from pytest_mock import MockerFixture
+
+from app.api.v1 import factura_endpoint
+from app.core.utils.qr_generator import FormatoQR
+from app.infrastructure.repository.cadena_repository import CabezaCadena
+from app.infrastructure.security.auth_cache import (
+    InstalacionSnapshot,
+    ObligadoSnapshot,
+)
+from app.sif.models.factura_create import FacturaBatchInput, FacturaInput
+
+FACTURA = {
+    "serie": "A",
+    "numero": "1",
+    "fecha_expedicion": "24-02-2025",
+    "tipo_factura": "F2",
+    "descripcion": "Factura simplificada",
+    "lineas": [
+        {"base_imponible": "100", "tipo_impositivo": "21", "cuota_repercutida": "21"}
+    ],
+    "importe_total": "121",
+}
+
+
+def _instalacion() -> InstalacionSnapshot:
+    obligado_id = uuid4()
+    return InstalacionSnapshot(
+        id=7,
+        key_hash="hash",
+        obligado_id=obligado_id,
+        cliente_id=None,
+        numero_instalacion="0001",
+        obligado=ObligadoSnapshot(
+            id=obligado_id,
+            nif="89890001K",
+            nombre_razon_social="Panadería Test",
+            activo=True,
+        ),
+    )
+
+
+async def test_duplicados_se_buscan_tras_bloquear_la_cabeza(
+    mocker: MockerFixture,
+) -> None:
+    """Un alta concurrente confirmada antes del bloqueo da 409, no un 500"""
+    orden: List[str] = []
+    factura = FacturaInput.model_validate(FACTURA)
+
+    async def bloquear(db: Any, instalacion_sif_id: int) -> CabezaCadena:
+        orden.append("bloquear")
+        return CabezaCadena(instalacion_sif_id=instalacion_sif_id)
+
+    async def buscar(db: Any, instalacion_sif_id: int, claves: Any) -> set:
+        orden.append("duplicados")
+        return {factura_endpoint._clave_factura(factura)}
+
+    mocker.patch.object(factura_endpoint, "bloquear_cabeza_cadena", bloquear)
+    mocker.patch.object(factura_endpoint, "_buscar_duplicados", buscar)
+    db = mocker.AsyncMock()
+
+    respuesta = await factura_endpoint._crear_facturas_batch(
+        FacturaBatchInput(facturas=[factura]),
+        FormatoQR.parsear("none"),
+        _instalacion(),
+        db,
+    )
+
+    assert orden == ["bloquear", "duplicados"]
+    assert respuesta.rechazadas == 1
+    assert respuesta.resultados[0].status_code == 409
+    db.commit.assert_not_awaited()
@@ -0,0 +1,98 @@
+"""Tests para el motor de huellas"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Generator
+
+import pytest
+
+from app.core.utils.huella import (
+    EntradaHuella,
+    MotorHuella,
+    calcular_huella,
+    calcular_huella_alta,
+)
+
+HUELLA_1 = "15D5AE7B10A4E0C9AAE50068C85D2BEF1DBA0240515A933443CE02F3CE5EC220"
+HUELLA_2 = "B48495EC88201536FFBAC2545D6442E9F28CC670195BB31D5828E6D7D4FADF08"
+
+
+@pytest.fixture(autouse=True)
+def zona_madrid(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    """FechaHoraHusoGenRegistro usa la zona horaria local del proceso"""
+    monkeypatch.setenv("TZ", "Europe/Madrid")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _entradas() -> list[EntradaHuella]:
+    return [
+        EntradaHuella(
+            nif_emisor="89890001K",
+            numero_serie="A001",
+            fecha_expedicion="14-11-2024",
+            tipo_factura="F1",
+            cuota_total=Decimal("42"),
+            importe_total=Decimal("242"),
+            fecha_hora_gen=datetime(
+                2024, 11, 14, 10, 30, tzinfo=timezone(timedelta(hours=1))
+            ),
+        ),
+        EntradaHuella(
+            nif_emisor=" 89890001K ",
+            numero_serie="A002",
+            fecha_expedicion="15-11-2024",
+            tipo_factura="F2",
+            cuota_total=Decimal("2.1"),
+            importe_total=Decimal("12.1"),
+            fecha_hora_gen=datetime(2024, 11, 15, 9, 0, tzinfo=timezone.utc),
+        ),
+    ]
+
+
+def test_huellas_de_referencia(capsys: pytest.CaptureFixture[str]) -> None:
+    """Mismo resultado que la implementación anterior y sin escribir en stdout"""
+    primera, segunda = _entradas()
+    h1 = calcular_huella(
+        nif_emisor=primera.nif_emisor,
+        numero_serie=primera.numero_serie,
+        fecha_expedicion=primera.fecha_expedicion,
+        tipo_factura=primera.tipo_factura,
+        cuota_total=primera.cuota_total,
+        importe_total=primera.importe_total,
+        fecha_hora_gen=primera.fecha_hora_gen,
+    )
+    h_alta = calcular_huella_alta(
+        "89890001K",
+        "A001",
+        datetime(2024, 11, 14),
+        "F1",
+        "42.00",
+        "242.00",
+        None,
+        primera.fecha_hora_gen,
+    )
+
+    assert h1 == h_alta == HUELLA_1
+    assert MotorHuella().huella_alta(segunda, h1) == HUELLA_2
+    assert capsys.readouterr().out == ""
+
+
+def test_encadenar_equivale_a_llamadas_sucesivas() -> None:
+    motor = MotorHuella()
+    assert motor.encadenar(_entradas()) == [HUELLA_1, HUELLA_2]
+    assert motor.encadenar(_entradas()[1:], HUELLA_1) == [HUELLA_2]
+
+
+def test_traza_solo_si_se_activa(caplog: pytest.LogCaptureFixture) -> None:
+    entrada = _entradas()[0]
+    with caplog.at_level(logging.DEBUG, logger="app.core.utils.huella"):
+        MotorHuella().huella_alta(entrada)
+        assert caplog.records == []
+
+        MotorHuella(traza=True).huella_alta(entrada)
+        assert "IDEmisorFactura=89890001K" in caplog.text
@@ -0,0 +1,110 @@
+"""Tests para la idempotencia de /create (Idempotency-Key)"""
+
+import asyncio
+from typing import Any, Optional
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from pytest_mock import MockerFixture
+
+from app.api.v1.schemas import FacturaResponse
+from app.infrastructure.idempotencia import IdempotenciaStore
+
+
+class RedisFalso:
+    """Subconjunto de redis.asyncio usado por IdempotenciaStore"""
+
+    def __init__(self) -> None:
+        self.datos: dict[str, str] = {}
+
+    async def get(self, clave: str) -> Optional[str]:
+        return self.datos.get(clave)
+
+    async def set(
+        self, clave: str, valor: str, nx: bool = False, ex: Optional[int] = None
+    ) -> bool:
+        if nx and clave in self.datos:
+            return False
+        self.datos[clave] = valor
+        return True
+
+    async def delete(self, *claves: str) -> int:
+        return sum(self.datos.pop(c, None) is not None for c in claves)
+
+
+@pytest.fixture
+def store(mocker: MockerFixture) -> IdempotenciaStore:
+    mocker.patch("app.infrastructure.idempotencia.redis_async_client", RedisFalso())
+    return IdempotenciaStore(ttl=60, ttl_en_curso=10, espera_max=1.0)
+
+
+def _respuesta() -> FacturaResponse:
+    return FacturaResponse(uuid=uuid4(), url="https://qr", qr=None, huella="abc")
+
+
+async def test_reintento_reproduce_respuesta(store: IdempotenciaStore) -> None:
+    llamadas = 0
+
+    async def crear() -> FacturaResponse:
+        nonlocal llamadas
+        llamadas += 1
+        return _respuesta()
+
+    primera, reproducida1 = await store.ejecutar("a", "k", "h", crear, FacturaResponse)
+    segunda, reproducida2 = await store.ejecutar("a", "k", "h", crear, FacturaResponse)
+
+    assert llamadas == 1
+    assert (reproducida1, reproducida2) == (False, True)
+    assert segunda == primera
+
+
+async def test_duplicados_en_vuelo_esperan_a_la_primera(
+    store: IdempotenciaStore,
+) -> None:
+    llamadas = 0
+
+    async def crear() -> FacturaResponse:
+        nonlocal llamadas
+        llamadas += 1
+        await asyncio.sleep(0.05)
+        return _respuesta()
+
+    resultados: list[Any] = await asyncio.gather(
+        *(store.ejecutar("a", "k", "h", crear, FacturaResponse) for _ in range(3))
+    )
+
+    assert llamadas == 1
+    assert len({r.uuid for r, _ in resultados}) == 1
+    assert sorted(reproducida for _, reproducida in resultados) == [
+        False,
+        True,
+        True,
+    ]
+
+
+async def test_clave_reutilizada_con_otro_cuerpo(store: IdempotenciaStore) -> None:
+    async def crear() -> FacturaResponse:
+        return _respuesta()
+
+    await store.ejecutar("a", "k", "h1", crear, FacturaResponse)
+    with pytest.raises(HTTPException) as exc:
+        await store.ejecutar("a", "k", "h2", crear, FacturaResponse)
+
+    assert exc.value.status_code == 422
+
+
+async def test_error_libera_la_clave(store: IdempotenciaStore) -> None:
+    """Si la primera petición falla, el reintento se ejecuta de nuevo"""
+
+    async def fallar() -> FacturaResponse:
+        raise HTTPException(status_code=400, detail="importe")
+
+    async def crear() -> FacturaResponse:
+        return _respuesta()
+
+    with pytest.raises(HTTPException):
+        await store.ejecutar("a", "k", "h", fallar, FacturaResponse)
+    _, reproducida = await store.ejecutar("a", "k", "h", crear, FacturaResponse)
+
+    assert reproducida is False
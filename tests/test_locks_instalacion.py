@@ -0,0 +1,56 @@
+"""Tests para el lock de orquestación por instalación (sin Redis ni BD)"""
+
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.infrastructure.locks_instalacion import (
+    BackendLocksPostgres,
+    BackendLocksRedis,
+    LockPerdido,
+)
+
+
+def _db(mocker: MockerFixture, *resultados: Any) -> Any:
+    db = mocker.MagicMock()
+    db.scalar.side_effect = list(resultados)
+    return db
+
+
+def test_redis_token_y_fencing(mocker: MockerFixture) -> None:
+    redis = mocker.MagicMock()
+    redis.eval.return_value = 8
+    # Último token aceptado en BD: 7 (se pasa como mínimo al script)
+    lock = BackendLocksRedis(redis).adquirir(_db(mocker, 7, None), 1)
+
+    assert lock is not None
+    assert lock.token == 8
+    assert redis.eval.call_args.args[-1] == 7
+    try:
+        # Otro orquestador ya escribió con un token mayor: el upsert no devuelve fila
+        with pytest.raises(LockPerdido):
+            lock.verificar(_db(mocker, None))
+    finally:
+        lock.liberar()
+
+
+def test_redis_ocupado(mocker: MockerFixture) -> None:
+    redis = mocker.MagicMock()
+    redis.eval.return_value = None
+    assert BackendLocksRedis(redis).adquirir(_db(mocker, None), 1) is None
+
+
+def test_postgres_advisory_lock(mocker: MockerFixture) -> None:
+    backend = BackendLocksPostgres()
+
+    assert backend.adquirir(_db(mocker, False), 1) is None
+
+    db = _db(mocker, True)
+    db.execute.return_value.scalar_one.return_value = 3
+    lock = backend.adquirir(db, 1)
+    assert lock is not None
+    assert lock.token == 3
+    assert "pg_try_advisory_xact_lock" in str(db.scalar.call_args_list[0].args[0])
+    lock.verificar(db)  # Misma transacción: nada que comprobar
+    lock.liberar()
@@ -0,0 +1,28 @@
+"""Tests para el endpoint de métricas internas"""
+
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+
+from app.config.settings import settings
+from app.main import app
+
+
+def test_metrics_sin_token_configurado_no_existe(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "metrics_token", None)
+    assert TestClient(app).get("/metrics").status_code == 404
+
+
+def test_metrics_requiere_token_de_metricas(mocker: MockerFixture) -> None:
+    mocker.patch.object(settings, "metrics_token", "secreto-metricas")
+    cliente = TestClient(app)
+
+    assert cliente.get("/metrics").status_code == 401
+    # Una API key de instalación no sirve: solo el token de métricas
+    otra = cliente.get("/metrics", headers={"Authorization": "Bearer api-key"})
+    assert otra.status_code == 401
+
+    respuesta = cliente.get(
+        "/metrics", headers={"Authorization": "Bearer secreto-metricas"}
+    )
+    assert respuesta.status_code == 200
+    assert "auth" in respuesta.json()
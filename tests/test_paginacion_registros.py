@@ -0,0 +1,27 @@
+"""Tests para la paginación por cursor de GET /v1/registros"""
+
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.consulta_endpoint import codificar_cursor, decodificar_cursor
+
+
+def test_cursor_ida_y_vuelta() -> None:
+    """El cursor conserva created_at (con microsegundos y zona) e id"""
+    created_at = datetime(2025, 2, 24, 10, 30, 15, 123456, tzinfo=timezone.utc)
+    registro_id = uuid4()
+
+    cursor = codificar_cursor(created_at, registro_id)
+
+    assert "=" not in cursor
+    assert decodificar_cursor(cursor) == (created_at, registro_id)
+
+
+@pytest.mark.parametrize("cursor", ["no-es-base64!", "WzFd", "bnVsbA"])
+def test_cursor_invalido_responde_400(cursor: str) -> None:
+    with pytest.raises(HTTPException) as exc:
+        decodificar_cursor(cursor)
+    assert exc.value.status_code == 400
@@ -0,0 +1,26 @@
+"""Tests para el cálculo de particiones mensuales (sin PostgreSQL)"""
+
+from datetime import date
+
+from app.infrastructure.particiones import Particion, meses_a_archivar, sumar_meses
+
+
+def test_sumar_meses_cruza_años() -> None:
+    assert sumar_meses(date(2025, 11, 1), 2) == date(2026, 1, 1)
+    assert sumar_meses(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert sumar_meses(date(2025, 12, 1), 0) == date(2025, 12, 1)
+
+
+def test_nombre_y_limites_de_particion() -> None:
+    particion = Particion("outbox_event", date(2025, 12, 1))
+    assert particion.nombre == "outbox_event_p202512"
+    assert particion.hasta == date(2026, 1, 1)
+
+
+def test_meses_a_archivar_respeta_retencion() -> None:
+    """Retención de 3 meses a 15/05: se archivan las que terminan antes del 01/02"""
+    existentes = [date(2025, m, 1) for m in range(7, 0, -1)]
+    assert meses_a_archivar(existentes, date(2025, 5, 15), 3) == [
+        date(2025, 1, 1),
+    ]
+    assert meses_a_archivar(existentes, date(2025, 5, 15), 12) == []
@@ -0,0 +1,40 @@
+"""Tests para los perfiles de carga de RegistroFacturacion (columnas diferidas)"""
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import undefer_group
+
+from app.api.v1.consulta_endpoint import CARGA_LISTADO
+from app.domain.models.models import PerfilCargaRegistro, RegistroFacturacion
+
+COLUMNAS_PESADAS = (
+    "factura_json",
+    "xml_respuesta_aeat_digest",
+    "respuesta_aeat",
+)
+
+
+def _sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+def test_columnas_pesadas_diferidas_por_defecto() -> None:
+    sql = _sql(select(RegistroFacturacion))
+    for columna in COLUMNAS_PESADAS:
+        assert f"registro_facturacion.{columna}" not in sql
+
+
+def test_perfil_contenido_carga_solo_factura_json() -> None:
+    sql = _sql(
+        select(RegistroFacturacion).options(
+            undefer_group(PerfilCargaRegistro.CONTENIDO)
+        )
+    )
+    assert "registro_facturacion.factura_json" in sql
+    assert "registro_facturacion.xml_respuesta_aeat_digest" not in sql
+
+
+def test_perfil_listado_no_carga_columnas_de_cadena() -> None:
+    sql = _sql(select(RegistroFacturacion).options(*CARGA_LISTADO))
+    assert "registro_facturacion.serie" in sql
+    assert "registro_facturacion.anterior_huella" not in sql
@@ -0,0 +1,113 @@
+"""Tests para el renderizado de QR en pool con caché"""
+
+import asyncio
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from app.core.utils.qr_generator import (
+    FormatoQR,
+    QRRenderer,
+    decodificar_data_uri,
+    generar_qr,
+)
+
+
+def _renderer(cache_max_items: int = 10) -> QRRenderer:
+    renderer = QRRenderer(
+        workers=2,
+        max_pendientes=4,
+        cache_max_items=cache_max_items,
+        cache_ttl=60,
+        usar_procesos=False,
+    )
+    # Sin Redis en tests: solo caché en memoria
+    renderer._redis_desactivado_hasta = float("inf")
+    return renderer
+
+
+async def test_reconsulta_no_vuelve_a_renderizar() -> None:
+    """La segunda petición de la misma URL sale de la caché en memoria"""
+    renderer = _renderer()
+    url = "https://prewww2.aeat.es/wlpl/TIKE-CONT/ValidarQR?nif=89890001K"
+    try:
+        primero = await renderer.generar(url)
+        segundo = await renderer.generar(url)
+    finally:
+        renderer.shutdown()
+
+    assert primero.startswith("data:image/png;base64,")
+    assert segundo == primero
+    stats = renderer.estadisticas()
+    assert stats["cache_misses"] == 1
+    assert stats["cache_hits_memoria"] == 1
+    assert stats["cache_hit_ratio"] == 0.5
+
+
+async def test_peticiones_concurrentes_comparten_render() -> None:
+    """N peticiones simultáneas de la misma URL generan un solo renderizado"""
+    renderer = _renderer()
+    try:
+        resultados = await asyncio.gather(
+            *(renderer.generar("https://ejemplo/qr") for _ in range(5))
+        )
+    finally:
+        renderer.shutdown()
+
+    assert len(set(resultados)) == 1
+    stats = renderer.estadisticas()
+    assert stats["cache_misses"] == 1
+    assert stats["cache_coalescidos"] == 4
+    assert stats["pool_en_curso"] == 0
+
+
+async def test_lru_expulsa_la_entrada_menos_usada() -> None:
+    renderer = _renderer(cache_max_items=2)
+    try:
+        for url in ("https://a", "https://b", "https://c"):
+            await renderer.generar(url)
+    finally:
+        renderer.shutdown()
+
+    assert renderer.estadisticas()["cache_items"] == 2
+    assert renderer._cache_get(QRRenderer.clave("https://a")) is None
+
+
+@pytest.mark.parametrize(
+    "valor,esperado",
+    [
+        ("none", FormatoQR("none")),
+        ("SVG", FormatoQR("svg")),
+        ("png", FormatoQR("png")),
+        ("png@300", FormatoQR("png", 300)),
+    ],
+)
+def test_parsear_formato_qr(valor: str, esperado: FormatoQR) -> None:
+    assert FormatoQR.parsear(valor) == esperado
+
+
+@pytest.mark.parametrize("valor", ["jpg", "svg@300", "png@", "png@abc", "png@10"])
+def test_parsear_formato_qr_invalido(valor: str) -> None:
+    with pytest.raises(ValueError):
+        FormatoQR.parsear(valor)
+
+
+def test_generar_qr_svg_y_png_con_tamano() -> None:
+    """svg devuelve SVG; png@<px> devuelve un PNG de exactamente <px> x <px>"""
+    url = "https://prewww2.aeat.es/wlpl/TIKE-CONT/ValidarQR?nif=89890001K"
+
+    contenido, media_type = decodificar_data_uri(generar_qr(url, formato="svg"))
+    assert media_type == "image/svg+xml"
+    assert b"<svg" in contenido
+
+    contenido, media_type = decodificar_data_uri(generar_qr(url, formato="png@300"))
+    assert media_type == "image/png"
+    assert Image.open(BytesIO(contenido)).size == (300, 300)
+
+
+def test_clave_png_compatible_y_distinta_por_formato() -> None:
+    """png conserva la clave previa (sha256(url)); otros formatos no colisionan"""
+    claves = {QRRenderer.clave("https://a", f) for f in ("png", "svg", "png@300")}
+    assert len(claves) == 3
+    assert QRRenderer.clave("https://a", "png") == QRRenderer.clave("https://a")
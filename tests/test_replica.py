@@ -0,0 +1,62 @@
+"""Tests para el enrutado de lecturas a la réplica"""
+
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+from app.infrastructure import database, lecturas
+from app.infrastructure.lecturas import EscriturasRecientes
+
+
+@pytest.fixture
+def con_replica(mocker: MockerFixture) -> None:
+    mocker.patch.object(
+        database.settings, "database_replica_url", "postgresql+asyncpg://replica/db"
+    )
+
+
+async def test_escritura_reciente_lee_de_la_primaria(
+    con_replica: None, mocker: MockerFixture
+) -> None:
+    """La marca local basta aunque Redis no responda"""
+    mocker.patch.object(
+        lecturas.redis_async_client, "set", side_effect=ConnectionError("sin redis")
+    )
+    escrituras = EscriturasRecientes(ventana=5)
+
+    await escrituras.registrar(7)
+
+    assert await escrituras.reciente(7) is True
+
+
+async def test_sin_escrituras_lee_de_la_replica(
+    con_replica: None, mocker: MockerFixture
+) -> None:
+    mocker.patch.object(
+        lecturas.redis_async_client,
+        "exists",
+        new_callable=mocker.AsyncMock,
+        return_value=0,
+    )
+    assert await EscriturasRecientes(ventana=5).reciente(7) is False
+
+
+async def test_replica_caida_vuelve_a_la_primaria(
+    con_replica: None, mocker: MockerFixture
+) -> None:
+    estado = database.EstadoReplica()
+    mocker.patch.object(database, "estado_replica", estado)
+    replica: Any = mocker.MagicMock()
+    replica.connection = mocker.AsyncMock(side_effect=OSError("connection refused"))
+    replica.close = mocker.AsyncMock()
+    mocker.patch.object(
+        database, "_replica_async_sessionmaker", return_value=lambda: replica
+    )
+    primaria = mocker.sentinel.primaria
+    mocker.patch.object(database, "session_factory_async", return_value=primaria)
+
+    assert await database.abrir_sesion_lectura() is primaria
+    replica.close.assert_awaited_once()
+    assert estado.disponible() is False
+    assert estado.estadisticas()["fallos"] == 1
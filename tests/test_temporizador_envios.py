@@ -0,0 +1,72 @@
+"""Tests para el temporizador de envíos (decisión de programación, sin Redis)"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.domain.services.lote_service import EstadoControlFlujo
+from app.infrastructure.temporizador_envios import envio_tras_ingesta
+
+AHORA = datetime(2025, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _estado(
+    pendientes: int, ultimo_envio_at: Optional[datetime] = None
+) -> EstadoControlFlujo:
+    return EstadoControlFlujo(
+        registros_pendientes=pendientes,
+        ultimo_envio_at=ultimo_envio_at,
+        ultimo_tiempo_espera=60,
+    )
+
+
+def test_cola_vacia_programa_al_vencer_t() -> None:
+    """Primer pendiente: al vencer 't' con margen (60 s → 66 s)"""
+    hace_10s = AHORA - timedelta(seconds=10)
+    assert envio_tras_ingesta(_estado(1, hace_10s), 1, AHORA) == hace_10s + timedelta(
+        seconds=66
+    )
+    # 't' ya cumplido o sin envíos previos: ya
+    assert envio_tras_ingesta(_estado(1, AHORA - timedelta(hours=1)), 1, AHORA) == AHORA
+    assert envio_tras_ingesta(_estado(3), 3, AHORA) == AHORA
+
+
+def test_1000_pendientes_envio_inmediato() -> None:
+    reciente = AHORA - timedelta(seconds=1)
+    assert envio_tras_ingesta(_estado(1000, reciente), 1, AHORA) == AHORA
+    # Bloque que cruza el umbral
+    assert envio_tras_ingesta(_estado(1200, reciente), 500, AHORA) == AHORA
+
+
+def test_sin_transicion_no_programa() -> None:
+    """Cola ya no vacía y por debajo (o ya por encima) del umbral: ya programado"""
+    reciente = AHORA - timedelta(seconds=1)
+    assert envio_tras_ingesta(_estado(5, reciente), 1, AHORA) is None
+    assert envio_tras_ingesta(_estado(1500, reciente), 1, AHORA) is None
+
+
+def test_entradas_de_beat_registradas_en_celery() -> None:
+    """Cada entrada de Beat (p. ej. "despertar-instalaciones") resuelve a una tarea"""
+    # Registran las tareas (como el include de cada worker)
+    import app.tasks.dispatcher  # noqa: F401
+    import app.tasks.mantenimiento  # noqa: F401
+    import app.tasks.monitoring  # noqa: F401
+    import app.tasks.scheduler  # noqa: F401
+    from app.celery import celery_app
+
+    assert "app.tasks.scheduler.despertar_instalaciones" in celery_app.tasks
+    for nombre, entrada in celery_app.conf.beat_schedule.items():
+        assert entrada["task"] in celery_app.tasks, nombre
+
+
+def test_intervalos_de_beat_salen_de_settings() -> None:
+    """Las entradas configurables se añaden al configurarse la app, no al importar"""
+    from app.celery import celery_app
+    from app.config.settings import settings
+
+    programacion = celery_app.conf.beat_schedule
+    assert (
+        programacion["despertar-instalaciones"]["schedule"]
+        == settings.temporizador_intervalo
+    )
+    assert "dispatcher-outbox" in programacion
+    assert "volcar-last-used-at" in programacion
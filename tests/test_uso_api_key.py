@@ -0,0 +1,71 @@
+"""Tests para el registro diferido de last_used_at"""
+
+from typing import Any
+
+from pytest_mock import MockerFixture
+
+from app.infrastructure.security.uso_api_key import (
+    CLAVE_REDIS_USO,
+    RegistroUso,
+    volcar_uso_api_keys,
+)
+
+
+async def test_una_anotacion_por_instalacion_y_periodo(mocker: MockerFixture) -> None:
+    hset = mocker.patch(
+        "app.infrastructure.security.uso_api_key.redis_async_client.hset",
+        new_callable=mocker.AsyncMock,
+    )
+    registro = RegistroUso(precision=60)
+
+    for _ in range(5):
+        await registro.registrar(1)
+    await registro.registrar(2)
+
+    assert hset.await_count == 2
+    assert registro.estadisticas() == {
+        "anotaciones": 2,
+        "omitidas": 4,
+        "instalaciones": 2,
+    }
+
+
+def _redis(mocker: MockerFixture, pendientes: dict[str, str]) -> Any:
+    redis = mocker.MagicMock()
+    redis.pipeline.return_value.execute.return_value = [pendientes, 1]
+    return redis
+
+
+def test_volcado_un_solo_update(mocker: MockerFixture) -> None:
+    """Todas las instalaciones tocadas se actualizan en una sola sentencia"""
+    redis = _redis(mocker, {"1": "1700000000.0", "2": "1700000030.5"})
+    db = mocker.MagicMock()
+
+    assert volcar_uso_api_keys(db, redis) == 2
+
+    assert db.execute.call_count == 1
+    sql = str(db.execute.call_args.args[0])
+    assert "UPDATE instalacion_sif" in sql
+    assert "FROM (VALUES" in sql
+
+
+def test_volcado_sin_pendientes_no_toca_bd(mocker: MockerFixture) -> None:
+    db = mocker.MagicMock()
+    assert volcar_uso_api_keys(db, _redis(mocker, {})) == 0
+    db.execute.assert_not_called()
+
+
+def test_volcado_fallido_devuelve_anotaciones(mocker: MockerFixture) -> None:
+    """Si falla el UPDATE, las anotaciones vuelven a Redis sin pisar las nuevas"""
+    redis = _redis(mocker, {"1": "1700000000.0"})
+    db = mocker.MagicMock()
+    db.execute.side_effect = RuntimeError("BD caída")
+
+    try:
+        volcar_uso_api_keys(db, redis)
+    except RuntimeError:
+        pass
+
+    redis.pipeline.return_value.hsetnx.assert_called_once_with(
+        CLAVE_REDIS_USO, "1", "1700000000.0"
+    )
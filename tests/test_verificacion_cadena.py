@@ -0,0 +1,100 @@
+"""Tests para la comprobación de la cadena de huellas (sin BD)"""
+
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Generator, List, Optional
+from uuid import uuid4
+
+import pytest
+
+from app.core.utils.huella import EntradaHuella, motor_huella
+from app.domain.services.verificacion_cadena import (
+    MOTIVO_ENLACE,
+    MOTIVO_HUELLA,
+    _comprobar,
+)
+from app.infrastructure.aeat.models.suministro_informacion import (
+    ClaveTipoFacturaType,
+    TipoOperacionType,
+)
+
+
+@pytest.fixture(autouse=True)
+def zona_madrid(monkeypatch: pytest.MonkeyPatch) -> Generator[None, None, None]:
+    monkeypatch.setenv("TZ", "Europe/Madrid")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _cadena(n: int) -> List[Any]:
+    """Filas con la forma de COLUMNAS_VERIFICACION, correctamente encadenadas"""
+    inicio = datetime(2024, 11, 14, 10, 30, tzinfo=timezone.utc)
+    filas = []
+    anterior: Optional[str] = None
+    for i in range(n):
+        fila = SimpleNamespace(
+            id=uuid4(),
+            created_at=inicio + timedelta(seconds=i),
+            emisor_nif="89890001K",
+            serie="A",
+            numero=str(i + 1),
+            fecha_expedicion=date(2024, 11, 14),
+            tipo_factura=ClaveTipoFacturaType.F1,
+            tipo_operacion=TipoOperacionType.ALTA,
+            cuota_total=Decimal("21.00"),
+            importe_total=Decimal("121.00"),
+            anterior_huella=anterior,
+        )
+        fila.huella = motor_huella.huella_alta(
+            EntradaHuella(
+                nif_emisor=fila.emisor_nif,
+                numero_serie=f"A{i + 1}",
+                fecha_expedicion="14-11-2024",
+                tipo_factura="F1",
+                cuota_total=fila.cuota_total,
+                importe_total=fila.importe_total,
+                fecha_hora_gen=fila.created_at,
+            ),
+            anterior,
+        )
+        anterior = fila.huella
+        filas.append(fila)
+    return filas
+
+
+def _roturas(filas: List[Any]) -> List[Any]:
+    roturas = []
+    previa = None
+    for posicion, fila in enumerate(filas, start=1):
+        roturas.extend(_comprobar(fila, previa, posicion))
+        previa = fila.huella
+    return roturas
+
+
+def test_cadena_intacta() -> None:
+    assert _roturas(_cadena(5)) == []
+
+
+def test_registro_alterado_se_localiza() -> None:
+    filas = _cadena(5)
+    filas[2].importe_total = Decimal("999.00")
+
+    roturas = _roturas(filas)
+
+    # Solo el registro alterado: los siguientes enlazan con la huella guardada
+    assert [(r.posicion, r.motivo) for r in roturas] == [(3, MOTIVO_HUELLA)]
+    assert roturas[0].encontrado == filas[2].huella
+
+
+def test_enlace_roto_se_localiza() -> None:
+    filas = _cadena(4)
+    del filas[1]  # registro eliminado de la cadena
+
+    roturas = _roturas(filas)
+
+    assert [(r.posicion, r.motivo) for r in roturas] == [(2, MOTIVO_ENLACE)]
+    assert roturas[0].esperado == filas[0].huella